@@ -0,0 +1,88 @@
+"""add session_id to astrology state notification
+
+Revision ID: 0b2d4f6a8c1e
+Revises: a7c9e1b3d5f8
+Create Date: 2026-10-19 19:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "0b2d4f6a8c1e"
+down_revision: Union[str, None] = "a7c9e1b3d5f8"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+NOTIFY_FUNCTION = """
+        CREATE OR REPLACE FUNCTION notify_astrology_state_change() RETURNS trigger
+        LANGUAGE plpgsql AS $$
+        DECLARE
+            old_stage text;
+            new_stage text;
+        BEGIN
+            new_stage := astrology_stage(
+                NEW.is_target, NEW.required_info, NEW.result, NEW.result_voice_path, NEW.is_played
+            );
+            IF TG_OP = 'UPDATE' THEN
+                old_stage := astrology_stage(
+                    OLD.is_target, OLD.required_info, OLD.result, OLD.result_voice_path, OLD.is_played
+                );
+                IF old_stage = new_stage THEN
+                    RETURN NULL;
+                END IF;
+            END IF;
+            PERFORM pg_notify(
+                'astrology_state_' || new_stage,
+                json_build_object(
+                    'session_id', NEW.session_id,
+                    'message_id', NEW.message_id,
+                    'from_stage', old_stage,
+                    'to_stage', new_stage
+                )::text
+            );
+            RETURN NULL;
+        END
+        $$
+"""
+
+PREVIOUS_NOTIFY_FUNCTION = """
+        CREATE OR REPLACE FUNCTION notify_astrology_state_change() RETURNS trigger
+        LANGUAGE plpgsql AS $$
+        DECLARE
+            old_stage text;
+            new_stage text;
+        BEGIN
+            new_stage := astrology_stage(
+                NEW.is_target, NEW.required_info, NEW.result, NEW.result_voice_path, NEW.is_played
+            );
+            IF TG_OP = 'UPDATE' THEN
+                old_stage := astrology_stage(
+                    OLD.is_target, OLD.required_info, OLD.result, OLD.result_voice_path, OLD.is_played
+                );
+                IF old_stage = new_stage THEN
+                    RETURN NULL;
+                END IF;
+            END IF;
+            PERFORM pg_notify(
+                'astrology_state_' || new_stage,
+                json_build_object(
+                    'message_id', NEW.message_id,
+                    'from_stage', old_stage,
+                    'to_stage', new_stage
+                )::text
+            );
+            RETURN NULL;
+        END
+        $$
+"""
+
+
+def upgrade() -> None:
+    op.execute(NOTIFY_FUNCTION)
+
+
+def downgrade() -> None:
+    op.execute(PREVIOUS_NOTIFY_FUNCTION)
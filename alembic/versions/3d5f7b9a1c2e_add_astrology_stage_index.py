@@ -0,0 +1,35 @@
+"""add astrology stage index
+
+Revision ID: 3d5f7b9a1c2e
+Revises: 0b2d4f6a8c1e
+Create Date: 2026-10-19 20:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "3d5f7b9a1c2e"
+down_revision: Union[str, None] = "0b2d4f6a8c1e"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+ASTROLOGY_STAGE = (
+    "astrology_stage(is_target, required_info, result, result_voice_path, is_played)"
+)
+
+
+def upgrade() -> None:
+    # 親テーブルに作成すると、既存のパーティションにも作成される
+    op.execute(
+        "CREATE INDEX ix_western_astrology_statuss_stage "
+        f"ON western_astrology_statuss ({ASTROLOGY_STAGE})"
+    )
+    # 式の統計情報を集めるまでは、処理段階で取得する件数を見積もれない
+    op.execute("ANALYZE western_astrology_statuss")
+
+
+def downgrade() -> None:
+    op.execute("DROP INDEX ix_western_astrology_statuss_stage")
@@ -0,0 +1,90 @@
+"""notify astrology state change
+
+Revision ID: 8c1f4e2a9b57
+Revises: 33fa13a73075
+Create Date: 2026-10-19 09:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "8c1f4e2a9b57"
+down_revision: Union[str, None] = "33fa13a73075"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION astrology_stage(
+            is_target boolean,
+            required_info jsonb,
+            result text,
+            result_voice_path text,
+            is_played boolean
+        ) RETURNS text
+        LANGUAGE sql IMMUTABLE AS $$
+            SELECT CASE
+                WHEN NOT is_target THEN 'excluded'
+                WHEN coalesce(required_info ->> 'name', '') = '' THEN 'not_prepared'
+                WHEN result = '' THEN 'no_result'
+                WHEN result_voice_path = '' THEN 'no_voice'
+                WHEN NOT is_played THEN 'waiting_play'
+                ELSE 'played'
+            END
+        $$
+        """
+    )
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION notify_astrology_state_change() RETURNS trigger
+        LANGUAGE plpgsql AS $$
+        DECLARE
+            old_stage text;
+            new_stage text;
+        BEGIN
+            new_stage := astrology_stage(
+                NEW.is_target, NEW.required_info, NEW.result, NEW.result_voice_path, NEW.is_played
+            );
+            IF TG_OP = 'UPDATE' THEN
+                old_stage := astrology_stage(
+                    OLD.is_target, OLD.required_info, OLD.result, OLD.result_voice_path, OLD.is_played
+                );
+                IF old_stage = new_stage THEN
+                    RETURN NULL;
+                END IF;
+            END IF;
+            PERFORM pg_notify(
+                'astrology_state_' || new_stage,
+                json_build_object(
+                    'message_id', NEW.message_id,
+                    'from_stage', old_stage,
+                    'to_stage', new_stage
+                )::text
+            );
+            RETURN NULL;
+        END
+        $$
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER western_astrology_statuss_notify
+            AFTER INSERT OR UPDATE ON western_astrology_statuss
+            FOR EACH ROW EXECUTE FUNCTION notify_astrology_state_change()
+        """
+    )
+
+
+def downgrade() -> None:
+    op.execute(
+        "DROP TRIGGER IF EXISTS western_astrology_statuss_notify ON western_astrology_statuss"
+    )
+    op.execute("DROP FUNCTION IF EXISTS notify_astrology_state_change()")
+    op.execute(
+        "DROP FUNCTION IF EXISTS astrology_stage(boolean, jsonb, text, text, boolean)"
+    )
@@ -0,0 +1,64 @@
+"""compact livechat message json
+
+Revision ID: a1c3e5f7b9d2
+Revises: f2a4c6e8d0b1
+Create Date: 2026-10-19 13:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "a1c3e5f7b9d2"
+down_revision: Union[str, None] = "f2a4c6e8d0b1"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# 1回のトランザクションで書き換える行数
+BATCH_SIZE = 1000
+
+# 主キーの順に BATCH_SIZE 行ずつ、値が null のフィールドを取り除く。
+# 書き換えが必要ない行は更新しない。次のバッチの開始位置として、バッチの最後の主キーを返す
+COMPACT_BATCH = sa.text(
+    """
+    WITH batch AS (
+        SELECT session_id, id FROM youtube_livechat_messages
+        WHERE (session_id, id) > (:session_id, :id)
+        ORDER BY session_id, id
+        LIMIT :limit
+    ), updated AS (
+        UPDATE youtube_livechat_messages AS m
+        SET message = jsonb_strip_nulls(m.message)
+        FROM batch
+        WHERE m.session_id = batch.session_id
+          AND m.id = batch.id
+          AND m.message <> jsonb_strip_nulls(m.message)
+    )
+    SELECT session_id, id FROM batch ORDER BY session_id DESC, id DESC LIMIT 1
+    """
+)
+
+
+def upgrade() -> None:
+    # 行数が多くてもロックやWALが溜まり続けないように、バッチごとにコミットする
+    with op.get_context().autocommit_block():
+        bind = op.get_bind()
+        last = {"session_id": "", "id": ""}
+        while True:
+            row = bind.execute(
+                COMPACT_BATCH, {**last, "limit": BATCH_SIZE}
+            ).one_or_none()
+            if row is None:
+                break
+            last = {"session_id": row.session_id, "id": row.id}
+        # 書き換え前の行の領域を再利用できるようにする（ファイルを縮めるには VACUUM FULL が必要）
+        bind.execute(sa.text("VACUUM ANALYZE youtube_livechat_messages"))
+
+
+def downgrade() -> None:
+    # null のフィールドがなくても同じエンティティとして読み込めるので、元に戻す必要はない
+    pass
@@ -0,0 +1,26 @@
+"""add natal chart to astrology status
+
+Revision ID: a7c9e1b3d5f8
+Revises: f5b7d9e1a3c6
+Create Date: 2026-10-19 17:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "a7c9e1b3d5f8"
+down_revision: Union[str, None] = "f5b7d9e1a3c6"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # 親テーブルに追加すると、既存のパーティションにも追加される
+    op.execute("ALTER TABLE western_astrology_statuss ADD COLUMN natal_chart jsonb")
+
+
+def downgrade() -> None:
+    op.execute("ALTER TABLE western_astrology_statuss DROP COLUMN natal_chart")
@@ -0,0 +1,36 @@
+"""add waiting partial index
+
+Revision ID: b3d5a7c9e2f1
+Revises: 8c1f4e2a9b57
+Create Date: 2026-10-19 10:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "b3d5a7c9e2f1"
+down_revision: Union[str, None] = "8c1f4e2a9b57"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        "ix_western_astrology_statuss_waiting",
+        "western_astrology_statuss",
+        ["message_id"],
+        unique=False,
+        postgresql_where=sa.text("is_target AND NOT is_played"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index(
+        "ix_western_astrology_statuss_waiting",
+        table_name="western_astrology_statuss",
+    )
@@ -0,0 +1,197 @@
+"""add pipeline rollup tables
+
+Revision ID: c4e6a8b0d2f3
+Revises: a1c3e5f7b9d2
+Create Date: 2026-10-19 14:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "c4e6a8b0d2f3"
+down_revision: Union[str, None] = "a1c3e5f7b9d2"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+ASTROLOGY_STAGE = (
+    "astrology_stage(is_target, required_info, result, result_voice_path, is_played)"
+)
+
+
+def upgrade() -> None:
+    op.create_table(
+        "pipeline_stage_counts",
+        sa.Column("session_id", sa.String(), nullable=False),
+        sa.Column("stage", sa.String(), nullable=False),
+        sa.Column("count", sa.BigInteger(), nullable=False),
+        sa.PrimaryKeyConstraint("session_id", "stage"),
+    )
+    op.create_table(
+        "pipeline_stage_throughputs",
+        sa.Column("session_id", sa.String(), nullable=False),
+        sa.Column("minute", sa.TIMESTAMP(timezone=True), nullable=False),
+        sa.Column("stage", sa.String(), nullable=False),
+        sa.Column("count", sa.BigInteger(), nullable=False),
+        sa.PrimaryKeyConstraint("session_id", "minute", "stage"),
+    )
+
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION rollup_stage_changes(
+            session_ids text[],
+            from_stages text[],
+            to_stages text[]
+        ) RETURNS void
+        LANGUAGE sql AS $$
+            WITH changes AS (
+                SELECT * FROM unnest(session_ids, from_stages, to_stages)
+                    AS c(session_id, from_stage, to_stage)
+            ), counted AS (
+                INSERT INTO pipeline_stage_counts AS t (session_id, stage, count)
+                SELECT session_id, stage, sum(n) FROM (
+                    SELECT session_id, to_stage AS stage, 1 AS n
+                    FROM changes WHERE to_stage IS NOT NULL
+                    UNION ALL
+                    SELECT session_id, from_stage, -1
+                    FROM changes WHERE from_stage IS NOT NULL
+                ) AS d
+                GROUP BY session_id, stage
+                HAVING sum(n) <> 0
+                ORDER BY session_id, stage
+                ON CONFLICT (session_id, stage) DO UPDATE SET count = t.count + excluded.count
+            )
+            INSERT INTO pipeline_stage_throughputs AS t (session_id, minute, stage, count)
+            SELECT session_id, date_trunc('minute', now()), to_stage, count(1)
+            FROM changes WHERE to_stage IS NOT NULL
+            GROUP BY session_id, to_stage
+            ORDER BY session_id, to_stage
+            ON CONFLICT (session_id, minute, stage) DO UPDATE SET count = t.count + excluded.count
+        $$
+        """
+    )
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION rollup_astrology_stage_change() RETURNS trigger
+        LANGUAGE plpgsql AS $$
+        BEGIN
+            IF TG_OP = 'INSERT' THEN
+                PERFORM rollup_stage_changes(
+                    array_agg(session_id),
+                    array_agg(NULL::text),
+                    array_agg(astrology_stage(
+                        is_target, required_info, result, result_voice_path, is_played
+                    ))
+                ) FROM new_rows;
+            ELSIF TG_OP = 'UPDATE' THEN
+                PERFORM rollup_stage_changes(
+                    array_agg(session_id), array_agg(from_stage), array_agg(to_stage)
+                ) FROM (
+                    SELECT session_id,
+                           astrology_stage(
+                               o.is_target, o.required_info, o.result, o.result_voice_path, o.is_played
+                           ) AS from_stage,
+                           astrology_stage(
+                               n.is_target, n.required_info, n.result, n.result_voice_path, n.is_played
+                           ) AS to_stage
+                    FROM new_rows AS n JOIN old_rows AS o USING (session_id, message_id)
+                ) AS c
+                WHERE from_stage <> to_stage;
+            ELSE
+                PERFORM rollup_stage_changes(
+                    array_agg(session_id),
+                    array_agg(astrology_stage(
+                        is_target, required_info, result, result_voice_path, is_played
+                    )),
+                    array_agg(NULL::text)
+                ) FROM old_rows;
+            END IF;
+            RETURN NULL;
+        END
+        $$
+        """
+    )
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION rollup_livechat_message_change() RETURNS trigger
+        LANGUAGE plpgsql AS $$
+        BEGIN
+            IF TG_OP = 'INSERT' THEN
+                PERFORM rollup_stage_changes(
+                    array_agg(session_id), array_agg(NULL::text), array_agg('message'::text)
+                ) FROM new_rows;
+            ELSE
+                PERFORM rollup_stage_changes(
+                    array_agg(session_id), array_agg('message'::text), array_agg(NULL::text)
+                ) FROM old_rows;
+            END IF;
+            RETURN NULL;
+        END
+        $$
+        """
+    )
+
+    # 既にあるデータを集計する。途中の段階に入った時刻は残っていないので、1分ごとの処理件数は
+    # メッセージは作成時刻、占星術ステータスは最後の更新時刻に現在の段階に入ったものとして数える
+    op.execute(
+        f"""
+        INSERT INTO pipeline_stage_counts (session_id, stage, count)
+        SELECT session_id, 'message', count(1) FROM youtube_livechat_messages
+        GROUP BY session_id
+        UNION ALL
+        SELECT session_id, {ASTROLOGY_STAGE}, count(1) FROM western_astrology_statuss
+        GROUP BY 1, 2
+        """
+    )
+    op.execute(
+        f"""
+        INSERT INTO pipeline_stage_throughputs (session_id, minute, stage, count)
+        SELECT session_id, date_trunc('minute', created_at), 'message', count(1)
+        FROM youtube_livechat_messages
+        GROUP BY 1, 2
+        UNION ALL
+        SELECT session_id, date_trunc('minute', updated_at), {ASTROLOGY_STAGE}, count(1)
+        FROM western_astrology_statuss
+        GROUP BY 1, 2, 3
+        """
+    )
+
+    # 集計した後の変更だけを数えるように、トリガーは最後に作成する
+    for table, function in [
+        ("western_astrology_statuss", "rollup_astrology_stage_change"),
+        ("youtube_livechat_messages", "rollup_livechat_message_change"),
+    ]:
+        op.execute(
+            f"CREATE TRIGGER {table}_rollup_insert AFTER INSERT ON {table} "
+            f"REFERENCING NEW TABLE AS new_rows "
+            f"FOR EACH STATEMENT EXECUTE FUNCTION {function}()"
+        )
+        op.execute(
+            f"CREATE TRIGGER {table}_rollup_delete AFTER DELETE ON {table} "
+            f"REFERENCING OLD TABLE AS old_rows "
+            f"FOR EACH STATEMENT EXECUTE FUNCTION {function}()"
+        )
+    op.execute(
+        "CREATE TRIGGER western_astrology_statuss_rollup_update "
+        "AFTER UPDATE ON western_astrology_statuss "
+        "REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows "
+        "FOR EACH STATEMENT EXECUTE FUNCTION rollup_astrology_stage_change()"
+    )
+
+
+def downgrade() -> None:
+    op.execute(
+        "DROP TRIGGER western_astrology_statuss_rollup_update ON western_astrology_statuss"
+    )
+    for table in ["western_astrology_statuss", "youtube_livechat_messages"]:
+        op.execute(f"DROP TRIGGER {table}_rollup_insert ON {table}")
+        op.execute(f"DROP TRIGGER {table}_rollup_delete ON {table}")
+    op.execute("DROP FUNCTION rollup_livechat_message_change()")
+    op.execute("DROP FUNCTION rollup_astrology_stage_change()")
+    op.execute("DROP FUNCTION rollup_stage_changes(text[], text[], text[])")
+    op.drop_table("pipeline_stage_throughputs")
+    op.drop_table("pipeline_stage_counts")
@@ -0,0 +1,33 @@
+"""add updated_at index
+
+Revision ID: d7e9f1a3b5c8
+Revises: b3d5a7c9e2f1
+Create Date: 2026-10-19 11:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "d7e9f1a3b5c8"
+down_revision: Union[str, None] = "b3d5a7c9e2f1"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        "ix_western_astrology_statuss_updated_at",
+        "western_astrology_statuss",
+        ["updated_at"],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index(
+        "ix_western_astrology_statuss_updated_at",
+        table_name="western_astrology_statuss",
+    )
@@ -0,0 +1,64 @@
+"""add livechat search indexes
+
+Revision ID: e8f0a2c4b6d9
+Revises: c4e6a8b0d2f3
+Create Date: 2026-10-19 15:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "e8f0a2c4b6d9"
+down_revision: Union[str, None] = "c4e6a8b0d2f3"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+AUTHOR_NAME = "((message -> 'authorDetails') ->> 'displayName')"
+DISPLAY_MESSAGE = "((message -> 'snippet') ->> 'displayMessage')"
+
+# app/infrastructure/tables.py の LIVECHAT_NGRAMS_FUNCTION_DDL と同じ
+NGRAMS_FUNCTION = """
+CREATE OR REPLACE FUNCTION livechat_ngrams(doc text) RETURNS text[]
+LANGUAGE sql IMMUTABLE STRICT PARALLEL SAFE AS $$
+    SELECT coalesce(array_agg(DISTINCT substr(lower(doc), i, n)), '{}')
+    FROM generate_series(1, 2) AS n, generate_series(1, char_length(doc) - n + 1) AS i
+$$
+"""
+
+# app/infrastructure/tables.py の LIVECHAT_QUERY_NGRAMS_FUNCTION_DDL と同じ
+QUERY_NGRAMS_FUNCTION = """
+CREATE OR REPLACE FUNCTION livechat_query_ngrams(term text) RETURNS text[]
+LANGUAGE sql IMMUTABLE STRICT PARALLEL SAFE AS $$
+    SELECT CASE
+        WHEN char_length(term) < 2 THEN ARRAY[lower(term)]
+        ELSE ARRAY(
+            SELECT DISTINCT substr(lower(term), i, 2)
+            FROM generate_series(1, char_length(term) - 1) AS i
+        )
+    END
+$$
+"""
+
+
+def upgrade() -> None:
+    op.execute(NGRAMS_FUNCTION)
+    op.execute(QUERY_NGRAMS_FUNCTION)
+    # 親テーブルに作成すると、既存のパーティションにも作成される
+    op.execute(
+        "CREATE INDEX ix_youtube_livechat_messages_author_name_ngram "
+        f"ON youtube_livechat_messages USING gin (livechat_ngrams({AUTHOR_NAME}))"
+    )
+    op.execute(
+        "CREATE INDEX ix_youtube_livechat_messages_display_message_ngram "
+        f"ON youtube_livechat_messages USING gin (livechat_ngrams({DISPLAY_MESSAGE}))"
+    )
+
+
+def downgrade() -> None:
+    op.execute("DROP INDEX ix_youtube_livechat_messages_display_message_ngram")
+    op.execute("DROP INDEX ix_youtube_livechat_messages_author_name_ngram")
+    op.execute("DROP FUNCTION livechat_query_ngrams(text)")
+    op.execute("DROP FUNCTION livechat_ngrams(text)")
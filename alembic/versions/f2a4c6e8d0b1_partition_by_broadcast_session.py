@@ -0,0 +1,210 @@
+"""partition by broadcast session
+
+Revision ID: f2a4c6e8d0b1
+Revises: d7e9f1a3b5c8
+Create Date: 2026-10-19 12:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "f2a4c6e8d0b1"
+down_revision: Union[str, None] = "d7e9f1a3b5c8"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# 既存のデータをまとめて移す配信セッション
+LEGACY_SESSION_ID = "legacy"
+
+NOTIFY_TRIGGER = """
+CREATE TRIGGER western_astrology_statuss_notify
+    AFTER INSERT OR UPDATE ON western_astrology_statuss
+    FOR EACH ROW EXECUTE FUNCTION notify_astrology_state_change()
+"""
+
+
+def _timestamps() -> list[sa.Column]:
+    return [
+        sa.Column(
+            "created_at",
+            sa.TIMESTAMP(timezone=True),
+            server_default=sa.text("now()"),
+            nullable=False,
+        ),
+        sa.Column(
+            "updated_at",
+            sa.TIMESTAMP(timezone=True),
+            server_default=sa.text("now()"),
+            nullable=False,
+        ),
+    ]
+
+
+def _create_state_indexes() -> None:
+    op.create_index(
+        "ix_western_astrology_statuss_waiting",
+        "western_astrology_statuss",
+        ["message_id"],
+        unique=False,
+        postgresql_where=sa.text("is_target AND NOT is_played"),
+    )
+    op.create_index(
+        "ix_western_astrology_statuss_updated_at",
+        "western_astrology_statuss",
+        ["updated_at"],
+        unique=False,
+    )
+
+
+def upgrade() -> None:
+    op.create_table(
+        "broadcast_sessions",
+        sa.Column("id", sa.String(), nullable=False),
+        sa.Column(
+            "started_at",
+            sa.TIMESTAMP(timezone=True),
+            server_default=sa.text("now()"),
+            nullable=False,
+        ),
+        sa.Column("archived_at", sa.TIMESTAMP(timezone=True), nullable=True),
+        sa.Column("archive_path", sa.Text(), nullable=True),
+        *_timestamps(),
+        sa.PrimaryKeyConstraint("id"),
+    )
+
+    # パーティションテーブルには変更できないため、退避してから作り直す
+    op.execute(
+        "CREATE TEMP TABLE youtube_livechat_messages_backup AS "
+        "SELECT * FROM youtube_livechat_messages"
+    )
+    op.execute(
+        "CREATE TEMP TABLE western_astrology_statuss_backup AS "
+        "SELECT * FROM western_astrology_statuss"
+    )
+    op.drop_table("western_astrology_statuss")
+    op.drop_table("youtube_livechat_messages")
+
+    op.create_table(
+        "youtube_livechat_messages",
+        sa.Column("session_id", sa.String(), nullable=False),
+        sa.Column("id", sa.String(), nullable=False),
+        sa.Column("message", postgresql.JSONB(astext_type=sa.Text()), nullable=False),
+        *_timestamps(),
+        sa.PrimaryKeyConstraint("session_id", "id"),
+        postgresql_partition_by="LIST (session_id)",
+    )
+    op.create_table(
+        "western_astrology_statuss",
+        sa.Column("session_id", sa.String(), nullable=False),
+        sa.Column("message_id", sa.String(), nullable=False),
+        sa.Column("is_target", sa.Boolean(), nullable=False),
+        sa.Column(
+            "required_info", postgresql.JSONB(astext_type=sa.Text()), nullable=False
+        ),
+        sa.Column("result", sa.Text(), nullable=False),
+        sa.Column("result_voice_path", sa.Text(), nullable=False),
+        sa.Column("is_played", sa.Boolean(), nullable=False),
+        *_timestamps(),
+        sa.ForeignKeyConstraint(
+            ["session_id", "message_id"],
+            ["youtube_livechat_messages.session_id", "youtube_livechat_messages.id"],
+        ),
+        sa.PrimaryKeyConstraint("session_id", "message_id"),
+        postgresql_partition_by="LIST (session_id)",
+    )
+    _create_state_indexes()
+
+    # 既存のデータは legacy の配信セッションに移す
+    op.execute(
+        f"INSERT INTO broadcast_sessions (id, started_at) "
+        f"VALUES ('{LEGACY_SESSION_ID}', '-infinity')"
+    )
+    for table in ["youtube_livechat_messages", "western_astrology_statuss"]:
+        op.execute(
+            f"CREATE TABLE {table}_{LEGACY_SESSION_ID} "
+            f"PARTITION OF {table} FOR VALUES IN ('{LEGACY_SESSION_ID}')"
+        )
+    op.execute(
+        f"INSERT INTO youtube_livechat_messages "
+        f"SELECT '{LEGACY_SESSION_ID}', id, message, created_at, updated_at "
+        f"FROM youtube_livechat_messages_backup"
+    )
+    op.execute(
+        f"INSERT INTO western_astrology_statuss "
+        f"SELECT '{LEGACY_SESSION_ID}', message_id, is_target, required_info, result, "
+        f"result_voice_path, is_played, created_at, updated_at "
+        f"FROM western_astrology_statuss_backup"
+    )
+    op.execute("DROP TABLE western_astrology_statuss_backup")
+    op.execute("DROP TABLE youtube_livechat_messages_backup")
+
+    # 移したデータで通知しないように、トリガーは最後に作成する
+    op.execute(NOTIFY_TRIGGER)
+
+
+def downgrade() -> None:
+    # アーカイブ済みの配信セッションのデータは戻さない。
+    # 配信セッションをまたいで同じIDのメッセージがある場合は、最初の1件だけを残す
+    op.execute(
+        "CREATE TEMP TABLE youtube_livechat_messages_backup AS "
+        "SELECT * FROM youtube_livechat_messages"
+    )
+    op.execute(
+        "CREATE TEMP TABLE western_astrology_statuss_backup AS "
+        "SELECT * FROM western_astrology_statuss"
+    )
+    op.execute("DROP TABLE western_astrology_statuss")
+    op.execute("DROP TABLE youtube_livechat_messages")
+    op.drop_table("broadcast_sessions")
+
+    op.create_table(
+        "youtube_livechat_messages",
+        sa.Column("id", sa.String(), nullable=False),
+        sa.Column("message", postgresql.JSONB(astext_type=sa.Text()), nullable=False),
+        *_timestamps(),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_table(
+        "western_astrology_statuss",
+        sa.Column("message_id", sa.String(), nullable=False),
+        sa.Column("is_target", sa.Boolean(), nullable=False),
+        sa.Column(
+            "required_info", postgresql.JSONB(astext_type=sa.Text()), nullable=False
+        ),
+        sa.Column("result", sa.Text(), nullable=False),
+        sa.Column("result_voice_path", sa.Text(), nullable=False),
+        sa.Column("is_played", sa.Boolean(), nullable=False),
+        *_timestamps(),
+        sa.ForeignKeyConstraint(["message_id"], ["youtube_livechat_messages.id"]),
+        sa.PrimaryKeyConstraint("message_id"),
+    )
+    op.create_index(
+        "ix_western_astrology_statuss_message_id",
+        "western_astrology_statuss",
+        ["message_id"],
+        unique=True,
+    )
+    _create_state_indexes()
+
+    op.execute(
+        "INSERT INTO youtube_livechat_messages "
+        "SELECT DISTINCT ON (id) id, message, created_at, updated_at "
+        "FROM youtube_livechat_messages_backup ORDER BY id, created_at "
+        "ON CONFLICT DO NOTHING"
+    )
+    op.execute(
+        "INSERT INTO western_astrology_statuss "
+        "SELECT DISTINCT ON (message_id) message_id, is_target, required_info, result, "
+        "result_voice_path, is_played, created_at, updated_at "
+        "FROM western_astrology_statuss_backup ORDER BY message_id, created_at "
+        "ON CONFLICT DO NOTHING"
+    )
+    op.execute("DROP TABLE western_astrology_statuss_backup")
+    op.execute("DROP TABLE youtube_livechat_messages_backup")
+    op.execute(NOTIFY_TRIGGER)
@@ -0,0 +1,38 @@
+"""add info extraction cache
+
+Revision ID: f5b7d9e1a3c6
+Revises: e8f0a2c4b6d9
+Create Date: 2026-10-19 16:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "f5b7d9e1a3c6"
+down_revision: Union[str, None] = "e8f0a2c4b6d9"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute(
+        """
+        CREATE TABLE info_extraction_caches (
+            key text NOT NULL PRIMARY KEY,
+            info jsonb NOT NULL,
+            created_at timestamp with time zone NOT NULL DEFAULT now(),
+            updated_at timestamp with time zone NOT NULL DEFAULT now()
+        )
+        """
+    )
+    op.execute(
+        "CREATE INDEX ix_info_extraction_caches_updated_at "
+        "ON info_extraction_caches (updated_at)"
+    )
+
+
+def downgrade() -> None:
+    op.execute("DROP TABLE info_extraction_caches")
@@ -1,10 +1,7 @@
 from logging import getLogger
 
 from app.application.audio import play_audio_file
-from app.domain.repositories import (
-    WesternAstrologyStateRepository,
-    YoutubeLiveChatMessageRepository,
-)
+from app.domain.repositories import WesternAstrologyStateRepository
 from app.domain.westernastrology import WesternAstrologyStateEntity
 from app.domain.youtube.live import LiveChatMessageEntity
 
@@ -12,13 +9,8 @@ logger = getLogger(__name__)
 
 
 class AutoAudioPlayer:
-    def __init__(
-        self,
-        state_repo: WesternAstrologyStateRepository,
-        chat_repo: YoutubeLiveChatMessageRepository,
-    ) -> None:
+    def __init__(self, state_repo: WesternAstrologyStateRepository) -> None:
         self.state_repo = state_repo
-        self.chat_repo = chat_repo
         self.target_state: WesternAstrologyStateEntity | None = None
         self.target_chat: LiveChatMessageEntity | None = None
 
@@ -35,21 +27,14 @@ class AutoAudioPlayer:
         """
         Set the target state to play audio.
         """
-        state_list = self.state_repo.get_should_play_audio_status()
+        # 再生する1件だけを、メッセージと一緒に1回のクエリで取得する
+        state_list, chat_messages = (
+            self.state_repo.get_should_play_audio_state_and_message(limit=1)
+        )
         if not state_list:
             self._reset_target()
             return
         self.target_state = state_list[0]
-
-        chat_messages: list = self.chat_repo.get_by_message_ids(
-            [self.target_state.message_id]
-        )
-        if not chat_messages:
-            # TODO: state.message_id は chat_messageのidを外部キーとして持っているので、ここでエラーになることはないはず
-            #  DBでJoinして取得するように修正する
-            raise RuntimeError(
-                f"Failed to get chat message for message_id={self.target_state.message_id}"
-            )
         self.target_chat = chat_messages[0]
 
     def play_target(self) -> None:
@@ -63,7 +48,7 @@ class AutoAudioPlayer:
         )
         play_audio_file(self.target_state.result_voice_path)
         self.target_state.is_played = True
-        self.state_repo.save([self.target_state])
+        self.state_repo.mark_played([self.target_state.message_id])
         logger.info(
             f"Succeeded to play audio for astrology result: (message_id={self.target_state.message_id})"
         )
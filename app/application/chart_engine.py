@@ -0,0 +1,220 @@
+# ===============================================================
+# 出生図（ネイタルチャート）をまとめて計算するエンジン
+# flatlib を通さずに pyswisseph（swe.calc_ut / swe.houses）を直接使い、
+# 複数の出生データの const.LIST_OBJECTS の黄経・星座・ハウスを一度に求める。
+# 計算の方法は flatlib（natal_chart.compute_natal_chart）と同じにしてあり、結果も一致する
+# ===============================================================
+
+import math
+from pathlib import Path
+from typing import Iterable, NamedTuple
+
+import swisseph as swe
+from flatlib import const
+
+from app.domain.westernastrology import NatalChartEntity, PlanetPositionEntity
+
+# 天体と Swiss Ephemeris の天体番号（flatlib と同じ。ノースノードは平均交点）
+SWE_OBJECTS = {
+    const.SUN: swe.SUN,
+    const.MOON: swe.MOON,
+    const.MERCURY: swe.MERCURY,
+    const.VENUS: swe.VENUS,
+    const.MARS: swe.MARS,
+    const.JUPITER: swe.JUPITER,
+    const.SATURN: swe.SATURN,
+    const.URANUS: swe.URANUS,
+    const.NEPTUNE: swe.NEPTUNE,
+    const.PLUTO: swe.PLUTO,
+    const.CHIRON: swe.CHIRON,
+    const.NORTH_NODE: swe.MEAN_NODE,
+}
+
+# flatlib の既定のハウスシステム（アルカビティウス）
+HOUSE_SYSTEM = b"B"
+# ハウスの境界の手前5度から、そのハウスに入っているとみなす（flatlib と同じ）
+HOUSE_OFFSET = -5.0
+# 反復計算の許容誤差（1秒角）
+MAX_ERROR = 0.0003
+# 月の平均日運動（度）
+MOON_MEAN_MOTION = 13.1833
+# 黄道傾斜角（flatlib の赤道座標への変換と同じ値）
+OBLIQUITY = math.radians(23.44)
+
+
+class BirthRecord(NamedTuple):
+    """
+    出生図を計算する出生データ
+
+    Attributes:
+        birthday: 誕生日（YYYY/MM/DD）
+        birth_time: 出生時刻（HH:MM）
+        latitude: 出生地の緯度
+        longitude: 出生地の経度
+        utc_offset: 出生時刻のUTCからの時差（+HH:MM）
+    """
+
+    birthday: str
+    birth_time: str
+    latitude: float
+    longitude: float
+    utc_offset: str
+
+
+def _hours(text: str) -> float:
+    # "+HH:MM[:SS]" を時間に変換する（flatlib.angle.strFloat と同じ計算）
+    values = [abs(int(x)) for x in text.split(":")]
+    value = sum(v / 60**i for i, v in enumerate(values))
+    return -value if text.startswith("-") else value
+
+
+def julian_day(birthday: str, birth_time: str, utc_offset: str) -> float:
+    """
+    世界時のユリウス日（グレゴリオ暦。flatlib.datetime.Datetime.jd と同じ計算）
+    """
+    year, month, day = (int(x) for x in birthday.split("/"))
+    a = (14 - month) // 12
+    y = year + 4800 - a
+    m = month + 12 * a - 3
+    jdn = day + (153 * m + 2) // 5 + 365 * y + y // 4 - y // 100 + y // 400 - 32045
+    return jdn + _hours(birth_time) / 24.0 - _hours(utc_offset) / 24.0 - 0.5
+
+
+def _znorm(angle: float) -> float:
+    angle = angle % 360
+    return angle if angle <= 180 else angle - 360
+
+
+def _lon(jd: float, swe_object: int) -> float:
+    return swe.calc_ut(jd, swe_object)[0][0]
+
+
+def _syzygy_moon_lon(jd: float, sun: float, moon: float) -> float:
+    # 直前の新月・満月の時刻を反復で求め、その時の月の黄経を返す
+    dist = (moon - sun) % 360
+    offset = 180 if dist >= 180 else 0
+    while abs(dist) > MAX_ERROR:
+        jd = jd - dist / MOON_MEAN_MOTION
+        sun = _lon(jd, swe.SUN)
+        moon = _lon(jd, swe.MOON)
+        dist = _znorm(moon - (sun - offset))
+    return moon
+
+
+def _equatorial(lon: float, lat: float) -> tuple[float, float]:
+    # 黄道座標から赤経・赤緯（度）に変換する（flatlib.utils.eqCoords と同じ計算）
+    lambda_ = math.radians(lon)
+    beta = math.radians(lat)
+    decl = math.asin(
+        math.sin(OBLIQUITY) * math.sin(lambda_) * math.cos(beta)
+        + math.cos(OBLIQUITY) * math.sin(beta)
+    )
+    ed = math.acos(math.cos(lambda_) * math.cos(beta) / math.cos(decl))
+    ra = ed if lon < 180 else math.radians(360) - ed
+    if abs(_znorm(0 - lon)) < 5 or abs(_znorm(180 - lon)) < 5:
+        a = math.sin(ra) * math.cos(decl)
+        b = math.cos(OBLIQUITY) * math.sin(lambda_) * math.cos(beta) - math.sin(
+            OBLIQUITY
+        ) * math.sin(beta)
+        if math.fabs(a - b) > 0.0003:
+            ra = math.radians(360) - ra
+    return math.degrees(ra), math.degrees(decl)
+
+
+def _is_diurnal(sun_lon: float, sun_lat: float, mc: float, latitude: float) -> bool:
+    # 太陽が地平線より上にあるか（MCからの赤経の差が日周弧の半分以内か）
+    ra, decl = _equatorial(sun_lon, sun_lat)
+    mc_ra, _ = _equatorial(mc, 0.0)
+    ascensional_difference = math.degrees(
+        math.asin(math.tan(math.radians(decl)) * math.tan(math.radians(latitude)))
+    )
+    diurnal_arc = 180 + 2 * ascensional_difference
+    return abs(_znorm(ra - mc_ra)) <= diurnal_arc / 2.0 + MAX_ERROR
+
+
+def _house_of(lon: float, cusps: tuple[float, ...]) -> int:
+    for i in range(12):
+        size = (cusps[(i + 1) % 12] - cusps[i]) % 360
+        if (lon - (cusps[i] + HOUSE_OFFSET)) % 360 < size:
+            return i + 1
+    raise ValueError(f"No house contains longitude {lon}.")
+
+
+def natal_chart_from_longitudes(
+    record: BirthRecord,
+    jd: float,
+    longitudes: dict[str, float],
+    sun_latitude: float,
+    syzygy: float,
+) -> NatalChartEntity:
+    """
+    天体（SWE_OBJECTS）の黄経から、ハウスと残りの感受点を求めて出生図にする。
+    ハウスの計算には天体暦のファイルを使わない
+
+    Args:
+        record: 出生データ
+        jd: 出生時刻の世界時のユリウス日
+        longitudes: SWE_OBJECTS の天体の黄経
+        sun_latitude: 太陽の黄緯（昼の出生かの判定に使う）
+        syzygy: 直前の新月・満月の時の月の黄経
+    """
+    lons = dict(longitudes)
+    cusps, ascmc = swe.houses(jd, record.latitude, record.longitude, HOUSE_SYSTEM)
+    sun, moon = lons[const.SUN], lons[const.MOON]
+    lons[const.SOUTH_NODE] = (lons[const.NORTH_NODE] + 180) % 360
+    lons[const.SYZYGY] = syzygy
+    asc, mc = ascmc[0], ascmc[1]
+    if _is_diurnal(sun, sun_latitude, mc, record.latitude):
+        lons[const.PARS_FORTUNA] = (asc + moon - sun) % 360
+    else:
+        lons[const.PARS_FORTUNA] = (asc + sun - moon) % 360
+
+    return NatalChartEntity(
+        positions={
+            obj_id: PlanetPositionEntity(
+                sign=const.LIST_SIGNS[int(lons[obj_id] / 30)],
+                degree=round(lons[obj_id], 2),
+                house=_house_of(lons[obj_id], cusps),
+            )
+            for obj_id in const.LIST_OBJECTS
+        }
+    )
+
+
+def _natal_chart(record: BirthRecord) -> NatalChartEntity:
+    jd = julian_day(record.birthday, record.birth_time, record.utc_offset)
+    lons: dict[str, float] = {}
+    sun_lat = 0.0
+    for obj_id, swe_object in SWE_OBJECTS.items():
+        values = swe.calc_ut(jd, swe_object)[0]
+        lons[obj_id] = values[0]
+        if obj_id == const.SUN:
+            sun_lat = values[1]
+    syzygy = _syzygy_moon_lon(jd, lons[const.SUN], lons[const.MOON])
+    return natal_chart_from_longitudes(record, jd, lons, sun_lat, syzygy)
+
+
+def compute_natal_charts(
+    records: Iterable[BirthRecord], ephemeris_dir: Path | None
+) -> list[NatalChartEntity]:
+    """
+    複数の出生データの出生図をまとめて計算する。
+    天体暦のファイルの場所は最初に一度だけ設定し、同じ出生データは一度だけ計算する
+
+    Args:
+        records: 出生データ
+        ephemeris_dir: 天体暦のファイルの保存先。None の場合は設定済みの場所を使う（ワーカープロセスなど）
+
+    Returns:
+        records と同じ順の出生図（同じ出生データには、同じオブジェクトを返す）
+    """
+    if ephemeris_dir is not None:
+        swe.set_ephe_path(str(ephemeris_dir))
+    charts: dict[BirthRecord, NatalChartEntity] = {}
+    results = []
+    for record in records:
+        chart = charts.get(record)
+        if chart is None:
+            chart = charts[record] = _natal_chart(record)
+        results.append(chart)
+    return results
@@ -0,0 +1,259 @@
+# ===============================================================
+# 出生図の計算のプロセスプール
+# 出生図の計算はCPUを使い、Swiss Ephemeris のグローバルな状態（swe.set_ephe_path）は複数のスレッドから使えないので、
+# 天体暦のファイルの場所を設定済みのワーカープロセスで計算する。
+# 占い結果の生成のスレッドは結果を待つだけになり、UIや取得・保存のスレッドとGILを取り合わない。
+# ワーカーは他のスレッドを始める前に fork するので、起動後に起動し直すことはしない。
+# ワーカーを使えない場合（起動前・異常終了後）は、呼び出したスレッドで計算する
+# ===============================================================
+
+import multiprocessing
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from logging import getLogger
+from typing import Any, Callable
+
+from pydantic import BaseModel
+
+from app.application.chart_engine import BirthRecord
+from app.domain.westernastrology import NatalChartEntity
+
+logger = getLogger(__name__)
+
+
+class ChartServiceStats(BaseModel):
+    """
+    出生図の計算のプロセスプールの状況
+    """
+
+    workers: int
+    # 計算を待っている（計算中を含む）バッチと出生データの数
+    pending_batches: int
+    pending_records: int
+    # 待っている出生データの数の最大値
+    max_pending_records: int
+    # 計算を終えたバッチと出生データの数と、バッチの投入から完了までの合計時間
+    completed_batches: int
+    completed_records: int
+    seconds: float
+    failed_batches: int
+    # ワーカーを使えずに、呼び出したスレッドで計算したバッチの数
+    in_thread_batches: int
+    # ワーカーが異常終了して使えなくなったかどうか
+    broken: bool
+
+    @property
+    def mean_latency(self) -> float:
+        return self.seconds / self.completed_batches if self.completed_batches else 0.0
+
+
+def _ready() -> bool:
+    return True
+
+
+class ChartService:
+    """
+    出生データのバッチをワーカープロセスで計算する。複数のスレッドから使える。
+    ワーカーは fork で起動する（spawn と forkserver ではワーカーでUIのスクリプトが読み込み直されるため）。
+    スレッドを持つプロセスから fork すると、他のスレッドが保持していたロックがワーカーで解放されないことがあるので、
+    他のスレッドを始める前に start() でワーカーを起動しておくこと。
+    start() の前と、ワーカーが異常終了した後は、ワーカーを起動せずに呼び出したスレッドで計算する
+    """
+
+    def __init__(
+        self,
+        workers: int,
+        batch_size: int,
+        compute: Callable[[list[BirthRecord]], list[NatalChartEntity]],
+        initializer: Callable[..., None],
+        initargs: tuple[Any, ...] = (),
+        fallback: Callable[[list[BirthRecord]], list[NatalChartEntity]] | None = None,
+    ):
+        """
+        Args:
+            workers: ワーカープロセスの数
+            batch_size: 1回でワーカーに渡す出生データの数の上限
+            compute: ワーカーで出生図を計算する関数（出生データと同じ順の出生図を返す）。モジュールの関数を渡す
+            initializer: ワーカーの起動時に一度だけ呼ぶ関数（天体暦のファイルの場所の設定など）
+            initargs: initializer の引数
+            fallback: ワーカーを使えない時に、呼び出したスレッドで出生図を計算する関数。None の場合は compute
+        """
+        if workers < 1:
+            raise ValueError("workers must be 1 or more.")
+        if batch_size < 1:
+            raise ValueError("batch_size must be 1 or more.")
+        self.workers = workers
+        self.batch_size = batch_size
+        self._compute = compute
+        self._initializer = initializer
+        self._initargs = initargs
+        self._fallback = fallback or compute
+        self._lock = threading.Lock()
+        self._executor: ProcessPoolExecutor | None = None
+        # ワーカーが異常終了した場合は True（起動し直さない）
+        self._broken = False
+        self._pending_batches = 0
+        self._pending_records = 0
+        self._max_pending_records = 0
+        self._completed_batches = 0
+        self._completed_records = 0
+        self._seconds = 0.0
+        self._failed_batches = 0
+        self._in_thread_batches = 0
+
+    def start(self) -> None:
+        """
+        ワーカープロセスを起動し、初期化が終わるまで待つ。
+        起動済みの場合と、ワーカーが異常終了した後は何もしない
+        """
+        with self._lock:
+            if self._executor is not None or self._broken:
+                return
+            executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("fork"),
+                initializer=self._initializer,
+                initargs=self._initargs,
+            )
+            # fork の場合、最初の投入で全てのワーカーが起動する
+            executor.submit(_ready).result()
+            self._executor = executor
+        logger.info(f"Started {self.workers} chart workers.")
+
+    def shutdown(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+    def _mark_broken(self, error: BaseException) -> None:
+        with self._lock:
+            if self._broken:
+                return
+            self._broken = True
+            executor, self._executor = self._executor, None
+        logger.error(
+            f"Chart workers were broken. Compute natal charts in the calling threads: {error}"
+        )
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def _compute_in_thread(self, records: list[BirthRecord]) -> list[NatalChartEntity]:
+        charts = self._fallback(records)
+        with self._lock:
+            self._in_thread_batches += 1
+        return charts
+
+    def _submit(self, records: list[BirthRecord]) -> Future | None:
+        """
+        ワーカーにバッチを投入する。ワーカーを使えない場合は None
+        """
+        with self._lock:
+            if self._executor is None:
+                return None
+            future = self._executor.submit(self._compute, records)
+            self._pending_batches += 1
+            self._pending_records += len(records)
+            self._max_pending_records = max(
+                self._max_pending_records, self._pending_records
+            )
+        submitted_at = time.perf_counter()
+        # 状況を更新してから結果を返すように、別の Future で結果を渡す
+        result: Future = Future()
+
+        def done(f: Future) -> None:
+            error = f.exception()
+            with self._lock:
+                self._pending_batches -= 1
+                self._pending_records -= len(records)
+                if error is None:
+                    self._completed_batches += 1
+                    self._completed_records += len(records)
+                    self._seconds += time.perf_counter() - submitted_at
+                else:
+                    self._failed_batches += 1
+            if error is None:
+                result.set_result(f.result())
+            else:
+                result.set_exception(error)
+
+        future.add_done_callback(done)
+        return result
+
+    def submit(self, records: list[BirthRecord]) -> Future:
+        """
+        出生データのバッチを投入する。
+        ワーカーを使えない場合（start() の前・ワーカーの異常終了後）は、呼び出したスレッドで計算した結果を返す
+
+        Returns:
+            records と同じ順の出生図のリストを結果に持つ Future。
+            計算中にワーカーが異常終了した場合は BrokenProcessPool を結果に持つ
+        """
+        try:
+            future = self._submit(records)
+        except BrokenProcessPool as e:
+            self._mark_broken(e)
+            future = None
+        if future is not None:
+            return future
+        result: Future = Future()
+        try:
+            result.set_result(self._compute_in_thread(records))
+        except Exception as e:
+            result.set_exception(e)
+        return result
+
+    def compute(self, records: list[BirthRecord]) -> list[NatalChartEntity]:
+        """
+        出生データを batch_size ごとに分けて投入し、全ての結果を待つ。
+        計算中にワーカーが異常終了したバッチは、呼び出したスレッドで一度だけ計算し直す
+
+        Returns:
+            records と同じ順の出生図
+        """
+        batches = [
+            records[i : i + self.batch_size]
+            for i in range(0, len(records), self.batch_size)
+        ]
+        futures = [self.submit(batch) for batch in batches]
+        charts = []
+        for batch, future in zip(batches, futures):
+            try:
+                charts += future.result()
+            except BrokenProcessPool as e:
+                self._mark_broken(e)
+                charts += self._compute_in_thread(batch)
+        return charts
+
+    def stats(self) -> ChartServiceStats:
+        with self._lock:
+            return ChartServiceStats(
+                workers=self.workers,
+                pending_batches=self._pending_batches,
+                pending_records=self._pending_records,
+                max_pending_records=self._max_pending_records,
+                completed_batches=self._completed_batches,
+                completed_records=self._completed_records,
+                seconds=self._seconds,
+                failed_batches=self._failed_batches,
+                in_thread_batches=self._in_thread_batches,
+                broken=self._broken,
+            )
+
+
+def format_chart_service_stats(stats: ChartServiceStats | None) -> str:
+    """
+    画面に表示するための、Markdownの文
+    """
+    if stats is None:
+        return "出生図の計算: ワーカープロセスを使っていません"
+    workers = "異常終了" if stats.broken else str(stats.workers)
+    return (
+        f"出生図の計算（ワーカー {workers}）: 待ち {stats.pending_records} 件"
+        f"（{stats.pending_batches} バッチ, 最大 {stats.max_pending_records} 件）, "
+        f"完了 {stats.completed_records} 件, 失敗 {stats.failed_batches} バッチ, "
+        f"平均 {stats.mean_latency:.3f} 秒/バッチ, "
+        f"スレッドで計算 {stats.in_thread_batches} バッチ"
+    )
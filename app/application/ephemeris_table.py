@@ -0,0 +1,256 @@
+# ===============================================================
+# 天体暦の表（近似の出生図の計算）
+# 天体（chart_engine.SWE_OBJECTS）の毎日0時（世界時）の黄経を、指定した年の範囲だけ前もって計算したファイルを
+# 初めて使う時にメモリマップし、補間して任意の時刻の黄経を求める。ファイルは tools/build_ephemeris_table.py で作成する。
+# 星座を読むには十分な精度で、実行時に天体暦のファイルを使わない
+# ===============================================================
+
+import struct
+import threading
+from pathlib import Path
+
+import numpy as np
+import swisseph as swe
+from flatlib import const
+
+from app.application.chart_engine import (
+    MAX_ERROR,
+    MOON_MEAN_MOTION,
+    SWE_OBJECTS,
+    BirthRecord,
+    julian_day,
+    natal_chart_from_longitudes,
+)
+from app.domain.westernastrology import NatalChartEntity
+
+EPHEMERIS_TABLE_PATH = Path(__file__).parent / "ephemeris" / "ephemeris_table.bin"
+
+# ファイルの形式（リトルエンディアン）
+# ヘッダ: マジックナンバー, 最初の日のユリウス日, 日数, 天体の数
+# 天体ごとの最大誤差（度）: float32 × 天体の数
+# 黄経（度）: float32 × 日数 × 天体の数（SWE_OBJECTS の順）
+_MAGIC = b"EPT1"
+_HEADER = struct.Struct("<4sdII")
+# 直前の新月・満月を探すために、範囲の始まりより前に持っておく日数
+_LEADING_DAYS = 32
+# 3次の補間に使う、前後の日数
+_TRAILING_DAYS = 2
+# 新月・満月を探す反復の上限
+_MAX_SYZYGY_ITERATIONS = 100
+
+_OBJECT_IDS = list(SWE_OBJECTS)
+
+
+def _znorm(angles: np.ndarray) -> np.ndarray:
+    angles = angles % 360
+    return np.where(angles <= 180, angles, angles - 360)
+
+
+def _year_start_jd(year: int) -> float:
+    return swe.julday(year, 1, 1, 0.0)
+
+
+def build_ephemeris_table(
+    start_year: int,
+    end_year: int,
+    ephemeris_dir: Path,
+    path: Path,
+    samples: int = 100_000,
+) -> dict[str, float]:
+    """
+    start_year の1月1日から end_year の12月31日までの天体暦の表を作成する。
+    作成後、範囲内の乱数の時刻で pyswisseph と比べた天体ごとの最大誤差を求めてファイルに書き込む
+
+    Args:
+        start_year: 範囲の始まりの年
+        end_year: 範囲の終わりの年（この年を含む）
+        ephemeris_dir: 表の作成に使う天体暦のファイルの保存先
+        path: 作成するファイル
+        samples: 誤差を確かめる時刻の数
+
+    Returns:
+        天体 -> 最大誤差（度）
+    """
+    if end_year < start_year:
+        raise ValueError("end_year must be start_year or later.")
+    swe.set_ephe_path(str(ephemeris_dir))
+    first_jd = _year_start_jd(start_year) - _LEADING_DAYS
+    days = int(_year_start_jd(end_year + 1) - first_jd) + _TRAILING_DAYS
+    lons = np.array(
+        [
+            [
+                swe.calc_ut(first_jd + day, swe_object)[0][0]
+                for swe_object in SWE_OBJECTS.values()
+            ]
+            for day in range(days)
+        ],
+        dtype="<f4",
+    )
+    max_errors = np.zeros(len(_OBJECT_IDS), dtype="<f4")
+    with open(path, "wb") as f:
+        f.write(_HEADER.pack(_MAGIC, first_jd, days, len(_OBJECT_IDS)))
+        f.write(max_errors.tobytes())
+        f.write(lons.tobytes())
+
+    table = EphemerisTable(path)
+    rng = np.random.default_rng(0)
+    jds = rng.uniform(table.start_jd, table.end_jd, samples)
+    expected = np.array(
+        [
+            [swe.calc_ut(jd, swe_object)[0][0] for swe_object in SWE_OBJECTS.values()]
+            for jd in jds
+        ]
+    )
+    max_errors = (
+        np.abs(_znorm(table.longitudes(jds) - expected)).max(axis=0).astype("<f4")
+    )
+    table.close()
+    with open(path, "r+b") as f:
+        f.seek(_HEADER.size)
+        f.write(max_errors.tobytes())
+    return dict(zip(_OBJECT_IDS, max_errors.tolist()))
+
+
+class EphemerisTable:
+    """
+    天体暦の表のファイルを読み込んで、天体の黄経を補間する。ファイルは初めて使う時にメモリマップする。
+    複数のスレッドから使える
+    """
+
+    def __init__(self, path: Path = EPHEMERIS_TABLE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._lons: np.ndarray | None = None
+        self._first_jd = 0.0
+        self._max_errors: dict[str, float] = {}
+
+    def _load(self) -> np.ndarray:
+        with self._lock:
+            if self._lons is None:
+                with open(self.path, "rb") as f:
+                    magic, first_jd, days, objects = _HEADER.unpack(
+                        f.read(_HEADER.size)
+                    )
+                    if magic != _MAGIC or objects != len(_OBJECT_IDS):
+                        raise ValueError(f"Invalid ephemeris table file: {self.path}")
+                    max_errors = np.frombuffer(f.read(4 * objects), dtype="<f4")
+                self._first_jd = first_jd
+                self._max_errors = dict(zip(_OBJECT_IDS, max_errors.tolist()))
+                self._lons = np.memmap(
+                    self.path,
+                    dtype="<f4",
+                    mode="r",
+                    offset=_HEADER.size + 4 * objects,
+                    shape=(days, objects),
+                )
+            return self._lons
+
+    def close(self) -> None:
+        with self._lock:
+            self._lons = None
+
+    @property
+    def start_jd(self) -> float:
+        """
+        出生図を計算できる範囲の始まりのユリウス日
+        """
+        self._load()
+        return self._first_jd + _LEADING_DAYS
+
+    @property
+    def end_jd(self) -> float:
+        """
+        出生図を計算できる範囲の終わりのユリウス日（この時刻を含まない）
+        """
+        lons = self._load()
+        return self._first_jd + len(lons) - _TRAILING_DAYS
+
+    @property
+    def max_errors(self) -> dict[str, float]:
+        """
+        表の作成時に確かめた、天体ごとの最大誤差（度）
+        """
+        self._load()
+        return dict(self._max_errors)
+
+    def covers(self, jd: float) -> bool:
+        return self.start_jd <= jd < self.end_jd
+
+    def longitudes(self, jds: np.ndarray) -> np.ndarray:
+        """
+        前後4日の黄経を3次のラグランジュ補間して、時刻ごとの天体の黄経を求める
+
+        Args:
+            jds: 世界時のユリウス日
+
+        Returns:
+            (時刻の数, 天体の数) の黄経（度）。天体は SWE_OBJECTS の順
+        """
+        lons = self._load()
+        t = np.asarray(jds, dtype=np.float64) - self._first_jd
+        day = np.floor(t).astype(np.int64)
+        if ((day < 1) | (day + 2 >= len(lons))).any():
+            raise ValueError("Julian day is out of the ephemeris table.")
+        u = (t - day)[:, None]
+        # 2日目の黄経を基準に、前後の日の黄経を360度の折り返しのない差にする
+        points = lons[day[:, None] + np.arange(-1, 3)].astype(np.float64)
+        base = points[:, 1, :]
+        diffs = _znorm(points - base[:, None, :])
+        weights = [
+            -u * (u - 1) * (u - 2) / 6,
+            (u + 1) * (u - 1) * (u - 2) / 2,
+            -(u + 1) * u * (u - 2) / 2,
+            (u + 1) * u * (u - 1) / 6,
+        ]
+        offset = sum(w * diffs[:, i, :] for i, w in enumerate(weights))
+        return (base + offset) % 360
+
+    def _syzygy_moon_lons(
+        self, jds: np.ndarray, sun: np.ndarray, moon: np.ndarray
+    ) -> np.ndarray:
+        # chart_engine と同じ反復で、直前の新月・満月の時の月の黄経を求める
+        sun_index = _OBJECT_IDS.index(const.SUN)
+        moon_index = _OBJECT_IDS.index(const.MOON)
+        jds, moon = jds.copy(), moon.copy()
+        dist = (moon - sun) % 360
+        offset = np.where(dist >= 180, 180.0, 0.0)
+        for _ in range(_MAX_SYZYGY_ITERATIONS):
+            pending = np.abs(dist) > MAX_ERROR
+            if not pending.any():
+                break
+            jds[pending] -= dist[pending] / MOON_MEAN_MOTION
+            lons = self.longitudes(jds[pending])
+            moon[pending] = lons[:, moon_index]
+            dist[pending] = _znorm(
+                moon[pending] - (lons[:, sun_index] - offset[pending])
+            )
+        return moon
+
+    def compute_natal_charts(
+        self, records: list[BirthRecord]
+    ) -> list[NatalChartEntity]:
+        """
+        複数の出生データの出生図を、表の補間でまとめて計算する
+
+        Raises:
+            ValueError: 表の範囲外の出生データがある場合
+        """
+        if not records:
+            return []
+        jds = np.array(
+            [julian_day(r.birthday, r.birth_time, r.utc_offset) for r in records]
+        )
+        lons = self.longitudes(jds)
+        columns = {obj_id: lons[:, i] for i, obj_id in enumerate(_OBJECT_IDS)}
+        syzygies = self._syzygy_moon_lons(jds, columns[const.SUN], columns[const.MOON])
+        return [
+            natal_chart_from_longitudes(
+                record,
+                float(jds[i]),
+                {obj_id: float(column[i]) for obj_id, column in columns.items()},
+                # 太陽の黄緯は1秒角未満なので0とする
+                0.0,
+                float(syzygies[i]),
+            )
+            for i, record in enumerate(records)
+        ]
@@ -0,0 +1,40 @@
+# ===============================================================
+# 占いに必要な情報の抽出結果のキャッシュのキー
+# 見た目だけが違うコメント（全角・半角、空白、大文字・小文字）は同じキーにする
+# ===============================================================
+
+import hashlib
+import re
+import unicodedata
+from typing import Sequence
+
+_SPACES = re.compile(r"\s+")
+
+
+def normalize_comment(text: str) -> str:
+    """
+    NFKC で正規化し（全角の英数字・記号を半角にする）、小文字にして、連続する空白を1つにする
+    """
+    text = unicodedata.normalize("NFKC", text).lower()
+    return _SPACES.sub(" ", text).strip()
+
+
+def extraction_cache_key(
+    text: str,
+    prompt_version: str,
+    model_names: Sequence[str] = (),
+    acceptance_version: str = "",
+) -> str:
+    """
+    正規化したコメントと、抽出の設定（プロンプトのバージョン、使うモデル、結果を採用する条件のバージョン）のハッシュ。
+    プロンプトやモデルの段階、採用の条件を変えると、以前の抽出結果は使われなくなる
+    """
+    source = "\n".join(
+        [
+            prompt_version,
+            ",".join(model_names),
+            acceptance_version,
+            normalize_comment(text),
+        ]
+    )
+    return hashlib.sha256(source.encode("utf-8")).hexdigest()
@@ -0,0 +1,161 @@
+# ===============================================================
+# 占いに必要な情報の段階的な抽出
+# まず安く速いモデルで抽出し、情報が揃わなかったコメントだけを、より強いモデルで抽出し直す
+# ===============================================================
+
+import threading
+import time
+from logging import getLogger
+from typing import Callable, TypeVar
+
+from pydantic import BaseModel
+
+from app.domain.westernastrology import InfoForAstrologyEntity
+
+logger = getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class ExtractionTierStats(BaseModel):
+    """
+    1つのモデル（段階）での抽出の状況
+    """
+
+    model_name: str
+    # このモデルで抽出した回数と、その合計時間
+    # （まとめての抽出に失敗して1件ずつ抽出し直した場合も、合わせて1回とする）
+    calls: int
+    seconds: float
+    # 抽出を試したコメントの数と、そのうちこの段階で結果を使ったコメントの数
+    attempted: int
+    accepted: int
+
+    @property
+    def hit_rate(self) -> float:
+        return self.accepted / self.attempted if self.attempted else 0.0
+
+    @property
+    def mean_latency(self) -> float:
+        return self.seconds / self.calls if self.calls else 0.0
+
+
+class ExtractionTierMetrics:
+    """
+    段階ごとの抽出の状況を集計する。複数のスレッドから使える
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._stats: dict[str, ExtractionTierStats] = {}
+
+    def record(
+        self, model_name: str, seconds: float, attempted: int, accepted: int
+    ) -> None:
+        with self._lock:
+            stats = self._stats.setdefault(
+                model_name,
+                ExtractionTierStats(
+                    model_name=model_name, calls=0, seconds=0, attempted=0, accepted=0
+                ),
+            )
+            stats.calls += 1
+            stats.seconds += seconds
+            stats.attempted += attempted
+            stats.accepted += accepted
+
+    def stats(self) -> list[ExtractionTierStats]:
+        with self._lock:
+            return [stats.model_copy() for stats in self._stats.values()]
+
+
+# アプリ全体の抽出の状況
+extraction_tier_metrics = ExtractionTierMetrics()
+
+
+# is_satisfied_after_supplement の条件を変えた時に上げる。抽出結果のキャッシュのキーに含める
+ACCEPTANCE_VERSION = "1"
+
+
+def is_satisfied_after_supplement(info: InfoForAstrologyEntity) -> bool:
+    """
+    不足情報を補完すると、占いに必要な情報が揃うか（補完は info のコピーに対して行う）
+    """
+    supplemented = info.model_copy()
+    supplemented.supplement_by_default()
+    return supplemented.satisfied_all()
+
+
+def extract_in_tiers(
+    items: list[T],
+    model_names: list[str],
+    extract: Callable[[str, list[T]], dict[int, InfoForAstrologyEntity]],
+    accept: Callable[[InfoForAstrologyEntity], bool] = is_satisfied_after_supplement,
+    metrics: ExtractionTierMetrics = extraction_tier_metrics,
+) -> list[InfoForAstrologyEntity | None]:
+    """
+    model_names の順にモデルを使って抽出する。
+    結果がない（出力がスキーマに合わなかった）コメントと、accept を満たさないコメントだけを次のモデルで抽出し直す。
+    最後のモデルの結果は、accept を満たさなくてもそのまま使う。
+    一部のコメントを抽出できなくても、他のコメントの結果は返す。
+
+    extract が ValueError（モデルの出力が使えない）を出した場合は、全てのコメントの結果がないものとして扱う。
+    それ以外の例外（レート制限やネットワークのエラーなどの呼び出しの失敗）はそのまま送出し、
+    呼び出し元でバッチ全体を後から抽出し直せるようにする（抽出できなかったものと区別する）
+
+    Args:
+        items: 抽出するコメント
+        model_names: 使うモデルの名前。安く速いものから順に並べる
+        extract: (モデルの名前, コメントのリスト) から、(リストの位置 -> 抽出した情報) を返す関数。
+            出力が使えなかったコメントは結果に含めない
+        accept: 抽出した情報を使ってよいか
+        metrics: 段階ごとの抽出の状況の集計先
+
+    Returns:
+        items と同じ順の抽出した情報。最後のモデルでも結果がなかったコメントは None
+
+    Raises:
+        Exception: extract が ValueError 以外の例外を出した場合
+    """
+    if not model_names:
+        raise ValueError("model_names must not be empty.")
+    results: list[InfoForAstrologyEntity | None] = [None] * len(items)
+    pending = list(range(len(items)))
+    for tier, model_name in enumerate(model_names):
+        is_last = tier == len(model_names) - 1
+        start = time.perf_counter()
+        try:
+            extracted = extract(model_name, [items[i] for i in pending])
+        except ValueError as e:
+            logger.warning(f"Unusable output from {model_name}: {e}")
+            extracted = {}
+        seconds = time.perf_counter() - start
+
+        escalated: list[int] = []
+        for position, i in enumerate(pending):
+            info = extracted.get(position)
+            if info is not None and (is_last or accept(info)):
+                results[i] = info
+            else:
+                escalated.append(i)
+        metrics.record(model_name, seconds, len(pending), len(pending) - len(escalated))
+        pending = escalated
+        if not pending:
+            break
+    if pending:
+        logger.warning(f"Failed to extract info for {len(pending)} items.")
+    return results
+
+
+def format_extraction_tier_stats(stats: list[ExtractionTierStats]) -> str:
+    """
+    画面に表示するための、Markdownの文
+    """
+    if not stats:
+        return "情報の抽出: まだ抽出していません"
+    return "\n\n".join(
+        f"情報の抽出（{s.model_name}）: {s.accepted} / {s.attempted} 件"
+        f"（採用率 {s.hit_rate:.1%}）, 呼び出し {s.calls} 回, "
+        f"平均 {s.mean_latency:.2f} 秒"
+        for s in stats
+    )
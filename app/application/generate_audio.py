@@ -1,11 +1,11 @@
-import time
 from logging import getLogger
 
 from app.application.audio import txt_to_audiofile
 from app.application.text_service import remove_enclosed
 from app.application.thread_manager import ThreadTask
-from app.config import USE_LOCAL
+from app.config import STATE_POLLING_FALLBACK_INTERVAL, USE_LOCAL
 from app.core.const import AUDIO_DIR
+from app.domain.listeners import StateChangeListener
 from app.domain.repositories import WesternAstrologyStateRepository
 from app.domain.westernastrology import WesternAstrologyStateEntity
 from app.infrastructure.external.stylebertvit2.voice import is_alive
@@ -13,16 +13,19 @@ from app.infrastructure.external.stylebertvit2.voice import is_alive
 logger = getLogger(__name__)
 
 
-def result_to_voice(astrology_repo: WesternAstrologyStateRepository) -> None:
+def result_to_voice(astrology_repo: WesternAstrologyStateRepository) -> int:
     """
     占い結果を音声化し、DBに保存する
+
+    Returns:
+        処理対象にした占星術ステータスの数
     """
     # まだ音声化されていない占星術ステータスを取得
     target_astrology_state_list: list[WesternAstrologyStateEntity] = (
         astrology_repo.get_no_voice_target(limit=1)
     )  # TODO limitは設定で変えるようにする
     if not target_astrology_state_list:
-        return
+        return 0
 
     # 占い結果を音声化
     logger.info("Start generating voice for astrology result list.")
@@ -43,13 +46,14 @@ def result_to_voice(astrology_repo: WesternAstrologyStateRepository) -> None:
                     audiofile_path=AUDIO_DIR / f"{astrology_state.message_id}.wav",
                     use_local=USE_LOCAL,
                 )
-                astrology_state.result_voice_path = audio_file_path
                 logger.info(
                     f"Succeeded to generate voice for astrology result: (message_id={astrology_state.message_id})"
                 )
                 # 音声化結果を保存
                 # 生成は1つ1つが時間がかかるので、1つの結果を生成したらすぐに保存する
-                astrology_repo.save([astrology_state])
+                astrology_repo.set_voice_path(
+                    {astrology_state.message_id: audio_file_path}
+                )
             except IOError as e:
                 logger.exception(
                     f"Failed to generate voice for astrology result: (message_id={astrology_state.message_id})"
@@ -60,15 +64,20 @@ def result_to_voice(astrology_repo: WesternAstrologyStateRepository) -> None:
             logger.exception(
                 f"No result to generate voice: (message_id={astrology_state.message_id})"
             )
+    return len(target_astrology_state_list)
 
 
 class VoiceTask(ThreadTask):
 
     def __init__(
-        self, name: str, western_astrology_repo: WesternAstrologyStateRepository
+        self,
+        name: str,
+        western_astrology_repo: WesternAstrologyStateRepository,
+        listener: StateChangeListener | None = None,
     ):
         super().__init__(name)
         self.western_astrology_repo = western_astrology_repo
+        self.listener = listener
 
     def start(self) -> str:
         if not is_alive():
@@ -79,10 +88,18 @@ class VoiceTask(ThreadTask):
     def run(self):
         """占星術結果を音声変換する無限ループ処理"""
         logger.info("Start Thread for generating voice audio.")
+        self.start_listening(self.listener)
         while not self.stop_event.is_set():
             try:
-                result_to_voice(self.western_astrology_repo)
-                time.sleep(0.1)
+                if result_to_voice(self.western_astrology_repo):
+                    # 続けて処理できるものがあるかもしれないので待たずに確認する
+                    continue
             except Exception as e:
                 logger.exception("Failed to generate voice audio: " + str(e))
+            # 音声化の対象ができるまで待つ
+            self.wait_for_change(
+                self.listener,
+                STATE_POLLING_FALLBACK_INTERVAL if self.listener else 0.1,
+            )
+        self.stop_listening(self.listener)
         logger.info("Stopped Thread for generating voice audio.")
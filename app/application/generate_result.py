@@ -1,14 +1,17 @@
-import time
 from logging import getLogger
 
 from app.application.thread_manager import ThreadTask
 from app.application.westernastrology import (
     create_prompt_for_astrology,
-    extract_info_for_astrology,
+    extract_info_for_astrology_batch,
+    get_natal_chart_for,
+    get_natal_charts_for,
 )
+from app.config import EXTRACTION_BATCH_SIZE, STATE_POLLING_FALLBACK_INTERVAL
+from app.domain.listeners import StateChangeListener
 from app.domain.repositories import (
+    InfoExtractionCacheRepository,
     WesternAstrologyStateRepository,
-    YoutubeLiveChatMessageRepository,
 )
 from app.domain.westernastrology import (
     InfoForAstrologyEntity,
@@ -23,64 +26,119 @@ logger = getLogger(__name__)
 
 def prepare_for_astrology(
     astrology_repo: WesternAstrologyStateRepository,
-    livechat_repo: YoutubeLiveChatMessageRepository,
-) -> None:
+    extraction_cache: InfoExtractionCacheRepository | None = None,
+) -> int:
     """
     コメント一覧から、占い対象のコメントを取得し、占いに必要な情報を抽出してDBに保存する
+
+    Args:
+        astrology_repo: 占星術ステータスのリポジトリ
+        extraction_cache: 抽出結果のキャッシュ。同じコメントからは、LLMを呼び出さずに抽出結果を使う
+
+    Returns:
+        処理対象にした占星術ステータスの数
+
+    Raises:
+        Exception: LLMの呼び出しに失敗した場合。占星術ステータスは変更しないので、次の呼び出しで抽出し直す
     """
-    # まだ占い結果がない占星術ステータスを取得
-    target_astrology_state_list: list[WesternAstrologyStateEntity] = (
-        astrology_repo.get_not_prepared_target(limit=3)
-    )  # TODO limitは設定で変えるようにする
+    # まだ占い結果がない占星術ステータスを、対応するメッセージと一緒に取得
+    target_astrology_state_list: list[WesternAstrologyStateEntity]
+    target_livechat_list: list[LiveChatMessageEntity]
+    target_astrology_state_list, target_livechat_list = (
+        astrology_repo.get_not_prepared_target_and_message(limit=EXTRACTION_BATCH_SIZE)
+    )
     if not target_astrology_state_list:
-        return
+        return 0
 
-    # 占い結果がない占星術ステータスのメッセージIDを取得
     target_astrology_state_message_ids = [
         astrology_state.message_id for astrology_state in target_astrology_state_list
     ]
-    # メッセージIDからメッセージを取得
-    target_livechat_list: list[LiveChatMessageEntity] = (
-        livechat_repo.get_by_message_ids(target_astrology_state_message_ids)
-    )
-
     logger.info(
         f"Start preparing for astrology. message_ids: {target_astrology_state_message_ids}"
     )
-    # メッセージから占星術に必要な情報を抽出する
-    for astrology_state in target_astrology_state_list:
-        target_livechat = [
-            livechat
-            for livechat in target_livechat_list
-            if livechat.id == astrology_state.message_id
-        ][0]
-        info: InfoForAstrologyEntity = extract_info_for_astrology(
-            name=target_livechat.authorDetails.displayName,
-            _input=target_livechat.snippet.displayMessage,
-        )
+    # メッセージから占星術に必要な情報を、1回のLLMの呼び出しでまとめて抽出する
+    infos: list[InfoForAstrologyEntity | None] = extract_info_for_astrology_batch(
+        [
+            (
+                target_livechat.authorDetails.displayName,
+                target_livechat.snippet.displayMessage,
+            )
+            for target_livechat in target_livechat_list
+        ],
+        cache=extraction_cache,
+    )
+    required_infos: dict[str, InfoForAstrologyEntity] = {}
+    not_target_message_ids: list[str] = []
+    for astrology_state, info in zip(target_astrology_state_list, infos):
+        if info is None:
+            # どのモデルの出力も使えなかったコメントは、同じコメントを繰り返し抽出しないように占い対象から外す
+            logger.warning(
+                f"Failed to extract required information: (message_id={astrology_state.message_id})"
+            )
+            not_target_message_ids.append(astrology_state.message_id)
+            continue
         # 不足情報を補完
         info.supplement_by_default()
         # 必要情報が正しいフォーマットで揃っているか確認
         if info.satisfied_all():
-            astrology_state.required_info = info
+            required_infos[astrology_state.message_id] = info
         else:
             logger.info(
                 f"Required information is not satisfied: (message_id={astrology_state.message_id})"
             )
             # 必要な情報が揃っていない場合は、占い対象から外す
-            astrology_state.is_target = False
+            not_target_message_ids.append(astrology_state.message_id)
 
-    astrology_repo.save(target_astrology_state_list)
+    # 変わった列だけを更新する
+    astrology_repo.set_required_info(required_infos)
+    astrology_repo.mark_not_target(not_target_message_ids)
     logger.info(
         f"Finished preparing for astrology. Prepared {len(target_astrology_state_list)} astrology states. message_ids: {target_astrology_state_message_ids}"
     )
+    return len(target_astrology_state_list)
 
 
-def generate_astrology_result(
+def _prepare_natal_charts(
     astrology_repo: WesternAstrologyStateRepository,
+    astrology_states: list[WesternAstrologyStateEntity],
 ) -> None:
+    """
+    出生図がまだない占星術ステータスの出生図をまとめて計算して保存し、エンティティにも設定する。
+    失敗した場合は、占星術ステータスごとに計算し直すので、ここでは例外を出さない
+    """
+    targets = [
+        astrology_state
+        for astrology_state in astrology_states
+        if astrology_state.natal_chart is None
+        and astrology_state.required_info.satisfied_all()
+    ]
+    if not targets:
+        return
+    try:
+        natal_charts = get_natal_charts_for(
+            [astrology_state.required_info for astrology_state in targets]
+        )
+        astrology_repo.set_natal_chart(
+            {
+                astrology_state.message_id: natal_chart
+                for astrology_state, natal_chart in zip(targets, natal_charts)
+            }
+        )
+    except Exception as e:
+        logger.warning(f"Failed to compute natal charts in a batch: {e}")
+        return
+    for astrology_state, natal_chart in zip(targets, natal_charts):
+        astrology_state.natal_chart = natal_chart
+
+
+def generate_astrology_result(
+    astrology_repo: WesternAstrologyStateRepository,
+) -> int:
     """
     占い対象のコメントから占い結果を生成し、DBに保存する
+
+    Returns:
+        占い結果（または占い対象外）を保存した占星術ステータスの数
     """
     # まだ占い結果がない占星術ステータスを取得
     target_astrology_state_list: list[WesternAstrologyStateEntity] = (
@@ -88,11 +146,13 @@ def generate_astrology_result(
     )  # TODO limitは設定で変えるようにする
     message_ids = [_state.message_id for _state in target_astrology_state_list]
     if not message_ids:
-        return
+        return 0
 
     # 占い結果を生成
     logger.info(f"Start generating astrology result list. message_ids: {message_ids}")
+    _prepare_natal_charts(astrology_repo, target_astrology_state_list)
     success_count = 0
+    saved_count = 0
     for astrology_state in target_astrology_state_list:
         required_info: InfoForAstrologyEntity = astrology_state.required_info
 
@@ -107,6 +167,17 @@ def generate_astrology_result(
             continue
 
         try:
+            # 出生図を保存済みなら、天体暦を計算し直さずに使う（生成のやり直しやプロンプトの変更時）
+            natal_chart = astrology_state.natal_chart
+            if natal_chart is None:
+                natal_chart = get_natal_chart_for(
+                    required_info.birthday,
+                    required_info.birth_time,
+                    required_info.birthplace,
+                )
+                astrology_repo.set_natal_chart(
+                    {astrology_state.message_id: natal_chart}
+                )
             # LLMを使って占星術結果を取得
             prompt = create_prompt_for_astrology(
                 name=required_info.name,
@@ -114,28 +185,32 @@ def generate_astrology_result(
                 birth_time=required_info.birth_time,
                 birthplace=required_info.birthplace,
                 worries=required_info.worries,
+                natal_chart=natal_chart,
             )
             output: Output = get_output(
                 prompt=prompt, temperature=0.9, top_k=40, max_output_tokens=1000
             )
-            astrology_state.result = output.text
-            logger.info(
-                f"Succeeded to generate astrology result: (message_id={astrology_state.message_id})"
-            )
-            success_count += 1
         except Exception as e:
             logger.exception(
                 f"Failed to generate astrology result. (message_id={astrology_state.message_id}) {e}"
             )
-            astrology_state.is_target = False
-        finally:
-            # 占い結果を保存
-            astrology_repo.save([astrology_state])
+            astrology_repo.mark_not_target([astrology_state.message_id])
+            saved_count += 1
+            continue
+
+        # 占い結果を保存
+        astrology_repo.set_result({astrology_state.message_id: output.text})
+        logger.info(
+            f"Succeeded to generate astrology result: (message_id={astrology_state.message_id})"
+        )
+        success_count += 1
+        saved_count += 1
 
     logger.info(
         f"Finished processing astrology result list. (Generated {success_count} / {len(target_astrology_state_list)})."
         f"(message_ids: {message_ids})"
     )
+    return saved_count
 
 
 class GenerateResultTask(ThreadTask):
@@ -144,23 +219,35 @@ class GenerateResultTask(ThreadTask):
         self,
         name: str,
         western_astrology_repo: WesternAstrologyStateRepository,
-        livechat_repo: YoutubeLiveChatMessageRepository,
+        listener: StateChangeListener | None = None,
+        extraction_cache: InfoExtractionCacheRepository | None = None,
     ):
         super().__init__(name)
         self.western_astrology_repo = western_astrology_repo
-        self.livechat_repo = livechat_repo
+        self.listener = listener
+        self.extraction_cache = extraction_cache
 
     def run(self):
         """占星術結果生成の無限ループ処理"""
         logger.info("Start Thread for generating result.")
+        self.start_listening(self.listener)
         while not self.stop_event.is_set():
             try:
                 # 占いの準備
-                prepare_for_astrology(self.western_astrology_repo, self.livechat_repo)
+                prepared_count = prepare_for_astrology(
+                    self.western_astrology_repo, self.extraction_cache
+                )
                 # 占い結果の生成
-                generate_astrology_result(self.western_astrology_repo)
-                # 停止フラグのチェック間隔として sleep
-                time.sleep(1)
+                generated_count = generate_astrology_result(self.western_astrology_repo)
+                if prepared_count or generated_count:
+                    # 続けて処理できるものがあるかもしれないので待たずに確認する
+                    continue
             except Exception as e:
                 logger.exception("Failed to generate result: " + str(e))
+            # 占いの準備・生成の対象ができるまで待つ
+            self.wait_for_change(
+                self.listener,
+                STATE_POLLING_FALLBACK_INTERVAL if self.listener else 1,
+            )
+        self.stop_listening(self.listener)
         logger.info("Stopped Thread for generating result.")
@@ -0,0 +1,229 @@
+# ===============================================================
+# 出生図（ネイタルチャート）の計算
+# 同じ人の占い結果を生成し直す時に天体暦を計算し直さないように、
+# 計算した出生図をプロセス内のLRUキャッシュに保持する（DBにも占星術ステータスと一緒に保存する）
+# 出生図は chart_engine で計算する（設定すれば、天体暦の表の範囲内の出生データは ephemeris_table で近似する）。
+# CHART_WORKERS を設定すれば、キャッシュにない出生図は chart_service のワーカープロセスで計算する。
+# flatlib での計算（compute_natal_chart）は、結果を確かめるために残している
+# ===============================================================
+
+import threading
+from collections import OrderedDict
+from logging import getLogger
+from pathlib import Path
+
+import swisseph as swe
+from flatlib import const
+from flatlib.chart import Chart
+from flatlib.datetime import Datetime
+from flatlib.geopos import GeoPos
+
+from app.application.chart_engine import BirthRecord, compute_natal_charts, julian_day
+from app.application.chart_service import ChartService
+from app.application.ephemeris_table import EPHEMERIS_TABLE_PATH, EphemerisTable
+from app.config import (
+    CHART_BATCH_SIZE,
+    CHART_WORKERS,
+    NATAL_CHART_CACHE_SIZE,
+    USE_EPHEMERIS_TABLE,
+)
+from app.domain.westernastrology import NatalChartEntity, PlanetPositionEntity
+
+logger = getLogger(__name__)
+
+# 天体暦のファイルの保存先（setup_init.py でダウンロードする）
+EPHEMERIS_DIR = Path(__file__).parent / "ephemeris"
+
+# 出生時刻のUTCからの時差。抽出した出生時刻はUTCとして扱う
+BIRTH_TIME_UTC_OFFSET = "+00:00"
+
+
+def compute_natal_chart(
+    birthday: str,
+    birth_time: str,
+    latitude: float,
+    longitude: float,
+    utc_offset: str = BIRTH_TIME_UTC_OFFSET,
+) -> NatalChartEntity:
+    """
+    flatlib で出生図を計算する（キャッシュを使わない）。chart_engine の結果と比べるための参照実装
+
+    Args:
+        birthday: 誕生日（YYYY/MM/DD）
+        birth_time: 出生時刻（HH:MM）
+        latitude: 出生地の緯度
+        longitude: 出生地の経度
+        utc_offset: 出生時刻のUTCからの時差（+HH:MM）
+    """
+    swe.set_ephe_path(str(EPHEMERIS_DIR))
+
+    natal_chart = Chart(
+        Datetime(birthday, birth_time, utc_offset),
+        GeoPos(latitude, longitude),
+        IDs=const.LIST_OBJECTS,
+    )
+    positions: dict[str, PlanetPositionEntity] = {}
+    for obj_id in const.LIST_OBJECTS:
+        obj = natal_chart.get(obj_id)
+        if obj:
+            house = natal_chart.houses.getObjectHouse(obj)
+            positions[obj_id] = PlanetPositionEntity(
+                sign=obj.sign,
+                degree=round(obj.lon, 2),  # type: ignore
+                house=int(house.id.replace("House", "")),
+            )
+    return NatalChartEntity(positions=positions)
+
+
+class _NatalChartCache:
+    """
+    出生データをキーにした、件数に上限のあるLRUキャッシュ。複数のスレッドから使える
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        # 最後に使われた順（末尾が最新）
+        self._charts: OrderedDict[BirthRecord, NatalChartEntity] = OrderedDict()
+
+    def get_many(
+        self, records: list[BirthRecord]
+    ) -> dict[BirthRecord, NatalChartEntity]:
+        found: dict[BirthRecord, NatalChartEntity] = {}
+        with self._lock:
+            for record in records:
+                chart = self._charts.get(record)
+                if chart is not None:
+                    self._charts.move_to_end(record)
+                    found[record] = chart
+        return found
+
+    def put_many(self, charts: dict[BirthRecord, NatalChartEntity]) -> None:
+        with self._lock:
+            for record, chart in charts.items():
+                self._charts[record] = chart
+                self._charts.move_to_end(record)
+            while len(self._charts) > self.max_size:
+                self._charts.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._charts.clear()
+
+
+def _load_ephemeris_table(use: bool, path: Path) -> EphemerisTable | None:
+    """
+    天体暦の表を使う設定で、表のファイルがある場合に表を返す。
+    ファイルがない場合は起動時に一度だけ警告し、天体暦のファイルで計算する
+    """
+    if not use:
+        return None
+    if not path.exists():
+        logger.warning(
+            f"USE_EPHEMERIS_TABLE is True but the ephemeris table file does not exist: {path}. "
+            "Create it with tools/build_ephemeris_table.py. "
+            "Natal charts are computed with the ephemeris files instead."
+        )
+        return None
+    return EphemerisTable(path)
+
+
+_natal_chart_cache = _NatalChartCache(NATAL_CHART_CACHE_SIZE)
+_ephemeris_table = _load_ephemeris_table(USE_EPHEMERIS_TABLE, EPHEMERIS_TABLE_PATH)
+
+
+def _compute_natal_charts(
+    records: list[BirthRecord], ephemeris_dir: Path | None
+) -> dict[BirthRecord, NatalChartEntity]:
+    charts: dict[BirthRecord, NatalChartEntity] = {}
+    if _ephemeris_table is not None:
+        try:
+            in_table = [
+                r
+                for r in records
+                if _ephemeris_table.covers(
+                    julian_day(r.birthday, r.birth_time, r.utc_offset)
+                )
+            ]
+            charts.update(
+                zip(in_table, _ephemeris_table.compute_natal_charts(in_table))
+            )
+        except (OSError, ValueError) as e:
+            logger.warning(f"Failed to compute natal charts with the table: {e}")
+    rest = [r for r in records if r not in charts]
+    if rest:
+        charts.update(zip(rest, compute_natal_charts(rest, ephemeris_dir)))
+    return charts
+
+
+def _init_chart_worker(ephemeris_dir: str) -> None:
+    # ワーカープロセスごとに一度だけ、天体暦のファイルの場所を設定する
+    swe.set_ephe_path(ephemeris_dir)
+
+
+def _compute_in_chart_worker(records: list[BirthRecord]) -> list[NatalChartEntity]:
+    charts = _compute_natal_charts(records, None)
+    return [charts[record] for record in records]
+
+
+def _compute_in_calling_thread(records: list[BirthRecord]) -> list[NatalChartEntity]:
+    # CHART_WORKERS が0の場合と同じく、呼び出したスレッドで計算する
+    charts = _compute_natal_charts(records, EPHEMERIS_DIR)
+    return [charts[record] for record in records]
+
+
+def create_chart_service(workers: int, batch_size: int) -> ChartService:
+    """
+    天体暦のファイルの場所（EPHEMERIS_DIR）を設定したワーカーで出生図を計算する、プロセスプール。
+    ワーカーを使えない場合は、呼び出したスレッドで計算する
+    """
+    return ChartService(
+        workers,
+        batch_size,
+        _compute_in_chart_worker,
+        _init_chart_worker,
+        (str(EPHEMERIS_DIR),),
+        fallback=_compute_in_calling_thread,
+    )
+
+
+# 出生図を計算するプロセスプール。CHART_WORKERS が0の場合は使わずに、呼び出したスレッドで計算する
+chart_service: ChartService | None = (
+    create_chart_service(CHART_WORKERS, CHART_BATCH_SIZE) if CHART_WORKERS else None
+)
+
+
+def get_natal_charts(records: list[BirthRecord]) -> list[NatalChartEntity]:
+    """
+    出生データごとに、計算した出生図をキャッシュして返す。
+    キャッシュにない出生データだけをまとめて計算する。
+    キャッシュした出生図を変更しないように、コピーを返す
+
+    Returns:
+        records と同じ順の出生図
+    """
+    found = _natal_chart_cache.get_many(records)
+    missing = list(dict.fromkeys(r for r in records if r not in found))
+    if missing:
+        if chart_service is not None:
+            computed = dict(zip(missing, chart_service.compute(missing)))
+        else:
+            computed = _compute_natal_charts(missing, EPHEMERIS_DIR)
+        _natal_chart_cache.put_many(computed)
+        found.update(computed)
+    return [found[record].model_copy(deep=True) for record in records]
+
+
+def get_natal_chart(
+    birthday: str,
+    birth_time: str,
+    latitude: float,
+    longitude: float,
+    utc_offset: str = BIRTH_TIME_UTC_OFFSET,
+) -> NatalChartEntity:
+    """
+    (誕生日, 出生時刻, 緯度, 経度, 時差) ごとに、計算した出生図をキャッシュして返す
+    """
+    return get_natal_charts(
+        [BirthRecord(birthday, birth_time, latitude, longitude, utc_offset)]
+    )[0]
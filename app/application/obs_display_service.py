@@ -7,10 +7,16 @@ from app.config import (
     OBS_SCENE_NAME,
     OBS_SOURCE_NAME_FOR_GROUP,
     RESULT_FILE_PATH,
+    STATE_POLLING_FALLBACK_INTERVAL,
     USER_NAME_FILE_PATH,
     WAITING_DISPLAY_FILE_PATH,
 )
-from app.domain.repositories import WesternAstrologyStateRepository
+from app.domain.listeners import StateChangeListener
+from app.domain.repositories import (
+    BroadcastSessionRepository,
+    WesternAstrologyStateRepository,
+)
+from app.domain.westernastrology import WaitingCounter
 from app.infrastructure.external.obs.utils import (
     get_scene_item_id_by_name,
     set_scene_item_enabled,
@@ -105,20 +111,53 @@ class DisplayWaitingCountTreadTask(ThreadTask):
         state_repo: WesternAstrologyStateRepository,
         display_format: str = "占い待ち: {}人",
         interval: int = 5,
+        listener: StateChangeListener | None = None,
+        session_repo: BroadcastSessionRepository | None = None,
     ):
+        """
+        Args:
+            interval: listener がない場合に待ち人数を確認する間隔（秒）
+            listener: 全ての処理段階の変化を受け取るリスナー。
+                変化があった時は、DBに問い合わせずにメモリ上の待ち人数を更新する
+            session_repo: 指定した場合は、現在の配信セッションの変化だけを待ち人数に反映する
+        """
         super().__init__(name)
         self.state_repo = state_repo
         self.display_format = display_format
         self.interval = interval
+        self.listener = listener
+        self.session_repo = session_repo
+        self.counter = WaitingCounter()
 
     def run(self) -> None:
         logger.info("Start Thread for fetching waiting count.")
+        # 通知を取りこぼさないように、DBで数える前に受信を開始する
+        self.start_listening(self.listener)
+        events = []
+        display_content = None
+        reset_at = 0.0
         while not self.stop_event.is_set():
-            count = len(self.state_repo.get_waiting_audio_play_state())
-
-            display_content = self.display_format.format(count)
-            update_waiting_display(display_content)
-
-            logger.info(f"Successfully updated display: {display_content}")
-            time.sleep(self.interval)
+            if events and time.monotonic() - reset_at < STATE_POLLING_FALLBACK_INTERVAL:
+                session_id = (
+                    self.session_repo.get_active_session_id()
+                    if self.session_repo is not None
+                    else None
+                )
+                self.counter.apply(events, session_id)
+            else:
+                # 通知がない場合や、配信セッションが切り替わった場合などのずれを、DBの件数で定期的に直す
+                self.counter.reset(self.state_repo.count_waiting_audio_play_state())
+                reset_at = time.monotonic()
+
+            new_display_content = self.display_format.format(self.counter.count)
+            if new_display_content != display_content:
+                display_content = new_display_content
+                update_waiting_display(display_content)
+                logger.info(f"Successfully updated display: {display_content}")
+
+            events = self.wait_for_change(
+                self.listener,
+                STATE_POLLING_FALLBACK_INTERVAL if self.listener else self.interval,
+            )
+        self.stop_listening(self.listener)
         logger.info("StateDisplayTreadTask is stopped.")
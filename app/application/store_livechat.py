@@ -7,6 +7,7 @@ from app.application.filter_yt_comment import filter_astrology_target
 from app.application.thread_manager import ThreadTask
 from app.core.const import get_dummy_live_chat_message, is_test
 from app.domain.repositories import (
+    BroadcastSessionRepository,
     WesternAstrologyStateRepository,
     YoutubeLiveChatMessageRepository,
 )
@@ -40,10 +41,16 @@ class LivechatTask(ThreadTask):
         name: str,
         western_astrology_repo: WesternAstrologyStateRepository,
         livechat_repo: YoutubeLiveChatMessageRepository,
+        session_repo: BroadcastSessionRepository | None = None,
     ):
+        """
+        Args:
+            session_repo: 動画IDを設定した時に、その動画の配信セッションを開始するためのリポジトリ
+        """
         super().__init__(name)
         self.western_astrology_repo = western_astrology_repo
         self.livechat_repo = livechat_repo
+        self.session_repo = session_repo
         self.live_chat_id = None
 
     def start(self) -> str:
@@ -68,6 +75,9 @@ class LivechatTask(ThreadTask):
             logger.info(
                 f"Successfully fetched liveChatId: {live_chat_id} from video id {yt_video_id}"
             )
+            # 以降のメッセージと占い結果は、この動画の配信セッションに保存する
+            if self.session_repo:
+                self.session_repo.start(yt_video_id)
 
     def run(self):
         """
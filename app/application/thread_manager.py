@@ -1,8 +1,15 @@
 import threading
+import time
 from logging import getLogger
 
+from app.domain.listeners import StateChangeListener
+from app.domain.westernastrology import StateChangeEvent
+
 logger = getLogger(__name__)
 
+# リスナーで待っている間も、この間隔（秒）で停止フラグを確認する
+STOP_CHECK_INTERVAL: float = 1.0
+
 
 class ThreadTask:
     def __init__(self, name: str):
@@ -39,5 +46,45 @@ class ThreadTask:
             logger.info(f"{self.name} is not running.")
             return "動作していません"
 
+    def start_listening(self, listener: StateChangeListener | None) -> None:
+        """
+        処理段階の変化の受信を開始する。失敗した場合は wait_for_change の中で再接続される。
+        """
+        if listener is None:
+            return
+        try:
+            listener.listen()
+        except Exception as e:
+            logger.warning(f"{self.name} failed to start listening: {e}")
+
+    def stop_listening(self, listener: StateChangeListener | None) -> None:
+        """
+        処理段階の変化の受信を終了する。
+        """
+        if listener is None:
+            return
+        listener.close()
+
+    def wait_for_change(
+        self, listener: StateChangeListener | None, timeout: float
+    ) -> list[StateChangeEvent]:
+        """
+        処理段階の変化を最大 timeout 秒待つ。停止を指示された場合はすぐに戻る。
+        listener がない場合は timeout 秒待つだけ（ポーリング）。
+        """
+        if listener is None:
+            self.stop_event.wait(timeout)
+            return []
+
+        deadline = time.monotonic() + timeout
+        while not self.stop_event.is_set():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            events = listener.wait(min(remaining, STOP_CHECK_INTERVAL))
+            if events:
+                return events
+        return []
+
     def run(self):
         raise NotImplementedError("Subclasses must implement this method.")
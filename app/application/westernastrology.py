@@ -1,47 +1,59 @@
 from logging import getLogger
 from pathlib import Path
 
-import swisseph as swe
-from flatlib import const
-from flatlib.chart import Chart
-from flatlib.datetime import Datetime
-from flatlib.geopos import GeoPos
-
-from app.core.const import CITY_LOCATION_MAP, PREFECTURE_LOCATION_MAP
-from app.domain.westernastrology import InfoForAstrologyEntity, LocationEntity
+from pydantic import BaseModel, Field
+
+from app.application.chart_engine import BirthRecord
+from app.application.extraction_cache import extraction_cache_key
+from app.application.extraction_tiers import ACCEPTANCE_VERSION, extract_in_tiers
+from app.application.natal_chart import (
+    BIRTH_TIME_UTC_OFFSET,
+    get_natal_chart,
+    get_natal_charts,
+)
+from app.config import EXTRACTION_MODEL_TIERS
+from app.core.gazetteer import lookup_place
+from app.domain.repositories import InfoExtractionCacheRepository
+from app.domain.westernastrology import (
+    InfoForAstrologyEntity,
+    LocationEntity,
+    NatalChartEntity,
+)
 from app.infrastructure.external.llm.dtos import StructuredOutput
 from app.infrastructure.external.llm.llm_google import get_structured_output
 from app.infrastructure.external.llm.utils import pydantic_to_markdown
 
 logger = getLogger(__name__)
 
-setup_dir = Path(__file__).parent / "ephemeris"
 prompts_dir = Path(__file__).parent / "prompts"
 
+# 抽出のプロンプトを変えた時に上げる。以前のプロンプトで抽出したキャッシュは使われなくなる
+EXTRACTION_PROMPT_VERSION = "1"
+
 
 def get_coordinates(place: str) -> LocationEntity:
     """
     Get static coordinates for a place.
     """
-    # 都道府県名から緯度経度を取得
-    latitude_longitude = PREFECTURE_LOCATION_MAP.get(place, None)
-    # 緯度経度を取得できない場合は、市町村名から緯度経度を取得
-    if not latitude_longitude:
-        latitude_longitude = CITY_LOCATION_MAP.get(place, None)
+    # 都道府県・市区町村の名前（住所やローマ字の名前を含む）から緯度経度を取得
+    found = lookup_place(place)
     # 緯度経度を取得できない場合は、東京の緯度経度を返す
-    if not latitude_longitude:
-        latitude_longitude = PREFECTURE_LOCATION_MAP["東京"]
-    latitude, longitude = latitude_longitude
-    return LocationEntity(latitude=latitude, longitude=longitude)
+    if found is None:
+        logger.info(f"Unknown place: {place}. Use the coordinates of Tokyo.")
+        found = lookup_place("東京都")
+    return LocationEntity(latitude=found.latitude, longitude=found.longitude)
 
 
-def extract_info_for_astrology(name: str, _input: str) -> InfoForAstrologyEntity:
+def extract_info_for_astrology(
+    name: str, _input: str, model_name: str = "gemini-1.5-flash"
+) -> InfoForAstrologyEntity:
     """
     Extract human information from input text for astrology.
     """
 
     result: StructuredOutput = get_structured_output(
         cls=InfoForAstrologyEntity,
+        model_name=model_name,
         prompt=f"""
 extract birthday, birth_time, birthplace from give info.
 format is below.
@@ -57,43 +69,223 @@ format is below.
     return result.model  # noqa
 
 
+class IndexedInfoForAstrologyEntity(InfoForAstrologyEntity):
+    """
+    まとめて抽出した時に、どのコメントから抽出したかを表す番号を付けた情報
+    """
+
+    index: int = Field(..., description="Index of the info the data is extracted from")
+
+
+class InfoForAstrologyListEntity(BaseModel):
+    infos: list[IndexedInfoForAstrologyEntity] = Field(
+        ..., description="Extracted data. One item for each info"
+    )
+
+
+def _extract_info_for_astrology_in_one_call(
+    inputs: list[str], model_name: str
+) -> dict[int, InfoForAstrologyEntity]:
+    numbered_inputs = "\n".join(
+        f"### index: {i}\n{_input}\n" for i, _input in enumerate(inputs)
+    )
+    result: StructuredOutput = get_structured_output(
+        cls=InfoForAstrologyListEntity,
+        model_name=model_name,
+        prompt=f"""
+extract birthday, birth_time, birthplace from each of the given infos.
+return one item for each info with the index of the info.
+format of each item is below.
+
+## format
+{pydantic_to_markdown(IndexedInfoForAstrologyEntity)}
+
+## infos
+{numbered_inputs}
+""",
+        # 件数に比例して出力が長くなる（gemini-1.5-flash の出力の上限は 8192 トークン）
+        max_output_tokens=min(1000 * len(inputs), 8192),
+    )
+    infos: dict[int, InfoForAstrologyEntity] = {}
+    for item in result.model.infos:  # noqa
+        if 0 <= item.index < len(inputs) and item.index not in infos:
+            infos[item.index] = InfoForAstrologyEntity(
+                **item.model_dump(exclude={"index"})
+            )
+    return infos
+
+
+def extract_info_for_astrology_batch(
+    names_and_inputs: list[tuple[str, str]],
+    cache: InfoExtractionCacheRepository | None = None,
+) -> list[InfoForAstrologyEntity | None]:
+    """
+    複数のコメントから、占いに必要な情報を1回のLLMの呼び出しでまとめて抽出する。
+    まとめての抽出に失敗した場合と、結果に含まれなかったコメントは、1件ずつ extract_info_for_astrology で抽出する。
+    EXTRACTION_MODEL_TIERS の最初のモデルで抽出し、情報が揃わなかったコメントだけを次のモデルで抽出し直す
+
+    Args:
+        names_and_inputs: (名前, コメント) のリスト
+        cache: 抽出結果のキャッシュ。指定した場合は、キャッシュにないコメントだけをLLMで抽出し、
+            抽出した結果をキャッシュに保存する
+
+    Returns:
+        names_and_inputs と同じ順の、抽出した情報のリスト。どのモデルでも抽出できなかったコメントは None
+
+    Raises:
+        Exception: LLMの呼び出しに失敗した場合（レート制限やネットワークのエラーなど）。どのコメントの結果も返さない
+    """
+    if cache is None:
+        return _extract_info_for_astrology_batch(names_and_inputs)
+
+    keys = [
+        extraction_cache_key(
+            _input,
+            EXTRACTION_PROMPT_VERSION,
+            EXTRACTION_MODEL_TIERS,
+            ACCEPTANCE_VERSION,
+        )
+        for _, _input in names_and_inputs
+    ]
+    try:
+        cached = cache.get_many(list(dict.fromkeys(keys)))
+    except Exception as e:
+        # キャッシュが使えなくても、LLMで抽出して処理を続ける
+        logger.warning(f"Failed to get extraction cache: {e}")
+        cached = {}
+
+    # 同じバッチの中の同じコメントは、1回だけ抽出する
+    missing: dict[str, tuple[str, str]] = {}
+    for key, name_and_input in zip(keys, names_and_inputs):
+        if key not in cached and key not in missing:
+            missing[key] = name_and_input
+    extracted = dict(
+        zip(missing, _extract_info_for_astrology_batch(list(missing.values())))
+    )
+    # 抽出できなかったコメントはキャッシュせず、次に同じコメントが来た時に抽出し直す
+    succeeded = {key: info for key, info in extracted.items() if info is not None}
+    if succeeded:
+        try:
+            cache.save(succeeded)
+        except Exception as e:
+            logger.warning(f"Failed to save extraction cache: {e}")
+    logger.info(
+        f"Extraction cache hit {len(names_and_inputs) - len(missing)}"
+        f"/{len(names_and_inputs)} comments"
+    )
+
+    results: list[InfoForAstrologyEntity | None] = []
+    for key, (name, _) in zip(keys, names_and_inputs):
+        info = cached.get(key) or extracted[key]
+        if info is None:
+            results.append(None)
+            continue
+        # 呼び出し元で補完・変更しても、キャッシュや同じコメントの結果に影響しないようにコピーする
+        info = info.model_copy()
+        info.name = name
+        results.append(info)
+    return results
+
+
+def _extract_info_for_astrology_batch(
+    names_and_inputs: list[tuple[str, str]],
+) -> list[InfoForAstrologyEntity | None]:
+    if not names_and_inputs:
+        return []
+    return extract_in_tiers(
+        names_and_inputs, EXTRACTION_MODEL_TIERS, _extract_info_with_model
+    )
+
+
+def _extract_info_with_model(
+    model_name: str, names_and_inputs: list[tuple[str, str]]
+) -> dict[int, InfoForAstrologyEntity]:
+    """
+    1つのモデルで抽出する。1件ずつ抽出しても出力が使えなかったコメントは、結果に含めない（次のモデルで抽出し直す）。
+    出力が使えない場合は ValueError（スキーマに合わない出力の ValidationError や、出力がない場合の ValueError）になる。
+    それ以外の例外（レート制限やネットワークのエラーなど）は、抽出し直せるようにそのまま送出する
+    """
+    infos: dict[int, InfoForAstrologyEntity] = {}
+    if len(names_and_inputs) > 1:
+        try:
+            infos = _extract_info_for_astrology_in_one_call(
+                [_input for _, _input in names_and_inputs], model_name
+            )
+        except ValueError as e:
+            logger.warning(
+                f"Failed to extract info in one call. Extract one by one instead: {e}"
+            )
+
+    for i, (name, _input) in enumerate(names_and_inputs):
+        if i not in infos:
+            try:
+                infos[i] = extract_info_for_astrology(
+                    name=name, _input=_input, model_name=model_name
+                )
+            except ValueError as e:
+                logger.warning(f"Unusable output from {model_name}: {e}")
+                continue
+        # 必要な情報が揃っているかは名前も含めて確かめるので、ここで名前を設定する
+        infos[i].name = name
+    return infos
+
+
+def get_natal_chart_for(
+    birthday: str, birth_time: str, birthplace: str
+) -> NatalChartEntity:
+    """
+    占いに必要な情報から出生図を求める。同じ誕生日・出生時刻・出生地の出生図は計算し直さない
+    """
+    location = get_coordinates(place=birthplace)
+    return get_natal_chart(birthday, birth_time, location.latitude, location.longitude)
+
+
+def get_natal_charts_for(
+    infos: list[InfoForAstrologyEntity],
+) -> list[NatalChartEntity]:
+    """
+    複数の占いに必要な情報から、出生図をまとめて求める
+
+    Returns:
+        infos と同じ順の出生図
+    """
+    records = []
+    for info in infos:
+        location = get_coordinates(place=info.birthplace)
+        records.append(
+            BirthRecord(
+                info.birthday,
+                info.birth_time,
+                location.latitude,
+                location.longitude,
+                BIRTH_TIME_UTC_OFFSET,
+            )
+        )
+    return get_natal_charts(records)
+
+
 def create_prompt_for_astrology(
     name: str,
     birthday: str,
     birth_time: str,
     birthplace: str,
     worries: str = "",
+    natal_chart: NatalChartEntity | None = None,
 ) -> str:
     """
     西洋占星術の占い用のプロンプトを作成する。
-    """
-    swe.set_ephe_path(str(setup_dir))
-
-    # 誕生日と誕生時刻
-    flatlib_datetime = Datetime(birthday, birth_time, "+00:00")
 
-    # 生まれた場所
-    location = get_coordinates(place=birthplace)
-    latitude = location.latitude
-    longitude = location.longitude
-    pos = GeoPos(latitude, longitude)
-
-    # チャートの作成
-    natal_chart = Chart(flatlib_datetime, pos, IDs=const.LIST_OBJECTS)
+    Args:
+        natal_chart: 計算済みの出生図。指定しない場合は、誕生日・出生時刻・出生地から求める
+    """
+    if natal_chart is None:
+        natal_chart = get_natal_chart_for(birthday, birth_time, birthplace)
 
     # 惑星配置の取得
-    planetary_positions = {}
-    for obj_id in const.LIST_OBJECTS:
-        obj = natal_chart.get(obj_id)
-        if obj:
-            house = natal_chart.houses.getObjectHouse(obj)
-            house_num = int(house.id.replace("House", ""))
-
-            planetary_positions[obj_id] = {
-                "sign": obj.sign,
-                "degree": round(obj.lon, 2),  # type: ignore
-                "house": house_num,
-            }
+    planetary_positions = {
+        obj_id: position.model_dump()
+        for obj_id, position in natal_chart.positions.items()
+    }
     # 惑星配置のテキスト化
     positions_text = "\n".join(
         [
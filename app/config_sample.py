@@ -31,6 +31,57 @@ ELEVENLABS_VOICE_ID = "Mv8AjrYZCBkdsmDHNwcB"
 ELEVENLABS_MODEL = "eleven_multilingual_v2"
 # ===============================
 
+# ===== DBの変更通知 (LISTEN/NOTIFY) ======
+# 各タスクは変更通知を受けて処理する。通知を取りこぼした場合に備えて、この間隔（秒）でもDBを確認する
+STATE_POLLING_FALLBACK_INTERVAL = 10
+# 占星術ステータスの書き込みをこの間隔（秒）の間溜めて、まとめてDBに書き込む。0の場合は溜めずにすぐ書き込む
+STATE_WRITE_BEHIND_INTERVAL = 0.2
+# 保存したチャットメッセージをメモリ上にキャッシュする件数の上限（メッセージは保存後に変更されない）
+MESSAGE_CACHE_SIZE = 10000
+# ========================================
+
+# ===== DBのコネクションプール ======
+# コネクションプールの大きさは、同時にDBを使うワーカーの数から決める
+# パイプラインのタスク（ui_auto.py, ui_manual.py の ThreadTask: コメント取得・占い生成・音声生成・待ち人数表示・自動再生）の数。
+# タスクを増やした場合はこの数も増やす。書き込みを溜めるスレッド（STATE_WRITE_BEHIND_INTERVAL）の分は自動で加わり、
+# 変更通知の待ち受け（LISTEN）はプールとは別のコネクションを使うので、どちらも含めない
+DB_TASK_WORKERS = 5
+# 画面の操作（ボタンのクリックなど）で同時にDBを使う数の見込み
+DB_UI_WORKERS = 3
+# コネクションが空くのを待つ最大の時間（秒）。超えるとエラーになる
+DB_POOL_TIMEOUT = 10
+# ===================================
+
+# ===== 配信セッションのアーカイブ ======
+# tools/archive_sessions.py で、新しい順にこの数の配信セッションを残して古いものをアーカイブする
+SESSION_RETENTION_COUNT = 3
+# アーカイブファイルの保存先ディレクトリ（プロジェクトのルートディレクトリからの相対パス）
+SESSION_ARCHIVE_DIR = Path("archive")
+# ===================================
+
+# ===== 占いに必要な情報の抽出（LLM） ======
+# 占いに必要な情報を、この件数のコメントまで1回のLLMの呼び出しでまとめて抽出する
+EXTRACTION_BATCH_SIZE = 10
+# 抽出に使うモデル。最初のモデルで抽出し、情報が揃わなかったコメントだけを次のモデルで抽出し直す
+# 安く速いものから順に並べる
+EXTRACTION_MODEL_TIERS = ["gemini-1.5-flash-8b", "gemini-1.5-flash"]
+# 同じコメントからの抽出結果を使う期間（秒）と、保存する抽出結果の数の上限
+EXTRACTION_CACHE_TTL = 60 * 60 * 24 * 30
+EXTRACTION_CACHE_MAX_SIZE = 100000
+# ==========================================
+
+# ============ 出生図の計算 ============
+# 計算した出生図をプロセス内に保持する数の上限
+NATAL_CHART_CACHE_SIZE = 10000
+# 天体暦の表（tools.build_ephemeris_table で作成する）を補間して出生図を計算するか。
+# 表の範囲外の出生データは、天体暦のファイルで計算する
+USE_EPHEMERIS_TABLE = False
+# 出生図を計算するワーカープロセスの数（0の場合は、占い結果を生成するスレッドで計算する）と、
+# 1回でワーカーに渡す出生データの数の上限
+CHART_WORKERS = 2
+CHART_BATCH_SIZE = 50
+# ======================================
+
 # ======= 音声出力先の設定 ========
 AUDIO_DEVICE_NAME = ""  # ex: VB-Cable
 # ================================
@@ -4,7 +4,6 @@ from datetime import datetime
 from pathlib import Path
 from typing import Any
 
-import pandas as pd
 from dotenv import load_dotenv
 from sqlalchemy import URL
 
@@ -40,34 +39,15 @@ PG_URL = URL.create(
     host=POSTGRES_HOST,
     port=int(POSTGRES_PORT),
 ).render_as_string(hide_password=False)
-
-
-# 緯度軽度のデータを読み込む
-city_data_csv = ROOT / "app" / "core" / "location_data" / "city.csv"
-prefecture_data_csv = ROOT / "app" / "core" / "location_data" / "prefecture.csv"
-city_df = pd.read_csv(city_data_csv, encoding="utf-8", skipinitialspace=True)
-prefecture_df = pd.read_csv(
-    prefecture_data_csv, encoding="utf-8", skipinitialspace=True
-)
-
-CITY_LOCATION_MAP = {}
-for i, row in city_df.iterrows():
-    city = row.city
-    CITY_LOCATION_MAP[city] = (row.latitude, row.longitude)
-    if city.endswith("市"):
-        CITY_LOCATION_MAP[city[:-1]] = (row.latitude, row.longitude)
-
-PREFECTURE_LOCATION_MAP = {}
-for i, row in prefecture_df.iterrows():
-    prefecture = row.prefecture
-    PREFECTURE_LOCATION_MAP[prefecture] = (row.latitude, row.longitude)
-
-    if (
-        prefecture.endswith("県")
-        or prefecture.endswith("府")
-        or prefecture.endswith("都")
-    ):
-        PREFECTURE_LOCATION_MAP[prefecture[:-1]] = (row.latitude, row.longitude)
+# 非同期版のリポジトリ（asyncpgドライバ）で使用する
+PG_ASYNC_URL = URL.create(
+    drivername="postgresql+asyncpg",
+    username=POSTGRES_USER,
+    password=POSTGRES_PASSWORD,
+    database=POSTGRES_DB,
+    host=POSTGRES_HOST,
+    port=int(POSTGRES_PORT),
+).render_as_string(hide_password=False)
 
 
 # テスト用のダミーデータ
@@ -166,5 +146,4 @@ if __name__ == "__main__":
     print(f"POSTGRES_HOST: {POSTGRES_HOST}")
     print(f"POSTGRES_PORT: {POSTGRES_PORT}")
     print(f"PG_URL: {PG_URL}")
-
-    print(CITY_LOCATION_MAP)
+    print(f"PG_ASYNC_URL: {PG_ASYNC_URL}")
@@ -0,0 +1,211 @@
+# ===============================================================
+# 地名から緯度経度を引く索引（ガゼティア）
+# 都道府県・市区町村の名前（ローマ字・英語名を含む）を正規化したキーで並べたファイルを、
+# 初めて使う時にメモリマップして二分探索する。ファイルは tools/build_gazetteer.py で作成する
+# ===============================================================
+
+import mmap
+import re
+import struct
+import threading
+import unicodedata
+from enum import IntEnum
+from pathlib import Path
+from typing import Iterable, NamedTuple
+
+GAZETTEER_PATH = Path(__file__).parent / "location_data" / "gazetteer.idx"
+
+# ファイルの形式（リトルエンディアン）
+# ヘッダ: マジックナンバー, レコード数
+# レコード: キーの位置, キーの長さ, 種類, 緯度, 経度（キーの昇順）
+# キー: UTF-8 のキーを連結したもの
+_MAGIC = b"GZT1"
+_HEADER = struct.Struct("<4sI")
+_RECORD = struct.Struct("<IHBxdd")
+
+# 取り除いてもよい行政区画の接尾辞
+_SUFFIXES = {"都", "府", "県", "市", "区", "町", "村"}
+# 住所を区切る時に、地名の終わりとみなす文字
+_SEGMENT_ENDS = _SUFFIXES | {"道"}
+_MACRONS = str.maketrans("āīūēōâîûêô", "aiueoaiueo")
+_ROMAN_WORD = re.compile(r"[a-z0-9]+")
+_NOT_KEY_CHARS = re.compile(r"[\s\-‐・,.、。()（）]+")
+
+
+class PlaceKind(IntEnum):
+    """
+    地名の種類。値が大きいほど狭い範囲を表す
+    """
+
+    PREFECTURE = 0
+    MUNICIPALITY = 1
+    WARD = 2
+
+
+class Place(NamedTuple):
+    kind: PlaceKind
+    latitude: float
+    longitude: float
+
+
+def normalize_place(text: str) -> str:
+    """
+    全角・半角と大文字・小文字を揃え、ローマ字の長音符号と空白・区切り記号を取り除く
+    （例: "Hokkaidō" -> "hokkaido", "宮城県 仙台市" -> "宮城県仙台市"）
+    """
+    return _NOT_KEY_CHARS.sub("", _fold(text))
+
+
+def _fold(text: str) -> str:
+    text = unicodedata.normalize("NFKC", text).lower()
+    return text.replace("ヶ", "ケ").translate(_MACRONS)
+
+
+def place_keys(name: str) -> list[str]:
+    """
+    地名を引くキー。正規化した名前と、行政区画の接尾辞を取り除いた名前
+    """
+    key = normalize_place(name)
+    keys = [key]
+    if len(key) > 1 and key[-1] in _SUFFIXES:
+        keys.append(key[:-1])
+    return keys
+
+
+def build_gazetteer(places: Iterable[tuple[str, Place]], path: Path) -> int:
+    """
+    (キー, 地名) から索引のファイルを作成する。
+    同じキーが複数ある場合は、先に指定したものを使う
+
+    Returns:
+        レコード数
+    """
+    records: dict[bytes, Place] = {}
+    for key, place in places:
+        records.setdefault(key.encode("utf-8"), place)
+    keys = sorted(records)
+    offset = 0
+    with open(path, "wb") as f:
+        f.write(_HEADER.pack(_MAGIC, len(keys)))
+        for key in keys:
+            place = records[key]
+            f.write(
+                _RECORD.pack(
+                    offset, len(key), place.kind, place.latitude, place.longitude
+                )
+            )
+            offset += len(key)
+        for key in keys:
+            f.write(key)
+    return len(keys)
+
+
+class Gazetteer:
+    """
+    索引のファイルを読み込んで地名を引く。ファイルは初めて引く時にメモリマップする。複数のスレッドから使える
+    """
+
+    def __init__(self, path: Path = GAZETTEER_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._buffer: mmap.mmap | None = None
+        self._count = 0
+        self._keys_start = 0
+
+    def _load(self) -> mmap.mmap:
+        with self._lock:
+            if self._buffer is None:
+                with open(self.path, "rb") as f:
+                    buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                magic, count = _HEADER.unpack_from(buffer, 0)
+                if magic != _MAGIC:
+                    raise ValueError(f"Invalid gazetteer file: {self.path}")
+                self._count = count
+                self._keys_start = _HEADER.size + _RECORD.size * count
+                self._buffer = buffer
+            return self._buffer
+
+    def __len__(self) -> int:
+        self._load()
+        return self._count
+
+    def get(self, key: str) -> Place | None:
+        """
+        正規化したキーと一致する地名
+        """
+        buffer = self._load()
+        target = key.encode("utf-8")
+        low, high = 0, self._count
+        while low < high:
+            middle = (low + high) // 2
+            offset, length, kind, latitude, longitude = _RECORD.unpack_from(
+                buffer, _HEADER.size + _RECORD.size * middle
+            )
+            start = self._keys_start + offset
+            current = buffer[start : start + length]
+            if current == target:
+                return Place(PlaceKind(kind), latitude, longitude)
+            if current < target:
+                low = middle + 1
+            else:
+                high = middle
+        return None
+
+    def lookup(self, text: str) -> Place | None:
+        """
+        地名を引く。住所のように複数の地名が続く場合（例: "宮城県仙台市青葉区"）は、
+        先頭から最も長く一致する地名で区切っていき、最も狭い範囲の地名を返す。
+        ローマ字・英語名は単語ごとに引く（例: "Sendai City, Miyagi" -> 仙台市）
+
+        Returns:
+            見つからない場合は None
+        """
+        key = normalize_place(text)
+        if not key:
+            return None
+        found = self.get(key)
+        if found is not None:
+            return found
+
+        candidates: list[Place] = []
+        if key.isascii():
+            candidates += filter(
+                None,
+                (self.get(word) for word in _ROMAN_WORD.findall(_fold(text))),
+            )
+        else:
+            position = 0
+            while position < len(key):
+                matched = self._longest_prefix(key, position)
+                if matched is None:
+                    # 残りは、接尾辞のない地名かもしれない（例: "宮城県仙台" の "仙台"）
+                    rest = self.get(key[position:])
+                    if rest is not None:
+                        candidates.append(rest)
+                    break
+                place, position = matched
+                candidates.append(place)
+        if not candidates:
+            return None
+        # 同じ種類の地名が複数ある場合は、後に書かれたものを使う
+        return max(reversed(candidates), key=lambda place: place.kind)
+
+    def _longest_prefix(self, key: str, start: int) -> tuple[Place, int] | None:
+        # 区切りに使うのは接尾辞で終わる名前だけ（"津" のような短い名前が途中で一致しないように）
+        for end in range(len(key), start, -1):
+            if key[end - 1] not in _SEGMENT_ENDS:
+                continue
+            place = self.get(key[start:end])
+            if place is not None:
+                return place, end
+        return None
+
+
+_gazetteer = Gazetteer()
+
+
+def lookup_place(text: str) -> Place | None:
+    """
+    同梱の索引（GAZETTEER_PATH）で地名を引く
+    """
+    return _gazetteer.lookup(text)
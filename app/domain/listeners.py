@@ -0,0 +1,44 @@
+from abc import ABC, abstractmethod
+
+from app.domain.westernastrology import StateChangeEvent
+
+
+class StateChangeListener(ABC):
+    """
+    占星術ステータスの処理段階の変化を待ち受けるリスナーの抽象クラス。
+    各タスクは一定間隔でDBを確認する代わりに、このリスナーで変化を待つ。
+    """
+
+    @abstractmethod
+    def listen(self) -> None:
+        """
+        変化の受信を開始する。
+        受信開始後に起きた変化は、次の wait で受け取れる。
+        """
+        raise NotImplementedError(
+            "listen method for StateChangeListener must be implemented."
+        )
+
+    @abstractmethod
+    def wait(self, timeout: float) -> list[StateChangeEvent]:
+        """
+        変化が起きるか、timeout 秒が経過するまで待つ。
+
+        Args:
+            timeout: 最大の待ち時間（秒）
+
+        Returns:
+            受け取った変化のリスト。timeoutした場合は空のリスト。
+        """
+        raise NotImplementedError(
+            "wait method for StateChangeListener must be implemented."
+        )
+
+    @abstractmethod
+    def close(self) -> None:
+        """
+        変化の受信を終了する。
+        """
+        raise NotImplementedError(
+            "close method for StateChangeListener must be implemented."
+        )
@@ -3,11 +3,45 @@
 # ===============================================================
 
 from abc import ABC, abstractmethod
+from datetime import datetime
 
-from app.domain.westernastrology import WesternAstrologyStateEntity
+from app.domain.westernastrology import (
+    InfoForAstrologyEntity,
+    NatalChartEntity,
+    WesternAstrologyStateEntity,
+)
 from app.domain.youtube.live import LiveChatMessageEntity
 
 
+class BroadcastSessionRepository(ABC):
+    """
+    配信セッション（1回のライブ配信）を扱うリポジトリの抽象クラス。
+    メッセージと占い結果は、開始した配信セッションに保存・検索される。
+    """
+
+    @abstractmethod
+    def start(self, session_id: str) -> None:
+        """
+        配信セッションを開始し、以降の保存・検索の対象にする。
+        既に開始したことがある配信セッションの場合は、その続きとして扱う。
+
+        Args:
+            session_id: 配信セッションのID（YouTubeの動画ID）
+        """
+        raise NotImplementedError(
+            "start method for BroadcastSessionRepository must be implemented."
+        )
+
+    @abstractmethod
+    def get_active_session_id(self) -> str:
+        """
+        保存・検索の対象になっている配信セッションのIDを取得する
+        """
+        raise NotImplementedError(
+            "get_active_session_id method for BroadcastSessionRepository must be implemented."
+        )
+
+
 class YoutubeLiveChatMessageRepository(ABC):
     """
     YouTubeライブチャットメッセージの永続化を扱うリポジトリの抽象クラス。
@@ -43,6 +77,32 @@ class YoutubeLiveChatMessageRepository(ABC):
         )
 
 
+class YoutubeLiveChatMessageSearchRepository(ABC):
+    """
+    オペレーターが配信中にコメントを探すための、YouTubeライブチャットメッセージの検索の抽象クラス。
+    """
+
+    @abstractmethod
+    def search(
+        self, query: str, limit: int, offset: int = 0
+    ) -> list[LiveChatMessageEntity]:
+        """
+        投稿者名かメッセージに、空白で区切った全ての語を含むメッセージを新しい順に返す。
+        大文字と小文字は区別しない。短い語（2文字以下）は、空白や記号で区切られた語として一致するものだけを返す。
+
+        Args:
+            query: 検索する語。空の場合は全てのメッセージを返す
+            limit: 返すメッセージの数の上限
+            offset: 新しい順に読み飛ばすメッセージの数（ページ送りに使う）
+
+        Returns:
+            一致したメッセージのリスト（新しい順）
+        """
+        raise NotImplementedError(
+            "search method for YoutubeLiveChatMessageSearchRepository must be implemented."
+        )
+
+
 class WesternAstrologyStateRepository(ABC):
     """
     西洋占星術結果の永続化を扱うリポジトリの抽象クラス。
@@ -58,6 +118,76 @@ class WesternAstrologyStateRepository(ABC):
             "save method for WesternAstrologyResultRepository must be implemented."
         )
 
+    # save は全ての列を書き換えるため、既存の占い結果の一部だけを変える時は以下の部分更新を使う。
+    # いずれも複数件をまとめて1回で更新する（1件の場合も1要素で渡す）
+
+    @abstractmethod
+    def set_required_info(self, infos: dict[str, InfoForAstrologyEntity]) -> None:
+        """
+        占いに必要な情報だけを更新する。
+
+        Args:
+            infos: メッセージID -> 占いに必要な情報
+        """
+        raise NotImplementedError(
+            "set_required_info method for WesternAstrologyResultRepository must be implemented."
+        )
+
+    @abstractmethod
+    def set_natal_chart(self, charts: dict[str, NatalChartEntity]) -> None:
+        """
+        占いに必要な情報から計算した出生図だけを更新する。
+        保存した出生図は、占い結果を生成し直す時に計算し直さずに使う
+
+        Args:
+            charts: メッセージID -> 出生図
+        """
+        raise NotImplementedError(
+            "set_natal_chart method for WesternAstrologyResultRepository must be implemented."
+        )
+
+    @abstractmethod
+    def set_result(self, results: dict[str, str]) -> None:
+        """
+        占い結果だけを更新する。
+
+        Args:
+            results: メッセージID -> 占い結果
+        """
+        raise NotImplementedError(
+            "set_result method for WesternAstrologyResultRepository must be implemented."
+        )
+
+    @abstractmethod
+    def set_voice_path(self, voice_paths: dict[str, str]) -> None:
+        """
+        占い結果の音声ファイルのパスだけを更新する。
+
+        Args:
+            voice_paths: メッセージID -> 音声ファイルのパス
+        """
+        raise NotImplementedError(
+            "set_voice_path method for WesternAstrologyResultRepository must be implemented."
+        )
+
+    @abstractmethod
+    def mark_played(self, message_ids: list[str]) -> None:
+        """
+        占い結果を再生済みにする。
+        """
+        raise NotImplementedError(
+            "mark_played method for WesternAstrologyResultRepository must be implemented."
+        )
+
+    @abstractmethod
+    def mark_not_target(self, message_ids: list[str]) -> None:
+        """
+        占い対象から外す。
+        """
+        raise NotImplementedError(
+            "mark_not_target method for WesternAstrologyResultRepository must be implemented."
+        )
+
     @abstractmethod
     def get_not_prepared_target(self, limit: int) -> list[WesternAstrologyStateEntity]:
         """
@@ -67,6 +197,18 @@ class WesternAstrologyStateRepository(ABC):
             "get_target method for WesternAstrologyResultRepository must be implemented."
         )
 
+    @abstractmethod
+    def get_not_prepared_target_and_message(
+        self, limit: int
+    ) -> tuple[list[WesternAstrologyStateEntity], list[LiveChatMessageEntity]]:
+        """
+        get_not_prepared_target と同じものを、メッセージと一緒に1回のクエリで取得する。
+        2つのリストは同じ順番で対応する
+        """
+        raise NotImplementedError(
+            "get_not_prepared_target_and_message method for WesternAstrologyResultRepository must be implemented."
+        )
+
     @abstractmethod
     def get_all_prepared_state_and_message(
         self,
@@ -78,6 +220,30 @@ class WesternAstrologyStateRepository(ABC):
             "get_target method for WesternAstrologyResultRepository must be implemented."
         )
 
+    @abstractmethod
+    def get_prepared_state_and_message_updated_after(
+        self, updated_after: datetime | None
+    ) -> tuple[list[WesternAstrologyStateEntity], list[LiveChatMessageEntity]]:
+        """
+        占い対象で、占いに必要な情報が揃っているもののうち、updated_after より後に更新されたものを取得する。
+        updated_after が None の場合は全て取得する（get_all_prepared_state_and_message と同じ）
+        """
+        raise NotImplementedError(
+            "get_prepared_state_and_message_updated_after method for WesternAstrologyResultRepository must be implemented."
+        )
+
+    @abstractmethod
+    def get_unprepared_message_ids_updated_after(
+        self, updated_after: datetime
+    ) -> list[str]:
+        """
+        占い対象外になったものなど、占いに必要な情報が揃っていないもののうち、updated_after より後に更新されたもののメッセージIDを取得する。
+        get_prepared_state_and_message_updated_after で取得したデータのうち、取得の対象から外れたものを見つけるために使う
+        """
+        raise NotImplementedError(
+            "get_unprepared_message_ids_updated_after method for WesternAstrologyResultRepository must be implemented."
+        )
+
     @abstractmethod
     def get_prepared_target_with_no_result(
         self, limit: int
@@ -116,6 +282,16 @@ class WesternAstrologyStateRepository(ABC):
             "get_waiting_audio_play_state method for WesternAstrologyResultRepository must be implemented."
         )
 
+    @abstractmethod
+    def count_waiting_audio_play_state(self) -> int:
+        """
+        音声再生待ちの占い結果の件数を取得する。
+        get_waiting_audio_play_state と同じ条件だが、行を読み込まずにDBで数える
+        """
+        raise NotImplementedError(
+            "count_waiting_audio_play_state method for WesternAstrologyResultRepository must be implemented."
+        )
+
     @abstractmethod
     def get_should_play_audio_status(self) -> list[WesternAstrologyStateEntity]:
         """
@@ -124,3 +300,215 @@ class WesternAstrologyStateRepository(ABC):
         raise NotImplementedError(
             "get_should_play_audio_status method for WesternAstrologyResultRepository must be implemented."
         )
+
+    @abstractmethod
+    def get_should_play_audio_state_and_message(
+        self, limit: int
+    ) -> tuple[list[WesternAstrologyStateEntity], list[LiveChatMessageEntity]]:
+        """
+        get_should_play_audio_status と同じものを、先頭から limit 件だけメッセージと一緒に1回のクエリで取得する。
+        2つのリストは同じ順番で対応する
+        """
+        raise NotImplementedError(
+            "get_should_play_audio_state_and_message method for WesternAstrologyResultRepository must be implemented."
+        )
+
+
+class InfoExtractionCacheRepository(ABC):
+    """
+    コメントから抽出した占いに必要な情報のキャッシュの抽象クラス。
+    同じコメント（コピーされた定型文や、同じ人の再投稿）のために、LLMを再び呼び出さないようにする。
+    キャッシュは配信セッションをまたいで使う。
+    """
+
+    @abstractmethod
+    def get_many(self, keys: list[str]) -> dict[str, InfoForAstrologyEntity]:
+        """
+        期限が切れていない抽出結果を返す。
+
+        Args:
+            keys: キャッシュのキー（app/application/extraction_cache.py の extraction_cache_key）
+
+        Returns:
+            キー -> 抽出結果。キャッシュにないキーは含まない
+        """
+        raise NotImplementedError(
+            "get_many method for InfoExtractionCacheRepository must be implemented."
+        )
+
+    @abstractmethod
+    def save(self, infos: dict[str, InfoForAstrologyEntity]) -> None:
+        """
+        抽出結果を保存する。同じキーの結果は置き換える。
+        件数の上限を超えた場合は、古いものから削除する（実装によっては、保存の度ではなく定期的に削除する）。
+
+        Args:
+            infos: キー -> 抽出結果
+        """
+        raise NotImplementedError(
+            "save method for InfoExtractionCacheRepository must be implemented."
+        )
+
+
+class AsyncYoutubeLiveChatMessageRepository(ABC):
+    """
+    YoutubeLiveChatMessageRepository の非同期版。
+    asyncio のイベントループ上で、スレッドを使わずに多数のDB操作を並行して実行するために使う。
+    """
+
+    @abstractmethod
+    async def save(self, messages: list[LiveChatMessageEntity]) -> None:
+        """
+        メッセージリストをDBに保存または更新する。
+        """
+        raise NotImplementedError(
+            "save method for AsyncYoutubeLiveChatMessageRepository must be implemented."
+        )
+
+    @abstractmethod
+    async def get_by_message_ids(
+        self, message_ids: list[str]
+    ) -> list[LiveChatMessageEntity]:
+        """
+        IDリストに一致するメッセージのリストを取得する。
+        """
+        raise NotImplementedError(
+            "get_by_message_ids method for AsyncYoutubeLiveChatMessageRepository must be implemented."
+        )
+
+
+class AsyncWesternAstrologyStateRepository(ABC):
+    """
+    WesternAstrologyStateRepository の非同期版。
+    各メソッドの仕様は WesternAstrologyStateRepository と同じ。
+    """
+
+    @abstractmethod
+    async def save(self, states: list[WesternAstrologyStateEntity]) -> None:
+        raise NotImplementedError(
+            "save method for AsyncWesternAstrologyStateRepository must be implemented."
+        )
+
+    @abstractmethod
+    async def set_required_info(self, infos: dict[str, InfoForAstrologyEntity]) -> None:
+        raise NotImplementedError(
+            "set_required_info method for AsyncWesternAstrologyStateRepository must be implemented."
+        )
+
+    @abstractmethod
+    async def set_natal_chart(self, charts: dict[str, NatalChartEntity]) -> None:
+        raise NotImplementedError(
+            "set_natal_chart method for AsyncWesternAstrologyStateRepository must be implemented."
+        )
+
+    @abstractmethod
+    async def set_result(self, results: dict[str, str]) -> None:
+        raise NotImplementedError(
+            "set_result method for AsyncWesternAstrologyStateRepository must be implemented."
+        )
+
+    @abstractmethod
+    async def set_voice_path(self, voice_paths: dict[str, str]) -> None:
+        raise NotImplementedError(
+            "set_voice_path method for AsyncWesternAstrologyStateRepository must be implemented."
+        )
+
+    @abstractmethod
+    async def mark_played(self, message_ids: list[str]) -> None:
+        raise NotImplementedError(
+            "mark_played method for AsyncWesternAstrologyStateRepository must be implemented."
+        )
+
+    @abstractmethod
+    async def mark_not_target(self, message_ids: list[str]) -> None:
+        raise NotImplementedError(
+            "mark_not_target method for AsyncWesternAstrologyStateRepository must be implemented."
+        )
+
+    @abstractmethod
+    async def get_not_prepared_target(
+        self, limit: int
+    ) -> list[WesternAstrologyStateEntity]:
+        raise NotImplementedError(
+            "get_not_prepared_target method for AsyncWesternAstrologyStateRepository must be implemented."
+        )
+
+    @abstractmethod
+    async def get_not_prepared_target_and_message(
+        self, limit: int
+    ) -> tuple[list[WesternAstrologyStateEntity], list[LiveChatMessageEntity]]:
+        raise NotImplementedError(
+            "get_not_prepared_target_and_message method for AsyncWesternAstrologyStateRepository must be implemented."
+        )
+
+    @abstractmethod
+    async def get_all_prepared_state_and_message(
+        self,
+    ) -> tuple[list[WesternAstrologyStateEntity], list[LiveChatMessageEntity]]:
+        raise NotImplementedError(
+            "get_all_prepared_state_and_message method for AsyncWesternAstrologyStateRepository must be implemented."
+        )
+
+    @abstractmethod
+    async def get_prepared_state_and_message_updated_after(
+        self, updated_after: datetime | None
+    ) -> tuple[list[WesternAstrologyStateEntity], list[LiveChatMessageEntity]]:
+        raise NotImplementedError(
+            "get_prepared_state_and_message_updated_after method for AsyncWesternAstrologyStateRepository must be implemented."
+        )
+
+    @abstractmethod
+    async def get_unprepared_message_ids_updated_after(
+        self, updated_after: datetime
+    ) -> list[str]:
+        raise NotImplementedError(
+            "get_unprepared_message_ids_updated_after method for AsyncWesternAstrologyStateRepository must be implemented."
+        )
+
+    @abstractmethod
+    async def get_prepared_target_with_no_result(
+        self, limit: int
+    ) -> list[WesternAstrologyStateEntity]:
+        raise NotImplementedError(
+            "get_prepared_target_with_no_result method for AsyncWesternAstrologyStateRepository must be implemented."
+        )
+
+    @abstractmethod
+    async def get_no_voice_target(
+        self, limit: int
+    ) -> list[WesternAstrologyStateEntity]:
+        raise NotImplementedError(
+            "get_no_voice_target method for AsyncWesternAstrologyStateRepository must be implemented."
+        )
+
+    @abstractmethod
+    async def get_all_with_voice(self) -> list[WesternAstrologyStateEntity]:
+        raise NotImplementedError(
+            "get_all_with_voice method for AsyncWesternAstrologyStateRepository must be implemented."
+        )
+
+    @abstractmethod
+    async def get_waiting_audio_play_state(self) -> list[WesternAstrologyStateEntity]:
+        raise NotImplementedError(
+            "get_waiting_audio_play_state method for AsyncWesternAstrologyStateRepository must be implemented."
+        )
+
+    @abstractmethod
+    async def count_waiting_audio_play_state(self) -> int:
+        raise NotImplementedError(
+            "count_waiting_audio_play_state method for AsyncWesternAstrologyStateRepository must be implemented."
+        )
+
+    @abstractmethod
+    async def get_should_play_audio_status(self) -> list[WesternAstrologyStateEntity]:
+        raise NotImplementedError(
+            "get_should_play_audio_status method for AsyncWesternAstrologyStateRepository must be implemented."
+        )
+
+    @abstractmethod
+    async def get_should_play_audio_state_and_message(
+        self, limit: int
+    ) -> tuple[list[WesternAstrologyStateEntity], list[LiveChatMessageEntity]]:
+        raise NotImplementedError(
+            "get_should_play_audio_state_and_message method for AsyncWesternAstrologyStateRepository must be implemented."
+        )
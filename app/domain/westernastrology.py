@@ -1,4 +1,5 @@
 from datetime import datetime
+from enum import Enum
 from typing import Any
 
 from pydantic import BaseModel, Field, field_validator
@@ -107,6 +108,61 @@ class InfoForAstrologyEntity(BaseModel):
         return f"{self.name} ({self.birthday} {self.birth_time} {self.birthplace}), worries: {self.worries}"
 
 
+class PlanetPositionEntity(BaseModel):
+    """
+    Position of a celestial object in a natal chart.
+    """
+
+    sign: str = Field(..., description="Zodiac sign the object is in")
+    degree: float = Field(..., description="Ecliptic longitude of the object")
+    house: int = Field(..., description="House number (1-12) the object is in")
+
+
+class NatalChartEntity(BaseModel):
+    """
+    Natal chart computed from the birth date, time and place.
+    """
+
+    positions: dict[str, PlanetPositionEntity] = Field(
+        ..., description="Object ID (flatlib const) -> position"
+    )
+
+
+class AstrologyStage(str, Enum):
+    """
+    占星術ステータスの処理段階。
+    DBの astrology_stage() 関数と同じ規則で判定する。
+    """
+
+    NOT_PREPARED = "not_prepared"  # 占いに必要な情報がまだない
+    NO_RESULT = "no_result"  # 占い結果がまだない
+    NO_VOICE = "no_voice"  # 音声ファイルがまだない
+    WAITING_PLAY = "waiting_play"  # 音声再生待ち
+    PLAYED = "played"  # 音声再生済み
+    EXCLUDED = "excluded"  # 占い対象外
+
+
+# 音声の再生を待っている（まだ再生されていない）処理段階
+WAITING_STAGES = frozenset(
+    {
+        AstrologyStage.NOT_PREPARED,
+        AstrologyStage.NO_RESULT,
+        AstrologyStage.NO_VOICE,
+        AstrologyStage.WAITING_PLAY,
+    }
+)
+
+# 占いに必要な情報が揃っている処理段階
+PREPARED_STAGES = frozenset(
+    {
+        AstrologyStage.NO_RESULT,
+        AstrologyStage.NO_VOICE,
+        AstrologyStage.WAITING_PLAY,
+        AstrologyStage.PLAYED,
+    }
+)
+
+
 class WesternAstrologyStateEntity(BaseModel):
     """
     西洋占星術の結果を表すエンティティ
@@ -128,9 +184,17 @@ class WesternAstrologyStateEntity(BaseModel):
     is_played: bool = Field(
         False, description="Whether the result has been played or not"
     )
+    natal_chart: NatalChartEntity | None = Field(
+        None,
+        description="The natal chart computed from required_info. None if not computed yet",
+    )
     created_at: datetime = Field(
         ..., description="The time when this state was created"
     )
+    updated_at: datetime | None = Field(
+        None,
+        description="The time when this state was last saved. None if not saved yet",
+    )
 
     @classmethod
     def get_initial(cls, message_id: str = "", is_target: bool = False):
@@ -143,3 +207,66 @@ class WesternAstrologyStateEntity(BaseModel):
             is_played=False,
             created_at=datetime.now(),
         )
+
+    @property
+    def stage(self) -> AstrologyStage:
+        """
+        現在の処理段階を返す
+        """
+        if not self.is_target:
+            return AstrologyStage.EXCLUDED
+        if not self.required_info or not self.required_info.name:
+            return AstrologyStage.NOT_PREPARED
+        if not self.result:
+            return AstrologyStage.NO_RESULT
+        if not self.result_voice_path:
+            return AstrologyStage.NO_VOICE
+        if not self.is_played:
+            return AstrologyStage.WAITING_PLAY
+        return AstrologyStage.PLAYED
+
+
+class StateChangeEvent(BaseModel):
+    """
+    占星術ステータスの処理段階が変わったことを表すイベント
+    """
+
+    session_id: str | None = Field(
+        None, description="The broadcast session id of the state"
+    )
+    message_id: str = Field(..., description="message id")
+    from_stage: AstrologyStage | None = Field(
+        None, description="The stage before the change. None if the state is new"
+    )
+    to_stage: AstrologyStage = Field(..., description="The stage after the change")
+
+
+class WaitingCounter:
+    """
+    占い待ちの件数をメモリ上で数える。
+    DBで数えた件数で初期化し、以降は処理段階の変化（StateChangeEvent）を反映して更新する。
+    """
+
+    def __init__(self) -> None:
+        self.count = 0
+
+    def reset(self, count: int) -> None:
+        self.count = count
+
+    def apply(
+        self, events: list[StateChangeEvent], session_id: str | None = None
+    ) -> None:
+        """
+        Args:
+            events: 処理段階の変化
+            session_id: 数える配信セッションのID。指定した場合は、他の配信セッションの変化を無視する
+        """
+        for event in events:
+            if session_id is not None and event.session_id != session_id:
+                continue
+            if event.from_stage in WAITING_STAGES:
+                self.count -= 1
+            if event.to_stage in WAITING_STAGES:
+                self.count += 1
+        # 初期化と通知の受信開始の間に起きた変化を二重に数えることがあるため、負にはしない
+        self.count = max(self.count, 0)
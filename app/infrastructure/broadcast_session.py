@@ -0,0 +1,190 @@
+# ===============================================================
+# 配信セッション（1回のライブ配信）ごとのパーティションの管理
+# メッセージと占星術ステータスは配信セッションごとのパーティションに保存し、
+# リポジトリは現在の配信セッションのパーティションだけを検索する
+# ===============================================================
+
+import gzip
+import re
+import threading
+from datetime import datetime, timezone
+from logging import getLogger
+from pathlib import Path
+
+from sqlalchemy import select, text, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from app.infrastructure.db_common import SessionLocal, engine
+from app.infrastructure.tables import (
+    BroadcastSessionOrm,
+    WesternAstrologyStatusOrm,
+    YoutubeLivechatMessageOrm,
+)
+
+logger = getLogger(__name__)
+
+# 配信セッションを開始せずに保存した場合に使う配信セッション
+DEFAULT_SESSION_ID = "default"
+
+# パーティションの親テーブル。作成は親 -> 子、アーカイブは子 -> 親の順に行う（外部キーのため）
+PARTITIONED_TABLES = [
+    YoutubeLivechatMessageOrm.__tablename__,
+    WesternAstrologyStatusOrm.__tablename__,
+]
+
+# パーティション名（テーブル名）に含めるため、使える文字と長さを制限する
+_SESSION_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]{1,32}$")
+
+_lock = threading.Lock()
+_active_session_id: str | None = None
+
+
+def validate_session_id(session_id: str) -> str:
+    if not _SESSION_ID_PATTERN.match(session_id):
+        raise ValueError(
+            f"Invalid session id {session_id!r}. "
+            "Use 1-32 characters of alphanumerics, '_' or '-'."
+        )
+    return session_id
+
+
+def partition_name(table_name: str, session_id: str) -> str:
+    return f"{table_name}_{validate_session_id(session_id)}"
+
+
+def create_partition_ddl(session_id: str) -> list[str]:
+    """
+    配信セッションのパーティションを作成するSQL（既にある場合は何もしない）
+    """
+    return [
+        f'CREATE TABLE IF NOT EXISTS "{partition_name(table, session_id)}" '
+        f"PARTITION OF {table} FOR VALUES IN ('{session_id}')"
+        for table in PARTITIONED_TABLES
+    ]
+
+
+def start_session(session_id: str) -> None:
+    """
+    配信セッションを開始する。パーティションを作成し、以降の保存・検索の対象にする。
+    既に開始したことがある配信セッションの場合は、その続きとして扱う。
+    """
+    validate_session_id(session_id)
+    with SessionLocal() as session:
+        try:
+            archived_at = session.execute(
+                select(BroadcastSessionOrm.archived_at).where(
+                    BroadcastSessionOrm.id == session_id
+                )
+            ).scalar_one_or_none()
+            if archived_at is not None:
+                raise ValueError(f"Session {session_id} is already archived.")
+            stmt = pg_insert(BroadcastSessionOrm).values(id=session_id)
+            session.execute(
+                stmt.on_conflict_do_update(
+                    index_elements=["id"], set_={"started_at": text("now()")}
+                )
+            )
+            for ddl in create_partition_ddl(session_id):
+                session.execute(text(ddl))
+            session.commit()
+        except Exception as e:
+            session.rollback()
+            logger.exception(f"Failed to start session {session_id}: {e}")
+            raise e
+    _set_active_session_id(session_id)
+    logger.info(f"Started broadcast session: {session_id}")
+
+
+def get_active_session_id() -> str:
+    """
+    現在の配信セッションのIDを返す。
+    このプロセスで開始していない場合は、最後に開始されたアーカイブされていない配信セッションを続けて使う。
+    それもない場合は DEFAULT_SESSION_ID の配信セッションを開始する。
+    """
+    if _active_session_id is not None:
+        return _active_session_id
+    with SessionLocal() as session:
+        latest = session.execute(
+            select(BroadcastSessionOrm.id)
+            .where(BroadcastSessionOrm.archived_at.is_(None))
+            .order_by(BroadcastSessionOrm.started_at.desc())
+            .limit(1)
+        ).scalar_one_or_none()
+    if latest is None:
+        start_session(DEFAULT_SESSION_ID)
+    else:
+        _set_active_session_id(latest)
+    return _active_session_id
+
+
+def reset_active_session() -> None:
+    """
+    DBを初期化した時などに、次回の get_active_session_id でDBから読み直すようにする
+    """
+    _set_active_session_id(None)
+
+
+def _set_active_session_id(session_id: str | None) -> None:
+    global _active_session_id
+    with _lock:
+        _active_session_id = session_id
+
+
+def list_archivable_sessions(keep: int) -> list[str]:
+    """
+    新しい順に keep 件を残して、アーカイブできる配信セッションのIDを古い順に返す。
+    現在の配信セッションは含めない。
+    """
+    with SessionLocal() as session:
+        session_ids = (
+            session.execute(
+                select(BroadcastSessionOrm.id)
+                .where(BroadcastSessionOrm.archived_at.is_(None))
+                .order_by(BroadcastSessionOrm.started_at.desc())
+            )
+            .scalars()
+            .all()
+        )
+    return [
+        session_id
+        for session_id in reversed(session_ids[keep:])
+        if session_id != _active_session_id
+    ]
+
+
+def archive_session(session_id: str, archive_dir: Path) -> Path:
+    """
+    配信セッションのパーティションを切り離し、gzip圧縮したCSVに書き出してから削除する。
+
+    Returns:
+        アーカイブファイルを保存したディレクトリ
+    """
+    validate_session_id(session_id)
+    if session_id == _active_session_id:
+        raise ValueError(f"Session {session_id} is active and cannot be archived.")
+
+    session_dir = archive_dir / session_id
+    session_dir.mkdir(parents=True, exist_ok=True)
+    with engine.begin() as conn:
+        cursor = conn.connection.cursor()
+        # 外部キーで参照している側（占星術ステータス）から切り離す
+        for table in reversed(PARTITIONED_TABLES):
+            partition = partition_name(table, session_id)
+            cursor.execute(f'ALTER TABLE {table} DETACH PARTITION "{partition}"')
+            with gzip.open(
+                session_dir / f"{table}.csv.gz", "wt", encoding="utf-8"
+            ) as f:
+                cursor.copy_expert(
+                    f'COPY "{partition}" TO STDOUT WITH (FORMAT csv, HEADER)', f
+                )
+        for table in reversed(PARTITIONED_TABLES):
+            cursor.execute(f'DROP TABLE "{partition_name(table, session_id)}"')
+        conn.execute(
+            update(BroadcastSessionOrm)
+            .where(BroadcastSessionOrm.id == session_id)
+            .values(
+                archived_at=datetime.now(timezone.utc), archive_path=str(session_dir)
+            )
+        )
+    logger.info(f"Archived broadcast session {session_id} to {session_dir}")
+    return session_dir
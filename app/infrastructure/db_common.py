@@ -1,7 +1,9 @@
 import re
 from datetime import datetime
 from logging import getLogger
+from typing import TYPE_CHECKING
 
+from pydantic_core import from_json, to_json
 from sqlalchemy import TIMESTAMP, create_engine, func
 from sqlalchemy.orm import (
     DeclarativeBase,
@@ -11,13 +13,82 @@ from sqlalchemy.orm import (
     sessionmaker,
 )
 
-from app.core.const import PG_URL
+from app.config import (
+    DB_POOL_TIMEOUT,
+    DB_TASK_WORKERS,
+    DB_UI_WORKERS,
+    STATE_WRITE_BEHIND_INTERVAL,
+)
+from app.core.const import PG_ASYNC_URL, PG_URL
+from app.infrastructure.pool_metrics import (
+    InstrumentedQueuePool,
+    PoolStats,
+    pool_options,
+)
+
+if TYPE_CHECKING:
+    from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 
 logger = getLogger(__name__)
 
-engine = create_engine(PG_URL, echo=False, pool_size=10, max_overflow=5)
+# 各タスクがコネクションを待たされないように、同時にDBを使うワーカーの数に合わせてプールの大きさを決める。
+# 書き込みを溜める場合は、溜めた書き込みをDBに書き込むスレッド（with_write_behind）の分も加える
+_POOL_OPTIONS = pool_options(
+    DB_TASK_WORKERS,
+    DB_UI_WORKERS,
+    background_workers=1 if STATE_WRITE_BEHIND_INTERVAL > 0 else 0,
+)
+
+
+def _json_serializer(obj) -> str:
+    return to_json(obj).decode()
+
+
+# jsonb の読み書きには、標準の json モジュールより速い pydantic-core のJSONの実装を使う
+_JSON_OPTIONS = {"json_serializer": _json_serializer, "json_deserializer": from_json}
+
+engine = create_engine(
+    PG_URL,
+    echo=False,
+    poolclass=InstrumentedQueuePool,
+    pool_timeout=DB_POOL_TIMEOUT,
+    **_POOL_OPTIONS,
+    **_JSON_OPTIONS,
+)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+_async_session_local: "async_sessionmaker[AsyncSession] | None" = None
+
+
+def get_async_session_local() -> "async_sessionmaker[AsyncSession]":
+    """
+    非同期版のセッションファクトリを返す。
+    asyncpg・greenletがなくても同期版を使えるように、sqlalchemy.ext.asyncio は初回に呼ばれた時に読み込み、非同期エンジンを作成する。
+    """
+    # sqlalchemy.ext.asyncio は読み込む時に greenlet を必要とする
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+    global _async_session_local
+    if _async_session_local is None:
+        async_engine = create_async_engine(
+            PG_ASYNC_URL,
+            echo=False,
+            pool_timeout=DB_POOL_TIMEOUT,
+            **_POOL_OPTIONS,
+            **_JSON_OPTIONS,
+        )
+        _async_session_local = async_sessionmaker(
+            bind=async_engine, autoflush=False, expire_on_commit=False
+        )
+    return _async_session_local
+
+
+def get_pool_stats() -> PoolStats:
+    """
+    同期版のエンジンのコネクションプールの使用状況を、タスク（スレッド）ごとに返す
+    """
+    return engine.pool.stats()
+
 
 # ヘルパー関数: CamelCase を snake_case に変換する
 def camel_to_snake(name: str) -> str:
@@ -45,9 +116,8 @@ class TableNameMixin:
 
 
 def initialize_db():
-    from app.infrastructure import (
-        tables,
-    )  # テーブル定義をここで読み込まないとalembicがテーブルを作成できない
+    # テーブル定義をここで読み込まないとalembicがテーブルを作成できない
+    from app.infrastructure import tables
 
     print(tables)
 
@@ -56,6 +126,10 @@ def initialize_db():
         engine = create_engine(PG_URL, echo=True)
         Base.metadata.drop_all(engine)
         Base.metadata.create_all(engine, checkfirst=False)
+        # 配信セッションも削除されたので、次回の保存時に作り直す
+        from app.infrastructure.broadcast_session import reset_active_session
+
+        reset_active_session()
         logger.info("Successfully initialized DB")
     except Exception as e:
         logger.exception(f"Failed to initialize DB: {e}")
@@ -0,0 +1,113 @@
+# ===============================================================
+# チャットメッセージのキャッシュ
+# チャットメッセージは保存後に変更されないので、保存時にキャッシュしておき、
+# 以降の読み込みではDBからの取得とJSONからのエンティティへの変換を省く
+# ===============================================================
+
+import threading
+from collections import OrderedDict
+
+from pydantic import BaseModel
+
+from app.domain.youtube.live import LiveChatMessageEntity
+
+
+class MessageCacheStats(BaseModel):
+    """
+    チャットメッセージのキャッシュの使用状況
+    """
+
+    max_size: int
+    size: int
+    hits: int
+    misses: int
+    # 上限を超えたために捨てたメッセージの数
+    evictions: int
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+class LiveChatMessageCache:
+    """
+    メッセージIDをキーにした、件数に上限のあるLRUキャッシュ。複数のスレッドから使える。
+    キャッシュしたエンティティはそのまま返すので、呼び出し側で変更しないこと
+    """
+
+    def __init__(self, max_size: int):
+        if max_size < 1:
+            raise ValueError("max_size must be 1 or more.")
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        # 最後に使われた順（末尾が最新）
+        self._messages: OrderedDict[str, LiveChatMessageEntity] = OrderedDict()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def get_many(
+        self, message_ids: list[str]
+    ) -> tuple[dict[str, LiveChatMessageEntity], list[str]]:
+        """
+        Returns:
+            キャッシュにあったメッセージ（ID -> メッセージ）と、キャッシュになかったIDのリスト
+        """
+        found: dict[str, LiveChatMessageEntity] = {}
+        missing: list[str] = []
+        with self._lock:
+            for message_id in dict.fromkeys(message_ids):
+                message = self._messages.get(message_id)
+                if message is None:
+                    missing.append(message_id)
+                    continue
+                self._messages.move_to_end(message_id)
+                found[message_id] = message
+            self._hits += len(found)
+            self._misses += len(missing)
+        return found, missing
+
+    def put_many(
+        self, messages: list[LiveChatMessageEntity], replace: bool = True
+    ) -> None:
+        """
+        Args:
+            replace: False の場合、既にキャッシュにあるメッセージは置き換えない
+        """
+        with self._lock:
+            for message in messages:
+                # IDのないメッセージは保存時にIDを決めるので、キャッシュできない
+                if message.id is None:
+                    continue
+                if replace or message.id not in self._messages:
+                    self._messages[message.id] = message
+                self._messages.move_to_end(message.id)
+            while len(self._messages) > self.max_size:
+                self._messages.popitem(last=False)
+                self._evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._messages.clear()
+
+    def stats(self) -> MessageCacheStats:
+        with self._lock:
+            return MessageCacheStats(
+                max_size=self.max_size,
+                size=len(self._messages),
+                hits=self._hits,
+                misses=self._misses,
+                evictions=self._evictions,
+            )
+
+
+def format_message_cache_stats(stats: MessageCacheStats) -> str:
+    """
+    画面に表示するための、Markdownの文
+    """
+    return (
+        f"メッセージのキャッシュ: {stats.size} / {stats.max_size} 件, "
+        f"ヒット {stats.hits} 回, ミス {stats.misses} 回"
+        f"（ヒット率 {stats.hit_rate:.1%}）, 破棄 {stats.evictions} 件"
+    )
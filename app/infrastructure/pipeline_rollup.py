@@ -0,0 +1,152 @@
+# ===============================================================
+# Grafanaのダッシュボード用の集計（ロールアップ）テーブルの更新
+# メッセージと占星術ステータスの変更をトリガーで受けて、
+# 配信セッションごとの処理段階別の件数と、1分ごとの処理件数を更新する。
+# ダッシュボードはこの集計テーブルを読むので、履歴の件数によらず一定の時間で表示できる
+# ===============================================================
+
+# 集計テーブルでコメント（メッセージ）の件数に使う段階の名前
+MESSAGE_STAGE = "message"
+
+# 変化（配信セッション, 変化前の段階, 変化後の段階）の配列を受けて、集計テーブルに反映する。
+# 段階ごとの件数は増減を足し込み、1分ごとの処理件数は変化後の段階に入った件数を数える。
+# 同時に更新するトランザクション同士がデッドロックしないように、主キーの順に更新する
+ROLLUP_FUNCTION_DDL = """
+CREATE OR REPLACE FUNCTION rollup_stage_changes(
+    session_ids text[],
+    from_stages text[],
+    to_stages text[]
+) RETURNS void
+LANGUAGE sql AS $$
+    WITH changes AS (
+        SELECT * FROM unnest(session_ids, from_stages, to_stages)
+            AS c(session_id, from_stage, to_stage)
+    ), counted AS (
+        INSERT INTO pipeline_stage_counts AS t (session_id, stage, count)
+        SELECT session_id, stage, sum(n) FROM (
+            SELECT session_id, to_stage AS stage, 1 AS n
+            FROM changes WHERE to_stage IS NOT NULL
+            UNION ALL
+            SELECT session_id, from_stage, -1
+            FROM changes WHERE from_stage IS NOT NULL
+        ) AS d
+        GROUP BY session_id, stage
+        HAVING sum(n) <> 0
+        ORDER BY session_id, stage
+        ON CONFLICT (session_id, stage) DO UPDATE SET count = t.count + excluded.count
+    )
+    INSERT INTO pipeline_stage_throughputs AS t (session_id, minute, stage, count)
+    SELECT session_id, date_trunc('minute', now()), to_stage, count(1)
+    FROM changes WHERE to_stage IS NOT NULL
+    GROUP BY session_id, to_stage
+    ORDER BY session_id, to_stage
+    ON CONFLICT (session_id, minute, stage) DO UPDATE SET count = t.count + excluded.count
+$$
+"""
+
+# 占星術ステータスの処理段階の変化を集計する。
+# まとめて保存・更新した時にも1回で集計できるように、文単位のトリガーで変化した行をまとめて渡す
+STATE_ROLLUP_FUNCTION_DDL = """
+CREATE OR REPLACE FUNCTION rollup_astrology_stage_change() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        PERFORM rollup_stage_changes(
+            array_agg(session_id),
+            array_agg(NULL::text),
+            array_agg(astrology_stage(
+                is_target, required_info, result, result_voice_path, is_played
+            ))
+        ) FROM new_rows;
+    ELSIF TG_OP = 'UPDATE' THEN
+        PERFORM rollup_stage_changes(
+            array_agg(session_id), array_agg(from_stage), array_agg(to_stage)
+        ) FROM (
+            SELECT session_id,
+                   astrology_stage(
+                       o.is_target, o.required_info, o.result, o.result_voice_path, o.is_played
+                   ) AS from_stage,
+                   astrology_stage(
+                       n.is_target, n.required_info, n.result, n.result_voice_path, n.is_played
+                   ) AS to_stage
+            FROM new_rows AS n JOIN old_rows AS o USING (session_id, message_id)
+        ) AS c
+        WHERE from_stage <> to_stage;
+    ELSE
+        PERFORM rollup_stage_changes(
+            array_agg(session_id),
+            array_agg(astrology_stage(
+                is_target, required_info, result, result_voice_path, is_played
+            )),
+            array_agg(NULL::text)
+        ) FROM old_rows;
+    END IF;
+    RETURN NULL;
+END
+$$
+"""
+
+MESSAGE_ROLLUP_FUNCTION_DDL = f"""
+CREATE OR REPLACE FUNCTION rollup_livechat_message_change() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        PERFORM rollup_stage_changes(
+            array_agg(session_id), array_agg(NULL::text), array_agg('{MESSAGE_STAGE}'::text)
+        ) FROM new_rows;
+    ELSE
+        PERFORM rollup_stage_changes(
+            array_agg(session_id), array_agg('{MESSAGE_STAGE}'::text), array_agg(NULL::text)
+        ) FROM old_rows;
+    END IF;
+    RETURN NULL;
+END
+$$
+"""
+
+# 遷移テーブル（REFERENCING）を使うトリガーは、1つのイベントにしか作成できない
+STATE_ROLLUP_TRIGGER_DDL = [
+    """
+CREATE TRIGGER western_astrology_statuss_rollup_insert
+    AFTER INSERT ON western_astrology_statuss
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION rollup_astrology_stage_change()
+""",
+    """
+CREATE TRIGGER western_astrology_statuss_rollup_update
+    AFTER UPDATE ON western_astrology_statuss
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION rollup_astrology_stage_change()
+""",
+    """
+CREATE TRIGGER western_astrology_statuss_rollup_delete
+    AFTER DELETE ON western_astrology_statuss
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION rollup_astrology_stage_change()
+""",
+]
+
+MESSAGE_ROLLUP_TRIGGER_DDL = [
+    """
+CREATE TRIGGER youtube_livechat_messages_rollup_insert
+    AFTER INSERT ON youtube_livechat_messages
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION rollup_livechat_message_change()
+""",
+    """
+CREATE TRIGGER youtube_livechat_messages_rollup_delete
+    AFTER DELETE ON youtube_livechat_messages
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION rollup_livechat_message_change()
+""",
+]
+
+# 全てのテーブルを作成した後に実行するDDL。
+# astrology_stage() はテーブルより先に作成する（app/infrastructure/tables.py）
+PIPELINE_ROLLUP_DDL: list[str] = [
+    ROLLUP_FUNCTION_DDL,
+    STATE_ROLLUP_FUNCTION_DDL,
+    MESSAGE_ROLLUP_FUNCTION_DDL,
+    *STATE_ROLLUP_TRIGGER_DDL,
+    *MESSAGE_ROLLUP_TRIGGER_DDL,
+]
@@ -0,0 +1,233 @@
+# ===============================================================
+# DBのコネクションプールの計測
+# コネクションを使ったスレッド（ThreadTask の名前）ごとに、
+# 取得までの待ち時間・タイムアウト・使用中の数を記録する
+# ===============================================================
+
+import threading
+import time
+from logging import getLogger
+
+from pydantic import BaseModel
+from sqlalchemy import event
+from sqlalchemy import exc as sa_exc
+from sqlalchemy.pool import QueuePool
+
+logger = getLogger(__name__)
+
+# コネクションの取得にこの時間（秒）以上かかった場合は、警告のログを出す
+WAIT_WARNING_SECONDS: float = 1.0
+
+
+class TaskPoolStats(BaseModel):
+    """
+    1つのタスク（スレッド）のコネクションの使用状況
+    """
+
+    checkouts: int = 0
+    # 現在使用中のコネクションの数
+    checked_out: int = 0
+    total_wait: float = 0.0
+    max_wait: float = 0.0
+    timeouts: int = 0
+
+
+class PoolStats(BaseModel):
+    """
+    コネクションプール全体と、タスクごとのコネクションの使用状況
+    """
+
+    pool_size: int
+    max_overflow: int
+    checked_out: int
+    overflow: int
+    timeouts: int
+    # プールが保持しているコネクションのうち、最も古いものが接続されてからの秒数
+    oldest_connection_age: float
+    tasks: dict[str, TaskPoolStats]
+
+
+class PoolMetrics:
+    """
+    コネクションプールのイベントを受けて、タスクごとの使用状況を記録する。
+    engine.dispose() でプールが作り直されても、同じ記録を使い続ける
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._tasks: dict[str, TaskPoolStats] = {}
+        self._timeouts = 0
+        # id(コネクションの記録) -> 接続した時刻
+        self._connected_at: dict[int, float] = {}
+
+    def attach(self, pool: QueuePool) -> None:
+        event.listen(pool, "connect", self._on_connect)
+        event.listen(pool, "close", self._on_close)
+        event.listen(pool, "checkout", self._on_checkout)
+        event.listen(pool, "checkin", self._on_checkin)
+
+    def _task(self, name: str | None = None) -> TaskPoolStats:
+        # ThreadTask はタスク名をスレッド名にしている
+        name = name or threading.current_thread().name
+        task = self._tasks.get(name)
+        if task is None:
+            task = self._tasks[name] = TaskPoolStats()
+        return task
+
+    def record_wait(self, wait: float, timed_out: bool) -> None:
+        with self._lock:
+            task = self._task()
+            task.total_wait += wait
+            task.max_wait = max(task.max_wait, wait)
+            if timed_out:
+                self._timeouts += 1
+                task.timeouts += 1
+
+    def _on_connect(self, dbapi_connection, connection_record) -> None:
+        with self._lock:
+            self._connected_at[id(connection_record)] = time.monotonic()
+
+    def _on_close(self, dbapi_connection, connection_record) -> None:
+        with self._lock:
+            self._connected_at.pop(id(connection_record), None)
+
+    def _on_checkout(self, dbapi_connection, connection_record, connection_proxy):
+        name = threading.current_thread().name
+        # 返却は別のスレッドで行われることもあるので、取得したタスクを覚えておく
+        connection_record.info["pool_metrics_task"] = name
+        with self._lock:
+            task = self._task(name)
+            task.checkouts += 1
+            task.checked_out += 1
+
+    def _on_checkin(self, dbapi_connection, connection_record) -> None:
+        name = connection_record.info.pop("pool_metrics_task", None)
+        with self._lock:
+            if name in self._tasks:
+                self._tasks[name].checked_out -= 1
+
+    def stats(self, pool: QueuePool) -> PoolStats:
+        now = time.monotonic()
+        with self._lock:
+            return PoolStats(
+                pool_size=pool.size(),
+                max_overflow=pool._max_overflow,
+                checked_out=pool.checkedout(),
+                overflow=max(pool.overflow(), 0),
+                timeouts=self._timeouts,
+                oldest_connection_age=max(
+                    (now - t for t in self._connected_at.values()), default=0.0
+                ),
+                tasks={name: task.model_copy() for name, task in self._tasks.items()},
+            )
+
+    def in_use_by_task(self) -> str:
+        with self._lock:
+            in_use = [
+                f"{name}={task.checked_out}"
+                for name, task in self._tasks.items()
+                if task.checked_out
+            ]
+        return ", ".join(in_use) or "none"
+
+
+class InstrumentedQueuePool(QueuePool):
+    """
+    コネクションの取得にかかった時間とタイムアウトを PoolMetrics に記録する QueuePool。
+    create_engine(..., poolclass=InstrumentedQueuePool) で使い、engine.pool.stats() で使用状況を取得する
+    """
+
+    def __init__(self, *args, pool_metrics: PoolMetrics | None = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        # 作り直した時（recreate）は、元のプールの記録とイベントのリスナーを引き継ぐ
+        if pool_metrics is None:
+            pool_metrics = PoolMetrics()
+            pool_metrics.attach(self)
+        self.metrics = pool_metrics
+        # _do_get は中で自身を呼び直すことがあるので、一番外側の呼び出しだけを計測する
+        self._local = threading.local()
+
+    def recreate(self) -> "InstrumentedQueuePool":
+        self.logger.info("Pool recreating")
+        return self.__class__(
+            self._creator,
+            pool_size=self._pool.maxsize,
+            max_overflow=self._max_overflow,
+            pre_ping=self._pre_ping,
+            use_lifo=self._pool.use_lifo,
+            timeout=self._timeout,
+            recycle=self._recycle,
+            echo=self.echo,
+            logging_name=self._orig_logging_name,
+            reset_on_return=self._reset_on_return,
+            _dispatch=self.dispatch,
+            dialect=self._dialect,
+            pool_metrics=self.metrics,
+        )
+
+    def _do_get(self):
+        if getattr(self._local, "measuring", False):
+            return super()._do_get()
+        self._local.measuring = True
+        started = time.monotonic()
+        timed_out = False
+        try:
+            return super()._do_get()
+        except sa_exc.TimeoutError:
+            timed_out = True
+            logger.error(f"Timed out waiting for a DB connection. {self.status()}")
+            raise
+        finally:
+            self._local.measuring = False
+            wait = time.monotonic() - started
+            self.metrics.record_wait(wait, timed_out)
+            if wait >= WAIT_WARNING_SECONDS and not timed_out:
+                logger.warning(
+                    f"Waited {wait:.2f}s for a DB connection. {self.status()}"
+                )
+
+    def status(self) -> str:
+        return f"{super().status()} In use by task: {self.metrics.in_use_by_task()}"
+
+    def stats(self) -> PoolStats:
+        return self.metrics.stats(self)
+
+
+def pool_options(
+    task_workers: int, ui_workers: int, background_workers: int = 0
+) -> dict:
+    """
+    同時にDBを使うワーカーの数から、コネクションプールの大きさを決める。
+    ワーカーはそれぞれ同時に1つのコネクションしか使わないので、pool_size はワーカーの数にする。
+    max_overflow は、画面の操作が集中した時などの見込み違いに備えた予備
+
+    Args:
+        task_workers: パイプラインのタスク（ThreadTask）の数
+        ui_workers: 画面の操作で同時にDBを使う数の見込み
+        background_workers: タスク以外にプールを使うスレッド（書き込みを溜めるリポジトリの書き込み）の数。
+            LISTEN のコネクション（PgStateChangeListener）はプールを使わないので含めない
+    """
+    workers = task_workers + ui_workers + background_workers
+    return {"pool_size": workers, "max_overflow": max(2, workers // 2)}
+
+
+def format_pool_stats(stats: PoolStats) -> str:
+    """
+    画面に表示するための、Markdownの表
+    """
+    lines = [
+        f"プール: {stats.checked_out} / {stats.pool_size} 使用中"
+        f"（予備 {stats.overflow} / {stats.max_overflow}）, "
+        f"タイムアウト {stats.timeouts} 回, "
+        f"最も古い接続 {stats.oldest_connection_age:.0f} 秒",
+        "",
+        "| タスク | 使用中 | 取得回数 | 平均待ち時間(秒) | 最大待ち時間(秒) | タイムアウト |",
+        "|---|---|---|---|---|---|",
+    ]
+    for name, task in sorted(stats.tasks.items()):
+        average = task.total_wait / task.checkouts if task.checkouts else 0.0
+        lines.append(
+            f"| {name} | {task.checked_out} | {task.checkouts} "
+            f"| {average:.3f} | {task.max_wait:.3f} | {task.timeouts} |"
+        )
+    return "\n".join(lines)
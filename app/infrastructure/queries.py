@@ -0,0 +1,542 @@
+# ===============================================================
+# リポジトリ実装（同期版・非同期版）で共通して使うSQL文とエンティティへの変換
+# 各SQL文は配信セッション（session_id）のパーティションだけを対象にする
+# ===============================================================
+
+from datetime import datetime, timedelta
+from typing import Sequence
+from uuid import uuid4
+
+from sqlalchemy import String, Text, cast, column, values
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.sql import (
+    Delete,
+    Select,
+    Update,
+    and_,
+    delete,
+    func,
+    or_,
+    select,
+    update,
+)
+
+from app.domain.westernastrology import (
+    WAITING_STAGES,
+    AstrologyStage,
+    InfoForAstrologyEntity,
+    NatalChartEntity,
+    WesternAstrologyStateEntity,
+)
+from app.domain.youtube.live import LiveChatMessageEntity
+from app.infrastructure.tables import (
+    ASTROLOGY_STAGE,
+    LIVECHAT_AUTHOR_NAME,
+    LIVECHAT_AUTHOR_NAME_NGRAMS,
+    LIVECHAT_DISPLAY_MESSAGE,
+    LIVECHAT_DISPLAY_MESSAGE_NGRAMS,
+    InfoExtractionCacheOrm,
+    WesternAstrologyStatusOrm,
+    YoutubeLivechatMessageOrm,
+)
+
+
+def to_message_document(message: LiveChatMessageEntity) -> dict:
+    """
+    message カラムに保存するJSON。
+    使われていないサブモデルなど、値が None のフィールドは保存しない。
+    LiveChatMessageEntity のフィールドの初期値は全て None なので、読み込むと同じエンティティに戻る
+    """
+    return message.model_dump(exclude_none=True)
+
+
+def save_messages_stmt(session_id: str, messages: list[LiveChatMessageEntity]):
+    """
+    INSERT ... ON CONFLICT DO NOTHING で、未保存のメッセージだけを保存する
+    """
+    message_dict_list = [to_message_document(message) for message in messages]
+    return (
+        pg_insert(YoutubeLivechatMessageOrm).values(
+            [
+                {
+                    "session_id": session_id,
+                    "id": d.get("id", str(uuid4())),
+                    "message": d,
+                }
+                for d in message_dict_list
+            ]
+        )
+        # (session_id, id) が主キーであることを前提
+        .on_conflict_do_nothing(index_elements=["session_id", "id"])
+        # sqlalchemyのバージョン2系 スタイルでは、ORMクラスそのものではなく
+        # 「返して欲しいカラム」を returning(...) で列挙することが推奨されている
+        # 例えばテーブル全カラムを返すなら __table__ を指定。
+        .returning(YoutubeLivechatMessageOrm.__table__)
+    )
+
+
+def messages_by_ids_stmt(session_id: str, message_ids: list[str]) -> Select:
+    # 保存時に message の 'id' を主キーの id にしているので、主キーで検索する
+    return select(YoutubeLivechatMessageOrm).where(
+        YoutubeLivechatMessageOrm.session_id == session_id,
+        YoutubeLivechatMessageOrm.id.in_(message_ids),
+    )
+
+
+def search_terms(query: str) -> list[str]:
+    return query.split()
+
+
+def _escape_like(term: str) -> str:
+    return term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def search_messages_stmt(
+    session_id: str, query: str, limit: int, offset: int
+) -> Select:
+    """
+    投稿者名かメッセージに、空白で区切った全ての語を含む（部分一致）メッセージを新しい順に取得する。
+    日本語は空白で区切られないので、語の長さによらず部分一致で検索する。
+    語の部分文字列を全て含む行をインデックス（app/infrastructure/tables.py）で絞り込んでから、ILIKE で確かめる
+    """
+    conditions = []
+    for term in search_terms(query):
+        pattern = f"%{_escape_like(term)}%"
+        ngrams = func.livechat_query_ngrams(term)
+        conditions.append(
+            or_(
+                and_(
+                    LIVECHAT_AUTHOR_NAME_NGRAMS.contains(ngrams),
+                    LIVECHAT_AUTHOR_NAME.ilike(pattern, escape="\\"),
+                ),
+                and_(
+                    LIVECHAT_DISPLAY_MESSAGE_NGRAMS.contains(ngrams),
+                    LIVECHAT_DISPLAY_MESSAGE.ilike(pattern, escape="\\"),
+                ),
+            )
+        )
+    return (
+        select(YoutubeLivechatMessageOrm)
+        .where(YoutubeLivechatMessageOrm.session_id == session_id, *conditions)
+        .order_by(
+            YoutubeLivechatMessageOrm.created_at.desc(),
+            YoutubeLivechatMessageOrm.id.desc(),
+        )
+        .limit(limit)
+        .offset(offset)
+    )
+
+
+def save_states_stmt(session_id: str, state_list: list[WesternAstrologyStateEntity]):
+    """
+    占い結果を保存または更新する UPSERT 文
+    """
+    values = [
+        {
+            "session_id": session_id,
+            "message_id": str(state.message_id),
+            "is_target": state.is_target,
+            "required_info": state.required_info.model_dump(),
+            "result": state.result,
+            "result_voice_path": state.result_voice_path,
+            "is_played": state.is_played,
+            "natal_chart": (
+                state.natal_chart.model_dump() if state.natal_chart else None
+            ),
+        }
+        for state in state_list
+    ]
+    stmt = pg_insert(WesternAstrologyStatusOrm).values(values)
+    return stmt.on_conflict_do_update(
+        index_elements=["session_id", "message_id"],
+        set_={
+            # "message_id": stmt.excluded.message_id,
+            "is_target": stmt.excluded.is_target,
+            "required_info": stmt.excluded.required_info,
+            "result": stmt.excluded.result,
+            "result_voice_path": stmt.excluded.result_voice_path,
+            "is_played": stmt.excluded.is_played,
+            "natal_chart": stmt.excluded.natal_chart,
+            # onupdate は ON CONFLICT DO UPDATE では効かないため、明示的に更新する
+            "updated_at": func.now(),
+        },
+    )
+
+
+def _update_states(session_id: str) -> Update:
+    # 変更した列と updated_at だけを更新する。
+    # 更新した行をセッションに同期する必要はないので、ORMの同期処理は行わない
+    return (
+        update(WesternAstrologyStatusOrm)
+        .where(WesternAstrologyStatusOrm.session_id == session_id)
+        .values(updated_at=func.now())
+        .execution_options(synchronize_session=False)
+    )
+
+
+def _update_states_from_values(
+    session_id: str, column_name: str, column_type, new_values: dict[str, object]
+) -> Update:
+    """
+    UPDATE ... FROM (VALUES ...) で、メッセージごとに異なる値を1つのSQL文で更新する
+    """
+    new = values(
+        column("message_id", String), column("value", column_type), name="new_values"
+    ).data(list(new_values.items()))
+    return (
+        _update_states(session_id)
+        .where(WesternAstrologyStatusOrm.message_id == new.c.message_id)
+        .values({column_name: new.c.value})
+    )
+
+
+def set_required_info_stmt(
+    session_id: str, infos: dict[str, InfoForAstrologyEntity]
+) -> Update:
+    return _update_states_from_values(
+        session_id,
+        "required_info",
+        JSONB,
+        {message_id: info.model_dump() for message_id, info in infos.items()},
+    )
+
+
+def set_natal_chart_stmt(
+    session_id: str, charts: dict[str, NatalChartEntity]
+) -> Update:
+    return _update_states_from_values(
+        session_id,
+        "natal_chart",
+        JSONB,
+        {message_id: chart.model_dump() for message_id, chart in charts.items()},
+    )
+
+
+def set_result_stmt(session_id: str, results: dict[str, str]) -> Update:
+    return _update_states_from_values(session_id, "result", Text, results)
+
+
+def set_voice_path_stmt(session_id: str, voice_paths: dict[str, str]) -> Update:
+    return _update_states_from_values(
+        session_id, "result_voice_path", Text, voice_paths
+    )
+
+
+def mark_played_stmt(session_id: str, message_ids: list[str]) -> Update:
+    return (
+        _update_states(session_id)
+        .where(WesternAstrologyStatusOrm.message_id.in_(message_ids))
+        .values(is_played=True)
+    )
+
+
+def mark_not_target_stmt(session_id: str, message_ids: list[str]) -> Update:
+    return (
+        _update_states(session_id)
+        .where(WesternAstrologyStatusOrm.message_id.in_(message_ids))
+        .values(is_target=False)
+    )
+
+
+def _in_session(stmt: Select, session_id: str) -> Select:
+    return stmt.where(WesternAstrologyStatusOrm.session_id == session_id)
+
+
+def _join_message(stmt: Select, session_id: str) -> Select:
+    # 結合条件にも session_id を含めて、メッセージ側も同じパーティションだけを見る
+    return (
+        _in_session(stmt, session_id)
+        .join(
+            YoutubeLivechatMessageOrm,
+            and_(
+                YoutubeLivechatMessageOrm.session_id
+                == WesternAstrologyStatusOrm.session_id,
+                YoutubeLivechatMessageOrm.id == WesternAstrologyStatusOrm.message_id,
+            ),
+        )
+        .order_by(YoutubeLivechatMessageOrm.created_at)
+    )
+
+
+def _in_stages(*stages: AstrologyStage):
+    # 処理中の段階は、処理段階のインデックス（tables.py の ix_western_astrology_statuss_stage）で取得する。
+    # SQL文が同じになるように、段階の並びを決めておく
+    return ASTROLOGY_STAGE.in_(sorted(stage.value for stage in stages))
+
+
+def _not_prepared_target_condition():
+    return and_(
+        _in_stages(AstrologyStage.NOT_PREPARED),
+        WesternAstrologyStatusOrm.result == "",
+    )
+
+
+def not_prepared_target_stmt(session_id: str, limit: int) -> Select:
+    return _join_message(
+        select(WesternAstrologyStatusOrm).where(_not_prepared_target_condition()),
+        session_id,
+    ).limit(limit)
+
+
+def not_prepared_target_and_message_stmt(session_id: str, limit: int) -> Select:
+    return _join_message(
+        select(WesternAstrologyStatusOrm, YoutubeLivechatMessageOrm).where(
+            _not_prepared_target_condition()
+        ),
+        session_id,
+    ).limit(limit)
+
+
+def all_prepared_state_and_message_stmt(session_id: str) -> Select:
+    return _join_message(
+        select(WesternAstrologyStatusOrm, YoutubeLivechatMessageOrm).where(
+            and_(
+                WesternAstrologyStatusOrm.is_target == True,  # noqa: E712
+                WesternAstrologyStatusOrm.required_info["name"].astext != "",
+            )
+        ),
+        session_id,
+    )
+
+
+def prepared_state_and_message_updated_after_stmt(
+    session_id: str, updated_after: datetime | None
+) -> Select:
+    stmt = all_prepared_state_and_message_stmt(session_id)
+    if updated_after is None:
+        return stmt
+    return stmt.where(WesternAstrologyStatusOrm.updated_at > updated_after)
+
+
+def unprepared_message_ids_updated_after_stmt(
+    session_id: str, updated_after: datetime
+) -> Select:
+    # all_prepared_state_and_message_stmt の条件を満たさなくなったもの（名前がない場合も含む）
+    return _in_session(
+        select(WesternAstrologyStatusOrm.message_id).where(
+            and_(
+                WesternAstrologyStatusOrm.updated_at > updated_after,
+                or_(
+                    WesternAstrologyStatusOrm.is_target == False,  # noqa: E712
+                    func.coalesce(
+                        WesternAstrologyStatusOrm.required_info["name"].astext, ""
+                    )
+                    == "",
+                ),
+            )
+        ),
+        session_id,
+    )
+
+
+def prepared_target_with_no_result_stmt(session_id: str, limit: int) -> Select:
+    return _join_message(
+        select(WesternAstrologyStatusOrm).where(_in_stages(AstrologyStage.NO_RESULT)),
+        session_id,
+    ).limit(limit)
+
+
+def no_voice_target_stmt(session_id: str, limit: int) -> Select:
+    return _join_message(
+        select(WesternAstrologyStatusOrm).where(_in_stages(AstrologyStage.NO_VOICE)),
+        session_id,
+    ).limit(limit)
+
+
+def all_with_voice_stmt(session_id: str) -> Select:
+    return _join_message(
+        select(WesternAstrologyStatusOrm).where(
+            and_(
+                WesternAstrologyStatusOrm.is_target == True,  # noqa: E712
+                WesternAstrologyStatusOrm.required_info["name"].astext != "",
+                WesternAstrologyStatusOrm.result != "",
+                WesternAstrologyStatusOrm.result_voice_path != "",
+            )
+        ),
+        session_id,
+    )
+
+
+def _waiting_audio_play_condition():
+    # 占い対象で再生していないもの（is_target AND NOT is_played）と同じ
+    return and_(
+        _in_stages(*WAITING_STAGES),
+        WesternAstrologyStatusOrm.is_played == False,  # noqa: E712
+    )
+
+
+def waiting_audio_play_state_stmt(session_id: str) -> Select:
+    return _join_message(
+        select(WesternAstrologyStatusOrm).where(_waiting_audio_play_condition()),
+        session_id,
+    )
+
+
+def count_waiting_audio_play_state_stmt(session_id: str) -> Select:
+    # メッセージとのJOINやエンティティへの変換をせず、インデックスだけで数える
+    return _in_session(
+        select(func.count())
+        .select_from(WesternAstrologyStatusOrm)
+        .where(_waiting_audio_play_condition()),
+        session_id,
+    )
+
+
+def should_play_audio_status_stmt(session_id: str) -> Select:
+    return (
+        _in_session(select(WesternAstrologyStatusOrm), session_id)
+        .where(
+            and_(
+                WesternAstrologyStatusOrm.is_target == True,  # noqa: E712
+                WesternAstrologyStatusOrm.is_played == False,  # noqa: E712
+                WesternAstrologyStatusOrm.result_voice_path != "",
+            )
+        )
+        .order_by(WesternAstrologyStatusOrm.created_at)
+    )
+
+
+def should_play_audio_state_and_message_stmt(session_id: str, limit: int) -> Select:
+    # should_play_audio_status_stmt と同じく、占星術ステータスの作成順に並べる
+    return (
+        _in_session(
+            select(WesternAstrologyStatusOrm, YoutubeLivechatMessageOrm), session_id
+        )
+        .join(
+            YoutubeLivechatMessageOrm,
+            and_(
+                YoutubeLivechatMessageOrm.session_id
+                == WesternAstrologyStatusOrm.session_id,
+                YoutubeLivechatMessageOrm.id == WesternAstrologyStatusOrm.message_id,
+            ),
+        )
+        .where(
+            and_(
+                WesternAstrologyStatusOrm.is_target == True,  # noqa: E712
+                WesternAstrologyStatusOrm.is_played == False,  # noqa: E712
+                WesternAstrologyStatusOrm.result_voice_path != "",
+            )
+        )
+        .order_by(WesternAstrologyStatusOrm.created_at)
+        .limit(limit)
+    )
+
+
+# ---------------------------------------------------------------
+# ORMのオブジェクトを作らずに、行（タプル）から直接エンティティを作る。
+# 入れ子のモデルも辞書・JSONのまま pydantic に渡す（pydantic-core で検証する方が、
+# model_construct で検証を省くよりも速い）。
+# メッセージはJSONの文字列のまま取得して、Pythonの辞書を経由せずに読み込む
+# ---------------------------------------------------------------
+
+# エンティティに変換するのに使う占星術ステータスの列。列名はエンティティのフィールド名と同じ
+STATE_COLUMNS = (
+    WesternAstrologyStatusOrm.message_id,
+    WesternAstrologyStatusOrm.is_target,
+    WesternAstrologyStatusOrm.required_info,
+    WesternAstrologyStatusOrm.result,
+    WesternAstrologyStatusOrm.result_voice_path,
+    WesternAstrologyStatusOrm.is_played,
+    WesternAstrologyStatusOrm.natal_chart,
+    WesternAstrologyStatusOrm.created_at,
+    WesternAstrologyStatusOrm.updated_at,
+)
+_STATE_FIELDS = tuple(column.key for column in STATE_COLUMNS)
+
+MESSAGE_JSON_COLUMN = cast(YoutubeLivechatMessageOrm.message, Text).label(
+    "message_json"
+)
+
+
+def state_rows_stmt(stmt: Select) -> Select:
+    """
+    占星術ステータスを取得する文を、結合・条件・並び順はそのままで STATE_COLUMNS だけを取得する文にする
+    """
+    return stmt.with_only_columns(*STATE_COLUMNS)
+
+
+def state_and_message_rows_stmt(stmt: Select) -> Select:
+    """
+    占星術ステータスとメッセージを取得する文を、STATE_COLUMNS とメッセージのJSONを取得する文にする
+    """
+    return stmt.with_only_columns(*STATE_COLUMNS, MESSAGE_JSON_COLUMN)
+
+
+def message_rows_stmt(stmt: Select) -> Select:
+    return stmt.with_only_columns(MESSAGE_JSON_COLUMN)
+
+
+def message_from_json(message_json: str) -> LiveChatMessageEntity:
+    return LiveChatMessageEntity.model_validate_json(message_json)
+
+
+def state_from_row(row: Sequence) -> WesternAstrologyStateEntity:
+    """
+    STATE_COLUMNS の順に並んだ行からエンティティを作る（to_state_entity と同じ値になる）
+    """
+    fields = dict(zip(_STATE_FIELDS, row))
+    # to_state_entity と同じく、空の情報は None として検証する
+    fields["required_info"] = fields["required_info"] or None
+    return WesternAstrologyStateEntity.model_validate(fields)
+
+
+def to_message_entity(obj: YoutubeLivechatMessageOrm) -> LiveChatMessageEntity:
+    return LiveChatMessageEntity(**obj.message)
+
+
+def to_state_entity(obj: WesternAstrologyStatusOrm) -> WesternAstrologyStateEntity:
+    if obj.required_info:
+        required_info = InfoForAstrologyEntity(**obj.required_info)
+    else:
+        required_info = None
+    return WesternAstrologyStateEntity(
+        message_id=obj.message_id,
+        is_target=obj.is_target,
+        required_info=required_info,
+        result=obj.result,
+        result_voice_path=obj.result_voice_path,
+        is_played=obj.is_played,
+        natal_chart=obj.natal_chart,
+        created_at=obj.created_at,
+        updated_at=obj.updated_at,
+    )
+
+
+def extraction_cache_stmt(keys: list[str], ttl: timedelta) -> Select:
+    # 更新されてから ttl 以上経ったものは期限切れとして返さない
+    return select(InfoExtractionCacheOrm.key, InfoExtractionCacheOrm.info).where(
+        InfoExtractionCacheOrm.key.in_(keys),
+        InfoExtractionCacheOrm.updated_at > func.now() - ttl,
+    )
+
+
+def save_extraction_cache_stmt(infos: dict[str, InfoForAstrologyEntity]):
+    stmt = pg_insert(InfoExtractionCacheOrm).values(
+        [{"key": key, "info": info.model_dump()} for key, info in infos.items()]
+    )
+    # 同じキーは抽出結果を置き換え、期限を延ばす
+    return stmt.on_conflict_do_update(
+        index_elements=["key"],
+        set_={"info": stmt.excluded.info, "updated_at": func.now()},
+    )
+
+
+def evict_extraction_cache_stmt(ttl: timedelta, max_size: int) -> Delete:
+    """
+    期限切れのものと、新しい順に max_size 件より後のものを削除する。
+    どちらも updated_at の範囲の条件にして、updated_at のインデックスで削除するものだけを読む
+    （境界に同じ更新時刻のものがある場合は残すので、件数は上限を少し超えることがある）
+    """
+    # 新しい順に max_size 件目の更新時刻。これより古いものを削除する。件数が max_size 未満の場合は NULL
+    size_cutoff = (
+        select(InfoExtractionCacheOrm.updated_at)
+        .order_by(InfoExtractionCacheOrm.updated_at.desc())
+        .offset(max_size - 1)
+        .limit(1)
+        .scalar_subquery()
+    )
+    # greatest は NULL を無視する
+    return delete(InfoExtractionCacheOrm).where(
+        InfoExtractionCacheOrm.updated_at < func.greatest(func.now() - ttl, size_cutoff)
+    )
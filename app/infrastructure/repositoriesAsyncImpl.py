@@ -0,0 +1,282 @@
+from datetime import datetime
+from logging import getLogger
+
+from app.domain.repositories import (
+    AsyncWesternAstrologyStateRepository,
+    AsyncYoutubeLiveChatMessageRepository,
+)
+from app.domain.westernastrology import (
+    InfoForAstrologyEntity,
+    NatalChartEntity,
+    WesternAstrologyStateEntity,
+)
+from app.domain.youtube.live import LiveChatMessageEntity
+from app.infrastructure.broadcast_session import get_active_session_id
+from app.infrastructure.db_common import get_async_session_local
+from app.infrastructure.queries import (
+    all_prepared_state_and_message_stmt,
+    all_with_voice_stmt,
+    count_waiting_audio_play_state_stmt,
+    mark_not_target_stmt,
+    mark_played_stmt,
+    message_from_json,
+    message_rows_stmt,
+    messages_by_ids_stmt,
+    no_voice_target_stmt,
+    not_prepared_target_and_message_stmt,
+    not_prepared_target_stmt,
+    prepared_state_and_message_updated_after_stmt,
+    prepared_target_with_no_result_stmt,
+    save_messages_stmt,
+    save_states_stmt,
+    set_natal_chart_stmt,
+    set_required_info_stmt,
+    set_result_stmt,
+    set_voice_path_stmt,
+    should_play_audio_state_and_message_stmt,
+    should_play_audio_status_stmt,
+    state_and_message_rows_stmt,
+    state_from_row,
+    state_rows_stmt,
+    unprepared_message_ids_updated_after_stmt,
+    waiting_audio_play_state_stmt,
+)
+
+logger = getLogger(__name__)
+
+
+class AsyncYoutubeLiveChatMessageRepositoryImpl(AsyncYoutubeLiveChatMessageRepository):
+    """
+    YoutubeLiveChatMessageRepositoryImpl の非同期版（asyncpgドライバ）
+    """
+
+    async def save(self, messages: list[LiveChatMessageEntity]) -> None:
+        if not messages:
+            logger.debug("messages is empty.")
+            return
+
+        stmt = save_messages_stmt(get_active_session_id(), messages)
+        async with get_async_session_local()() as session:
+            try:
+                await session.execute(stmt)
+                await session.commit()
+            except Exception as e:
+                await session.rollback()
+                logger.exception(f"Failed to save messages: {e}")
+                raise e
+
+    async def get_by_message_ids(
+        self, message_ids: list[str]
+    ) -> list[LiveChatMessageEntity]:
+        if not message_ids:
+            return []
+
+        stmt = messages_by_ids_stmt(get_active_session_id(), message_ids)
+        async with get_async_session_local()() as session:
+            try:
+                rows = (await session.execute(message_rows_stmt(stmt))).scalars().all()
+                return [message_from_json(row) for row in rows]
+            except Exception as e:
+                logger.exception(f"Failed to get messages by message_ids: {e}")
+                raise e
+
+
+class AsyncWesternAstrologyStateRepositoryImpl(AsyncWesternAstrologyStateRepository):
+    """
+    WesternAstrologyStateRepositoryImpl の非同期版（asyncpgドライバ）
+    """
+
+    async def save(self, state_list: list[WesternAstrologyStateEntity]) -> None:
+        if not state_list:
+            return
+        stmt = save_states_stmt(get_active_session_id(), state_list)
+        async with get_async_session_local()() as session:
+            try:
+                await session.execute(stmt)
+                await session.commit()
+            except Exception as e:
+                await session.rollback()
+                logger.exception(f"Failed to save state: {e}")
+                raise e
+
+    async def _update(self, stmt, error_msg: str) -> None:
+        async with get_async_session_local()() as session:
+            try:
+                await session.execute(stmt)
+                await session.commit()
+            except Exception as e:
+                await session.rollback()
+                logger.exception(f"{error_msg}: {e}")
+                raise e
+
+    async def set_required_info(self, infos: dict[str, InfoForAstrologyEntity]) -> None:
+        if not infos:
+            return
+        await self._update(
+            set_required_info_stmt(get_active_session_id(), infos),
+            "Failed to set required info",
+        )
+
+    async def set_natal_chart(self, charts: dict[str, NatalChartEntity]) -> None:
+        if not charts:
+            return
+        await self._update(
+            set_natal_chart_stmt(get_active_session_id(), charts),
+            "Failed to set natal chart",
+        )
+
+    async def set_result(self, results: dict[str, str]) -> None:
+        if not results:
+            return
+        await self._update(
+            set_result_stmt(get_active_session_id(), results), "Failed to set result"
+        )
+
+    async def set_voice_path(self, voice_paths: dict[str, str]) -> None:
+        if not voice_paths:
+            return
+        await self._update(
+            set_voice_path_stmt(get_active_session_id(), voice_paths),
+            "Failed to set voice path",
+        )
+
+    async def mark_played(self, message_ids: list[str]) -> None:
+        if not message_ids:
+            return
+        await self._update(
+            mark_played_stmt(get_active_session_id(), message_ids),
+            "Failed to mark played",
+        )
+
+    async def mark_not_target(self, message_ids: list[str]) -> None:
+        if not message_ids:
+            return
+        await self._update(
+            mark_not_target_stmt(get_active_session_id(), message_ids),
+            "Failed to mark not target",
+        )
+
+    async def _get_states(
+        self, stmt, error_msg: str
+    ) -> list[WesternAstrologyStateEntity]:
+        async with get_async_session_local()() as session:
+            try:
+                rows = (await session.execute(state_rows_stmt(stmt))).all()
+                return [state_from_row(row) for row in rows]
+            except Exception as e:
+                logger.exception(f"{error_msg}: {e}")
+                raise e
+
+    async def get_not_prepared_target(
+        self, limit: int
+    ) -> list[WesternAstrologyStateEntity]:
+        return await self._get_states(
+            not_prepared_target_stmt(get_active_session_id(), limit),
+            "Failed to get not prepared target",
+        )
+
+    async def get_not_prepared_target_and_message(
+        self, limit: int
+    ) -> tuple[list[WesternAstrologyStateEntity], list[LiveChatMessageEntity]]:
+        return await self._get_state_and_message(
+            not_prepared_target_and_message_stmt(get_active_session_id(), limit),
+            "Failed to get not prepared target and message",
+        )
+
+    async def get_all_prepared_state_and_message(
+        self,
+    ) -> tuple[list[WesternAstrologyStateEntity], list[LiveChatMessageEntity]]:
+        return await self._get_state_and_message(
+            all_prepared_state_and_message_stmt(get_active_session_id()),
+            "Failed to get all prepared state and message",
+        )
+
+    async def get_prepared_state_and_message_updated_after(
+        self, updated_after: datetime | None
+    ) -> tuple[list[WesternAstrologyStateEntity], list[LiveChatMessageEntity]]:
+        return await self._get_state_and_message(
+            prepared_state_and_message_updated_after_stmt(
+                get_active_session_id(), updated_after
+            ),
+            "Failed to get prepared state and message updated after",
+        )
+
+    async def get_unprepared_message_ids_updated_after(
+        self, updated_after: datetime
+    ) -> list[str]:
+        stmt = unprepared_message_ids_updated_after_stmt(
+            get_active_session_id(), updated_after
+        )
+        async with get_async_session_local()() as session:
+            try:
+                return list((await session.execute(stmt)).scalars().all())
+            except Exception as e:
+                logger.exception(
+                    f"Failed to get unprepared message ids updated after: {e}"
+                )
+                raise e
+
+    async def _get_state_and_message(
+        self, stmt, error_msg: str
+    ) -> tuple[list[WesternAstrologyStateEntity], list[LiveChatMessageEntity]]:
+        async with get_async_session_local()() as session:
+            try:
+                rows = (await session.execute(state_and_message_rows_stmt(stmt))).all()
+                state_entities = [state_from_row(row) for row in rows]
+                livechat_messages = [
+                    message_from_json(row.message_json) for row in rows
+                ]
+                return state_entities, livechat_messages
+            except Exception as e:
+                logger.exception(f"{error_msg}: {e}")
+                raise e
+
+    async def get_prepared_target_with_no_result(
+        self, limit: int
+    ) -> list[WesternAstrologyStateEntity]:
+        return await self._get_states(
+            prepared_target_with_no_result_stmt(get_active_session_id(), limit),
+            "Failed to get prepared target with no result",
+        )
+
+    async def get_no_voice_target(
+        self, limit: int
+    ) -> list[WesternAstrologyStateEntity]:
+        return await self._get_states(
+            no_voice_target_stmt(get_active_session_id(), limit),
+            "Failed to get no voice target",
+        )
+
+    async def get_all_with_voice(self) -> list[WesternAstrologyStateEntity]:
+        return await self._get_states(
+            all_with_voice_stmt(get_active_session_id()), "Failed to get all with voice"
+        )
+
+    async def get_waiting_audio_play_state(self) -> list[WesternAstrologyStateEntity]:
+        return await self._get_states(
+            waiting_audio_play_state_stmt(get_active_session_id()),
+            "Failed to get waiting audio play state",
+        )
+
+    async def count_waiting_audio_play_state(self) -> int:
+        stmt = count_waiting_audio_play_state_stmt(get_active_session_id())
+        async with get_async_session_local()() as session:
+            try:
+                return (await session.execute(stmt)).scalar_one()
+            except Exception as e:
+                logger.exception(f"Failed to count waiting audio play state: {e}")
+                raise e
+
+    async def get_should_play_audio_status(self) -> list[WesternAstrologyStateEntity]:
+        return await self._get_states(
+            should_play_audio_status_stmt(get_active_session_id()),
+            "Failed to get should play audio",
+        )
+
+    async def get_should_play_audio_state_and_message(
+        self, limit: int
+    ) -> tuple[list[WesternAstrologyStateEntity], list[LiveChatMessageEntity]]:
+        return await self._get_state_and_message(
+            should_play_audio_state_and_message_stmt(get_active_session_id(), limit),
+            "Failed to get should play audio state and message",
+        )
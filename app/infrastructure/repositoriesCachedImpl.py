@@ -0,0 +1,46 @@
+# ===============================================================
+# チャットメッセージをキャッシュするリポジトリ実装
+# 保存したメッセージをキャッシュし、取得時はキャッシュにないものだけを
+# 包んだリポジトリ（DB）から読み込む（リードスルー）
+# ===============================================================
+
+from app.domain.repositories import YoutubeLiveChatMessageRepository
+from app.domain.youtube.live import LiveChatMessageEntity
+from app.infrastructure.message_cache import LiveChatMessageCache, MessageCacheStats
+
+
+class CachedYoutubeLiveChatMessageRepositoryImpl(YoutubeLiveChatMessageRepository):
+    """
+    メッセージIDをキーにして、保存・取得したメッセージをキャッシュする。
+    キャッシュはメッセージIDだけをキーにするので、配信セッションを切り替えても同じメッセージを返す
+    （YouTubeのメッセージIDは配信をまたいで重複しない）
+    """
+
+    def __init__(self, repo: YoutubeLiveChatMessageRepository, max_size: int):
+        """
+        Args:
+            repo: 実際に保存・取得するリポジトリ
+            max_size: キャッシュするメッセージの数の上限
+        """
+        self.repo = repo
+        self.cache = LiveChatMessageCache(max_size)
+
+    def save(self, messages: list[LiveChatMessageEntity]) -> None:
+        self.repo.save(messages)
+        # 保存済みのIDのメッセージは保存されない（ON CONFLICT DO NOTHING）ので、キャッシュも置き換えない
+        self.cache.put_many(messages, replace=False)
+
+    def get_by_message_ids(self, message_ids: list[str]) -> list[LiveChatMessageEntity]:
+        found, missing = self.cache.get_many(message_ids)
+        if missing:
+            loaded = self.repo.get_by_message_ids(missing)
+            self.cache.put_many(loaded)
+            found.update((message.id, message) for message in loaded)
+        return [
+            found[message_id]
+            for message_id in dict.fromkeys(message_ids)
+            if message_id in found
+        ]
+
+    def stats(self) -> MessageCacheStats:
+        return self.cache.stats()
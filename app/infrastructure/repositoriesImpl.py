@@ -1,29 +1,99 @@
+import csv
+import io
+import json
+import threading
+from datetime import datetime, timedelta
 from logging import getLogger
 from uuid import uuid4
 
-from sqlalchemy.dialects.postgresql import insert as pg_insert
-from sqlalchemy.sql import and_, select
-
 from app.domain.repositories import (
+    BroadcastSessionRepository,
+    InfoExtractionCacheRepository,
     WesternAstrologyStateRepository,
     YoutubeLiveChatMessageRepository,
+    YoutubeLiveChatMessageSearchRepository,
 )
 from app.domain.westernastrology import (
     InfoForAstrologyEntity,
+    NatalChartEntity,
     WesternAstrologyStateEntity,
 )
 from app.domain.youtube.live import LiveChatMessageEntity
+from app.infrastructure.broadcast_session import get_active_session_id, start_session
 from app.infrastructure.db_common import SessionLocal
-from app.infrastructure.tables import (
-    WesternAstrologyStatusOrm,
-    YoutubeLivechatMessageOrm,
+from app.infrastructure.queries import (
+    all_prepared_state_and_message_stmt,
+    all_with_voice_stmt,
+    count_waiting_audio_play_state_stmt,
+    evict_extraction_cache_stmt,
+    extraction_cache_stmt,
+    mark_not_target_stmt,
+    mark_played_stmt,
+    message_from_json,
+    message_rows_stmt,
+    messages_by_ids_stmt,
+    no_voice_target_stmt,
+    not_prepared_target_and_message_stmt,
+    not_prepared_target_stmt,
+    prepared_state_and_message_updated_after_stmt,
+    prepared_target_with_no_result_stmt,
+    save_extraction_cache_stmt,
+    save_messages_stmt,
+    save_states_stmt,
+    search_messages_stmt,
+    set_natal_chart_stmt,
+    set_required_info_stmt,
+    set_result_stmt,
+    set_voice_path_stmt,
+    should_play_audio_state_and_message_stmt,
+    should_play_audio_status_stmt,
+    state_and_message_rows_stmt,
+    state_from_row,
+    state_rows_stmt,
+    to_message_document,
+    unprepared_message_ids_updated_after_stmt,
+    waiting_audio_play_state_stmt,
 )
 
 logger = getLogger(__name__)
 
+# COPYで流し込む一時テーブル。トランザクションの終了時に削除される
+CREATE_MESSAGE_STAGING_TABLE = """
+CREATE TEMP TABLE youtube_livechat_messages_staging (
+    id varchar NOT NULL,
+    message jsonb NOT NULL
+) ON COMMIT DROP
+"""
+COPY_MESSAGE_STAGING = (
+    "COPY youtube_livechat_messages_staging (id, message) FROM STDIN WITH (FORMAT csv)"
+)
+# 一時テーブルから、まだ保存されていないIDのメッセージだけを1つのSQL文で移す
+MERGE_MESSAGE_STAGING = """
+INSERT INTO youtube_livechat_messages (session_id, id, message)
+SELECT DISTINCT ON (id) %(session_id)s, id, message
+FROM youtube_livechat_messages_staging
+ON CONFLICT (session_id, id) DO NOTHING
+"""
+
+
+class BroadcastSessionRepositoryImpl(BroadcastSessionRepository):
+
+    def start(self, session_id: str) -> None:
+        start_session(session_id)
+
+    def get_active_session_id(self) -> str:
+        return get_active_session_id()
+
 
 class YoutubeLiveChatMessageRepositoryImpl(YoutubeLiveChatMessageRepository):
 
+    def __init__(self, copy_threshold: int = 200) -> None:
+        """
+        Args:
+            copy_threshold: この件数以上のメッセージを保存する時は、COPYを使う save_bulk で保存する
+        """
+        self.copy_threshold = copy_threshold
+
     def save(self, messages: list[LiveChatMessageEntity]) -> None:
         """
         メッセージリストをDBに保存または更新する。
@@ -32,29 +102,14 @@ class YoutubeLiveChatMessageRepositoryImpl(YoutubeLiveChatMessageRepository):
         if not messages:
             logger.debug("messages is empty.")
             return
-
-        message_dict_list = [message.model_dump() for message in messages]
+        if len(messages) >= self.copy_threshold:
+            self.save_bulk(messages)
+            return
 
         # INSERT ... ON CONFLICT DO NOTHING (UPSERT)
-        for message_dict in message_dict_list:
-            logger.debug(f"message_dict: {message_dict}")
-            logger.debug(f"message_dict['id']: {message_dict['id']}")
-        stm = (
-            pg_insert(YoutubeLivechatMessageOrm)
-            .values(
-                [
-                    {"id": d.get("id", str(uuid4())), "message": d}
-                    for d in message_dict_list
-                ]
-            )
-            .on_conflict_do_nothing(
-                index_elements=["id"]
-            )  # id がユニークキーであることを前提
-            # sqlalchemyのバージョン2系 スタイルでは、ORMクラスそのものではなく
-            # 「返して欲しいカラム」を returning(...) で列挙することが推奨されている
-            # 例えばテーブル全カラムを返すなら __table__ を指定。
-            .returning(YoutubeLivechatMessageOrm.__table__)
-        )
+        for message in messages:
+            logger.debug(f"message_dict['id']: {message.id}")
+        stm = save_messages_stmt(get_active_session_id(), messages)
         logger.debug(f"stm: {stm}")
         with SessionLocal() as session:
             try:
@@ -66,62 +121,153 @@ class YoutubeLiveChatMessageRepositoryImpl(YoutubeLiveChatMessageRepository):
                 logger.exception(f"Failed to save messages: {e}")
                 raise e
 
+    def save_bulk(self, messages: list[LiveChatMessageEntity]) -> None:
+        """
+        大量のメッセージを保存する。
+        COPYで一時テーブルに流し込んでから、未保存のIDのメッセージだけを移す。
+        パラメータを大量に持つ INSERT 文を組み立てないので、件数が多い時は save より速い。
+        """
+        if not messages:
+            return
+
+        rows = io.StringIO()
+        writer = csv.writer(rows)
+        for message in messages:
+            d = to_message_document(message)
+            writer.writerow(
+                [d.get("id", str(uuid4())), json.dumps(d, ensure_ascii=False)]
+            )
+        rows.seek(0)
+
+        with SessionLocal() as session:
+            try:
+                # 同じトランザクションで実行するために、セッションのコネクションからカーソルを取得する
+                cursor = session.connection().connection.cursor()
+                cursor.execute(CREATE_MESSAGE_STAGING_TABLE)
+                cursor.copy_expert(COPY_MESSAGE_STAGING, rows)
+                cursor.execute(
+                    MERGE_MESSAGE_STAGING, {"session_id": get_active_session_id()}
+                )
+                logger.debug(f"saved {cursor.rowcount} / {len(messages)} messages")
+                session.commit()
+            except Exception as e:
+                session.rollback()
+                logger.exception(f"Failed to save messages in bulk: {e}")
+                raise e
+
     def get_by_message_ids(self, message_ids: list[str]) -> list[LiveChatMessageEntity]:
         if not message_ids:
             return []
 
-        # JSONカラムの特定キーを文字列として取り出し、in_ 句で検索する
-        stmt = select(YoutubeLivechatMessageOrm).where(
-            YoutubeLivechatMessageOrm.message["id"].astext.in_(message_ids)
-        )
+        stmt = messages_by_ids_stmt(get_active_session_id(), message_ids)
         with SessionLocal() as session:
             try:
-                rows = session.execute(stmt).scalars().all()
-                # 取得した行からエンティティに変換して返す
-                results: list[LiveChatMessageEntity] = []
-                for row in rows:
-                    entity = LiveChatMessageEntity(**row.message)
-                    results.append(entity)
-
-                return results
+                rows = session.execute(message_rows_stmt(stmt)).scalars().all()
+                # 取得したJSONからエンティティに変換して返す
+                return [message_from_json(row) for row in rows]
             except Exception as e:
                 logger.exception(f"Failed to get messages by message_ids: {e}")
                 raise e
 
 
+class YoutubeLiveChatMessageSearchRepositoryImpl(
+    YoutubeLiveChatMessageSearchRepository
+):
+    """
+    投稿者名とメッセージの1〜2文字の部分文字列のインデックスを使って部分一致で検索する（app/infrastructure/tables.py）
+    """
+
+    def search(
+        self, query: str, limit: int, offset: int = 0
+    ) -> list[LiveChatMessageEntity]:
+        stmt = search_messages_stmt(get_active_session_id(), query, limit, offset)
+        with SessionLocal() as session:
+            try:
+                rows = session.execute(message_rows_stmt(stmt)).scalars().all()
+                return [message_from_json(row) for row in rows]
+            except Exception as e:
+                logger.exception(f"Failed to search messages: {e}")
+                raise e
+
+
+class InfoExtractionCacheRepositoryImpl(InfoExtractionCacheRepository):
+    """
+    抽出結果を info_extraction_caches テーブルに保存する。
+    evict_every 回保存するごとに、期限切れのものと件数の上限を超えたもの（更新が古いもの）を削除する。
+    期限切れのものは削除するまでの間も返さない。件数は削除するまでの間、上限を超えることがある
+    """
+
+    def __init__(self, ttl_seconds: int, max_size: int, evict_every: int = 100) -> None:
+        """
+        Args:
+            ttl_seconds: 抽出結果を使う期間（秒）
+            max_size: 保存する抽出結果の数の上限
+            evict_every: この回数の保存ごとに削除する
+        """
+        self.ttl = timedelta(seconds=ttl_seconds)
+        self.max_size = max_size
+        self.evict_every = evict_every
+        self._lock = threading.Lock()
+        self._saves = 0
+
+    def _should_evict(self) -> bool:
+        with self._lock:
+            self._saves += 1
+            if self._saves < self.evict_every:
+                return False
+            self._saves = 0
+            return True
+
+    def get_many(self, keys: list[str]) -> dict[str, InfoForAstrologyEntity]:
+        if not keys:
+            return {}
+        with SessionLocal() as session:
+            try:
+                rows = session.execute(extraction_cache_stmt(keys, self.ttl)).all()
+                return {key: InfoForAstrologyEntity(**info) for key, info in rows}
+            except Exception as e:
+                logger.exception(f"Failed to get extraction cache: {e}")
+                raise e
+
+    def save(self, infos: dict[str, InfoForAstrologyEntity]) -> None:
+        if not infos:
+            return
+        with SessionLocal() as session:
+            try:
+                session.execute(save_extraction_cache_stmt(infos))
+                if self._should_evict():
+                    session.execute(
+                        evict_extraction_cache_stmt(self.ttl, self.max_size)
+                    )
+                session.commit()
+            except Exception as e:
+                session.rollback()
+                logger.exception(f"Failed to save extraction cache: {e}")
+                raise e
+
+
 class WesternAstrologyStateRepositoryImpl(WesternAstrologyStateRepository):
 
+    def __init__(
+        self, message_repo: YoutubeLiveChatMessageRepository | None = None
+    ) -> None:
+        """
+        Args:
+            message_repo: 状態と一緒に返すメッセージを取得するリポジトリ。
+                メッセージをキャッシュするリポジトリを指定すると、状態だけをDBから取得し、
+                メッセージはキャッシュから取得する。指定しない場合は、1つのクエリで両方をDBから取得する
+        """
+        self.message_repo = message_repo
+
     def save(self, state_list: list[WesternAstrologyStateEntity]) -> None:
         """
         占い結果をDBに保存または更新する。
         """
-        values = [
-            {
-                "message_id": str(state.message_id),
-                "is_target": state.is_target,
-                "required_info": state.required_info.model_dump(),
-                "result": state.result,
-                "result_voice_path": state.result_voice_path,
-                "is_played": state.is_played,
-            }
-            for state in state_list
-        ]
-        if not values:
+        if not state_list:
             # valuesが[]の時にはWesternAstrologyStateOrmのフィールドが全て空のデータをinsertしようとして
             # message_idのnot null制約(primary key)に引っかかるため、ここでreturnする
             return
-        stmt = pg_insert(WesternAstrologyStatusOrm).values(values)
-        stmt = stmt.on_conflict_do_update(
-            index_elements=["message_id"],
-            set_={
-                # "message_id": stmt.excluded.message_id,
-                "is_target": stmt.excluded.is_target,
-                "required_info": stmt.excluded.required_info,
-                "result": stmt.excluded.result,
-                "result_voice_path": stmt.excluded.result_voice_path,
-                "is_played": stmt.excluded.is_played,
-            },
-        )
+        stmt = save_states_stmt(get_active_session_id(), state_list)
         with SessionLocal() as session:
             try:
                 session.execute(stmt)
@@ -131,272 +277,219 @@ class WesternAstrologyStateRepositoryImpl(WesternAstrologyStateRepository):
                 logger.exception(f"Failed to save state: {e}")
                 raise e
 
-    def get_not_prepared_target(self, limit: int) -> list[WesternAstrologyStateEntity]:
-        stmt = (
-            select(WesternAstrologyStatusOrm)
-            .where(
-                and_(
-                    WesternAstrologyStatusOrm.is_target == True,  # noqa: E712
-                    WesternAstrologyStatusOrm.required_info["name"].astext == "",
-                    WesternAstrologyStatusOrm.result == "",
-                )
-            )
-            .join(
-                YoutubeLivechatMessageOrm,
-                YoutubeLivechatMessageOrm.id == WesternAstrologyStatusOrm.message_id,
-            )
-            .order_by(YoutubeLivechatMessageOrm.created_at)
-            .limit(limit)
+    def _update(self, stmt, error_msg: str) -> None:
+        with SessionLocal() as session:
+            try:
+                session.execute(stmt)
+                session.commit()
+            except Exception as e:
+                session.rollback()
+                logger.exception(f"{error_msg}: {e}")
+                raise e
+
+    def set_required_info(self, infos: dict[str, InfoForAstrologyEntity]) -> None:
+        if not infos:
+            return
+        self._update(
+            set_required_info_stmt(get_active_session_id(), infos),
+            "Failed to set required info",
+        )
+
+    def set_natal_chart(self, charts: dict[str, NatalChartEntity]) -> None:
+        if not charts:
+            return
+        self._update(
+            set_natal_chart_stmt(get_active_session_id(), charts),
+            "Failed to set natal chart",
+        )
+
+    def set_result(self, results: dict[str, str]) -> None:
+        if not results:
+            return
+        self._update(
+            set_result_stmt(get_active_session_id(), results), "Failed to set result"
+        )
+
+    def set_voice_path(self, voice_paths: dict[str, str]) -> None:
+        if not voice_paths:
+            return
+        self._update(
+            set_voice_path_stmt(get_active_session_id(), voice_paths),
+            "Failed to set voice path",
         )
+
+    def mark_played(self, message_ids: list[str]) -> None:
+        if not message_ids:
+            return
+        self._update(
+            mark_played_stmt(get_active_session_id(), message_ids),
+            "Failed to mark played",
+        )
+
+    def mark_not_target(self, message_ids: list[str]) -> None:
+        if not message_ids:
+            return
+        self._update(
+            mark_not_target_stmt(get_active_session_id(), message_ids),
+            "Failed to mark not target",
+        )
+
+    def get_not_prepared_target(self, limit: int) -> list[WesternAstrologyStateEntity]:
+        stmt = not_prepared_target_stmt(get_active_session_id(), limit)
         with SessionLocal() as session:
             try:
-                orm_objects = session.execute(stmt).scalars().all()
-                return [
-                    WesternAstrologyStateEntity(
-                        message_id=obj.message_id,
-                        is_target=obj.is_target,
-                        required_info=InfoForAstrologyEntity(**obj.required_info),
-                        result=obj.result,
-                        result_voice_path=obj.result_voice_path,
-                        is_played=obj.is_played,
-                        created_at=obj.created_at,
-                    )
-                    for obj in orm_objects
-                ]
+                rows = session.execute(state_rows_stmt(stmt)).all()
+                return [state_from_row(row) for row in rows]
             except Exception as e:
                 logger.exception(f"Failed to get not prepared target: {e}")
                 raise e
 
+    def get_not_prepared_target_and_message(
+        self, limit: int
+    ) -> tuple[list[WesternAstrologyStateEntity], list[LiveChatMessageEntity]]:
+        return self._get_state_and_message(
+            not_prepared_target_and_message_stmt(get_active_session_id(), limit),
+            "Failed to get not prepared target and message",
+        )
+
     def get_all_prepared_state_and_message(
         self,
     ) -> tuple[list[WesternAstrologyStateEntity], list[LiveChatMessageEntity]]:
-        stmt = (
-            select(WesternAstrologyStatusOrm, YoutubeLivechatMessageOrm)
-            .where(
-                and_(
-                    WesternAstrologyStatusOrm.is_target == True,  # noqa: E712
-                    WesternAstrologyStatusOrm.required_info["name"].astext != "",
-                )
-            )
-            .join(
-                YoutubeLivechatMessageOrm,
-                YoutubeLivechatMessageOrm.id == WesternAstrologyStatusOrm.message_id,
-            )
-            .order_by(YoutubeLivechatMessageOrm.created_at)
+        return self._get_state_and_message(
+            all_prepared_state_and_message_stmt(get_active_session_id()),
+            "Failed to get all prepared state and message",
+        )
+
+    def get_prepared_state_and_message_updated_after(
+        self, updated_after: datetime | None
+    ) -> tuple[list[WesternAstrologyStateEntity], list[LiveChatMessageEntity]]:
+        return self._get_state_and_message(
+            prepared_state_and_message_updated_after_stmt(
+                get_active_session_id(), updated_after
+            ),
+            "Failed to get prepared state and message updated after",
+        )
+
+    def get_unprepared_message_ids_updated_after(
+        self, updated_after: datetime
+    ) -> list[str]:
+        stmt = unprepared_message_ids_updated_after_stmt(
+            get_active_session_id(), updated_after
         )
         with SessionLocal() as session:
             try:
-                # scalars().all()だと複数のオブジェクトのうち最初のオブジェクトしかが返ってこない
-                # このケースだと、WesternAstrologyStateOrmしか取得できない
-                orm_objects = session.execute(stmt).all()
-                # そのため、scalars()は使用せずにall()で全てのオブジェクトを取得する必要がある
-                state_entities: list[WesternAstrologyStateEntity] = []
-                livechat_messages: list[LiveChatMessageEntity] = []
-
-                for state_obj, livechat_obj in orm_objects:
-                    state_entity = WesternAstrologyStateEntity(
-                        message_id=state_obj.message_id,
-                        is_target=state_obj.is_target,
-                        required_info=InfoForAstrologyEntity(**state_obj.required_info),
-                        result=state_obj.result,
-                        result_voice_path=state_obj.result_voice_path,
-                        is_played=state_obj.is_played,
-                        created_at=state_obj.created_at,
-                    )
-                    state_entities.append(state_entity)
-                    livechat_messages.append(
-                        LiveChatMessageEntity(**livechat_obj.message)
-                    )
+                return list(session.execute(stmt).scalars().all())
+            except Exception as e:
+                logger.exception(
+                    f"Failed to get unprepared message ids updated after: {e}"
+                )
+                raise e
 
+    def _get_state_and_message(
+        self, stmt, error_msg: str
+    ) -> tuple[list[WesternAstrologyStateEntity], list[LiveChatMessageEntity]]:
+        if self.message_repo is not None:
+            return self._get_state_and_cached_message(stmt, error_msg)
+        with SessionLocal() as session:
+            try:
+                rows = session.execute(state_and_message_rows_stmt(stmt)).all()
+                state_entities = [state_from_row(row) for row in rows]
+                livechat_messages = [
+                    message_from_json(row.message_json) for row in rows
+                ]
                 return state_entities, livechat_messages
             except Exception as e:
-                logger.exception(f"Failed to get all prepared state and message: {e}")
+                logger.exception(f"{error_msg}: {e}")
                 raise e
 
+    def _get_state_and_cached_message(
+        self, stmt, error_msg: str
+    ) -> tuple[list[WesternAstrologyStateEntity], list[LiveChatMessageEntity]]:
+        # 結合・並び順はそのままで、メッセージの列（JSON）は取得しない
+        with SessionLocal() as session:
+            try:
+                rows = session.execute(state_rows_stmt(stmt)).all()
+                state_entities = [state_from_row(row) for row in rows]
+            except Exception as e:
+                logger.exception(f"{error_msg}: {e}")
+                raise e
+        messages = {
+            message.id: message
+            for message in self.message_repo.get_by_message_ids(
+                [state.message_id for state in state_entities]
+            )
+        }
+        # メッセージが取得できなかった状態は、結合した場合と同じく返さない
+        state_entities = [
+            state for state in state_entities if state.message_id in messages
+        ]
+        return state_entities, [messages[state.message_id] for state in state_entities]
+
     def get_prepared_target_with_no_result(
         self, limit: int
     ) -> list[WesternAstrologyStateEntity]:
-        stmt = (
-            select(WesternAstrologyStatusOrm)
-            .where(
-                and_(
-                    WesternAstrologyStatusOrm.is_target == True,  # noqa: E712
-                    WesternAstrologyStatusOrm.required_info["name"].astext != "",
-                    WesternAstrologyStatusOrm.result == "",
-                )
-            )
-            .join(
-                YoutubeLivechatMessageOrm,
-                YoutubeLivechatMessageOrm.id == WesternAstrologyStatusOrm.message_id,
-            )
-            .order_by(YoutubeLivechatMessageOrm.created_at)
-            .limit(limit)
-        )
+        stmt = prepared_target_with_no_result_stmt(get_active_session_id(), limit)
         with SessionLocal() as session:
             try:
-                orm_objects = session.execute(stmt).scalars().all()
-                return [
-                    WesternAstrologyStateEntity(
-                        message_id=obj.message_id,
-                        is_target=obj.is_target,
-                        required_info=InfoForAstrologyEntity(**obj.required_info),
-                        result=obj.result,
-                        result_voice_path=obj.result_voice_path,
-                        is_played=obj.is_played,
-                        created_at=obj.created_at,
-                    )
-                    for obj in orm_objects
-                ]
+                rows = session.execute(state_rows_stmt(stmt)).all()
+                return [state_from_row(row) for row in rows]
             except Exception as e:
                 logger.exception(f"Failed to get prepared target with no result: {e}")
                 raise e
 
     def get_no_voice_target(self, limit: int) -> list[WesternAstrologyStateEntity]:
-        stmt = (
-            select(WesternAstrologyStatusOrm)
-            .where(
-                and_(
-                    WesternAstrologyStatusOrm.is_target == True,  # noqa: E712
-                    WesternAstrologyStatusOrm.required_info["name"].astext != "",
-                    WesternAstrologyStatusOrm.result != "",
-                    WesternAstrologyStatusOrm.result_voice_path == "",
-                )
-            )
-            .join(
-                YoutubeLivechatMessageOrm,
-                YoutubeLivechatMessageOrm.id == WesternAstrologyStatusOrm.message_id,
-            )
-            .order_by(YoutubeLivechatMessageOrm.created_at)
-            .limit(limit)
-        )
+        stmt = no_voice_target_stmt(get_active_session_id(), limit)
         with SessionLocal() as session:
             try:
-                orm_objects = session.execute(stmt).scalars().all()
-                return [
-                    WesternAstrologyStateEntity(
-                        message_id=obj.message_id,
-                        is_target=obj.is_target,
-                        required_info=InfoForAstrologyEntity(**obj.required_info),
-                        result=obj.result,
-                        result_voice_path=obj.result_voice_path,
-                        is_played=obj.is_played,
-                        created_at=obj.created_at,
-                    )
-                    for obj in orm_objects
-                ]
+                rows = session.execute(state_rows_stmt(stmt)).all()
+                return [state_from_row(row) for row in rows]
             except Exception as e:
                 logger.exception(f"Failed to get no voice target: {e}")
                 raise e
 
     def get_all_with_voice(self) -> list[WesternAstrologyStateEntity]:
-        stmt = (
-            select(WesternAstrologyStatusOrm)
-            .where(
-                and_(
-                    WesternAstrologyStatusOrm.is_target == True,  # noqa: E712
-                    WesternAstrologyStatusOrm.required_info["name"].astext != "",
-                    WesternAstrologyStatusOrm.result != "",
-                    WesternAstrologyStatusOrm.result_voice_path != "",
-                )
-            )
-            .join(
-                YoutubeLivechatMessageOrm,
-                YoutubeLivechatMessageOrm.id == WesternAstrologyStatusOrm.message_id,
-            )
-            .order_by(YoutubeLivechatMessageOrm.created_at)
-        )
+        stmt = all_with_voice_stmt(get_active_session_id())
         with SessionLocal() as session:
             try:
-                orm_objects = session.execute(stmt).scalars().all()
-                return [
-                    WesternAstrologyStateEntity(
-                        message_id=obj.message_id,
-                        is_target=obj.is_target,
-                        required_info=InfoForAstrologyEntity(**obj.required_info),
-                        result=obj.result,
-                        result_voice_path=obj.result_voice_path,
-                        is_played=obj.is_played,
-                        created_at=obj.created_at,
-                    )
-                    for obj in orm_objects
-                ]
+                rows = session.execute(state_rows_stmt(stmt)).all()
+                return [state_from_row(row) for row in rows]
             except Exception as e:
                 logger.exception(f"Failed to get all with voice: {e}")
                 raise e
 
     def get_waiting_audio_play_state(self) -> list[WesternAstrologyStateEntity]:
-        stmt = (
-            select(WesternAstrologyStatusOrm)
-            .where(
-                and_(
-                    WesternAstrologyStatusOrm.is_target == True,  # noqa: E712
-                    WesternAstrologyStatusOrm.is_played == False,  # noqa: E712
-                )
-            )
-            .join(
-                YoutubeLivechatMessageOrm,
-                YoutubeLivechatMessageOrm.id == WesternAstrologyStatusOrm.message_id,
-            )
-            .order_by(YoutubeLivechatMessageOrm.created_at)
-        )
+        stmt = waiting_audio_play_state_stmt(get_active_session_id())
         with SessionLocal() as session:
             try:
-                orm_objects = session.execute(stmt).scalars().all()
-                results = []
-                for obj in orm_objects:
-                    if obj.required_info:
-                        required_info = InfoForAstrologyEntity(**obj.required_info)
-                    else:
-                        required_info = None
-                    results.append(
-                        WesternAstrologyStateEntity(
-                            message_id=obj.message_id,
-                            is_target=obj.is_target,
-                            required_info=required_info,
-                            result=obj.result,
-                            result_voice_path=obj.result_voice_path,
-                            is_played=obj.is_played,
-                            created_at=obj.created_at,
-                        )
-                    )
-                return results
+                rows = session.execute(state_rows_stmt(stmt)).all()
+                return [state_from_row(row) for row in rows]
             except Exception as e:
                 logger.exception(f"Failed to get waiting audio play state: {e}")
                 raise e
 
     def get_should_play_audio_status(self) -> list[WesternAstrologyStateEntity]:
-        stmt = (
-            select(WesternAstrologyStatusOrm)
-            .where(
-                and_(
-                    WesternAstrologyStatusOrm.is_target == True,  # noqa: E712
-                    WesternAstrologyStatusOrm.is_played == False,  # noqa: E712
-                    WesternAstrologyStatusOrm.result_voice_path != "",
-                )
-            )
-            .order_by(WesternAstrologyStatusOrm.created_at)
-        )
+        stmt = should_play_audio_status_stmt(get_active_session_id())
         with SessionLocal() as session:
             try:
-                orm_objects = session.execute(stmt).scalars().all()
-                results = []
-                for obj in orm_objects:
-                    if obj.required_info:
-                        required_info = InfoForAstrologyEntity(**obj.required_info)
-                    else:
-                        required_info = None
-                    results.append(
-                        WesternAstrologyStateEntity(
-                            message_id=obj.message_id,
-                            is_target=obj.is_target,
-                            required_info=required_info,
-                            result=obj.result,
-                            result_voice_path=obj.result_voice_path,
-                            is_played=obj.is_played,
-                            created_at=obj.created_at,
-                        )
-                    )
-                return results
+                rows = session.execute(state_rows_stmt(stmt)).all()
+                return [state_from_row(row) for row in rows]
             except Exception as e:
                 logger.exception(f"Failed to get should play audio: {e}")
                 raise e
+
+    def count_waiting_audio_play_state(self) -> int:
+        stmt = count_waiting_audio_play_state_stmt(get_active_session_id())
+        with SessionLocal() as session:
+            try:
+                return session.execute(stmt).scalar_one()
+            except Exception as e:
+                logger.exception(f"Failed to count waiting audio play state: {e}")
+                raise e
+
+    def get_should_play_audio_state_and_message(
+        self, limit: int
+    ) -> tuple[list[WesternAstrologyStateEntity], list[LiveChatMessageEntity]]:
+        return self._get_state_and_message(
+            should_play_audio_state_and_message_stmt(get_active_session_id(), limit),
+            "Failed to get should play audio state and message",
+        )
@@ -0,0 +1,381 @@
+# ===============================================================
+# DBを使わずにメモリ上にデータを保持するリポジトリ実装
+# アプリケーション層の単体でのベンチマークやテストに使う
+# ===============================================================
+
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Callable, Iterable
+
+from app.domain.repositories import (
+    InfoExtractionCacheRepository,
+    WesternAstrologyStateRepository,
+    YoutubeLiveChatMessageRepository,
+    YoutubeLiveChatMessageSearchRepository,
+)
+from app.domain.westernastrology import (
+    PREPARED_STAGES,
+    WAITING_STAGES,
+    AstrologyStage,
+    InfoForAstrologyEntity,
+    NatalChartEntity,
+    WesternAstrologyStateEntity,
+)
+from app.domain.youtube.live import LiveChatMessageEntity
+from app.infrastructure.queries import search_terms
+
+
+def _name(state: WesternAstrologyStateEntity) -> str | None:
+    # DBの required_info ->> 'name' と同じく、情報がない場合は None
+    return state.required_info.name if state.required_info else None
+
+
+class InMemoryYoutubeLiveChatMessageRepositoryImpl(YoutubeLiveChatMessageRepository):
+    """
+    YoutubeLiveChatMessageRepositoryImpl のメモリ上の実装
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.RLock()
+        # id -> メッセージ。dictは挿入順を保つので、保存順（DBの created_at 順）に並ぶ
+        self._messages: dict[str, LiveChatMessageEntity] = {}
+        # id -> 保存順の番号
+        self._order: dict[str, int] = {}
+
+    def save(self, messages: list[LiveChatMessageEntity]) -> None:
+        with self._lock:
+            for message in messages:
+                # 既に保存されているIDは更新しない（ON CONFLICT DO NOTHING と同じ）
+                if message.id in self._messages:
+                    continue
+                self._order[message.id] = len(self._order)
+                self._messages[message.id] = message.model_copy(deep=True)
+
+    def get_by_message_ids(self, message_ids: list[str]) -> list[LiveChatMessageEntity]:
+        with self._lock:
+            return [
+                self._messages[message_id].model_copy(deep=True)
+                for message_id in dict.fromkeys(message_ids)
+                if message_id in self._messages
+            ]
+
+    def get(self, message_id: str) -> LiveChatMessageEntity | None:
+        with self._lock:
+            return self._messages.get(message_id)
+
+    def order_of(self, message_id: str) -> int | None:
+        with self._lock:
+            return self._order.get(message_id)
+
+    def get_all(self) -> list[LiveChatMessageEntity]:
+        """
+        全てのメッセージを保存順に返す
+        """
+        with self._lock:
+            return list(self._messages.values())
+
+
+def _matches(message: LiveChatMessageEntity, terms: list[str]) -> bool:
+    texts = [
+        (message.authorDetails.displayName if message.authorDetails else None) or "",
+        (message.snippet.displayMessage if message.snippet else None) or "",
+    ]
+    # DBの ILIKE と同じく、大文字と小文字を区別しない部分一致
+    return all(any(term.lower() in text.lower() for text in texts) for term in terms)
+
+
+class InMemoryYoutubeLiveChatMessageSearchRepositoryImpl(
+    YoutubeLiveChatMessageSearchRepository
+):
+    """
+    YoutubeLiveChatMessageSearchRepositoryImpl のメモリ上の実装。全てのメッセージを順に調べる
+    """
+
+    def __init__(self, message_repo: InMemoryYoutubeLiveChatMessageRepositoryImpl):
+        self.message_repo = message_repo
+
+    def search(
+        self, query: str, limit: int, offset: int = 0
+    ) -> list[LiveChatMessageEntity]:
+        terms = search_terms(query)
+        found = [
+            message
+            for message in reversed(self.message_repo.get_all())
+            if _matches(message, terms)
+        ]
+        return [
+            message.model_copy(deep=True) for message in found[offset : offset + limit]
+        ]
+
+
+class InMemoryInfoExtractionCacheRepositoryImpl(InfoExtractionCacheRepository):
+    """
+    InfoExtractionCacheRepositoryImpl のメモリ上の実装。更新が古い順に並べて保持する
+    """
+
+    def __init__(
+        self,
+        ttl_seconds: float,
+        max_size: int,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        """
+        Args:
+            ttl_seconds: 抽出結果を使う期間（秒）
+            max_size: 保持する抽出結果の数の上限
+            clock: 現在時刻（秒）を返す関数。テストで期限切れを確かめるために差し替える
+        """
+        self.ttl_seconds = ttl_seconds
+        self.max_size = max_size
+        self.clock = clock
+        # キー -> (更新した時刻, 抽出結果)
+        self._infos: OrderedDict[str, tuple[float, InfoForAstrologyEntity]] = (
+            OrderedDict()
+        )
+        self._lock = threading.Lock()
+
+    def get_many(self, keys: list[str]) -> dict[str, InfoForAstrologyEntity]:
+        expires_before = self.clock() - self.ttl_seconds
+        with self._lock:
+            return {
+                key: self._infos[key][1].model_copy()
+                for key in keys
+                if key in self._infos and self._infos[key][0] > expires_before
+            }
+
+    def save(self, infos: dict[str, InfoForAstrologyEntity]) -> None:
+        now = self.clock()
+        with self._lock:
+            for key, info in infos.items():
+                self._infos[key] = (now, info.model_copy())
+                self._infos.move_to_end(key)
+            while self._infos:
+                key, (updated_at, _) = next(iter(self._infos.items()))
+                if len(self._infos) <= self.max_size and (
+                    updated_at > now - self.ttl_seconds
+                ):
+                    break
+                del self._infos[key]
+
+
+class InMemoryWesternAstrologyStateRepositoryImpl(WesternAstrologyStateRepository):
+    """
+    WesternAstrologyStateRepositoryImpl のメモリ上の実装。
+    処理段階ごとの索引を持ち、各取得メソッドは該当する段階の状態だけを調べる。
+    """
+
+    def __init__(self, message_repo: InMemoryYoutubeLiveChatMessageRepositoryImpl):
+        """
+        Args:
+            message_repo: メッセージとの結合（DBのJOIN）に使うメッセージのリポジトリ
+        """
+        self.message_repo = message_repo
+        self._lock = threading.RLock()
+        self._states: dict[str, WesternAstrologyStateEntity] = {}
+        # message_id -> 作成順の番号（created_at が同じ時の並び順を決めるため）
+        self._order: dict[str, int] = {}
+        self._by_stage: dict[AstrologyStage, set[str]] = {
+            stage: set() for stage in AstrologyStage
+        }
+
+    def save(self, state_list: list[WesternAstrologyStateEntity]) -> None:
+        now = datetime.now(timezone.utc)
+        with self._lock:
+            for state in state_list:
+                message_id = str(state.message_id)
+                old = self._states.get(message_id)
+                if old is not None:
+                    self._by_stage[old.stage].discard(message_id)
+                # created_at はDBと同じく最初に保存した時刻のまま、updated_at は保存の度に更新する
+                new = state.model_copy(
+                    deep=True,
+                    update={
+                        "message_id": message_id,
+                        "created_at": old.created_at if old is not None else now,
+                        "updated_at": now,
+                    },
+                )
+                self._states[message_id] = new
+                self._order.setdefault(message_id, len(self._order))
+                self._by_stage[new.stage].add(message_id)
+
+    def _update(self, updates: dict[str, dict]) -> None:
+        """
+        保存済みの状態の一部の値だけを更新する。保存されていないIDは無視する（DBのUPDATEと同じ）
+
+        Args:
+            updates: メッセージID -> 更新する値
+        """
+        now = datetime.now(timezone.utc)
+        with self._lock:
+            for message_id, update in updates.items():
+                old = self._states.get(message_id)
+                if old is None:
+                    continue
+                self._by_stage[old.stage].discard(message_id)
+                new = old.model_copy(deep=True, update={**update, "updated_at": now})
+                self._states[message_id] = new
+                self._by_stage[new.stage].add(message_id)
+
+    def set_required_info(self, infos: dict[str, InfoForAstrologyEntity]) -> None:
+        self._update(
+            {
+                message_id: {"required_info": info.model_copy(deep=True)}
+                for message_id, info in infos.items()
+            }
+        )
+
+    def set_natal_chart(self, charts: dict[str, NatalChartEntity]) -> None:
+        self._update(
+            {
+                message_id: {"natal_chart": chart.model_copy(deep=True)}
+                for message_id, chart in charts.items()
+            }
+        )
+
+    def set_result(self, results: dict[str, str]) -> None:
+        self._update(
+            {message_id: {"result": result} for message_id, result in results.items()}
+        )
+
+    def set_voice_path(self, voice_paths: dict[str, str]) -> None:
+        self._update(
+            {
+                message_id: {"result_voice_path": path}
+                for message_id, path in voice_paths.items()
+            }
+        )
+
+    def mark_played(self, message_ids: list[str]) -> None:
+        self._update({message_id: {"is_played": True} for message_id in message_ids})
+
+    def mark_not_target(self, message_ids: list[str]) -> None:
+        self._update({message_id: {"is_target": False} for message_id in message_ids})
+
+    def _find(
+        self,
+        stages: Iterable[AstrologyStage],
+        condition: Callable[[WesternAstrologyStateEntity], bool],
+        limit: int | None = None,
+        join_message: bool = True,
+    ) -> list[WesternAstrologyStateEntity]:
+        """
+        stages の索引から condition を満たす状態を探す。
+        join_message が True の場合はメッセージがあるものだけを、メッセージの保存順に返す（DBのJOINと同じ）。
+        False の場合は状態の作成順に返す。
+        """
+        with self._lock:
+            states = [
+                self._states[message_id]
+                for stage in stages
+                for message_id in self._by_stage[stage]
+            ]
+            states = [s for s in states if condition(s)]
+            if join_message:
+                orders = {
+                    s.message_id: self.message_repo.order_of(s.message_id)
+                    for s in states
+                }
+                states = [s for s in states if orders[s.message_id] is not None]
+                states.sort(key=lambda s: orders[s.message_id])
+            else:
+                states.sort(key=lambda s: self._order[s.message_id])
+            if limit is not None:
+                states = states[:limit]
+            return [s.model_copy(deep=True) for s in states]
+
+    def _with_messages(
+        self, states: list[WesternAstrologyStateEntity]
+    ) -> tuple[list[WesternAstrologyStateEntity], list[LiveChatMessageEntity]]:
+        messages = [
+            self.message_repo.get(s.message_id).model_copy(deep=True) for s in states
+        ]
+        return states, messages
+
+    def get_not_prepared_target(self, limit: int) -> list[WesternAstrologyStateEntity]:
+        return self._find(
+            [AstrologyStage.NOT_PREPARED],
+            lambda s: _name(s) == "" and s.result == "",
+            limit,
+        )
+
+    def get_not_prepared_target_and_message(
+        self, limit: int
+    ) -> tuple[list[WesternAstrologyStateEntity], list[LiveChatMessageEntity]]:
+        with self._lock:
+            return self._with_messages(self.get_not_prepared_target(limit))
+
+    def get_all_prepared_state_and_message(
+        self,
+    ) -> tuple[list[WesternAstrologyStateEntity], list[LiveChatMessageEntity]]:
+        return self.get_prepared_state_and_message_updated_after(None)
+
+    def get_prepared_state_and_message_updated_after(
+        self, updated_after: datetime | None
+    ) -> tuple[list[WesternAstrologyStateEntity], list[LiveChatMessageEntity]]:
+        with self._lock:
+            return self._with_messages(
+                self._find(
+                    PREPARED_STAGES,
+                    lambda s: updated_after is None or s.updated_at > updated_after,
+                )
+            )
+
+    def get_unprepared_message_ids_updated_after(
+        self, updated_after: datetime
+    ) -> list[str]:
+        return [
+            s.message_id
+            for s in self._find(
+                [AstrologyStage.EXCLUDED, AstrologyStage.NOT_PREPARED],
+                lambda s: s.updated_at > updated_after,
+                join_message=False,
+            )
+        ]
+
+    def get_prepared_target_with_no_result(
+        self, limit: int
+    ) -> list[WesternAstrologyStateEntity]:
+        return self._find([AstrologyStage.NO_RESULT], lambda s: True, limit)
+
+    def get_no_voice_target(self, limit: int) -> list[WesternAstrologyStateEntity]:
+        return self._find([AstrologyStage.NO_VOICE], lambda s: True, limit)
+
+    def get_all_with_voice(self) -> list[WesternAstrologyStateEntity]:
+        return self._find(
+            [AstrologyStage.WAITING_PLAY, AstrologyStage.PLAYED], lambda s: True
+        )
+
+    def get_waiting_audio_play_state(self) -> list[WesternAstrologyStateEntity]:
+        return self._find(WAITING_STAGES, lambda s: not s.is_played)
+
+    def count_waiting_audio_play_state(self) -> int:
+        with self._lock:
+            return sum(
+                not self._states[message_id].is_played
+                for stage in WAITING_STAGES
+                for message_id in self._by_stage[stage]
+            )
+
+    def get_should_play_audio_status(self) -> list[WesternAstrologyStateEntity]:
+        return self._find(
+            WAITING_STAGES,
+            lambda s: not s.is_played and s.result_voice_path != "",
+            join_message=False,
+        )
+
+    def get_should_play_audio_state_and_message(
+        self, limit: int
+    ) -> tuple[list[WesternAstrologyStateEntity], list[LiveChatMessageEntity]]:
+        with self._lock:
+            states = self._find(
+                WAITING_STAGES,
+                lambda s: not s.is_played
+                and s.result_voice_path != ""
+                and self.message_repo.get(s.message_id) is not None,
+                limit,
+                join_message=False,
+            )
+            return self._with_messages(states)
@@ -0,0 +1,419 @@
+# ===============================================================
+# SQLiteを使うリポジトリ実装
+# PostgreSQL（Docker）を用意せずに、手元でパイプライン全体を動かすために使う
+# ===============================================================
+
+import json
+import sqlite3
+import threading
+from datetime import datetime, timezone
+from logging import getLogger
+from pathlib import Path
+
+from app.domain.repositories import (
+    WesternAstrologyStateRepository,
+    YoutubeLiveChatMessageRepository,
+)
+from app.domain.westernastrology import (
+    InfoForAstrologyEntity,
+    NatalChartEntity,
+    WesternAstrologyStateEntity,
+)
+from app.domain.youtube.live import LiveChatMessageEntity
+from app.infrastructure.queries import to_message_document
+
+logger = getLogger(__name__)
+
+# テーブル名・インデックスは app/infrastructure/tables.py と揃える
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS youtube_livechat_messages (
+    id TEXT PRIMARY KEY,
+    message TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_youtube_livechat_messages_created_at
+    ON youtube_livechat_messages (created_at);
+CREATE TABLE IF NOT EXISTS western_astrology_statuss (
+    message_id TEXT PRIMARY KEY REFERENCES youtube_livechat_messages (id),
+    is_target INTEGER NOT NULL,
+    required_info TEXT NOT NULL DEFAULT '{}',
+    result TEXT NOT NULL DEFAULT '',
+    result_voice_path TEXT NOT NULL DEFAULT '',
+    is_played INTEGER NOT NULL DEFAULT 0,
+    natal_chart TEXT,
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_western_astrology_statuss_waiting
+    ON western_astrology_statuss (message_id) WHERE is_target AND NOT is_played;
+CREATE INDEX IF NOT EXISTS ix_western_astrology_statuss_updated_at
+    ON western_astrology_statuss (updated_at);
+"""
+
+_STATE_COLUMNS = (
+    "s.message_id, s.is_target, s.required_info, s.result, s.result_voice_path, "
+    "s.is_played, s.natal_chart, s.created_at, s.updated_at"
+)
+_NAME = "json_extract(s.required_info, '$.name')"
+
+
+def _select_joined(columns: str, where: str) -> str:
+    # メッセージの保存順に並べる。created_at が同じ場合は rowid（挿入順）で決める
+    return (
+        f"SELECT {columns} FROM western_astrology_statuss AS s "
+        "JOIN youtube_livechat_messages AS m ON m.id = s.message_id "
+        f"WHERE {where} ORDER BY m.created_at, m.rowid"
+    )
+
+
+def _now() -> str:
+    # UTCのISO形式の文字列は、文字列として比較しても時刻順になる
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _to_text(dt: datetime) -> str:
+    return dt.astimezone(timezone.utc).isoformat()
+
+
+class SqliteDatabase:
+    """
+    SQLiteのコネクションを保持する。
+    各タスクのスレッドから使うため、1つのコネクションをロックで排他して共有する
+    """
+
+    def __init__(self, path: str | Path = ":memory:"):
+        self.conn = sqlite3.connect(str(path), check_same_thread=False)
+        self.lock = threading.RLock()
+        with self.lock:
+            self.conn.executescript(SCHEMA)
+
+    def close(self) -> None:
+        with self.lock:
+            self.conn.close()
+
+
+class SqliteYoutubeLiveChatMessageRepositoryImpl(YoutubeLiveChatMessageRepository):
+
+    def __init__(self, db: SqliteDatabase):
+        self.db = db
+
+    def save(self, messages: list[LiveChatMessageEntity]) -> None:
+        if not messages:
+            return
+        now = _now()
+        rows = [
+            (m.id, json.dumps(to_message_document(m), ensure_ascii=False), now, now)
+            for m in messages
+        ]
+        with self.db.lock:
+            try:
+                with self.db.conn:
+                    self.db.conn.executemany(
+                        "INSERT INTO youtube_livechat_messages (id, message, created_at, updated_at) "
+                        "VALUES (?, ?, ?, ?) ON CONFLICT (id) DO NOTHING",
+                        rows,
+                    )
+            except Exception as e:
+                logger.exception(f"Failed to save messages: {e}")
+                raise e
+
+    def get_by_message_ids(self, message_ids: list[str]) -> list[LiveChatMessageEntity]:
+        if not message_ids:
+            return []
+        placeholders = ", ".join("?" * len(message_ids))
+        with self.db.lock:
+            try:
+                rows = self.db.conn.execute(
+                    f"SELECT message FROM youtube_livechat_messages WHERE id IN ({placeholders})",
+                    message_ids,
+                ).fetchall()
+            except Exception as e:
+                logger.exception(f"Failed to get messages by message_ids: {e}")
+                raise e
+        return [LiveChatMessageEntity(**json.loads(row[0])) for row in rows]
+
+
+class SqliteWesternAstrologyStateRepositoryImpl(WesternAstrologyStateRepository):
+
+    def __init__(self, db: SqliteDatabase):
+        self.db = db
+
+    def save(self, state_list: list[WesternAstrologyStateEntity]) -> None:
+        if not state_list:
+            return
+        now = _now()
+        rows = [
+            (
+                str(state.message_id),
+                state.is_target,
+                json.dumps(state.required_info.model_dump(), ensure_ascii=False),
+                state.result,
+                state.result_voice_path,
+                state.is_played,
+                (state.natal_chart.model_dump_json() if state.natal_chart else None),
+                now,
+                now,
+            )
+            for state in state_list
+        ]
+        with self.db.lock:
+            try:
+                with self.db.conn:
+                    self.db.conn.executemany(
+                        """
+                        INSERT INTO western_astrology_statuss (
+                            message_id, is_target, required_info, result,
+                            result_voice_path, is_played, natal_chart,
+                            created_at, updated_at
+                        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                        ON CONFLICT (message_id) DO UPDATE SET
+                            is_target = excluded.is_target,
+                            required_info = excluded.required_info,
+                            result = excluded.result,
+                            result_voice_path = excluded.result_voice_path,
+                            is_played = excluded.is_played,
+                            natal_chart = excluded.natal_chart,
+                            updated_at = excluded.updated_at
+                        """,
+                        rows,
+                    )
+            except Exception as e:
+                logger.exception(f"Failed to save state: {e}")
+                raise e
+
+    def _update(self, column: str, rows: list[tuple], error_msg: str) -> None:
+        """
+        column の列と updated_at だけを更新する
+
+        Args:
+            rows: (新しい値, メッセージID) のリスト
+        """
+        if not rows:
+            return
+        now = _now()
+        with self.db.lock:
+            try:
+                with self.db.conn:
+                    self.db.conn.executemany(
+                        f"UPDATE western_astrology_statuss SET {column} = ?, updated_at = ? "
+                        "WHERE message_id = ?",
+                        [(value, now, message_id) for value, message_id in rows],
+                    )
+            except Exception as e:
+                logger.exception(f"{error_msg}: {e}")
+                raise e
+
+    def set_required_info(self, infos: dict[str, InfoForAstrologyEntity]) -> None:
+        self._update(
+            "required_info",
+            [
+                (json.dumps(info.model_dump(), ensure_ascii=False), message_id)
+                for message_id, info in infos.items()
+            ],
+            "Failed to set required info",
+        )
+
+    def set_natal_chart(self, charts: dict[str, NatalChartEntity]) -> None:
+        self._update(
+            "natal_chart",
+            [
+                (chart.model_dump_json(), message_id)
+                for message_id, chart in charts.items()
+            ],
+            "Failed to set natal chart",
+        )
+
+    def set_result(self, results: dict[str, str]) -> None:
+        self._update(
+            "result",
+            [(result, message_id) for message_id, result in results.items()],
+            "Failed to set result",
+        )
+
+    def set_voice_path(self, voice_paths: dict[str, str]) -> None:
+        self._update(
+            "result_voice_path",
+            [(path, message_id) for message_id, path in voice_paths.items()],
+            "Failed to set voice path",
+        )
+
+    def mark_played(self, message_ids: list[str]) -> None:
+        self._update(
+            "is_played",
+            [(True, message_id) for message_id in message_ids],
+            "Failed to mark played",
+        )
+
+    def mark_not_target(self, message_ids: list[str]) -> None:
+        self._update(
+            "is_target",
+            [(False, message_id) for message_id in message_ids],
+            "Failed to mark not target",
+        )
+
+    def _fetch(self, sql: str, params: tuple, error_msg: str) -> list[tuple]:
+        with self.db.lock:
+            try:
+                return self.db.conn.execute(sql, params).fetchall()
+            except Exception as e:
+                logger.exception(f"{error_msg}: {e}")
+                raise e
+
+    def _get_states(
+        self, where: str, error_msg: str, limit: int | None = None
+    ) -> list[WesternAstrologyStateEntity]:
+        sql = _select_joined(_STATE_COLUMNS, where)
+        params: tuple = ()
+        if limit is not None:
+            sql += " LIMIT ?"
+            params = (limit,)
+        return [_to_state_entity(row) for row in self._fetch(sql, params, error_msg)]
+
+    def get_not_prepared_target(self, limit: int) -> list[WesternAstrologyStateEntity]:
+        return self._get_states(
+            f"s.is_target AND {_NAME} = '' AND s.result = ''",
+            "Failed to get not prepared target",
+            limit,
+        )
+
+    def get_not_prepared_target_and_message(
+        self, limit: int
+    ) -> tuple[list[WesternAstrologyStateEntity], list[LiveChatMessageEntity]]:
+        return self._get_state_and_message(
+            _select_joined(
+                f"{_STATE_COLUMNS}, m.message",
+                f"s.is_target AND {_NAME} = '' AND s.result = ''",
+            )
+            + " LIMIT ?",
+            (limit,),
+            "Failed to get not prepared target and message",
+        )
+
+    def get_all_prepared_state_and_message(
+        self,
+    ) -> tuple[list[WesternAstrologyStateEntity], list[LiveChatMessageEntity]]:
+        return self.get_prepared_state_and_message_updated_after(None)
+
+    def get_prepared_state_and_message_updated_after(
+        self, updated_after: datetime | None
+    ) -> tuple[list[WesternAstrologyStateEntity], list[LiveChatMessageEntity]]:
+        where = f"s.is_target AND {_NAME} != ''"
+        params: tuple = ()
+        if updated_after is not None:
+            where += " AND s.updated_at > ?"
+            params = (_to_text(updated_after),)
+        return self._get_state_and_message(
+            _select_joined(f"{_STATE_COLUMNS}, m.message", where),
+            params,
+            "Failed to get prepared state and message",
+        )
+
+    def get_unprepared_message_ids_updated_after(
+        self, updated_after: datetime
+    ) -> list[str]:
+        rows = self._fetch(
+            "SELECT s.message_id FROM western_astrology_statuss AS s "
+            f"WHERE NOT (s.is_target AND coalesce({_NAME}, '') != '') "
+            "AND s.updated_at > ?",
+            (_to_text(updated_after),),
+            "Failed to get unprepared message ids updated after",
+        )
+        return [row[0] for row in rows]
+
+    def _get_state_and_message(
+        self, sql: str, params: tuple, error_msg: str
+    ) -> tuple[list[WesternAstrologyStateEntity], list[LiveChatMessageEntity]]:
+        # sql は _STATE_COLUMNS の後に m.message を選択すること
+        rows = self._fetch(sql, params, error_msg)
+        states = [_to_state_entity(row[:-1]) for row in rows]
+        messages = [LiveChatMessageEntity(**json.loads(row[-1])) for row in rows]
+        return states, messages
+
+    def get_prepared_target_with_no_result(
+        self, limit: int
+    ) -> list[WesternAstrologyStateEntity]:
+        return self._get_states(
+            f"s.is_target AND {_NAME} != '' AND s.result = ''",
+            "Failed to get prepared target with no result",
+            limit,
+        )
+
+    def get_no_voice_target(self, limit: int) -> list[WesternAstrologyStateEntity]:
+        return self._get_states(
+            f"s.is_target AND {_NAME} != '' AND s.result != '' AND s.result_voice_path = ''",
+            "Failed to get no voice target",
+            limit,
+        )
+
+    def get_all_with_voice(self) -> list[WesternAstrologyStateEntity]:
+        return self._get_states(
+            f"s.is_target AND {_NAME} != '' AND s.result != '' AND s.result_voice_path != ''",
+            "Failed to get all with voice",
+        )
+
+    def get_waiting_audio_play_state(self) -> list[WesternAstrologyStateEntity]:
+        return self._get_states(
+            "s.is_target AND NOT s.is_played",
+            "Failed to get waiting audio play state",
+        )
+
+    def count_waiting_audio_play_state(self) -> int:
+        rows = self._fetch(
+            "SELECT COUNT(*) FROM western_astrology_statuss WHERE is_target AND NOT is_played",
+            (),
+            "Failed to count waiting audio play state",
+        )
+        return rows[0][0]
+
+    def get_should_play_audio_status(self) -> list[WesternAstrologyStateEntity]:
+        rows = self._fetch(
+            f"SELECT {_STATE_COLUMNS} FROM western_astrology_statuss AS s "
+            "WHERE s.is_target AND NOT s.is_played AND s.result_voice_path != '' "
+            "ORDER BY s.created_at, s.rowid",
+            (),
+            "Failed to get should play audio",
+        )
+        return [_to_state_entity(row) for row in rows]
+
+    def get_should_play_audio_state_and_message(
+        self, limit: int
+    ) -> tuple[list[WesternAstrologyStateEntity], list[LiveChatMessageEntity]]:
+        return self._get_state_and_message(
+            f"SELECT {_STATE_COLUMNS}, m.message FROM western_astrology_statuss AS s "
+            "JOIN youtube_livechat_messages AS m ON m.id = s.message_id "
+            "WHERE s.is_target AND NOT s.is_played AND s.result_voice_path != '' "
+            "ORDER BY s.created_at, s.rowid LIMIT ?",
+            (limit,),
+            "Failed to get should play audio state and message",
+        )
+
+
+def _to_state_entity(row: tuple) -> WesternAstrologyStateEntity:
+    (
+        message_id,
+        is_target,
+        required_info,
+        result,
+        result_voice_path,
+        is_played,
+        natal_chart,
+        created_at,
+        updated_at,
+    ) = row
+    required_info = json.loads(required_info)
+    return WesternAstrologyStateEntity(
+        message_id=message_id,
+        is_target=bool(is_target),
+        required_info=(
+            InfoForAstrologyEntity(**required_info) if required_info else None
+        ),
+        result=result,
+        result_voice_path=result_voice_path,
+        is_played=bool(is_played),
+        natal_chart=(
+            NatalChartEntity.model_validate_json(natal_chart) if natal_chart else None
+        ),
+        created_at=datetime.fromisoformat(created_at),
+        updated_at=datetime.fromisoformat(updated_at),
+    )
@@ -0,0 +1,660 @@
+# ===============================================================
+# 占星術ステータスの書き込みをまとめて遅延させるリポジトリ実装
+# 各タスクは1件ずつ保存・更新するが、短い間隔の間に溜めた書き込みを
+# 同じメッセージIDごとにまとめ、操作ごとに1つのSQL文で書き込む
+# ===============================================================
+
+import atexit
+import json
+import threading
+from collections import Counter
+from datetime import datetime
+from logging import getLogger
+from pathlib import Path
+from typing import Callable, Iterator
+
+from pydantic import BaseModel
+from sqlalchemy import exc as sa_exc
+
+from app.core.const import LOG_DIR
+from app.domain.repositories import WesternAstrologyStateRepository
+from app.domain.westernastrology import (
+    PREPARED_STAGES,
+    WAITING_STAGES,
+    AstrologyStage,
+    InfoForAstrologyEntity,
+    NatalChartEntity,
+    WesternAstrologyStateEntity,
+)
+from app.domain.youtube.live import LiveChatMessageEntity
+
+logger = getLogger(__name__)
+
+# 書き込みを諦めたものの保存先。次に起動した時に書き込み直す
+DEAD_LETTER_PATH = LOG_DIR / "state_dead_letters.jsonl"
+
+# 部分更新の操作 -> 更新する WesternAstrologyStateEntity のフィールド
+_FIELDS = {
+    "set_required_info": "required_info",
+    "set_natal_chart": "natal_chart",
+    "set_result": "result",
+    "set_voice_path": "result_voice_path",
+    "mark_played": "is_played",
+    "mark_not_target": "is_target",
+}
+
+# 操作 -> 書き込む値の型（書き込みを諦めたものをファイルから読み込む時に使う）
+_VALUE_TYPES: dict[str, type[BaseModel]] = {
+    "save": WesternAstrologyStateEntity,
+    "set_required_info": InfoForAstrologyEntity,
+    "set_natal_chart": NatalChartEntity,
+}
+
+
+def _is_transient(e: Exception) -> bool:
+    """
+    DBに繋がらない・コネクションが空かないなど、時間を置けば書き込めるエラーか
+    """
+    if isinstance(e, sa_exc.DBAPIError) and e.connection_invalidated:
+        return True
+    return isinstance(
+        e,
+        (
+            sa_exc.OperationalError,
+            sa_exc.InterfaceError,
+            sa_exc.DisconnectionError,
+            sa_exc.TimeoutError,
+            ConnectionError,
+            TimeoutError,
+        ),
+    )
+
+
+class _Batch:
+    """
+    メッセージIDごとにまとめた書き込み。
+    同じメッセージIDの保存（states）と部分更新（updates）は同時に持たない（保存に部分更新を反映する）
+    """
+
+    def __init__(self) -> None:
+        # message_id -> 保存する状態（save）
+        self.states: dict[str, WesternAstrologyStateEntity] = {}
+        # 操作 -> {message_id -> 値}（部分更新）
+        self.updates: dict[str, dict[str, object]] = {op: {} for op in _FIELDS}
+
+    def __len__(self) -> int:
+        return len(self.states) + sum(len(u) for u in self.updates.values())
+
+    def add(self, op: str, message_id: str, value: object) -> None:
+        if op == "save":
+            # 全ての列を書き換えるので、それより前の部分更新は不要になる
+            for updates in self.updates.values():
+                updates.pop(message_id, None)
+            self.states[message_id] = value  # type: ignore[assignment]
+            return
+        state = self.states.get(message_id)
+        if state is not None:
+            # 保存前の状態がある場合は、その状態に反映して1回の保存にまとめる
+            setattr(state, _FIELDS[op], value)
+        else:
+            self.updates[op][message_id] = value
+
+    def items(self) -> Iterator[tuple[str, str, object]]:
+        """
+        (操作, message_id, 値) を書き込む順（保存を先に、部分更新を操作ごとに後から）に返す
+        """
+        for message_id, state in self.states.items():
+            yield "save", message_id, state
+        for op, updates in self.updates.items():
+            for message_id, value in updates.items():
+                yield op, message_id, value
+
+    def extend(self, newer: "_Batch") -> None:
+        """
+        この書き込みより後の書き込みを反映する
+        """
+        for op, message_id, value in newer.items():
+            self.add(op, message_id, value)
+
+    def overlay(
+        self, state: WesternAstrologyStateEntity
+    ) -> WesternAstrologyStateEntity:
+        message_id = str(state.message_id)
+        saved = self.states.get(message_id)
+        if saved is not None:
+            return saved.model_copy(deep=True)
+        update = {
+            _FIELDS[op]: updates[message_id]
+            for op, updates in self.updates.items()
+            if message_id in updates
+        }
+        if not update:
+            return state
+        return state.model_copy(update=update).model_copy(deep=True)
+
+
+class WriteBehindWesternAstrologyStateRepositoryImpl(WesternAstrologyStateRepository):
+    """
+    書き込みを溜めてから、包んだリポジトリにまとめて書き込む。
+    複数のタスクで1つのインスタンスを共有すると、タスクをまたいで書き込みをまとめられる。
+
+    - 同じメッセージIDへの書き込みは最後の値にまとめる
+    - flush_interval 秒ごと、または溜めた件数が max_pending 件に達した時に書き込む。
+      DBへの書き込み中も、書き込みを溜めることと読み込みは待たされない
+    - 読み込みでは書き込まずに、包んだリポジトリから読んだ状態に溜めている（書き込み中を含む）書き込みを反映して返す。
+      溜めている書き込みで対象から外れるものは結果から除くので、同じ状態を二度処理することはない。
+      溜めている部分更新で新たに対象になるものは、書き込まれた後（flush_interval 秒以内）に読めるようになる
+    - DBに繋がらないなどの一時的なエラーで書き込めなかったものは、書き込めるまで溜めておく
+    - それ以外のエラーの場合は1件ずつ書き込み直し、書き込めない書き込みだけを分ける。
+      max_attempts 回続けて書き込めなかったものは dead_letters に移し、dead_letter_path のファイルに保存する。
+      ファイルに保存したものは、次に起動した時（または replay_dead_letters() の呼び出し時）に書き込み直す
+    - close() の時（プロセスの終了時を含む）には溜まっている書き込みを書き込み、
+      書き込めなかったものは dead_letter_path のファイルに保存する
+    """
+
+    def __init__(
+        self,
+        repo: WesternAstrologyStateRepository,
+        flush_interval: float = 0.2,
+        max_pending: int = 100,
+        max_attempts: int = 3,
+        dead_letter_path: Path | None = None,
+    ):
+        """
+        Args:
+            repo: 実際に書き込むリポジトリ
+            flush_interval: 溜めた書き込みを書き込む間隔（秒）
+            max_pending: この件数の書き込みが溜まったら、間隔を待たずに書き込む
+            max_attempts: 一時的でないエラーで書き込めなかった書き込みを試す回数の上限
+            dead_letter_path: 書き込みを諦めたものを保存するファイル。None の場合は保存しない
+        """
+        self.repo = repo
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.max_attempts = max_attempts
+        self.dead_letter_path = dead_letter_path
+        # 溜めている書き込みを読み書きする間だけ保持する（DBの読み書きの間は保持しない）
+        self._lock = threading.Lock()
+        # flush を1つずつ実行する
+        self._flush_lock = threading.Lock()
+        # 溜めている書き込みと、書き込み中の書き込み
+        self._pending = _Batch()
+        self._in_flight: _Batch | None = None
+        # 書き込みを終えた回数と、書き込みを終える前から読み込み中のものがある書き込み
+        # （その読み込みの結果に反映されていない場合があるので、読み込みが終わるまで反映する）
+        self._flushes = 0
+        self._written: list[tuple[int, _Batch]] = []
+        # 読み込みを始めた時の書き込みを終えた回数 -> 読み込み中の数
+        self._readers: Counter[int] = Counter()
+        # 直前の書き込みが一時的なエラーで失敗した場合は False（書き込みを溜める側では書き込まない）
+        self._healthy = True
+        # (操作, message_id) -> 続けて書き込めなかった回数
+        self._failures: dict[tuple[str, str], int] = {}
+        # 書き込みを諦めた (操作, message_id, 値)
+        self.dead_letters: list[tuple[str, str, object]] = []
+        self._replay(self._load_dead_letters())
+        self._closed = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, name="state_write_behind", daemon=True
+        )
+        self._thread.start()
+        atexit.register(self.close)
+
+    @property
+    def pending_count(self) -> int:
+        """
+        まだ書き込んでいない（書き込み中を含む）書き込みの数
+        """
+        with self._lock:
+            return len(self._pending) + len(self._in_flight or ())
+
+    def _run(self) -> None:
+        while not self._closed.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception as e:
+                logger.warning(f"Failed to flush buffered states: {e}")
+
+    def close(self) -> None:
+        """
+        定期的な書き込みを止め、溜まっている書き込みを全て書き込む。
+        書き込めなかったものは、次に起動した時に書き込むようにファイルに保存する
+        """
+        self._closed.set()
+        self.flush()
+        with self._flush_lock:
+            with self._lock:
+                rest, self._pending = self._pending, _Batch()
+            if rest:
+                logger.error(
+                    f"Could not write {len(rest)} buffered states before closing."
+                )
+                self._save_dead_letters(list(rest.items()))
+
+    def flush(self) -> None:
+        """
+        溜まっている書き込みを書き込む。
+        書き込めなかったものは溜めている書き込みに戻し、次の flush で再度書き込む。
+        """
+        with self._flush_lock:
+            self._flush()
+
+    def _flush(self) -> None:
+        with self._lock:
+            if not self._pending:
+                return
+            batch, self._pending = self._pending, _Batch()
+            self._in_flight = batch
+        written, retry, dead = _Batch(), _Batch(), []
+        try:
+            self._write_batch(batch, written, retry, dead)
+        finally:
+            with self._lock:
+                # 書き込めなかったものを、書き込み中に溜まった書き込みより前の書き込みとして戻す
+                retry.extend(self._pending)
+                self._pending = retry
+                self._in_flight = None
+                self._flushes += 1
+                if self._readers and written:
+                    self._written.append((self._flushes, written))
+                self.dead_letters += dead
+            if dead:
+                self._save_dead_letters(dead)
+
+    def _write_batch(
+        self,
+        batch: _Batch,
+        written: _Batch,
+        retry: _Batch,
+        dead: list[tuple[str, str, object]],
+    ) -> None:
+        # 保存（INSERT）を先に、部分更新を操作ごとに後から書き込む
+        ops = [("save", batch.states)] + list(batch.updates.items())
+        for i, (op, items) in enumerate(ops):
+            if not items:
+                continue
+            if not self._write(op, items, written, retry, dead):
+                # DBが使えないので、残りの操作は次の flush で書き込む
+                for rest_op, rest_items in ops[i + 1 :]:
+                    for message_id, value in rest_items.items():
+                        retry.add(rest_op, message_id, value)
+                return
+
+    def _call(self, op: str, items: dict) -> None:
+        if op == "save":
+            self.repo.save(list(items.values()))
+        elif op in ("mark_played", "mark_not_target"):
+            getattr(self.repo, op)(list(items))
+        else:
+            getattr(self.repo, op)(dict(items))
+
+    def _write(
+        self,
+        op: str,
+        items: dict,
+        written: _Batch,
+        retry: _Batch,
+        dead: list[tuple[str, str, object]],
+    ) -> bool:
+        """
+        1つの操作の書き込みをまとめて書き込む。一時的なエラーで書き込めなかった場合は False
+        """
+        try:
+            self._call(op, items)
+        except Exception as e:
+            if _is_transient(e):
+                if self._healthy:
+                    logger.warning(f"Failed to write buffered {op}. Retry later: {e}")
+                self._healthy = False
+                for message_id, value in items.items():
+                    retry.add(op, message_id, value)
+                return False
+            if len(items) > 1:
+                # 書き込めない1件が他の書き込みを止めないように、1件ずつ書き込み直す
+                logger.warning(f"Failed to write buffered {op}. Write one by one: {e}")
+                rows = list(items.items())
+                for i, (message_id, value) in enumerate(rows):
+                    if not self._write(op, {message_id: value}, written, retry, dead):
+                        for rest_id, rest_value in rows[i + 1 :]:
+                            retry.add(op, rest_id, rest_value)
+                        return False
+                return True
+            [(message_id, value)] = items.items()
+            self._count_failure(op, message_id, value, retry, dead, e)
+            return True
+        if not self._healthy:
+            logger.info("Writing buffered states succeeded again.")
+        self._healthy = True
+        for message_id, value in items.items():
+            self._failures.pop((op, message_id), None)
+            written.add(op, message_id, value)
+        return True
+
+    def _count_failure(
+        self,
+        op: str,
+        message_id: str,
+        value: object,
+        retry: _Batch,
+        dead: list[tuple[str, str, object]],
+        error: Exception,
+    ) -> None:
+        key = (op, message_id)
+        self._failures[key] = self._failures.get(key, 0) + 1
+        if self._failures[key] < self.max_attempts:
+            logger.warning(
+                f"Failed to write buffered {op}: message_id={message_id}, {error}"
+            )
+            retry.add(op, message_id, value)
+            return
+        del self._failures[key]
+        dead.append((op, message_id, value))
+        logger.error(
+            f"Gave up writing buffered {op} after {self.max_attempts} attempts: message_id={message_id}, {error}"
+        )
+
+    # 書き込みを諦めたものは、1行に1件のJSONでファイルに保存する
+
+    def _save_dead_letters(self, entries: list[tuple[str, str, object]]) -> None:
+        if self.dead_letter_path is None:
+            return
+        try:
+            self.dead_letter_path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.dead_letter_path, "a", encoding="utf-8") as f:
+                for op, message_id, value in entries:
+                    if isinstance(value, BaseModel):
+                        value = value.model_dump(mode="json")
+                    record = {"op": op, "message_id": message_id, "value": value}
+                    f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        except Exception as e:
+            logger.exception(f"Failed to save dead letters: {e}")
+
+    def _load_dead_letters(self) -> list[tuple[str, str, object]]:
+        if self.dead_letter_path is None or not self.dead_letter_path.exists():
+            return []
+        entries = []
+        with open(self.dead_letter_path, encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                op, value = record["op"], record["value"]
+                if op in _VALUE_TYPES:
+                    value = _VALUE_TYPES[op].model_validate(value)
+                entries.append((op, record["message_id"], value))
+        self.dead_letter_path.unlink()
+        if entries:
+            logger.info(f"Replay {len(entries)} dead letters.")
+        return entries
+
+    def _replay(self, entries: list[tuple[str, str, object]]) -> None:
+        with self._lock:
+            for op, message_id, value in entries:
+                self._pending.add(op, message_id, value)
+
+    def replay_dead_letters(self) -> None:
+        """
+        書き込みを諦めたもの（ファイルに保存したものを含む）を、溜めている書き込みに戻す
+        """
+        with self._flush_lock:
+            with self._lock:
+                entries, self.dead_letters = self.dead_letters, []
+            if self.dead_letter_path is not None:
+                # メモリ上のものはファイルにも保存しているので、ファイルから読み込んだものを戻す
+                entries = self._load_dead_letters()
+            self._replay(entries)
+
+    def _flush_if_full(self, full: bool) -> None:
+        # 書き込み中の場合と、DBが使えない場合は、定期的な書き込みに任せる
+        if not full or not self._healthy:
+            return
+        if self._flush_lock.acquire(blocking=False):
+            try:
+                self._flush()
+            finally:
+                self._flush_lock.release()
+
+    def _add(self, op: str, values: dict[str, object]) -> None:
+        with self._lock:
+            for message_id, value in values.items():
+                self._pending.add(op, message_id, value)
+            full = len(self._pending) >= self.max_pending
+        self._flush_if_full(full)
+
+    def save(self, state_list: list[WesternAstrologyStateEntity]) -> None:
+        self._add(
+            "save",
+            {
+                str(state.message_id): state.model_copy(deep=True)
+                for state in state_list
+            },
+        )
+
+    def _update(self, op: str, updates: dict[str, object]) -> None:
+        self._add(op, updates)
+
+    def set_required_info(self, infos: dict[str, InfoForAstrologyEntity]) -> None:
+        self._update(
+            "set_required_info",
+            {
+                message_id: info.model_copy(deep=True)
+                for message_id, info in infos.items()
+            },
+        )
+
+    def set_natal_chart(self, charts: dict[str, NatalChartEntity]) -> None:
+        self._update(
+            "set_natal_chart",
+            {
+                message_id: chart.model_copy(deep=True)
+                for message_id, chart in charts.items()
+            },
+        )
+
+    def set_result(self, results: dict[str, str]) -> None:
+        self._update("set_result", results)
+
+    def set_voice_path(self, voice_paths: dict[str, str]) -> None:
+        self._update("set_voice_path", voice_paths)
+
+    def mark_played(self, message_ids: list[str]) -> None:
+        self._update("mark_played", dict.fromkeys(message_ids, True))
+
+    def mark_not_target(self, message_ids: list[str]) -> None:
+        self._update("mark_not_target", dict.fromkeys(message_ids, False))
+
+    # 読み込みは書き込みをせずに、読んだ状態に溜めている書き込みを反映する。
+    # 反映すると対象から外れる分を見込んで、上限を溜めている件数だけ増やして読む。
+    # DBからの読み込みの間は溜めている書き込みのロックを保持しないので、
+    # 読み込み中に書き込みを終えたもの（読み込みの結果に反映されていない場合がある）も反映する
+
+    def _begin_read(self) -> tuple[int, int]:
+        """
+        Returns:
+            (書き込みを終えた回数, 反映する書き込みの数)
+        """
+        with self._lock:
+            self._readers[self._flushes] += 1
+            count = len(self._pending) + len(self._in_flight or ())
+            count += sum(len(b) for _, b in self._written)
+            return self._flushes, count
+
+    def _end_read(self, start: int) -> None:
+        with self._lock:
+            self._readers[start] -= 1
+            if not self._readers[start]:
+                del self._readers[start]
+            # 書き込みを終える前から読み込み中のものがなくなった書き込みは、反映しなくてよい
+            oldest = min(self._readers, default=self._flushes)
+            self._written = [(n, b) for n, b in self._written if n > oldest]
+
+    def _layers(self, start: int) -> list[_Batch]:
+        # 古い順（後の書き込みほど後に反映する）
+        layers = [b for n, b in self._written if n > start]
+        if self._in_flight is not None:
+            layers.append(self._in_flight)
+        layers.append(self._pending)
+        return layers
+
+    def _overlay(
+        self, state: WesternAstrologyStateEntity, layers: list[_Batch]
+    ) -> WesternAstrologyStateEntity:
+        for layer in layers:
+            state = layer.overlay(state)
+        return state
+
+    def _read(
+        self,
+        read: Callable[[int | None], list[WesternAstrologyStateEntity]],
+        stages: frozenset[AstrologyStage],
+        limit: int | None = None,
+    ) -> list[WesternAstrologyStateEntity]:
+        start, count = self._begin_read()
+        try:
+            states = read(None if limit is None else limit + count)
+            with self._lock:
+                layers = self._layers(start)
+                states = [self._overlay(s, layers) for s in states]
+        finally:
+            self._end_read(start)
+        states = [s for s in states if s.stage in stages]
+        return states if limit is None else states[:limit]
+
+    def _read_with_messages(
+        self,
+        read: Callable[
+            [int | None],
+            tuple[list[WesternAstrologyStateEntity], list[LiveChatMessageEntity]],
+        ],
+        stages: frozenset[AstrologyStage],
+        limit: int | None = None,
+    ) -> tuple[list[WesternAstrologyStateEntity], list[LiveChatMessageEntity]]:
+        start, count = self._begin_read()
+        try:
+            states, messages = read(None if limit is None else limit + count)
+            with self._lock:
+                layers = self._layers(start)
+                pairs = [
+                    (self._overlay(s, layers), m)
+                    for s, m in zip(states, messages, strict=True)
+                ]
+        finally:
+            self._end_read(start)
+        pairs = [(s, m) for s, m in pairs if s.stage in stages]
+        if limit is not None:
+            pairs = pairs[:limit]
+        return [s for s, _ in pairs], [m for _, m in pairs]
+
+    def get_not_prepared_target(self, limit: int) -> list[WesternAstrologyStateEntity]:
+        return self._read(
+            self.repo.get_not_prepared_target,
+            frozenset({AstrologyStage.NOT_PREPARED}),
+            limit,
+        )
+
+    def get_not_prepared_target_and_message(
+        self, limit: int
+    ) -> tuple[list[WesternAstrologyStateEntity], list[LiveChatMessageEntity]]:
+        return self._read_with_messages(
+            self.repo.get_not_prepared_target_and_message,
+            frozenset({AstrologyStage.NOT_PREPARED}),
+            limit,
+        )
+
+    def get_all_prepared_state_and_message(
+        self,
+    ) -> tuple[list[WesternAstrologyStateEntity], list[LiveChatMessageEntity]]:
+        return self._read_with_messages(
+            lambda _: self.repo.get_all_prepared_state_and_message(), PREPARED_STAGES
+        )
+
+    def get_prepared_state_and_message_updated_after(
+        self, updated_after: datetime | None
+    ) -> tuple[list[WesternAstrologyStateEntity], list[LiveChatMessageEntity]]:
+        return self._read_with_messages(
+            lambda _: self.repo.get_prepared_state_and_message_updated_after(
+                updated_after
+            ),
+            PREPARED_STAGES,
+        )
+
+    def get_unprepared_message_ids_updated_after(
+        self, updated_after: datetime
+    ) -> list[str]:
+        start, _ = self._begin_read()
+        try:
+            message_ids = self.repo.get_unprepared_message_ids_updated_after(
+                updated_after
+            )
+            with self._lock:
+                # 書き込まれると updated_after より後に更新されたことになる
+                for layer in self._layers(start):
+                    message_ids += [
+                        message_id
+                        for message_id, state in layer.states.items()
+                        if state.stage not in PREPARED_STAGES
+                    ]
+                    message_ids += list(layer.updates["mark_not_target"])
+        finally:
+            self._end_read(start)
+        return list(dict.fromkeys(message_ids))
+
+    def get_prepared_target_with_no_result(
+        self, limit: int
+    ) -> list[WesternAstrologyStateEntity]:
+        return self._read(
+            self.repo.get_prepared_target_with_no_result,
+            frozenset({AstrologyStage.NO_RESULT}),
+            limit,
+        )
+
+    def get_no_voice_target(self, limit: int) -> list[WesternAstrologyStateEntity]:
+        return self._read(
+            self.repo.get_no_voice_target,
+            frozenset({AstrologyStage.NO_VOICE}),
+            limit,
+        )
+
+    def get_all_with_voice(self) -> list[WesternAstrologyStateEntity]:
+        return self._read(
+            lambda _: self.repo.get_all_with_voice(),
+            frozenset({AstrologyStage.WAITING_PLAY, AstrologyStage.PLAYED}),
+        )
+
+    def get_waiting_audio_play_state(self) -> list[WesternAstrologyStateEntity]:
+        return self._read(
+            lambda _: self.repo.get_waiting_audio_play_state(), WAITING_STAGES
+        )
+
+    def count_waiting_audio_play_state(self) -> int:
+        # 件数だけでは溜めている書き込みを反映できないので、書き込み済みの件数を返す
+        return self.repo.count_waiting_audio_play_state()
+
+    def get_should_play_audio_status(self) -> list[WesternAstrologyStateEntity]:
+        return self._read(
+            lambda _: self.repo.get_should_play_audio_status(),
+            frozenset({AstrologyStage.WAITING_PLAY}),
+        )
+
+    def get_should_play_audio_state_and_message(
+        self, limit: int
+    ) -> tuple[list[WesternAstrologyStateEntity], list[LiveChatMessageEntity]]:
+        return self._read_with_messages(
+            self.repo.get_should_play_audio_state_and_message,
+            frozenset({AstrologyStage.WAITING_PLAY}),
+            limit,
+        )
+
+
+def with_write_behind(
+    repo: WesternAstrologyStateRepository, flush_interval: float
+) -> WesternAstrologyStateRepository:
+    """
+    flush_interval が正の値の場合は、書き込みを溜めるリポジトリで包んで返す（書き込みを諦めたものは DEAD_LETTER_PATH に保存する）。
+    0以下の場合は repo をそのまま返す（書き込みの度にDBに書き込む）
+    """
+    if flush_interval <= 0:
+        return repo
+    return WriteBehindWesternAstrologyStateRepositoryImpl(
+        repo, flush_interval, dead_letter_path=DEAD_LETTER_PATH
+    )
@@ -0,0 +1,144 @@
+import json
+import select
+import time
+from logging import getLogger
+
+import psycopg2
+from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
+from sqlalchemy.engine import make_url
+
+from app.core.const import PG_URL
+from app.domain.listeners import StateChangeListener
+from app.domain.westernastrology import AstrologyStage, StateChangeEvent
+
+logger = getLogger(__name__)
+
+CHANNEL_PREFIX = "astrology_state_"
+
+# 処理段階の判定。app.domain.westernastrology.WesternAstrologyStateEntity.stage と同じ規則にすること。
+# インデックス ix_western_astrology_statuss_stage の式で使うので、規則を変えた時はインデックスも作り直すこと
+ASTROLOGY_STAGE_FUNCTION_DDL = """
+CREATE OR REPLACE FUNCTION astrology_stage(
+    is_target boolean,
+    required_info jsonb,
+    result text,
+    result_voice_path text,
+    is_played boolean
+) RETURNS text
+LANGUAGE sql IMMUTABLE AS $$
+    SELECT CASE
+        WHEN NOT is_target THEN 'excluded'
+        WHEN coalesce(required_info ->> 'name', '') = '' THEN 'not_prepared'
+        WHEN result = '' THEN 'no_result'
+        WHEN result_voice_path = '' THEN 'no_voice'
+        WHEN NOT is_played THEN 'waiting_play'
+        ELSE 'played'
+    END
+$$
+"""
+
+# 処理段階が変わった時に、変化後の段階のチャンネルに通知する（配信セッションのIDも通知する）
+NOTIFY_FUNCTION_DDL = """
+CREATE OR REPLACE FUNCTION notify_astrology_state_change() RETURNS trigger
+LANGUAGE plpgsql AS $$
+DECLARE
+    old_stage text;
+    new_stage text;
+BEGIN
+    new_stage := astrology_stage(
+        NEW.is_target, NEW.required_info, NEW.result, NEW.result_voice_path, NEW.is_played
+    );
+    IF TG_OP = 'UPDATE' THEN
+        old_stage := astrology_stage(
+            OLD.is_target, OLD.required_info, OLD.result, OLD.result_voice_path, OLD.is_played
+        );
+        IF old_stage = new_stage THEN
+            RETURN NULL;
+        END IF;
+    END IF;
+    PERFORM pg_notify(
+        'astrology_state_' || new_stage,
+        json_build_object(
+            'session_id', NEW.session_id,
+            'message_id', NEW.message_id,
+            'from_stage', old_stage,
+            'to_stage', new_stage
+        )::text
+    );
+    RETURN NULL;
+END
+$$
+"""
+
+NOTIFY_TRIGGER_DDL = """
+CREATE TRIGGER western_astrology_statuss_notify
+    AFTER INSERT OR UPDATE ON western_astrology_statuss
+    FOR EACH ROW EXECUTE FUNCTION notify_astrology_state_change()
+"""
+
+# テーブル作成後に実行するDDL（テーブルを削除するとトリガーも削除される）。
+# astrology_stage() はインデックスの式でも使うので、テーブルより先に作成する（app/infrastructure/tables.py）
+STATE_NOTIFY_DDL: list[str] = [
+    NOTIFY_FUNCTION_DDL,
+    NOTIFY_TRIGGER_DDL,
+]
+
+
+def channel_name(stage: AstrologyStage) -> str:
+    return CHANNEL_PREFIX + stage.value
+
+
+class PgStateChangeListener(StateChangeListener):
+    """
+    PostgreSQLの LISTEN/NOTIFY で処理段階の変化を待ち受ける。
+    コネクションプールを占有しないように、専用のコネクションを使用する。
+    """
+
+    def __init__(self, stages: list[AstrologyStage]) -> None:
+        self.channels = [channel_name(stage) for stage in stages]
+        self._conn = None
+
+    def listen(self) -> None:
+        if self._conn is not None:
+            return
+        dsn = make_url(PG_URL).set(drivername="postgresql")
+        conn = psycopg2.connect(dsn.render_as_string(hide_password=False))
+        conn.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+        with conn.cursor() as cursor:
+            for channel in self.channels:
+                cursor.execute(f"LISTEN {channel};")
+        self._conn = conn
+        logger.info(f"Start listening: {self.channels}")
+
+    def wait(self, timeout: float) -> list[StateChangeEvent]:
+        try:
+            self.listen()
+            if not self._conn.notifies:
+                readable, _, _ = select.select([self._conn], [], [], timeout)
+                if readable:
+                    self._conn.poll()
+            notifies = list(self._conn.notifies)
+            self._conn.notifies.clear()
+        except (psycopg2.Error, OSError) as e:
+            # 接続が切れた場合は次の wait で再接続する。それまではポーリングと同じ動作になる
+            logger.warning(f"Failed to wait for notification: {e}")
+            self.close()
+            time.sleep(timeout)
+            return []
+
+        events: list[StateChangeEvent] = []
+        for notify in notifies:
+            try:
+                events.append(StateChangeEvent(**json.loads(notify.payload)))
+            except ValueError as e:
+                logger.warning(f"Invalid notification payload: {notify.payload} {e}")
+        return events
+
+    def close(self) -> None:
+        if self._conn is None:
+            return
+        try:
+            self._conn.close()
+        except psycopg2.Error as e:
+            logger.warning(f"Failed to close listener connection: {e}")
+        self._conn = None
@@ -1,11 +1,46 @@
-from sqlalchemy import ForeignKey, Text
-from sqlalchemy.dialects.postgresql import JSONB
+from datetime import datetime
+
+from sqlalchemy import (
+    DDL,
+    TIMESTAMP,
+    BigInteger,
+    ForeignKeyConstraint,
+    Index,
+    Text,
+    event,
+    func,
+    text,
+)
+from sqlalchemy.dialects.postgresql import ARRAY, JSONB
 from sqlalchemy.orm import Mapped, mapped_column
 
 from app.infrastructure.db_common import Base, TableNameMixin, TimestampMixin
+from app.infrastructure.pipeline_rollup import PIPELINE_ROLLUP_DDL
+from app.infrastructure.state_notify import (
+    ASTROLOGY_STAGE_FUNCTION_DDL,
+    STATE_NOTIFY_DDL,
+)
+
 
+class BroadcastSessionOrm(Base, TimestampMixin, TableNameMixin):
+    # 配信セッションのID（YouTubeの動画ID）
+    id: Mapped[str] = mapped_column(primary_key=True)
+    # 最後に開始した時刻。最も新しいものを現在の配信セッションとする
+    started_at: Mapped[datetime] = mapped_column(
+        TIMESTAMP(timezone=True), server_default=func.now(), nullable=False
+    )
+    # アーカイブしてパーティションを削除した時刻とアーカイブファイルの保存先
+    archived_at: Mapped[datetime | None] = mapped_column(
+        TIMESTAMP(timezone=True), nullable=True
+    )
+    archive_path: Mapped[str | None] = mapped_column(Text, nullable=True)
 
+
+# メッセージと占星術ステータスは、配信セッションごとにパーティションを分ける（LIST パーティション）
+# パーティションは配信セッションの開始時に作成する（app/infrastructure/broadcast_session.py）
 class YoutubeLivechatMessageOrm(Base, TimestampMixin, TableNameMixin):
+    # 配信セッションのID（パーティションキー）
+    session_id: Mapped[str] = mapped_column(primary_key=True)
     # 主キー: UUID (insert時に決める)
     id: Mapped[str] = mapped_column(
         primary_key=True,
@@ -13,6 +48,65 @@ class YoutubeLivechatMessageOrm(Base, TimestampMixin, TableNameMixin):
     # postgres jsonb column
     message: Mapped[dict] = mapped_column(JSONB, nullable=False)
 
+    __table_args__ = {"postgresql_partition_by": "LIST (session_id)"}
+
+
+# オペレーターがコメントを検索する時に使う式（app/infrastructure/queries.py の search_messages_stmt）。
+# 検索のSQL文でインデックスと同じ式を使わないと、インデックスが使われない
+LIVECHAT_AUTHOR_NAME = YoutubeLivechatMessageOrm.message["authorDetails"][
+    "displayName"
+].astext
+LIVECHAT_DISPLAY_MESSAGE = YoutubeLivechatMessageOrm.message["snippet"][
+    "displayMessage"
+].astext
+
+# 文字列に含まれる1文字と2文字の部分文字列（小文字にしたもの）の配列。
+# 日本語の1〜2文字の語でもインデックスで検索できるように、トライグラムではなく1〜2文字で分割する
+LIVECHAT_NGRAMS_FUNCTION_DDL = """
+CREATE OR REPLACE FUNCTION livechat_ngrams(doc text) RETURNS text[]
+LANGUAGE sql IMMUTABLE STRICT PARALLEL SAFE AS $$
+    SELECT coalesce(array_agg(DISTINCT substr(lower(doc), i, n)), '{}')
+    FROM generate_series(1, 2) AS n, generate_series(1, char_length(doc) - n + 1) AS i
+$$
+"""
+
+# 検索する語の2文字の部分文字列（1文字の語はその1文字）の配列。
+# livechat_ngrams(文字列) がこの配列を全て含む（@>）行だけが、語を部分一致で含みうる
+LIVECHAT_QUERY_NGRAMS_FUNCTION_DDL = """
+CREATE OR REPLACE FUNCTION livechat_query_ngrams(term text) RETURNS text[]
+LANGUAGE sql IMMUTABLE STRICT PARALLEL SAFE AS $$
+    SELECT CASE
+        WHEN char_length(term) < 2 THEN ARRAY[lower(term)]
+        ELSE ARRAY(
+            SELECT DISTINCT substr(lower(term), i, 2)
+            FROM generate_series(1, char_length(term) - 1) AS i
+        )
+    END
+$$
+"""
+
+# 部分一致（ILIKE）で検索するための1〜2文字の部分文字列のインデックス。パーティションにも同じインデックスが作成される。
+# 検索では ILIKE の前にこのインデックスで候補を絞り込む
+LIVECHAT_AUTHOR_NAME_NGRAMS = func.livechat_ngrams(
+    LIVECHAT_AUTHOR_NAME, type_=ARRAY(Text)
+)
+LIVECHAT_DISPLAY_MESSAGE_NGRAMS = func.livechat_ngrams(
+    LIVECHAT_DISPLAY_MESSAGE, type_=ARRAY(Text)
+)
+Index(
+    "ix_youtube_livechat_messages_author_name_ngram",
+    LIVECHAT_AUTHOR_NAME_NGRAMS,
+    postgresql_using="gin",
+)
+Index(
+    "ix_youtube_livechat_messages_display_message_ngram",
+    LIVECHAT_DISPLAY_MESSAGE_NGRAMS,
+    postgresql_using="gin",
+)
+# インデックスの式で使う関数は、テーブルより先に作成する
+for _ddl in [LIVECHAT_NGRAMS_FUNCTION_DDL, LIVECHAT_QUERY_NGRAMS_FUNCTION_DDL]:
+    event.listen(Base.metadata, "before_create", DDL(_ddl))
+
 
 # TODO WesternAstrologyStateOrm にrename(table名も変更されるので注意)
 class WesternAstrologyStatusOrm(Base, TimestampMixin, TableNameMixin):
@@ -20,13 +114,12 @@ class WesternAstrologyStatusOrm(Base, TimestampMixin, TableNameMixin):
     # id: Mapped[str] = mapped_column(
     #     primary_key=True,
     # )
+    # 配信セッションのID（パーティションキー）
+    session_id: Mapped[str] = mapped_column(primary_key=True)
     # 主キーかつ外部キー: YoutubeLivechatMessage の id を参照
     message_id: Mapped[str] = mapped_column(
-        ForeignKey("youtube_livechat_messages.id"),
         primary_key=True,
         nullable=False,
-        index=True,
-        unique=True,
     )
     # 占い対象かどうか
     is_target: Mapped[bool] = mapped_column(nullable=False)
@@ -37,8 +130,82 @@ class WesternAstrologyStatusOrm(Base, TimestampMixin, TableNameMixin):
     # 音声ファイルのパス
     result_voice_path: Mapped[str] = mapped_column(Text, default="", nullable=False)
     is_played: Mapped[bool] = mapped_column(nullable=False, default=False)
+    # 占いに必要な情報から計算した出生図（NatalChartEntity）。占い結果を生成し直す時は計算し直さずに使う
+    natal_chart: Mapped[dict | None] = mapped_column(JSONB, nullable=True)
+
+    __table_args__ = (
+        ForeignKeyConstraint(
+            ["session_id", "message_id"],
+            ["youtube_livechat_messages.session_id", "youtube_livechat_messages.id"],
+        ),
+        # 占い待ち（音声再生待ち）の件数を数えるための部分インデックス
+        Index(
+            "ix_western_astrology_statuss_waiting",
+            "message_id",
+            postgresql_where=text("is_target AND NOT is_played"),
+        ),
+        # UIで前回の取得以降に更新された行だけを取得するためのインデックス
+        Index("ix_western_astrology_statuss_updated_at", "updated_at"),
+        {"postgresql_partition_by": "LIST (session_id)"},
+    )
 
     def construct_from_entity(
         self,
     ):
         pass
+
+
+# 処理段階（astrology_stage() の値）。パイプラインの各タスクは段階ごとに処理待ちのものを取得する
+ASTROLOGY_STAGE = func.astrology_stage(
+    WesternAstrologyStatusOrm.is_target,
+    WesternAstrologyStatusOrm.required_info,
+    WesternAstrologyStatusOrm.result,
+    WesternAstrologyStatusOrm.result_voice_path,
+    WesternAstrologyStatusOrm.is_played,
+    type_=Text,
+)
+# 処理段階で取得するためのインデックス。処理中の段階の行は配信セッションのごく一部なので、
+# ANALYZE で集める式の統計情報から件数を正しく見積もり、パーティション全体を読まずに取得する
+Index("ix_western_astrology_statuss_stage", ASTROLOGY_STAGE)
+event.listen(Base.metadata, "before_create", DDL(ASTROLOGY_STAGE_FUNCTION_DDL))
+
+# 処理段階の変化を NOTIFY するトリガーを、テーブル作成時に合わせて作成する
+for _ddl in STATE_NOTIFY_DDL:
+    event.listen(WesternAstrologyStatusOrm.__table__, "after_create", DDL(_ddl))
+
+
+# Grafanaのダッシュボード用の集計テーブル。トリガーで更新する（app/infrastructure/pipeline_rollup.py）
+# アーカイブでパーティションを削除しても、配信セッションの集計は残る
+class PipelineStageCountOrm(Base, TableNameMixin):
+    session_id: Mapped[str] = mapped_column(primary_key=True)
+    # 処理段階（astrology_stage() の値）。コメント数は "message"
+    stage: Mapped[str] = mapped_column(primary_key=True)
+    # 現在その段階にある件数
+    count: Mapped[int] = mapped_column(BigInteger, default=0, nullable=False)
+
+
+class PipelineStageThroughputOrm(Base, TableNameMixin):
+    session_id: Mapped[str] = mapped_column(primary_key=True)
+    # 1分単位に切り捨てた時刻
+    minute: Mapped[datetime] = mapped_column(TIMESTAMP(timezone=True), primary_key=True)
+    stage: Mapped[str] = mapped_column(primary_key=True)
+    # その1分間にその段階に入った件数
+    count: Mapped[int] = mapped_column(BigInteger, default=0, nullable=False)
+
+
+# コメントから抽出した占いに必要な情報のキャッシュ。配信セッションをまたいで使うので、パーティションを分けない
+class InfoExtractionCacheOrm(Base, TimestampMixin, TableNameMixin):
+    # 正規化したコメントとプロンプトのバージョンのハッシュ（app/application/extraction_cache.py）
+    key: Mapped[str] = mapped_column(Text, primary_key=True)
+    # InfoForAstrologyEntity のJSON
+    info: Mapped[dict] = mapped_column(JSONB, nullable=False)
+
+    __table_args__ = (
+        # 期限切れと件数の上限を超えたものを、古い順に削除するため
+        Index("ix_info_extraction_caches_updated_at", "updated_at"),
+    )
+
+
+# 集計のトリガーは、集計テーブルを含む全てのテーブルを作成した後に作成する
+for _ddl in PIPELINE_ROLLUP_DDL:
+    event.listen(Base.metadata, "after_create", DDL(_ddl))
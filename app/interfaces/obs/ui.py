@@ -2,8 +2,19 @@ import datetime
 
 from pydantic import BaseModel
 
+from app.application.chart_service import ChartService, format_chart_service_stats
+from app.application.extraction_tiers import (
+    extraction_tier_metrics,
+    format_extraction_tier_stats,
+)
 from app.domain.westernastrology import WesternAstrologyStateEntity
 from app.domain.youtube.live import LiveChatMessageEntity
+from app.infrastructure.db_common import get_pool_stats
+from app.infrastructure.message_cache import format_message_cache_stats
+from app.infrastructure.pool_metrics import format_pool_stats
+from app.infrastructure.repositoriesCachedImpl import (
+    CachedYoutubeLiveChatMessageRepositoryImpl,
+)
 from app.interfaces.gradio_app.constract_html import h2_tag
 
 
@@ -12,6 +23,38 @@ class AstrologyData(BaseModel):
     state: WesternAstrologyStateEntity
 
 
+# 前回の取得より前に開始し、後からコミットされた更新を取りこぼさないように、少し遡って取得する
+DELTA_FETCH_OVERLAP = datetime.timedelta(seconds=10)
+
+
+def get_delta_cursor(data_list: list[AstrologyData]) -> datetime.datetime | None:
+    """
+    保持しているデータから、次に差分を取得する時の基準時刻を返す。データがない場合は None（全件取得）
+    """
+    updated_at_list = [d.state.updated_at for d in data_list if d.state.updated_at]
+    if not updated_at_list:
+        return None
+    return max(updated_at_list) - DELTA_FETCH_OVERLAP
+
+
+def merge_astrology_data(
+    data_list: list[AstrologyData],
+    new_data_list: list[AstrologyData],
+    removed_message_ids: list[str] | None = None,
+) -> list[AstrologyData]:
+    """
+    保持しているデータに差分を反映する。同じメッセージのデータは新しい方で置き換え、
+    removed_message_ids のデータ（占い対象外になったものなど）は取り除く。
+    """
+    merged = {d.state.message_id: d for d in data_list}
+    for message_id in removed_message_ids or []:
+        merged.pop(message_id, None)
+    for data in new_data_list:
+        merged[data.state.message_id] = data
+    # 全件取得した時と同じく、作成順に並べる
+    return sorted(merged.values(), key=lambda d: d.state.created_at)
+
+
 class LatestGlobalStateView(BaseModel):
     """
     最新の画面表示用データを保持するオブジェクト
@@ -79,6 +122,52 @@ def get_play_button_name(data: AstrologyData | None):
     return btn_name
 
 
+# コメントの検索結果の表の列
+SEARCH_RESULT_HEADERS = ["時刻", "投稿者", "コメント", "ID"]
+
+
+def get_search_rows(messages: list[LiveChatMessageEntity]) -> list[list[str]]:
+    """
+    コメントの検索結果を、SEARCH_RESULT_HEADERS の列の表にする
+    """
+    rows = []
+    for message in messages:
+        snippet = message.snippet
+        author = message.authorDetails
+        rows.append(
+            [
+                (
+                    get_jp_time(snippet.publishedAt)
+                    if snippet and snippet.publishedAt
+                    else ""
+                ),
+                (author.displayName if author else None) or "",
+                (snippet.displayMessage if snippet else None) or "",
+                message.id or "",
+            ]
+        )
+    return rows
+
+
+def get_connection_stats_markdown(
+    message_repo: CachedYoutubeLiveChatMessageRepositoryImpl,
+    chart_service: ChartService | None,
+) -> str:
+    """
+    DBのコネクションの使用状況と、メッセージのキャッシュ・情報の抽出・出生図の計算の状況を表示する Markdown を返す。
+    """
+    return "\n\n".join(
+        [
+            format_pool_stats(get_pool_stats()),
+            format_message_cache_stats(message_repo.stats()),
+            format_extraction_tier_stats(extraction_tier_metrics.stats()),
+            format_chart_service_stats(
+                chart_service.stats() if chart_service is not None else None
+            ),
+        ]
+    )
+
+
 def as_code_block(text: str) -> str:
     return "```\n" + text + "\n```"
 
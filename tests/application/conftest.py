@@ -0,0 +1,27 @@
+from pathlib import Path
+
+import flatlib
+import pytest
+
+from app.application import natal_chart
+
+
+@pytest.fixture(autouse=True)
+def ephemeris_dir(monkeypatch) -> Path:
+    """
+    天体暦のファイルをダウンロードしていない（setup_init.py を実行していない）環境では、
+    flatlib に同梱されている同じファイルを使う
+    """
+    if not any(natal_chart.EPHEMERIS_DIR.glob("*.se1")):
+        monkeypatch.setattr(
+            natal_chart, "EPHEMERIS_DIR", Path(flatlib.PATH_RES) / "swefiles"
+        )
+    return natal_chart.EPHEMERIS_DIR
+
+
+@pytest.fixture(autouse=True)
+def no_chart_workers(monkeypatch) -> None:
+    """
+    ワーカープロセスを使うテスト以外では、出生図を呼び出したスレッドで計算する
+    """
+    monkeypatch.setattr(natal_chart, "chart_service", None)
@@ -0,0 +1,52 @@
+import random
+
+import pytest
+from flatlib.datetime import Datetime
+
+from app.application import natal_chart
+from app.application.chart_engine import (
+    BirthRecord,
+    compute_natal_charts,
+    julian_day,
+)
+from app.application.natal_chart import compute_natal_chart
+
+
+def _records(count: int) -> list[BirthRecord]:
+    rng = random.Random(0)
+    return [
+        BirthRecord(
+            f"{rng.randint(1930, 2020)}/{rng.randint(1, 12):02}/{rng.randint(1, 28):02}",
+            f"{rng.randint(0, 23):02}:{rng.randint(0, 59):02}",
+            rng.uniform(24.0, 46.0),
+            rng.uniform(122.0, 146.0),
+            rng.choice(["+00:00", "+09:00", "-03:30"]),
+        )
+        for _ in range(count)
+    ]
+
+
+@pytest.mark.parametrize(
+    "birthday, birth_time, utc_offset",
+    [("1990/01/01", "12:00", "+00:00"), ("1600/03/01", "23:59", "-03:30")],
+)
+def test_julian_day_matches_flatlib(birthday, birth_time, utc_offset):
+    assert julian_day(birthday, birth_time, utc_offset) == (
+        Datetime(birthday, birth_time, utc_offset).jd
+    )
+
+
+def test_compute_natal_charts_matches_flatlib():
+    records = _records(200)
+
+    charts = compute_natal_charts(records, natal_chart.EPHEMERIS_DIR)
+
+    assert charts == [compute_natal_chart(*record) for record in records]
+
+
+def test_compute_natal_charts_computes_same_record_once():
+    record = BirthRecord("1990/01/01", "12:00", 35.68, 139.65, "+00:00")
+
+    first, second = compute_natal_charts([record, record], natal_chart.EPHEMERIS_DIR)
+
+    assert first is second
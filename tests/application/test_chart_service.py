@@ -0,0 +1,105 @@
+import os
+
+import pytest
+
+from app.application import natal_chart
+from app.application.chart_engine import BirthRecord, compute_natal_charts
+from app.application.chart_service import ChartService
+from app.application.natal_chart import create_chart_service, get_natal_charts
+
+RECORDS = [
+    BirthRecord(f"19{year}/0{month}/15", "12:00", 35.68, 139.65, "+09:00")
+    for year in range(70, 74)
+    for month in range(1, 3)
+]
+
+
+@pytest.fixture
+def chart_service(ephemeris_dir):
+    service = create_chart_service(workers=2, batch_size=3)
+    service.start()
+    yield service
+    service.shutdown()
+
+
+def test_compute_splits_records_into_batches_in_order(chart_service, ephemeris_dir):
+    charts = chart_service.compute(RECORDS)
+
+    assert charts == compute_natal_charts(RECORDS, ephemeris_dir)
+    stats = chart_service.stats()
+    assert stats.workers == 2
+    assert stats.completed_batches == 3
+    assert stats.completed_records == len(RECORDS)
+    assert stats.pending_batches == stats.pending_records == 0
+    assert 0 < stats.max_pending_records <= len(RECORDS)
+    assert stats.failed_batches == 0
+
+
+def test_failed_batch_is_counted(chart_service):
+    future = chart_service.submit([BirthRecord("1990/13/45", "12:00", 0, 0, "x")])
+
+    with pytest.raises(ValueError):
+        future.result()
+    assert chart_service.stats().failed_batches == 1
+    assert chart_service.stats().pending_records == 0
+
+
+def test_get_natal_charts_computes_missing_records_in_workers(
+    monkeypatch, chart_service, ephemeris_dir
+):
+    monkeypatch.setattr(natal_chart, "chart_service", chart_service)
+    natal_chart._natal_chart_cache.clear()
+
+    charts = get_natal_charts(RECORDS[:2] + RECORDS[:1])
+
+    assert charts == [
+        compute_natal_charts([r], ephemeris_dir)[0] for r in RECORDS[:2] + RECORDS[:1]
+    ]
+    assert chart_service.stats().completed_records == 2
+    natal_chart._natal_chart_cache.clear()
+
+
+def test_chart_service_requires_workers():
+    with pytest.raises(ValueError):
+        ChartService(0, 10, compute_natal_charts, print)
+
+
+def _exit_worker(records: list[BirthRecord]) -> list:
+    # 計算中にワーカーが異常終了した場合
+    os._exit(1)
+
+
+def test_computes_in_calling_thread_before_start(ephemeris_dir):
+    service = create_chart_service(workers=2, batch_size=3)
+
+    charts = service.compute(RECORDS)
+
+    assert charts == compute_natal_charts(RECORDS, ephemeris_dir)
+    stats = service.stats()
+    assert stats.in_thread_batches == 3
+    assert stats.completed_batches == 0
+
+
+def test_batches_in_flight_are_computed_again_when_worker_dies(ephemeris_dir):
+    service = ChartService(
+        2,
+        3,
+        _exit_worker,
+        os.getpid,
+        fallback=lambda records: compute_natal_charts(records, ephemeris_dir),
+    )
+    service.start()
+    try:
+        charts = service.compute(RECORDS)
+    finally:
+        service.shutdown()
+
+    assert charts == compute_natal_charts(RECORDS, ephemeris_dir)
+    stats = service.stats()
+    assert stats.broken
+    assert stats.in_thread_batches == 3
+    # 異常終了した後は、ワーカーを起動し直さない
+    service.start()
+    service.compute(RECORDS[:1])
+    assert service.stats().in_thread_batches == 4
+    assert service.stats().completed_batches == 0
@@ -0,0 +1,95 @@
+import numpy as np
+import pytest
+import swisseph as swe
+
+from app.application import natal_chart
+from app.application.chart_engine import (
+    SWE_OBJECTS,
+    BirthRecord,
+    compute_natal_charts,
+    julian_day,
+)
+from app.application.ephemeris_table import EphemerisTable, build_ephemeris_table
+
+RECORDS = [
+    BirthRecord("1999/01/01", "00:00", 35.68, 139.65, "+00:00"),
+    BirthRecord("1999/07/15", "12:34", 43.06, 141.35, "+09:00"),
+    BirthRecord("2000/02/29", "23:59", 26.21, 127.68, "-03:30"),
+    BirthRecord("2000/12/31", "18:00", 34.69, 135.50, "+00:00"),
+]
+
+
+@pytest.fixture
+def table(tmp_path, ephemeris_dir) -> EphemerisTable:
+    path = tmp_path / "ephemeris_table.bin"
+    build_ephemeris_table(1999, 2000, ephemeris_dir, path, samples=2000)
+    return EphemerisTable(path)
+
+
+def test_build_ephemeris_table_records_small_max_errors(table):
+    max_errors = table.max_errors
+
+    assert list(max_errors) == list(SWE_OBJECTS)
+    assert max_errors["Moon"] < 0.01
+    assert all(0 < error < 0.01 for error in max_errors.values())
+
+
+def test_longitudes_are_within_max_errors(table, ephemeris_dir):
+    swe.set_ephe_path(str(ephemeris_dir))
+    jds = np.linspace(table.start_jd, table.end_jd - 0.01, 50)
+
+    lons = table.longitudes(jds)
+
+    for i, jd in enumerate(jds):
+        for j, (obj_id, swe_object) in enumerate(SWE_OBJECTS.items()):
+            expected = swe.calc_ut(jd, swe_object)[0][0]
+            error = abs((lons[i, j] - expected + 180) % 360 - 180)
+            assert error <= table.max_errors[obj_id] + 1e-6
+
+
+def test_compute_natal_charts_matches_swisseph_at_sign_level(table, ephemeris_dir):
+    charts = table.compute_natal_charts(RECORDS)
+
+    for chart, expected in zip(charts, compute_natal_charts(RECORDS, ephemeris_dir)):
+        for obj_id, position in chart.positions.items():
+            assert position.sign == expected.positions[obj_id].sign
+            assert position.house == expected.positions[obj_id].house
+            assert position.degree == pytest.approx(
+                expected.positions[obj_id].degree, abs=0.02
+            )
+
+
+def test_table_covers_only_its_year_range(table):
+    assert table.covers(julian_day("1999/01/01", "00:00", "+00:00"))
+    assert not table.covers(julian_day("1998/12/31", "23:59", "+00:00"))
+    assert not table.covers(julian_day("2001/01/01", "00:00", "+00:00"))
+    with pytest.raises(ValueError):
+        table.compute_natal_charts([BirthRecord("1990/01/01", "12:00", 0, 0, "+00:00")])
+
+
+def test_get_natal_charts_uses_table_in_range_only(monkeypatch, table):
+    monkeypatch.setattr(natal_chart, "_ephemeris_table", table)
+    natal_chart._natal_chart_cache.clear()
+    outside = BirthRecord("1990/01/01", "12:00", 35.68, 139.65, "+00:00")
+
+    charts = natal_chart.get_natal_charts([RECORDS[1], outside])
+
+    assert charts[0] == table.compute_natal_charts([RECORDS[1]])[0]
+    assert charts[1] == natal_chart.compute_natal_chart(*outside)
+    natal_chart._natal_chart_cache.clear()
+
+
+def test_load_ephemeris_table_warns_once_without_file(tmp_path, caplog):
+    path = tmp_path / "missing.bin"
+
+    assert natal_chart._load_ephemeris_table(False, path) is None
+    assert natal_chart._load_ephemeris_table(True, path) is None
+    assert [r.levelname for r in caplog.records] == ["WARNING"]
+    assert str(path) in caplog.records[0].getMessage()
+
+
+def test_load_ephemeris_table_with_file(table):
+    loaded = natal_chart._load_ephemeris_table(True, table.path)
+
+    assert loaded is not None
+    assert loaded.covers(julian_day("1999/07/15", "12:34", "+09:00"))
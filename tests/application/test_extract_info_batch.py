@@ -0,0 +1,64 @@
+import pytest
+
+pytest.importorskip("google.generativeai")
+
+from app.application import westernastrology  # noqa: E402
+from app.application.westernastrology import (  # noqa: E402
+    extract_info_for_astrology_batch,
+)
+from app.domain.westernastrology import InfoForAstrologyEntity  # noqa: E402
+from app.infrastructure.repositoriesInMemoryImpl import (  # noqa: E402
+    InMemoryInfoExtractionCacheRepositoryImpl,
+)
+
+# どのモデルでも抽出できないコメント
+_FAILING = "失敗するコメント"
+
+
+class _Extractor:
+    """
+    _FAILING 以外のコメントから同じ情報を抽出し、抽出したコメントを記録する
+    """
+
+    def __init__(self):
+        self.inputs: list[str] = []
+
+    def __call__(self, model_name: str, names_and_inputs):
+        self.inputs += [_input for _, _input in names_and_inputs]
+        return {
+            i: InfoForAstrologyEntity(
+                name=name, birthday="1990/01/01", birth_time="12:00", birthplace="東京"
+            )
+            for i, (name, _input) in enumerate(names_and_inputs)
+            if _input != _FAILING
+        }
+
+
+@pytest.fixture
+def extractor(monkeypatch):
+    extractor = _Extractor()
+    monkeypatch.setattr(westernastrology, "_extract_info_with_model", extractor)
+    return extractor
+
+
+def test_returns_none_for_failed_item(extractor):
+    infos = extract_info_for_astrology_batch(
+        [("たろう", "占い依頼"), ("はなこ", _FAILING)]
+    )
+
+    assert infos[0].name == "たろう"
+    assert infos[1] is None
+
+
+def test_caches_only_extracted_items(extractor):
+    cache = InMemoryInfoExtractionCacheRepositoryImpl(ttl_seconds=60, max_size=10)
+    names_and_inputs = [("たろう", "占い依頼"), ("はなこ", _FAILING)]
+
+    first = extract_info_for_astrology_batch(names_and_inputs, cache=cache)
+    extractor.inputs.clear()
+    second = extract_info_for_astrology_batch(names_and_inputs, cache=cache)
+
+    assert first[0] == second[0]
+    assert first[1] is None and second[1] is None
+    # 抽出できたコメントはキャッシュから返し、抽出できなかったコメントだけを抽出し直す
+    assert set(extractor.inputs) == {_FAILING}
@@ -0,0 +1,28 @@
+from app.application.extraction_cache import extraction_cache_key, normalize_comment
+
+
+def test_normalize_comment_ignores_width_case_and_spaces():
+    assert (
+        normalize_comment("  誕生日：１９９０／０１／０１\n　Tokyo  生まれ ")
+        == "誕生日:1990/01/01 tokyo 生まれ"
+    )
+
+
+def test_extraction_cache_key_is_same_for_same_normalized_comment():
+    assert extraction_cache_key("Ｔｏｋｙｏ　1990/01/01", "1") == extraction_cache_key(
+        "tokyo 1990/01/01", "1"
+    )
+    assert extraction_cache_key("tokyo 1990/01/01", "1") != extraction_cache_key(
+        "tokyo 1990/01/02", "1"
+    )
+
+
+def test_extraction_cache_key_changes_with_prompt_version():
+    assert extraction_cache_key("tokyo", "1") != extraction_cache_key("tokyo", "2")
+
+
+def test_extraction_cache_key_changes_with_models_and_acceptance():
+    key = extraction_cache_key("tokyo", "1", ["small", "large"], "1")
+    assert key != extraction_cache_key("tokyo", "1", ["small"], "1")
+    assert key != extraction_cache_key("tokyo", "1", ["large", "small"], "1")
+    assert key != extraction_cache_key("tokyo", "1", ["small", "large"], "2")
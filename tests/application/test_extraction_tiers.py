@@ -0,0 +1,108 @@
+import pytest
+
+from app.application.extraction_tiers import ExtractionTierMetrics, extract_in_tiers
+from app.domain.westernastrology import InfoForAstrologyEntity
+
+MODELS = ["small", "large"]
+
+
+def _info(birthday: str) -> InfoForAstrologyEntity:
+    return InfoForAstrologyEntity(
+        name="たろう", birthday=birthday, birth_time="", birthplace="", worries=""
+    )
+
+
+class _Extractor:
+    """
+    モデルの名前 -> (コメント -> 抽出した情報) の通りに抽出する。表にないコメントは結果に含めない
+    """
+
+    def __init__(self, tables: dict[str, dict[str, InfoForAstrologyEntity]]):
+        self.tables = tables
+        self.calls: list[tuple[str, list[str]]] = []
+
+    def __call__(self, model_name: str, items: list[str]):
+        self.calls.append((model_name, items))
+        table = self.tables[model_name]
+        return {i: table[item] for i, item in enumerate(items) if item in table}
+
+
+def test_escalates_only_unsatisfied_items():
+    extract = _Extractor(
+        {
+            "small": {"a": _info("1990/01/01"), "b": _info("")},
+            "large": {"b": _info("1990/01/02"), "c": _info("1990/01/03")},
+        }
+    )
+    metrics = ExtractionTierMetrics()
+
+    infos = extract_in_tiers(["a", "b", "c"], MODELS, extract, metrics=metrics)
+
+    assert infos == [_info("1990/01/01"), _info("1990/01/02"), _info("1990/01/03")]
+    assert extract.calls == [("small", ["a", "b", "c"]), ("large", ["b", "c"])]
+    small, large = metrics.stats()
+    assert (small.attempted, small.accepted, small.hit_rate) == (3, 1, 1 / 3)
+    assert (large.attempted, large.accepted, large.calls) == (2, 2, 1)
+
+
+def test_last_tier_result_is_used_even_if_unsatisfied():
+    extract = _Extractor({"small": {}, "large": {"a": _info("")}})
+
+    infos = extract_in_tiers(["a"], MODELS, extract, metrics=ExtractionTierMetrics())
+
+    assert infos == [_info("")]
+
+
+def test_does_not_call_next_tier_when_all_satisfied():
+    extract = _Extractor({"small": {"a": _info("1990/01/01")}, "large": {}})
+
+    extract_in_tiers(["a"], MODELS, extract, metrics=ExtractionTierMetrics())
+
+    assert [model_name for model_name, _ in extract.calls] == ["small"]
+
+
+def test_escalates_when_tier_fails():
+    def extract(model_name: str, items: list[str]):
+        if model_name == "small":
+            raise ValueError("invalid output")
+        return {0: _info("1990/01/01")}
+
+    assert extract_in_tiers(
+        ["a"], MODELS, extract, metrics=ExtractionTierMetrics()
+    ) == [_info("1990/01/01")]
+
+
+def test_returns_none_for_item_without_result_in_any_tier():
+    # 1件だけどのモデルでも抽出できなくても、同じバッチの他のコメントの結果は返す
+    extract = _Extractor(
+        {
+            "small": {"a": _info("1990/01/01")},
+            "large": {"c": _info("1990/01/03")},
+        }
+    )
+
+    infos = extract_in_tiers(
+        ["a", "b", "c"], MODELS, extract, metrics=ExtractionTierMetrics()
+    )
+
+    assert infos == [_info("1990/01/01"), None, _info("1990/01/03")]
+
+
+def test_returns_none_when_last_tier_fails():
+    def extract(model_name: str, items: list[str]):
+        if model_name == "small":
+            return {0: _info("1990/01/01")}
+        raise ValueError("invalid output")
+
+    assert extract_in_tiers(
+        ["a", "b"], MODELS, extract, metrics=ExtractionTierMetrics()
+    ) == [_info("1990/01/01"), None]
+
+
+def test_raises_when_call_fails():
+    # レート制限などの呼び出しの失敗は、抽出できなかったコメントと区別して呼び出し元に伝える
+    def extract(model_name: str, items: list[str]):
+        raise ConnectionError("429 Resource has been exhausted")
+
+    with pytest.raises(ConnectionError):
+        extract_in_tiers(["a", "b"], MODELS, extract, metrics=ExtractionTierMetrics())
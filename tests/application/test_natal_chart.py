@@ -0,0 +1,58 @@
+from app.application import natal_chart
+from app.application.chart_engine import BirthRecord, compute_natal_charts
+from app.application.natal_chart import (
+    compute_natal_chart,
+    get_natal_chart,
+    get_natal_charts,
+)
+
+TOKYO = (35.6764225, 139.650027)
+
+
+def test_compute_natal_chart_places_all_objects_in_signs_and_houses():
+    chart = compute_natal_chart("1990/01/01", "12:00", *TOKYO)
+
+    sun = chart.positions["Sun"]
+    assert sun.sign == "Capricorn"
+    assert 270 <= sun.degree < 300
+    assert all(1 <= p.house <= 12 for p in chart.positions.values())
+
+
+def test_get_natal_chart_computes_once_per_key(monkeypatch):
+    calls = []
+
+    def compute(records, ephemeris_dir):
+        calls.extend(records)
+        return compute_natal_charts(records, ephemeris_dir)
+
+    monkeypatch.setattr(natal_chart, "compute_natal_charts", compute)
+    natal_chart._natal_chart_cache.clear()
+
+    first = get_natal_chart("1990/01/01", "12:00", *TOKYO)
+    # 返したものを変更しても、キャッシュには影響しない
+    first.positions.clear()
+    second = get_natal_chart("1990/01/01", "12:00", *TOKYO)
+    get_natal_chart("1990/01/02", "12:00", *TOKYO)
+
+    assert len(calls) == 2
+    assert second == compute_natal_chart("1990/01/01", "12:00", *TOKYO)
+
+
+def test_get_natal_charts_computes_only_missing_records(monkeypatch):
+    calls = []
+
+    def compute(records, ephemeris_dir):
+        calls.append(records)
+        return compute_natal_charts(records, ephemeris_dir)
+
+    monkeypatch.setattr(natal_chart, "compute_natal_charts", compute)
+    natal_chart._natal_chart_cache.clear()
+    cached = BirthRecord("1990/01/01", "12:00", *TOKYO, "+00:00")
+    missing = BirthRecord("2000/06/15", "06:30", *TOKYO, "+00:00")
+    get_natal_charts([cached])
+
+    charts = get_natal_charts([missing, cached, missing])
+
+    assert calls == [[cached], [missing]]
+    assert charts[0] == charts[2] == compute_natal_chart(*missing)
+    assert charts[1] == compute_natal_chart(*cached)
@@ -0,0 +1,90 @@
+import pytest
+
+pytest.importorskip("google.generativeai")
+
+from app.application import westernastrology  # noqa: E402
+from app.application.generate_result import prepare_for_astrology  # noqa: E402
+from app.core.const import get_dummy_live_chat_message  # noqa: E402
+from app.domain.westernastrology import (  # noqa: E402
+    AstrologyStage,
+    InfoForAstrologyEntity,
+    WesternAstrologyStateEntity,
+)
+from app.domain.youtube.live import LiveChatMessageEntity  # noqa: E402
+from app.infrastructure.repositoriesInMemoryImpl import (  # noqa: E402
+    InMemoryWesternAstrologyStateRepositoryImpl,
+    InMemoryYoutubeLiveChatMessageRepositoryImpl,
+)
+
+# どのモデルでも抽出できないコメント
+_FAILING = "失敗するコメント"
+
+
+def _extract_info_with_model(model_name: str, names_and_inputs):
+    return {
+        i: InfoForAstrologyEntity(
+            name=name, birthday="1990/01/01", birth_time="12:00", birthplace="東京"
+        )
+        for i, (name, _input) in enumerate(names_and_inputs)
+        if _input != _FAILING
+    }
+
+
+def _setup(texts: list[str]) -> InMemoryWesternAstrologyStateRepositoryImpl:
+    message_repo = InMemoryYoutubeLiveChatMessageRepositoryImpl()
+    state_repo = InMemoryWesternAstrologyStateRepositoryImpl(message_repo)
+    for i, text in enumerate(texts):
+        message = get_dummy_live_chat_message(f"m{i}")
+        message["snippet"]["displayMessage"] = text
+        message_repo.save([LiveChatMessageEntity(**message)])
+        state_repo.save(
+            [WesternAstrologyStateEntity.get_initial(f"m{i}", is_target=True)]
+        )
+    return state_repo
+
+
+def test_marks_only_failed_item_not_target(monkeypatch):
+    monkeypatch.setattr(
+        westernastrology, "_extract_info_with_model", _extract_info_with_model
+    )
+    state_repo = _setup(["占い依頼", _FAILING, "占い依頼"])
+
+    assert prepare_for_astrology(state_repo) == 3
+
+    stages = {
+        s.message_id: s.stage
+        for s in state_repo.get_prepared_target_with_no_result(limit=10)
+    }
+    assert stages == {"m0": AstrologyStage.NO_RESULT, "m2": AstrologyStage.NO_RESULT}
+    # 抽出できなかったコメントは占い対象から外れ、次の呼び出しで再び取得されない
+    assert state_repo.get_not_prepared_target(limit=10) == []
+    assert prepare_for_astrology(state_repo) == 0
+
+
+def test_keeps_states_when_llm_call_fails(monkeypatch):
+    def get_structured_output(**kwargs):
+        raise ConnectionError("429 Resource has been exhausted")
+
+    monkeypatch.setattr(
+        westernastrology, "get_structured_output", get_structured_output
+    )
+    state_repo = _setup(["占い依頼", "占い依頼"])
+
+    with pytest.raises(ConnectionError):
+        prepare_for_astrology(state_repo)
+
+    # 占い対象から外さずに、次の呼び出しで抽出し直す
+    assert len(state_repo.get_not_prepared_target(limit=10)) == 2
+
+
+def test_marks_not_target_when_output_is_unusable(monkeypatch):
+    def get_structured_output(**kwargs):
+        raise ValueError("invalid output")
+
+    monkeypatch.setattr(
+        westernastrology, "get_structured_output", get_structured_output
+    )
+    state_repo = _setup(["占い依頼"])
+
+    assert prepare_for_astrology(state_repo) == 1
+    assert state_repo.get_not_prepared_target(limit=10) == []
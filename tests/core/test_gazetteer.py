@@ -0,0 +1,129 @@
+import csv
+
+import pytest
+
+from app.core.gazetteer import (
+    GAZETTEER_PATH,
+    Gazetteer,
+    Place,
+    PlaceKind,
+    build_gazetteer,
+    lookup_place,
+    place_keys,
+)
+
+MIYAGI = Place(PlaceKind.PREFECTURE, 38.0, 141.0)
+SENDAI = Place(PlaceKind.MUNICIPALITY, 38.2, 140.8)
+AOBA = Place(PlaceKind.WARD, 38.3, 140.7)
+TSU = Place(PlaceKind.MUNICIPALITY, 34.7, 136.5)
+
+
+@pytest.fixture
+def gazetteer(tmp_path):
+    path = tmp_path / "gazetteer.idx"
+    places = [
+        (key, place)
+        for name, place in [
+            ("宮城県", MIYAGI),
+            ("仙台市", SENDAI),
+            ("仙台市青葉区", AOBA),
+            ("津市", TSU),
+        ]
+        for key in place_keys(name)
+    ]
+    build_gazetteer([*places, ("sendai", SENDAI), ("miyagi", MIYAGI)], path)
+    return Gazetteer(path)
+
+
+@pytest.mark.parametrize(
+    "text, expected",
+    [
+        ("宮城県", MIYAGI),
+        ("宮城", MIYAGI),
+        ("仙台", SENDAI),
+        ("　仙台市 ", SENDAI),
+        ("Sendai", SENDAI),
+        ("ＳＥＮＤＡＩ", SENDAI),
+        ("津", TSU),
+    ],
+)
+def test_lookup_normalized_name(gazetteer, text, expected):
+    assert gazetteer.lookup(text) == expected
+
+
+@pytest.mark.parametrize(
+    "text, expected",
+    [
+        ("宮城県仙台市", SENDAI),
+        ("宮城県仙台", SENDAI),
+        ("宮城県仙台市青葉区", AOBA),
+        # 索引にない区は、その前の地名を使う
+        ("宮城県仙台市泉区", SENDAI),
+        ("Sendai City, Miyagi", SENDAI),
+        ("Miyagi Prefecture", MIYAGI),
+    ],
+)
+def test_lookup_most_specific_place_in_address(gazetteer, text, expected):
+    assert gazetteer.lookup(text) == expected
+
+
+@pytest.mark.parametrize("text", ["", "津軽", "New York", "宮城野"])
+def test_lookup_unknown_place(gazetteer, text):
+    assert gazetteer.lookup(text) is None
+
+
+def test_bundled_gazetteer_has_all_bundled_places():
+    # 同梱の索引は、同梱のCSVから tools/build_gazetteer.py で作成したものであること
+    with open(GAZETTEER_PATH.parent / "prefecture.csv", encoding="utf-8") as f:
+        rows = [(row["prefecture"], row) for row in csv.DictReader(f)]
+    with open(GAZETTEER_PATH.parent / "city.csv", encoding="utf-8") as f:
+        # 同じ名前の市区町村があるので、都道府県名を付けて引く
+        rows += [(row["prefecture"] + row["city"], row) for row in csv.DictReader(f)]
+
+    for name, row in rows:
+        place = lookup_place(name)
+        assert place is not None, name
+        assert (place.latitude, place.longitude) == (
+            float(row["latitude"]),
+            float(row["longitude"]),
+        )
+
+
+def _bundled_city(prefecture: str, city: str) -> Place:
+    with open(GAZETTEER_PATH.parent / "city.csv", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            if (row["prefecture"], row["city"]) == (prefecture, city):
+                return Place(
+                    PlaceKind.WARD if city.endswith("区") else PlaceKind.MUNICIPALITY,
+                    float(row["latitude"]),
+                    float(row["longitude"]),
+                )
+    raise KeyError(prefecture + city)
+
+
+@pytest.mark.parametrize(
+    "text, prefecture, city",
+    [
+        # 同じ名前の市区町村は、都道府県名・市名を付けると区別できる
+        ("東京都府中市", "東京都", "府中市"),
+        ("広島県府中市", "広島県", "府中市"),
+        ("広島県府中市府川町", "広島県", "府中市"),
+        ("東京都北区", "東京都", "北区"),
+        ("大阪市北区", "大阪府", "大阪市北区"),
+        ("京都府京都市北区上賀茂", "京都府", "京都市北区"),
+        ("福島県伊達市", "福島県", "伊達市"),
+        # 郡名を付けた町村
+        ("静岡県賀茂郡東伊豆町", "静岡県", "東伊豆町"),
+        # 都道府県名を付けない場合は、CSVの先のもの
+        ("府中市", "東京都", "府中市"),
+        ("北区", "東京都", "北区"),
+    ],
+)
+def test_bundled_gazetteer_distinguishes_same_names(text, prefecture, city):
+    assert lookup_place(text) == _bundled_city(prefecture, city)
+
+
+def test_bundled_gazetteer_has_every_municipality():
+    # 全国の市区町村（東京23区、政令指定都市とその区を含む）
+    with open(GAZETTEER_PATH.parent / "city.csv", encoding="utf-8") as f:
+        assert sum(1 for _ in csv.DictReader(f)) > 1900
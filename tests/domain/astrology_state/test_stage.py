@@ -0,0 +1,43 @@
+import pytest
+
+from app.domain.westernastrology import (
+    AstrologyStage,
+    InfoForAstrologyEntity,
+    WesternAstrologyStateEntity,
+)
+
+
+def _state(**kwargs) -> WesternAstrologyStateEntity:
+    state = WesternAstrologyStateEntity.get_initial(message_id="id", is_target=True)
+    return state.model_copy(update=kwargs)
+
+
+_INFO = InfoForAstrologyEntity(
+    name="たけし", birthday="1985/06/12", birth_time="10:00", birthplace="大阪"
+)
+
+
+@pytest.mark.parametrize(
+    "state, expected",
+    [
+        (_state(), AstrologyStage.NOT_PREPARED),
+        (_state(required_info=_INFO), AstrologyStage.NO_RESULT),
+        (_state(required_info=_INFO, result="result"), AstrologyStage.NO_VOICE),
+        (
+            _state(required_info=_INFO, result="result", result_voice_path="a.wav"),
+            AstrologyStage.WAITING_PLAY,
+        ),
+        (
+            _state(
+                required_info=_INFO,
+                result="result",
+                result_voice_path="a.wav",
+                is_played=True,
+            ),
+            AstrologyStage.PLAYED,
+        ),
+        (_state(required_info=_INFO, is_target=False), AstrologyStage.EXCLUDED),
+    ],
+)
+def test_stage(state, expected):
+    assert state.stage == expected
@@ -0,0 +1,49 @@
+from app.domain.westernastrology import (
+    AstrologyStage,
+    StateChangeEvent,
+    WaitingCounter,
+)
+
+
+def _event(from_stage, to_stage) -> StateChangeEvent:
+    return StateChangeEvent(message_id="id", from_stage=from_stage, to_stage=to_stage)
+
+
+def test_apply():
+    counter = WaitingCounter()
+    counter.reset(2)
+    counter.apply(
+        [
+            _event(None, AstrologyStage.NOT_PREPARED),  # 新規の占い依頼
+            _event(None, AstrologyStage.EXCLUDED),  # 占い対象外のコメント
+            _event(AstrologyStage.NOT_PREPARED, AstrologyStage.NO_RESULT),
+            _event(AstrologyStage.WAITING_PLAY, AstrologyStage.PLAYED),
+        ]
+    )
+    assert counter.count == 2
+
+
+def test_apply_does_not_go_negative():
+    counter = WaitingCounter()
+    counter.apply([_event(AstrologyStage.WAITING_PLAY, AstrologyStage.PLAYED)])
+    assert counter.count == 0
+
+
+def test_apply_ignores_other_sessions():
+    counter = WaitingCounter()
+    counter.apply(
+        [
+            StateChangeEvent(
+                session_id="current",
+                message_id="id1",
+                to_stage=AstrologyStage.NOT_PREPARED,
+            ),
+            StateChangeEvent(
+                session_id="previous",
+                message_id="id2",
+                to_stage=AstrologyStage.NOT_PREPARED,
+            ),
+        ],
+        session_id="current",
+    )
+    assert counter.count == 1
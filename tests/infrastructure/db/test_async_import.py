@@ -0,0 +1,12 @@
+import subprocess
+import sys
+
+
+def test_db_common_does_not_import_asyncio_extension():
+    # 同期版だけを使う場合は、greenlet・asyncpg がなくても動くように
+    code = (
+        "import sys\n"
+        "import app.infrastructure.db_common\n"
+        "assert 'sqlalchemy.ext.asyncio' not in sys.modules\n"
+    )
+    subprocess.run([sys.executable, "-c", code], check=True)
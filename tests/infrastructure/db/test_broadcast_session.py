@@ -0,0 +1,29 @@
+import pytest
+
+from app.infrastructure.broadcast_session import (
+    create_partition_ddl,
+    validate_session_id,
+)
+
+
+@pytest.mark.parametrize("session_id", ["dQw4w9WgXcQ", "a-b_c", "default"])
+def test_validate_session_id(session_id):
+    assert validate_session_id(session_id) == session_id
+
+
+@pytest.mark.parametrize(
+    "session_id", ["", "a b", "a'; DROP TABLE x; --", "動画", "a" * 33]
+)
+def test_validate_session_id_rejects_invalid(session_id):
+    with pytest.raises(ValueError):
+        validate_session_id(session_id)
+
+
+def test_create_partition_ddl():
+    # 外部キーで参照される側（メッセージ）のパーティションから作成する
+    assert create_partition_ddl("abc-1") == [
+        'CREATE TABLE IF NOT EXISTS "youtube_livechat_messages_abc-1" '
+        "PARTITION OF youtube_livechat_messages FOR VALUES IN ('abc-1')",
+        'CREATE TABLE IF NOT EXISTS "western_astrology_statuss_abc-1" '
+        "PARTITION OF western_astrology_statuss FOR VALUES IN ('abc-1')",
+    ]
@@ -0,0 +1,28 @@
+from app.core.const import get_dummy_live_chat_message
+from app.domain.youtube.live import LiveChatMessageEntity
+from app.infrastructure.queries import to_message_document
+
+
+def test_document_has_no_null_fields():
+    message = LiveChatMessageEntity(**get_dummy_live_chat_message("a"))
+
+    document = to_message_document(message)
+
+    assert "pollDetails" not in document["snippet"]
+    assert "type_" not in document["snippet"]
+    assert document["authorDetails"]["isVerified"] is False
+
+
+def test_document_round_trip():
+    message = LiveChatMessageEntity(**get_dummy_live_chat_message("a"))
+    # 保存前と同じく、一度 model_dump した値から読み込んだものと比べる
+    expected = LiveChatMessageEntity(**message.model_dump())
+
+    assert LiveChatMessageEntity(**to_message_document(message)) == expected
+
+
+def test_minimal_message_round_trip():
+    message = LiveChatMessageEntity(id="a")
+
+    assert to_message_document(message) == {"id": "a"}
+    assert LiveChatMessageEntity(**to_message_document(message)) == message
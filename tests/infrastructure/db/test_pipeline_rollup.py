@@ -0,0 +1,50 @@
+import json
+
+import pytest
+
+from app.core.const import ROOT
+from app.infrastructure.pipeline_rollup import PIPELINE_ROLLUP_DDL
+from app.infrastructure.tables import (
+    WesternAstrologyStatusOrm,
+    YoutubeLivechatMessageOrm,
+)
+
+DASHBOARD = ROOT / "grafana_conf" / "dashboards" / "dashboard.json"
+
+
+def _dashboard_sql() -> dict[str, str]:
+    dashboard = json.loads(DASHBOARD.read_text(encoding="utf-8"))
+    return {
+        target["refId"]: target["rawSql"]
+        for panel in dashboard["panels"]
+        for target in panel["targets"]
+    }
+
+
+@pytest.mark.parametrize(
+    "table, events",
+    [
+        (WesternAstrologyStatusOrm.__tablename__, ["INSERT", "UPDATE", "DELETE"]),
+        (YoutubeLivechatMessageOrm.__tablename__, ["INSERT", "DELETE"]),
+    ],
+)
+def test_rollup_triggers_cover_all_changes(table, events):
+    # 集計がずれないように、行が増減・変化する全てのイベントで集計する
+    triggers = [ddl for ddl in PIPELINE_ROLLUP_DDL if f" ON {table}\n" in ddl]
+    for event in events:
+        assert any(f"AFTER {event} ON {table}" in ddl for ddl in triggers)
+    # まとめて保存・更新した時に1回で集計するように、文単位のトリガーにする
+    assert all("FOR EACH STATEMENT" in ddl for ddl in triggers)
+
+
+@pytest.mark.parametrize("ref_id", ["コメント数", "処理状況", "占い待ち数", "処理件数"])
+def test_dashboard_aggregates_read_rollup_tables(ref_id):
+    sql = _dashboard_sql()[ref_id]
+    assert "pipeline_stage_" in sql
+    assert WesternAstrologyStatusOrm.__tablename__ not in sql
+    assert YoutubeLivechatMessageOrm.__tablename__ not in sql
+
+
+def test_dashboard_detail_table_is_bounded():
+    sql = _dashboard_sql()["A"]
+    assert "LIMIT 100" in sql
@@ -0,0 +1,97 @@
+import threading
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy import exc as sa_exc
+from sqlalchemy import text
+
+from app.infrastructure.pool_metrics import (
+    InstrumentedQueuePool,
+    format_pool_stats,
+    pool_options,
+)
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(
+        f"sqlite:///{tmp_path / 'pool.db'}",
+        poolclass=InstrumentedQueuePool,
+        pool_size=1,
+        max_overflow=0,
+        pool_timeout=0.1,
+    )
+    yield engine
+    engine.dispose()
+
+
+def _run_in_thread(name: str, fn) -> None:
+    thread = threading.Thread(target=fn, name=name)
+    thread.start()
+    thread.join()
+
+
+def test_records_checkouts_per_task(engine):
+    def use():
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+
+    _run_in_thread("voice", use)
+    _run_in_thread("voice", use)
+    _run_in_thread("result", use)
+
+    stats = engine.pool.stats()
+    assert stats.tasks["voice"].checkouts == 2
+    assert stats.tasks["result"].checkouts == 1
+    assert stats.checked_out == 0
+    assert all(task.checked_out == 0 for task in stats.tasks.values())
+    assert stats.oldest_connection_age >= 0
+
+
+def test_records_timeout_and_task_in_use(engine):
+    conn = engine.connect()
+    errors = []
+
+    def wait():
+        try:
+            engine.connect()
+        except sa_exc.TimeoutError as e:
+            errors.append(e)
+
+    _run_in_thread("livechat", wait)
+
+    stats = engine.pool.stats()
+    assert len(errors) == 1
+    assert stats.timeouts == 1
+    assert stats.tasks["livechat"].timeouts == 1
+    assert stats.tasks["livechat"].max_wait >= 0.1
+    assert stats.tasks["MainThread"].checked_out == 1
+    assert "MainThread=1" in engine.pool.status()
+    assert "livechat" in format_pool_stats(stats)
+    conn.close()
+
+
+def test_metrics_survive_dispose(engine):
+    with engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
+    engine.dispose()
+    with engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
+
+    assert engine.pool.stats().tasks["MainThread"].checkouts == 2
+
+
+def test_pool_options():
+    assert pool_options(task_workers=5, ui_workers=3) == {
+        "pool_size": 8,
+        "max_overflow": 4,
+    }
+    assert pool_options(task_workers=1, ui_workers=0)["max_overflow"] == 2
+
+
+def test_pool_options_count_background_workers():
+    # 書き込みを溜めるリポジトリの書き込みのスレッドの分も、コネクションを用意する
+    assert pool_options(task_workers=5, ui_workers=3, background_workers=1) == {
+        "pool_size": 9,
+        "max_overflow": 4,
+    }
@@ -0,0 +1,105 @@
+import json
+from datetime import datetime, timezone
+
+import pytest
+from pydantic import ValidationError
+
+from app.core.const import get_dummy_live_chat_message
+from app.domain.westernastrology import (
+    InfoForAstrologyEntity,
+    NatalChartEntity,
+    PlanetPositionEntity,
+)
+from app.domain.youtube.live import LiveChatMessageEntity
+from app.infrastructure.queries import (
+    message_from_json,
+    state_from_row,
+    to_message_document,
+    to_message_entity,
+    to_state_entity,
+)
+from app.infrastructure.tables import (
+    WesternAstrologyStatusOrm,
+    YoutubeLivechatMessageOrm,
+)
+
+NOW = datetime(2026, 1, 1, 12, 0, tzinfo=timezone.utc)
+
+
+def _state_orm(
+    required_info: dict, natal_chart: dict | None = None
+) -> WesternAstrologyStatusOrm:
+    return WesternAstrologyStatusOrm(
+        session_id="s",
+        message_id="a",
+        is_target=True,
+        required_info=required_info,
+        result="result",
+        result_voice_path="voice.wav",
+        is_played=False,
+        natal_chart=natal_chart,
+        created_at=NOW,
+        updated_at=NOW,
+    )
+
+
+def _row(obj: WesternAstrologyStatusOrm) -> tuple:
+    return (
+        obj.message_id,
+        obj.is_target,
+        obj.required_info,
+        obj.result,
+        obj.result_voice_path,
+        obj.is_played,
+        obj.natal_chart,
+        obj.created_at,
+        obj.updated_at,
+    )
+
+
+def test_state_from_row_equals_validated_entity():
+    info = InfoForAstrologyEntity(
+        name="たろう",
+        birthday="1990/01/01",
+        birth_time="12:00",
+        birthplace="東京都",
+        worries="仕事",
+    )
+    obj = _state_orm(info.model_dump())
+
+    assert state_from_row(_row(obj)) == to_state_entity(obj)
+
+
+def test_state_from_row_reads_natal_chart():
+    chart = NatalChartEntity(
+        positions={
+            "Sun": PlanetPositionEntity(sign="Capricorn", degree=280.5, house=10)
+        }
+    )
+    obj = _state_orm(
+        InfoForAstrologyEntity.get_initial().model_dump(), chart.model_dump()
+    )
+
+    assert state_from_row(_row(obj)).natal_chart == chart
+    assert state_from_row(_row(obj)) == to_state_entity(obj)
+
+
+def test_state_from_row_validates_incomplete_required_info():
+    obj = _state_orm({"name": "たろう"})
+
+    with pytest.raises(ValidationError):
+        state_from_row(_row(obj))
+
+
+def test_state_from_row_ignores_trailing_columns():
+    obj = _state_orm(InfoForAstrologyEntity.get_initial().model_dump())
+
+    assert state_from_row((*_row(obj), "{}")) == to_state_entity(obj)
+
+
+def test_message_from_json_equals_validated_entity():
+    message = LiveChatMessageEntity(**get_dummy_live_chat_message("a"))
+    document = to_message_document(message)
+    obj = YoutubeLivechatMessageOrm(session_id="s", id="a", message=document)
+
+    assert message_from_json(json.dumps(document)) == to_message_entity(obj)
@@ -0,0 +1,43 @@
+# コメントの検索のSQL文が、1〜2文字の部分文字列のインデックスと同じ式で絞り込んでいるかのテスト
+
+from sqlalchemy import func
+from sqlalchemy.dialects import postgresql
+
+from app.infrastructure.queries import search_messages_stmt
+from app.infrastructure.tables import (
+    LIVECHAT_AUTHOR_NAME_NGRAMS,
+    LIVECHAT_DISPLAY_MESSAGE_NGRAMS,
+    YoutubeLivechatMessageOrm,
+)
+
+
+def _sql(clause) -> str:
+    return str(
+        clause.compile(
+            dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}
+        )
+    )
+
+
+def test_indexes_use_the_ngram_expressions():
+    expressions = {
+        index.name: list(index.expressions)
+        for index in YoutubeLivechatMessageOrm.__table__.indexes
+    }
+
+    (author_name,) = expressions["ix_youtube_livechat_messages_author_name_ngram"]
+    (display_message,) = expressions[
+        "ix_youtube_livechat_messages_display_message_ngram"
+    ]
+    assert author_name.compare(LIVECHAT_AUTHOR_NAME_NGRAMS)
+    assert display_message.compare(LIVECHAT_DISPLAY_MESSAGE_NGRAMS)
+
+
+def test_every_term_is_narrowed_by_both_indexes():
+    # 1文字の語も、インデックスで絞り込む
+    sql = _sql(search_messages_stmt("s", "蠍 座", limit=10, offset=0))
+
+    for ngrams in [LIVECHAT_AUTHOR_NAME_NGRAMS, LIVECHAT_DISPLAY_MESSAGE_NGRAMS]:
+        for term in ["蠍", "座"]:
+            condition = ngrams.contains(func.livechat_query_ngrams(term))
+            assert _sql(condition) in sql
@@ -0,0 +1,71 @@
+# 抽出結果のキャッシュのテスト（PostgreSQLを使わない実装が対象）
+
+import pytest
+
+from app.domain.westernastrology import InfoForAstrologyEntity
+from app.infrastructure.repositoriesInMemoryImpl import (
+    InMemoryInfoExtractionCacheRepositoryImpl,
+)
+
+
+class _Clock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def _info(birthday: str) -> InfoForAstrologyEntity:
+    return InfoForAstrologyEntity(
+        name="たろう",
+        birthday=birthday,
+        birth_time="12:00",
+        birthplace="東京都",
+        worries="仕事",
+    )
+
+
+@pytest.fixture
+def clock():
+    return _Clock()
+
+
+def test_get_many_returns_only_saved_keys(clock):
+    cache = InMemoryInfoExtractionCacheRepositoryImpl(10, 10, clock=clock)
+    cache.save({"a": _info("1990/01/01")})
+
+    assert cache.get_many(["a", "b"]) == {"a": _info("1990/01/01")}
+
+
+def test_get_many_returns_copy(clock):
+    cache = InMemoryInfoExtractionCacheRepositoryImpl(10, 10, clock=clock)
+    cache.save({"a": _info("1990/01/01")})
+
+    cache.get_many(["a"])["a"].name = "はなこ"
+
+    assert cache.get_many(["a"])["a"].name == "たろう"
+
+
+def test_expired_info_is_not_returned(clock):
+    cache = InMemoryInfoExtractionCacheRepositoryImpl(10, 10, clock=clock)
+    cache.save({"a": _info("1990/01/01")})
+    clock.now = 5
+    cache.save({"b": _info("1990/01/02")})
+
+    clock.now = 11
+    assert list(cache.get_many(["a", "b"])) == ["b"]
+
+
+def test_save_evicts_least_recently_saved(clock):
+    cache = InMemoryInfoExtractionCacheRepositoryImpl(100, 2, clock=clock)
+    cache.save({"a": _info("1990/01/01"), "b": _info("1990/01/02")})
+    clock.now = 1
+    # 保存し直したものは新しいものとして扱う
+    cache.save({"a": _info("1990/01/03")})
+    cache.save({"c": _info("1990/01/04")})
+
+    assert cache.get_many(["a", "b", "c"]) == {
+        "a": _info("1990/01/03"),
+        "c": _info("1990/01/04"),
+    }
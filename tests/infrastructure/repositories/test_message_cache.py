@@ -0,0 +1,76 @@
+import pytest
+
+from app.core.const import get_dummy_live_chat_message
+from app.domain.youtube.live import LiveChatMessageEntity
+from app.infrastructure.message_cache import LiveChatMessageCache
+from app.infrastructure.repositoriesCachedImpl import (
+    CachedYoutubeLiveChatMessageRepositoryImpl,
+)
+from app.infrastructure.repositoriesInMemoryImpl import (
+    InMemoryYoutubeLiveChatMessageRepositoryImpl,
+)
+
+
+def _message(message_id: str) -> LiveChatMessageEntity:
+    return LiveChatMessageEntity(**get_dummy_live_chat_message(message_id))
+
+
+class _CountingRepo(InMemoryYoutubeLiveChatMessageRepositoryImpl):
+    """
+    取得したメッセージIDを記録する（DBへの問い合わせの代わり）
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.requested: list[list[str]] = []
+
+    def get_by_message_ids(self, message_ids):
+        self.requested.append(list(message_ids))
+        return super().get_by_message_ids(message_ids)
+
+
+def test_saved_messages_are_read_from_cache():
+    inner = _CountingRepo()
+    repo = CachedYoutubeLiveChatMessageRepositoryImpl(inner, max_size=10)
+    repo.save([_message("a"), _message("b")])
+
+    messages = repo.get_by_message_ids(["b", "a", "b"])
+
+    assert [m.id for m in messages] == ["b", "a"]
+    assert inner.requested == []
+    stats = repo.stats()
+    assert (stats.hits, stats.misses, stats.size) == (2, 0, 2)
+
+
+def test_misses_are_read_through_and_cached():
+    inner = _CountingRepo()
+    inner.save([_message("a"), _message("b")])
+    repo = CachedYoutubeLiveChatMessageRepositoryImpl(inner, max_size=10)
+
+    assert [m.id for m in repo.get_by_message_ids(["a", "b", "unknown"])] == ["a", "b"]
+    assert [m.id for m in repo.get_by_message_ids(["a", "b"])] == ["a", "b"]
+
+    # 2回目はキャッシュにないIDだけを問い合わせる（存在しないIDは毎回問い合わせる）
+    assert inner.requested == [["a", "b", "unknown"]]
+    stats = repo.stats()
+    assert (stats.hits, stats.misses) == (2, 3)
+    assert stats.hit_rate == pytest.approx(0.4)
+
+
+def test_least_recently_used_messages_are_evicted():
+    cache = LiveChatMessageCache(max_size=2)
+    cache.put_many([_message("a"), _message("b")])
+    # a を使うと、最も長く使われていないのは b になる
+    cache.get_many(["a"])
+    cache.put_many([_message("c")])
+
+    found, missing = cache.get_many(["a", "b", "c"])
+
+    assert sorted(found) == ["a", "c"]
+    assert missing == ["b"]
+    assert cache.stats().evictions == 1
+
+
+def test_max_size_must_be_positive():
+    with pytest.raises(ValueError):
+        LiveChatMessageCache(max_size=0)
@@ -0,0 +1,65 @@
+# コメントの検索のテスト（PostgreSQLを使わない実装が対象）
+
+import pytest
+
+from app.core.const import get_dummy_live_chat_message
+from app.domain.youtube.live import LiveChatMessageEntity
+from app.infrastructure.repositoriesInMemoryImpl import (
+    InMemoryYoutubeLiveChatMessageRepositoryImpl,
+    InMemoryYoutubeLiveChatMessageSearchRepositoryImpl,
+)
+
+# (ID, 投稿者名, メッセージ) を保存順に並べたもの
+_MESSAGES = [
+    ("m1", "Taro Yamada", "占い依頼です。誕生日：1990/01/01"),
+    ("m2", "はなこ", "こんにちは ok"),
+    ("m3", "Jiro", "okay! 100% 当たりますか"),
+    ("m4", "たろう", "誕生日：2000/05/23 生まれた場所：宮城"),
+]
+
+
+def _message(message_id: str, name: str, text: str) -> LiveChatMessageEntity:
+    message = get_dummy_live_chat_message(message_id)
+    message["authorDetails"]["displayName"] = name
+    message["snippet"]["displayMessage"] = text
+    return LiveChatMessageEntity(**message)
+
+
+@pytest.fixture
+def search_repo():
+    message_repo = InMemoryYoutubeLiveChatMessageRepositoryImpl()
+    for message in _MESSAGES:
+        # 保存順（新しい順の並び）を確かめるため、1件ずつ保存する
+        message_repo.save([_message(*message)])
+    return InMemoryYoutubeLiveChatMessageSearchRepositoryImpl(message_repo)
+
+
+def _ids(messages: list[LiveChatMessageEntity]) -> list[str]:
+    return [m.id for m in messages]
+
+
+def test_search_author_name_and_message_ignoring_case(search_repo):
+    assert _ids(search_repo.search("taro", limit=10)) == ["m1"]
+    assert _ids(search_repo.search("誕生日", limit=10)) == ["m4", "m1"]
+
+
+def test_search_requires_all_terms(search_repo):
+    assert _ids(search_repo.search("誕生日 宮城", limit=10)) == ["m4"]
+    assert search_repo.search("誕生日 はなこ", limit=10) == []
+
+
+def test_search_short_term_matches_substring(search_repo):
+    # 短い語も、空白で区切られていない日本語の中から部分一致で探す
+    assert _ids(search_repo.search("OK", limit=10)) == ["m3", "m2"]
+    assert _ids(search_repo.search("宮城", limit=10)) == ["m4"]
+    assert _ids(search_repo.search("は", limit=10)) == ["m2"]
+
+
+def test_search_treats_wildcards_literally(search_repo):
+    assert _ids(search_repo.search("100%", limit=10)) == ["m3"]
+    assert search_repo.search("_%_", limit=10) == []
+
+
+def test_search_pages_newest_first(search_repo):
+    assert _ids(search_repo.search("", limit=3)) == ["m4", "m3", "m2"]
+    assert _ids(search_repo.search("", limit=3, offset=3)) == ["m1"]
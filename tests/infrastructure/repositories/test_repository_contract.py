@@ -0,0 +1,299 @@
+# リポジトリ実装が共通して満たすべき振る舞いのテスト（PostgreSQLを使わない実装が対象）
+
+import pytest
+
+from app.core.const import get_dummy_live_chat_message
+from app.domain.westernastrology import (
+    InfoForAstrologyEntity,
+    NatalChartEntity,
+    PlanetPositionEntity,
+    WesternAstrologyStateEntity,
+)
+from app.domain.youtube.live import LiveChatMessageEntity
+from app.infrastructure.repositoriesCachedImpl import (
+    CachedYoutubeLiveChatMessageRepositoryImpl,
+)
+from app.infrastructure.repositoriesInMemoryImpl import (
+    InMemoryWesternAstrologyStateRepositoryImpl,
+    InMemoryYoutubeLiveChatMessageRepositoryImpl,
+)
+from app.infrastructure.repositoriesSqliteImpl import (
+    SqliteDatabase,
+    SqliteWesternAstrologyStateRepositoryImpl,
+    SqliteYoutubeLiveChatMessageRepositoryImpl,
+)
+from app.infrastructure.repositoriesWriteBehindImpl import (
+    WriteBehindWesternAstrologyStateRepositoryImpl,
+)
+
+_INFO = InfoForAstrologyEntity(
+    name="たけし", birthday="1985/06/12", birth_time="10:00", birthplace="大阪"
+)
+_CHART = NatalChartEntity(
+    positions={
+        "Sun": PlanetPositionEntity(sign="Gemini", degree=81.23, house=10),
+        "Moon": PlanetPositionEntity(sign="Aries", degree=12.5, house=8),
+    }
+)
+
+
+@pytest.fixture(params=["in_memory", "sqlite", "write_behind", "cached"])
+def repos(request):
+    if request.param == "in_memory":
+        message_repo = InMemoryYoutubeLiveChatMessageRepositoryImpl()
+        yield message_repo, InMemoryWesternAstrologyStateRepositoryImpl(message_repo)
+    elif request.param == "write_behind":
+        # 書き込みの度に書き込むようにして、包んだリポジトリと振る舞いが変わらないことを確かめる
+        # （溜めている書き込みの読み込みへの反映は test_write_behind.py で確かめる）
+        message_repo = InMemoryYoutubeLiveChatMessageRepositoryImpl()
+        state_repo = WriteBehindWesternAstrologyStateRepositoryImpl(
+            InMemoryWesternAstrologyStateRepositoryImpl(message_repo),
+            flush_interval=60,
+            max_pending=1,
+        )
+        yield message_repo, state_repo
+        state_repo.close()
+    elif request.param == "cached":
+        # キャッシュ越しに保存・取得しても、振る舞いが変わらないことを確かめる
+        message_repo = InMemoryYoutubeLiveChatMessageRepositoryImpl()
+        yield (
+            CachedYoutubeLiveChatMessageRepositoryImpl(message_repo, max_size=2),
+            InMemoryWesternAstrologyStateRepositoryImpl(message_repo),
+        )
+    else:
+        db = SqliteDatabase()
+        yield (
+            SqliteYoutubeLiveChatMessageRepositoryImpl(db),
+            SqliteWesternAstrologyStateRepositoryImpl(db),
+        )
+        db.close()
+
+
+def _message(message_id: str) -> LiveChatMessageEntity:
+    return LiveChatMessageEntity(**get_dummy_live_chat_message(message_id))
+
+
+def _state(message_id: str, is_target: bool = True, **kwargs):
+    state = WesternAstrologyStateEntity.get_initial(message_id, is_target=is_target)
+    return state.model_copy(update=kwargs)
+
+
+# 処理段階ごとの状態
+_STATES = [
+    _state("not_prepared"),
+    _state("no_result", required_info=_INFO),
+    _state("no_voice", required_info=_INFO, result="結果"),
+    _state(
+        "waiting_play", required_info=_INFO, result="結果", result_voice_path="a.wav"
+    ),
+    _state(
+        "played",
+        required_info=_INFO,
+        result="結果",
+        result_voice_path="b.wav",
+        is_played=True,
+    ),
+    _state("excluded", is_target=False),
+]
+
+
+@pytest.fixture
+def saved(repos):
+    message_repo, state_repo = repos
+    for state in _STATES:
+        # メッセージの保存順を確かめるため、1件ずつ保存する
+        message_repo.save([_message(state.message_id)])
+        state_repo.save([state])
+    return message_repo, state_repo
+
+
+def _ids(states: list[WesternAstrologyStateEntity]) -> list[str]:
+    return [s.message_id for s in states]
+
+
+def test_save_message_ignores_duplicate_id(repos):
+    message_repo, _ = repos
+    first = _message("a")
+    message_repo.save([first])
+    message_repo.save([_message("a"), _message("b")])
+
+    messages = message_repo.get_by_message_ids(["a", "b", "unknown"])
+
+    assert sorted(m.id for m in messages) == ["a", "b"]
+    assert next(m for m in messages if m.id == "a") == first
+
+
+def test_empty_inputs(repos):
+    message_repo, state_repo = repos
+    message_repo.save([])
+    state_repo.save([])
+    assert message_repo.get_by_message_ids([]) == []
+    assert state_repo.get_waiting_audio_play_state() == []
+    assert state_repo.count_waiting_audio_play_state() == 0
+
+
+def test_save_state_upserts(saved):
+    _, state_repo = saved
+    before = state_repo.get_prepared_target_with_no_result(limit=10)[0]
+
+    state_repo.save([before.model_copy(update={"result": "結果"})])
+
+    after = state_repo.get_no_voice_target(limit=10)
+    assert _ids(after) == ["no_result", "no_voice"]
+    assert after[0].created_at == before.created_at
+    assert after[0].updated_at >= before.updated_at
+
+
+def test_get_by_stage(saved):
+    _, state_repo = saved
+    assert _ids(state_repo.get_not_prepared_target(limit=10)) == ["not_prepared"]
+    assert _ids(state_repo.get_prepared_target_with_no_result(limit=10)) == [
+        "no_result"
+    ]
+    assert _ids(state_repo.get_no_voice_target(limit=10)) == ["no_voice"]
+    assert _ids(state_repo.get_all_with_voice()) == ["waiting_play", "played"]
+    assert _ids(state_repo.get_should_play_audio_status()) == ["waiting_play"]
+    assert _ids(state_repo.get_waiting_audio_play_state()) == [
+        "not_prepared",
+        "no_result",
+        "no_voice",
+        "waiting_play",
+    ]
+    assert state_repo.count_waiting_audio_play_state() == 4
+
+
+def test_get_all_prepared_state_and_message(saved):
+    _, state_repo = saved
+    states, messages = state_repo.get_all_prepared_state_and_message()
+
+    assert _ids(states) == ["no_result", "no_voice", "waiting_play", "played"]
+    assert [m.id for m in messages] == _ids(states)
+
+
+def test_get_prepared_state_and_message_updated_after(saved):
+    _, state_repo = saved
+    states, _ = state_repo.get_prepared_state_and_message_updated_after(None)
+    cursor = max(s.updated_at for s in states)
+    assert state_repo.get_prepared_state_and_message_updated_after(cursor) == ([], [])
+
+    played = states[2].model_copy(update={"is_played": True})
+    state_repo.save([played])
+
+    states, messages = state_repo.get_prepared_state_and_message_updated_after(cursor)
+    assert _ids(states) == ["waiting_play"]
+    assert states[0].is_played
+    assert [m.id for m in messages] == ["waiting_play"]
+
+
+def test_get_unprepared_message_ids_updated_after(saved):
+    _, state_repo = saved
+    states, _ = state_repo.get_prepared_state_and_message_updated_after(None)
+    cursor = max(s.updated_at for s in states)
+    # 占い対象外のコメントは、実装によっては基準時刻より後に保存されている
+    before = set(state_repo.get_unprepared_message_ids_updated_after(cursor))
+    assert before <= {"excluded"}
+
+    state_repo.mark_not_target(["no_voice"])
+
+    assert set(state_repo.get_unprepared_message_ids_updated_after(cursor)) == (
+        before | {"no_voice"}
+    )
+    assert state_repo.get_prepared_state_and_message_updated_after(cursor) == (
+        [],
+        [],
+    )
+
+
+def test_limit_follows_message_order(repos):
+    message_repo, state_repo = repos
+    for i in range(5):
+        message_repo.save([_message(f"m{i}")])
+    # 状態はメッセージと逆の順に保存する
+    state_repo.save([_state(f"m{i}") for i in reversed(range(5))])
+
+    assert _ids(state_repo.get_not_prepared_target(limit=3)) == ["m0", "m1", "m2"]
+
+
+def test_returned_entities_are_detached(saved):
+    _, state_repo = saved
+    state = state_repo.get_should_play_audio_status()[0]
+    state.is_played = True
+
+    assert _ids(state_repo.get_should_play_audio_status()) == ["waiting_play"]
+
+
+def test_partial_updates_move_stage(saved):
+    _, state_repo = saved
+    before = {s.message_id: s for s in state_repo.get_waiting_audio_play_state()}
+
+    state_repo.set_required_info({"not_prepared": _INFO})
+    state_repo.set_result({"no_result": "結果"})
+    state_repo.set_voice_path({"no_voice": "c.wav"})
+
+    assert state_repo.get_not_prepared_target(limit=10) == []
+    assert _ids(state_repo.get_prepared_target_with_no_result(limit=10)) == [
+        "not_prepared"
+    ]
+    assert _ids(state_repo.get_no_voice_target(limit=10)) == ["no_result"]
+    after = {s.message_id: s for s in state_repo.get_should_play_audio_status()}
+    assert after["no_voice"].result_voice_path == "c.wav"
+    # 更新していない列はそのまま
+    assert after["no_voice"].result == "結果"
+    assert after["no_voice"].required_info == _INFO
+    assert after["no_voice"].created_at == before["no_voice"].created_at
+    assert after["no_voice"].updated_at >= before["no_voice"].updated_at
+
+
+def test_natal_chart_is_kept_without_changing_stage(saved):
+    _, state_repo = saved
+
+    state_repo.set_natal_chart({"no_result": _CHART})
+
+    (state,) = state_repo.get_prepared_target_with_no_result(limit=10)
+    assert state.natal_chart == _CHART
+    # 出生図を保存しても処理段階は変わらず、保存し直しても出生図は残る
+    state_repo.save([state.model_copy(update={"result": "結果"})])
+    assert state_repo.get_no_voice_target(limit=10)[0].natal_chart == _CHART
+    assert state_repo.get_no_voice_target(limit=10)[1].natal_chart is None
+
+
+def test_mark_played_and_not_target_in_batch(saved):
+    _, state_repo = saved
+
+    state_repo.mark_played(["waiting_play", "unknown"])
+    state_repo.mark_not_target(["not_prepared", "no_result"])
+    state_repo.mark_played([])
+    state_repo.set_result({})
+
+    assert state_repo.get_should_play_audio_status() == []
+    assert _ids(state_repo.get_waiting_audio_play_state()) == ["no_voice"]
+    assert state_repo.count_waiting_audio_play_state() == 1
+    states, _ = state_repo.get_all_prepared_state_and_message()
+    assert _ids(states) == ["no_voice", "waiting_play", "played"]
+    assert states[1].is_played
+
+
+def test_get_state_and_message_joined(saved):
+    _, state_repo = saved
+
+    states, messages = state_repo.get_not_prepared_target_and_message(limit=10)
+    assert _ids(states) == ["not_prepared"]
+    assert [m.id for m in messages] == ["not_prepared"]
+
+    states, messages = state_repo.get_should_play_audio_state_and_message(limit=1)
+    assert _ids(states) == ["waiting_play"]
+    assert [m.id for m in messages] == ["waiting_play"]
+
+
+def test_should_play_state_and_message_limit(repos):
+    message_repo, state_repo = repos
+    message_repo.save([_message(f"m{i}") for i in range(3)])
+    state_repo.save(
+        [_state(f"m{i}", required_info=_INFO, result="結果") for i in range(3)]
+    )
+    state_repo.set_voice_path({f"m{i}": f"m{i}.wav" for i in range(3)})
+
+    states, messages = state_repo.get_should_play_audio_state_and_message(limit=2)
+
+    assert _ids(states) == ["m0", "m1"]
+    assert [m.id for m in messages] == ["m0", "m1"]
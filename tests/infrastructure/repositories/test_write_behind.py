@@ -0,0 +1,375 @@
+import threading
+import time
+
+from sqlalchemy import exc as sa_exc
+
+from app.core.const import get_dummy_live_chat_message
+from app.domain.westernastrology import (
+    InfoForAstrologyEntity,
+    WesternAstrologyStateEntity,
+)
+from app.domain.youtube.live import LiveChatMessageEntity
+from app.infrastructure.repositoriesInMemoryImpl import (
+    InMemoryWesternAstrologyStateRepositoryImpl,
+    InMemoryYoutubeLiveChatMessageRepositoryImpl,
+)
+from app.infrastructure.repositoriesWriteBehindImpl import (
+    WriteBehindWesternAstrologyStateRepositoryImpl,
+    with_write_behind,
+)
+
+_INFO = InfoForAstrologyEntity(
+    name="たけし", birthday="1985/06/12", birth_time="10:00", birthplace="大阪"
+)
+
+
+class _CountingRepo(InMemoryWesternAstrologyStateRepositoryImpl):
+    """
+    書き込みの回数（DBではコミットの回数）を数える
+    """
+
+    def __init__(self, message_repo):
+        super().__init__(message_repo)
+        self.calls: list[tuple[str, int]] = []
+
+    def save(self, state_list):
+        self.calls.append(("save", len(state_list)))
+        super().save(state_list)
+
+    def set_result(self, results):
+        self.calls.append(("set_result", len(results)))
+        super().set_result(results)
+
+    def mark_played(self, message_ids):
+        self.calls.append(("mark_played", len(message_ids)))
+        super().mark_played(message_ids)
+
+
+def _messages(n: int) -> InMemoryYoutubeLiveChatMessageRepositoryImpl:
+    message_repo = InMemoryYoutubeLiveChatMessageRepositoryImpl()
+    message_repo.save(
+        [
+            LiveChatMessageEntity(**get_dummy_live_chat_message(f"m{i}"))
+            for i in range(n)
+        ]
+    )
+    return message_repo
+
+
+def _setup(n: int, max_pending: int = 1000):
+    message_repo = _messages(n)
+    inner = _CountingRepo(message_repo)
+    repo = WriteBehindWesternAstrologyStateRepositoryImpl(
+        inner, flush_interval=60, max_pending=max_pending
+    )
+    return inner, repo
+
+
+def _initial(message_id: str) -> WesternAstrologyStateEntity:
+    return WesternAstrologyStateEntity.get_initial(message_id, is_target=True)
+
+
+def _prepared(message_id: str) -> WesternAstrologyStateEntity:
+    return _initial(message_id).model_copy(update={"required_info": _INFO})
+
+
+def test_coalesces_writes_into_one_call_per_operation():
+    inner, repo = _setup(50)
+    for i in range(50):
+        repo.save([_initial(f"m{i}")])
+    for i in range(50):
+        repo.set_result({f"m{i}": "古い結果"})
+        repo.set_result({f"m{i}": "結果"})
+    assert inner.calls == []
+
+    repo.flush()
+
+    # save の後の部分更新は、保存前の状態に反映されて1回の保存にまとまる
+    assert inner.calls == [("save", 50)]
+    assert {s.result for s in inner.get_waiting_audio_play_state()} == {"結果"}
+    repo.close()
+
+
+def test_updates_after_flush_are_batched_per_operation():
+    inner, repo = _setup(3)
+    repo.save([_initial(f"m{i}") for i in range(3)])
+    repo.flush()
+
+    repo.set_result({"m0": "結果"})
+    repo.set_result({"m1": "結果"})
+    repo.mark_played(["m0"])
+    repo.mark_played(["m0", "m2"])
+    repo.flush()
+
+    assert inner.calls == [("save", 3), ("set_result", 2), ("mark_played", 2)]
+    repo.close()
+
+
+def test_save_overrides_earlier_partial_update():
+    inner, repo = _setup(1)
+    inner.save([_initial("m0")])
+    repo.set_result({"m0": "結果"})
+    repo.save([_initial("m0").model_copy(update={"required_info": _INFO})])
+    repo.flush()
+
+    [state] = inner.get_prepared_target_with_no_result(limit=10)
+    assert state.result == ""
+    repo.close()
+
+
+def test_read_does_not_flush_and_reflects_pending_writes():
+    inner, repo = _setup(3)
+    inner.save(
+        [
+            _initial(f"m{i}").model_copy(update={"required_info": _INFO})
+            for i in range(3)
+        ]
+    )
+    repo.set_result({"m0": "結果"})
+    repo.mark_not_target(["m1"])
+
+    # 溜めている書き込みで対象から外れたものは除き、上限までは次のものを返す
+    assert [s.message_id for s in repo.get_prepared_target_with_no_result(limit=1)] == [
+        "m2"
+    ]
+    # 溜めている書き込みで新たに対象になったものは、書き込んだ後に読める
+    assert repo.get_no_voice_target(limit=10) == []
+    assert repo.pending_count == 2
+    assert inner.calls == [("save", 3)]
+
+    repo.flush()
+    [state] = repo.get_no_voice_target(limit=10)
+    assert (state.message_id, state.result) == ("m0", "結果")
+    repo.close()
+
+
+def test_task_loop_writes_are_batched():
+    # 読み込み -> 書き込み -> 読み込み を繰り返すタスクでも、書き込みは溜めてまとめて書き込む
+    inner, repo = _setup(10)
+    inner.save(
+        [
+            _initial(f"m{i}").model_copy(update={"required_info": _INFO})
+            for i in range(10)
+        ]
+    )
+    inner.calls.clear()
+
+    processed = []
+    while states := repo.get_prepared_target_with_no_result(limit=1):
+        processed.append(states[0].message_id)
+        repo.set_result({states[0].message_id: "結果"})
+
+    assert processed == [f"m{i}" for i in range(10)]
+    assert inner.calls == []
+    repo.flush()
+    assert inner.calls == [("set_result", 10)]
+    repo.close()
+
+
+class _FailingRepo(_CountingRepo):
+    """
+    failing のメッセージの結果を書き込もうとすると失敗する
+    """
+
+    failing = "m0"
+
+    def set_result(self, results):
+        if self.failing in results:
+            raise RuntimeError("failed to write")
+        super().set_result(results)
+
+
+def test_gives_up_writes_that_keep_failing():
+    message_repo = InMemoryYoutubeLiveChatMessageRepositoryImpl()
+    inner = _FailingRepo(message_repo)
+    inner.save([_initial("m0"), _initial("m1")])
+    repo = WriteBehindWesternAstrologyStateRepositoryImpl(
+        inner, flush_interval=60, max_attempts=2
+    )
+    repo.set_result({"m0": "結果"})
+    repo.flush()
+    assert repo.pending_count == 1
+    assert repo.dead_letters == []
+
+    repo.flush()
+    assert repo.pending_count == 0
+    assert repo.dead_letters == [("set_result", "m0", "結果")]
+
+    # 諦めた後の書き込みは、他の書き込みを止めない
+    repo.set_result({"m1": "結果"})
+    repo.flush()
+    assert inner.calls[-1] == ("set_result", 1)
+    repo.close()
+
+
+class _UnavailableRepo(_CountingRepo):
+    """
+    available が False の間は、DBに繋がらない時と同じエラーで書き込みに失敗する
+    """
+
+    available = True
+
+    def _check(self):
+        if not self.available:
+            raise sa_exc.OperationalError("UPDATE", {}, ConnectionError("down"))
+
+    def save(self, state_list):
+        self._check()
+        super().save(state_list)
+
+    def set_result(self, results):
+        self._check()
+        super().set_result(results)
+
+
+def test_keeps_writes_while_db_is_unavailable():
+    message_repo = _messages(3)
+    inner = _UnavailableRepo(message_repo)
+    inner.save([_prepared("m0"), _prepared("m1")])
+    repo = WriteBehindWesternAstrologyStateRepositoryImpl(
+        inner, flush_interval=60, max_attempts=2
+    )
+    inner.available = False
+    repo.set_result({"m0": "結果", "m1": "結果"})
+    repo.save([_prepared("m2")])
+    for _ in range(5):
+        repo.flush()
+    assert repo.pending_count == 3
+    assert repo.dead_letters == []
+
+    inner.available = True
+    repo.flush()
+
+    assert repo.pending_count == 0
+    assert {s.message_id for s in inner.get_no_voice_target(limit=10)} == {"m0", "m1"}
+    repo.close()
+
+
+def test_isolates_the_write_that_fails():
+    message_repo = _messages(3)
+    inner = _FailingRepo(message_repo)
+    inner.save([_prepared(f"m{i}") for i in range(3)])
+    repo = WriteBehindWesternAstrologyStateRepositoryImpl(
+        inner, flush_interval=60, max_attempts=1
+    )
+    repo.set_result({f"m{i}": "結果" for i in range(3)})
+    repo.flush()
+
+    # 書き込めない m0 だけを諦め、一緒に溜めていた書き込みは書き込む
+    assert repo.dead_letters == [("set_result", "m0", "結果")]
+    assert {s.message_id for s in inner.get_no_voice_target(limit=10)} == {"m1", "m2"}
+    repo.close()
+
+
+def test_dead_letters_are_saved_and_replayed(tmp_path):
+    path = tmp_path / "dead_letters.jsonl"
+    message_repo = _messages(3)
+    inner = _FailingRepo(message_repo)
+    inner.save([_prepared("m0")])
+    repo = WriteBehindWesternAstrologyStateRepositoryImpl(
+        inner, flush_interval=60, max_attempts=1, dead_letter_path=path
+    )
+    repo.set_result({"m0": "結果"})
+    repo.flush()
+    repo.close()
+    assert path.exists()
+
+    # 次に起動した時に書き込み直す
+    inner.failing = None
+    repo = WriteBehindWesternAstrologyStateRepositoryImpl(
+        inner, flush_interval=60, dead_letter_path=path
+    )
+    assert not path.exists()
+    repo.flush()
+    [state] = inner.get_no_voice_target(limit=10)
+    assert (state.message_id, state.result) == ("m0", "結果")
+    repo.close()
+
+
+def test_unwritten_states_are_saved_on_close(tmp_path):
+    path = tmp_path / "dead_letters.jsonl"
+    message_repo = _messages(3)
+    inner = _UnavailableRepo(message_repo)
+    inner.save([_prepared("m0")])
+    repo = WriteBehindWesternAstrologyStateRepositoryImpl(
+        inner, flush_interval=60, dead_letter_path=path
+    )
+    inner.available = False
+    repo.set_result({"m0": "結果"})
+    repo.close()
+
+    inner.available = True
+    repo = WriteBehindWesternAstrologyStateRepositoryImpl(
+        inner, flush_interval=60, dead_letter_path=path
+    )
+    repo.close()
+    [state] = inner.get_no_voice_target(limit=10)
+    assert state.result == "結果"
+
+
+class _BlockingRepo(_CountingRepo):
+    """
+    release されるまで set_result の書き込みを止める
+    """
+
+    def __init__(self, message_repo):
+        super().__init__(message_repo)
+        self.writing = threading.Event()
+        self.release = threading.Event()
+
+    def set_result(self, results):
+        self.writing.set()
+        self.release.wait(5)
+        super().set_result(results)
+
+
+def test_writes_and_reads_do_not_wait_for_flush():
+    message_repo = _messages(3)
+    inner = _BlockingRepo(message_repo)
+    inner.save([_prepared(f"m{i}") for i in range(2)])
+    repo = WriteBehindWesternAstrologyStateRepositoryImpl(inner, flush_interval=60)
+    repo.set_result({"m0": "結果"})
+    flushing = threading.Thread(target=repo.flush)
+    flushing.start()
+    assert inner.writing.wait(5)
+
+    # 書き込み中でも待たされず、書き込み中の書き込みを反映して読める
+    repo.set_result({"m1": "結果"})
+    assert [s.message_id for s in repo.get_prepared_target_with_no_result(10)] == []
+    assert repo.pending_count == 2
+
+    inner.release.set()
+    flushing.join()
+    repo.flush()
+    assert {s.message_id for s in inner.get_no_voice_target(limit=10)} == {"m0", "m1"}
+    repo.close()
+
+
+def test_flushes_when_full_and_on_close():
+    inner, repo = _setup(5, max_pending=3)
+    repo.save([_initial("m0"), _initial("m1")])
+    assert inner.calls == []
+    repo.save([_initial("m2")])
+    assert inner.calls == [("save", 3)]
+
+    repo.save([_initial("m3")])
+    repo.close()
+    assert inner.calls == [("save", 3), ("save", 1)]
+
+
+def test_flushes_at_interval():
+    inner = _CountingRepo(InMemoryYoutubeLiveChatMessageRepositoryImpl())
+    repo = WriteBehindWesternAstrologyStateRepositoryImpl(inner, flush_interval=0.01)
+    repo.save([_initial("m0")])
+
+    deadline = time.monotonic() + 1
+    while not inner.calls and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    assert inner.calls == [("save", 1)]
+    repo.close()
+
+
+def test_with_write_behind_disabled():
+    inner = _CountingRepo(InMemoryYoutubeLiveChatMessageRepositoryImpl())
+    assert with_write_behind(inner, 0) is inner
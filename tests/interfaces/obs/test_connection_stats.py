@@ -0,0 +1,18 @@
+from app.infrastructure.repositoriesCachedImpl import (
+    CachedYoutubeLiveChatMessageRepositoryImpl,
+)
+from app.infrastructure.repositoriesInMemoryImpl import (
+    InMemoryYoutubeLiveChatMessageRepositoryImpl,
+)
+from app.interfaces.obs.ui import get_connection_stats_markdown
+
+
+def test_connection_stats_markdown_joins_every_section():
+    message_repo = CachedYoutubeLiveChatMessageRepositoryImpl(
+        InMemoryYoutubeLiveChatMessageRepositoryImpl(), 10
+    )
+
+    sections = get_connection_stats_markdown(message_repo, None).split("\n\n")
+
+    assert any(s.startswith("メッセージのキャッシュ: 0 / 10 件") for s in sections)
+    assert sections[-1] == "出生図の計算: ワーカープロセスを使っていません"
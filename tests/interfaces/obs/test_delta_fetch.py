@@ -0,0 +1,56 @@
+from datetime import datetime, timedelta, timezone
+
+from app.core.const import get_dummy_live_chat_message
+from app.domain.westernastrology import WesternAstrologyStateEntity
+from app.domain.youtube.live import LiveChatMessageEntity
+from app.interfaces.obs.ui import (
+    DELTA_FETCH_OVERLAP,
+    AstrologyData,
+    get_delta_cursor,
+    merge_astrology_data,
+)
+
+_BASE = datetime(2025, 4, 1, 12, 0, tzinfo=timezone.utc)
+
+
+def _data(message_id: str, minutes: int, result: str = "") -> AstrologyData:
+    state = WesternAstrologyStateEntity.get_initial(message_id, is_target=True)
+    state = state.model_copy(
+        update={
+            "result": result,
+            "created_at": _BASE + timedelta(minutes=minutes),
+            "updated_at": _BASE + timedelta(minutes=minutes, seconds=30),
+        }
+    )
+    return AstrologyData(
+        chat_message=LiveChatMessageEntity(**get_dummy_live_chat_message(message_id)),
+        state=state,
+    )
+
+
+def test_get_delta_cursor():
+    assert get_delta_cursor([]) is None
+    data_list = [_data("a", 0), _data("b", 2), _data("c", 1)]
+    assert (
+        get_delta_cursor(data_list)
+        == _BASE + timedelta(minutes=2, seconds=30) - DELTA_FETCH_OVERLAP
+    )
+
+
+def test_merge_astrology_data():
+    data_list = [_data("a", 0), _data("c", 2)]
+    new_data_list = [_data("c", 2, result="結果"), _data("b", 1)]
+
+    merged = merge_astrology_data(data_list, new_data_list)
+
+    assert [d.state.message_id for d in merged] == ["a", "b", "c"]
+    assert merged[2].state.result == "結果"
+
+
+def test_merge_astrology_data_removes_data_left_the_target():
+    data_list = [_data("a", 0), _data("b", 1), _data("c", 2)]
+    new_data_list = [_data("c", 2, result="結果")]
+
+    merged = merge_astrology_data(data_list, new_data_list, ["b", "unknown"])
+
+    assert [d.state.message_id for d in merged] == ["a", "c"]
@@ -0,0 +1,47 @@
+import argparse
+import logging
+from logging import getLogger
+from pathlib import Path
+
+from app.config import SESSION_ARCHIVE_DIR, SESSION_RETENTION_COUNT
+from app.core.const import ROOT
+from app.infrastructure.broadcast_session import (
+    archive_session,
+    list_archivable_sessions,
+)
+
+logger = getLogger(__name__)
+logger.addHandler(logging.StreamHandler())
+logger.setLevel(logging.INFO)
+
+
+def archive_old_sessions(keep: int, archive_dir: Path, dry_run: bool) -> None:
+    """
+    新しい順に keep 件の配信セッションを残し、それより古い配信セッションをアーカイブする。
+    アーカイブした配信セッションのパーティションはDBから削除される。
+    配信中の配信セッションを消さないように、keep は1以上にすること。
+    """
+    if keep < 1:
+        raise ValueError("keep must be 1 or more not to archive the active session.")
+
+    session_ids = list_archivable_sessions(keep)
+    if not session_ids:
+        logger.info("No session to archive.")
+        return
+    for session_id in session_ids:
+        if dry_run:
+            logger.info(f"[dry run] {session_id} will be archived to {archive_dir}")
+            continue
+        archive_session(session_id, archive_dir)
+        logger.info(f"{session_id} was archived to {archive_dir / session_id}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Archive old broadcast sessions to gzipped CSV files and drop their partitions."
+    )
+    parser.add_argument("--keep", type=int, default=SESSION_RETENTION_COUNT)
+    parser.add_argument("--archive-dir", type=Path, default=ROOT / SESSION_ARCHIVE_DIR)
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+    archive_old_sessions(args.keep, args.archive_dir, args.dry_run)
@@ -0,0 +1,82 @@
+import argparse
+import logging
+import random
+import statistics
+import time
+from logging import getLogger
+from typing import Callable
+
+from app.application.chart_engine import BirthRecord, compute_natal_charts
+from app.application.natal_chart import EPHEMERIS_DIR, compute_natal_chart
+from app.domain.westernastrology import NatalChartEntity
+
+logger = getLogger(__name__)
+logger.addHandler(logging.StreamHandler())
+logger.setLevel(logging.INFO)
+
+
+def birth_records(count: int, seed: int = 0) -> list[BirthRecord]:
+    """
+    日本国内の出生地を想定した、重複のない出生データ
+    """
+    rng = random.Random(seed)
+    return [
+        BirthRecord(
+            f"{rng.randint(1930, 2020)}/{rng.randint(1, 12):02}/{rng.randint(1, 28):02}",
+            f"{rng.randint(0, 23):02}:{rng.randint(0, 59):02}",
+            rng.uniform(24.0, 46.0),
+            rng.uniform(122.0, 146.0),
+            "+00:00",
+        )
+        for _ in range(count)
+    ]
+
+
+def flatlib_charts(records: list[BirthRecord]) -> list[NatalChartEntity]:
+    return [compute_natal_chart(*record) for record in records]
+
+
+def engine_charts(records: list[BirthRecord]) -> list[NatalChartEntity]:
+    return compute_natal_charts(records, EPHEMERIS_DIR)
+
+
+def _charts_per_sec(
+    compute: Callable[[list[BirthRecord]], list[NatalChartEntity]],
+    records: list[BirthRecord],
+    repeat: int,
+) -> float:
+    rates = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        compute(records)
+        rates.append(len(records) / (time.perf_counter() - start))
+    return statistics.median(rates)
+
+
+def benchmark_chart_engine(charts: int, repeat: int) -> None:
+    """
+    出生図を計算する速度（出生図/秒）を、flatlib で1件ずつ計算する方法（参照実装）と、
+    chart_engine で pyswisseph を直接使ってまとめて計算する方法で比較する。
+    計測の前に、両方の結果が一致することを確かめる
+    """
+    records = birth_records(charts)
+    if flatlib_charts(records) != engine_charts(records):
+        raise ValueError("chart_engine does not match the flatlib reference.")
+
+    before = _charts_per_sec(flatlib_charts, records, repeat)
+    after = _charts_per_sec(engine_charts, records, repeat)
+    logger.info(f"{'engine':<12} | {'charts':>8} | {'charts/s':>10}")
+    logger.info(f"{'flatlib':<12} | {charts:>8} | {before:>10.0f}")
+    logger.info(f"{'chart_engine':<12} | {charts:>8} | {after:>10.0f}")
+    logger.info(f"speedup: {after / before:.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Benchmark natal charts per second computed with flatlib "
+        "vs the batch chart engine on pyswisseph."
+    )
+    parser.add_argument("--charts", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    benchmark_chart_engine(args.charts, args.repeat)
@@ -0,0 +1,121 @@
+import argparse
+import logging
+import statistics
+import time
+from logging import getLogger
+from typing import Callable
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session, sessionmaker
+
+from app.core.const import PG_URL
+from app.infrastructure.broadcast_session import reset_active_session, start_session
+from app.infrastructure.db_common import SessionLocal
+from app.infrastructure.queries import (
+    all_prepared_state_and_message_stmt,
+    all_with_voice_stmt,
+    message_from_json,
+    state_and_message_rows_stmt,
+    state_from_row,
+    state_rows_stmt,
+    to_message_entity,
+    to_state_entity,
+)
+from tools.benchmark_query_plans import SESSION_ID, count_states, drop_session, fill
+
+logger = getLogger(__name__)
+logger.addHandler(logging.StreamHandler())
+logger.setLevel(logging.INFO)
+
+# 変更前と同じく、標準の json モジュールで jsonb を読み込むエンジン
+_OrmSessionLocal = sessionmaker(autoflush=False, bind=create_engine(PG_URL))
+
+
+def orm_states(session: Session) -> int:
+    objs = session.execute(all_with_voice_stmt(SESSION_ID)).scalars().all()
+    return len([to_state_entity(obj) for obj in objs])
+
+
+def row_states(session: Session) -> int:
+    rows = session.execute(state_rows_stmt(all_with_voice_stmt(SESSION_ID))).all()
+    return len([state_from_row(row) for row in rows])
+
+
+def orm_states_and_messages(session: Session) -> int:
+    objs = session.execute(all_prepared_state_and_message_stmt(SESSION_ID)).all()
+    pairs = [
+        (to_state_entity(state_obj), to_message_entity(message_obj))
+        for state_obj, message_obj in objs
+    ]
+    return len(pairs)
+
+
+def row_states_and_messages(session: Session) -> int:
+    rows = session.execute(
+        state_and_message_rows_stmt(all_prepared_state_and_message_stmt(SESSION_ID))
+    ).all()
+    pairs = [(state_from_row(row), message_from_json(row.message_json)) for row in rows]
+    return len(pairs)
+
+
+def _rows_per_sec(
+    session_factory: sessionmaker, read: Callable[[Session], int], repeat: int
+) -> tuple[int, float]:
+    rates = []
+    for _ in range(repeat):
+        with session_factory() as session:
+            start = time.perf_counter()
+            count = read(session)
+            rates.append(count / (time.perf_counter() - start))
+    return count, statistics.median(rates)
+
+
+def benchmark_hydration(rows: int, queue: int, repeat: int, keep_data: bool) -> None:
+    """
+    占星術ステータスとメッセージを読み込んでエンティティにするまでの速度（行/秒）を、
+    ORMのオブジェクトを検証して変換する方法（変更前）と、行から直接変換する方法で比較する。
+    tools.benchmark_query_plans と同じ計測用の配信セッションを使う。
+    設定されたDBに書き込むので、配信に使っていないDBで実行すること
+    """
+    start_session(SESSION_ID)
+    try:
+        if count_states() != rows:
+            drop_session()
+            start_session(SESSION_ID)
+            fill(rows, queue)
+
+        logger.info(
+            f"{'read':<20} | {'rows':>8} | {'orm rows/s':>11} | {'row rows/s':>11} | speedup"
+        )
+        for name, before, after in [
+            ("states", orm_states, row_states),
+            ("states + messages", orm_states_and_messages, row_states_and_messages),
+        ]:
+            count, before_rate = _rows_per_sec(_OrmSessionLocal, before, repeat)
+            _, after_rate = _rows_per_sec(SessionLocal, after, repeat)
+            logger.info(
+                f"{name:<20} | {count:>8} | {before_rate:>11.0f} | {after_rate:>11.0f} "
+                f"| {after_rate / before_rate:.1f}x"
+            )
+    finally:
+        if keep_data:
+            reset_active_session()
+        else:
+            drop_session()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Benchmark rows per second when loading states and messages "
+        "through ORM objects vs straight from row tuples."
+    )
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--queue", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument(
+        "--keep-data",
+        action="store_true",
+        help="keep the synthetic session to reuse it in the next run",
+    )
+    args = parser.parse_args()
+    benchmark_hydration(args.rows, args.queue, args.repeat, args.keep_data)
@@ -0,0 +1,73 @@
+import argparse
+import logging
+import time
+from logging import getLogger
+from uuid import uuid4
+
+from sqlalchemy import delete
+
+from app.core.const import get_dummy_live_chat_message
+from app.domain.youtube.live import LiveChatMessageEntity
+from app.infrastructure.db_common import SessionLocal
+from app.infrastructure.repositoriesImpl import YoutubeLiveChatMessageRepositoryImpl
+from app.infrastructure.tables import YoutubeLivechatMessageOrm
+
+logger = getLogger(__name__)
+logger.addHandler(logging.StreamHandler())
+logger.setLevel(logging.INFO)
+
+
+def _dummy_messages(size: int) -> list[LiveChatMessageEntity]:
+    return [
+        LiveChatMessageEntity(**get_dummy_live_chat_message(str(uuid4())))
+        for _ in range(size)
+    ]
+
+
+def _delete_messages(messages: list[LiveChatMessageEntity]) -> None:
+    with SessionLocal() as session:
+        session.execute(
+            delete(YoutubeLivechatMessageOrm).where(
+                YoutubeLivechatMessageOrm.id.in_([m.id for m in messages])
+            )
+        )
+        session.commit()
+
+
+def benchmark_livechat_ingest(page_sizes: list[int], repeat: int) -> None:
+    """
+    チャットメッセージの保存について、INSERT ... ON CONFLICT（save）と COPY（save_bulk）の速度を比較する。
+    設定されたDBに書き込むので、計測に使ったメッセージは計測後に削除する。
+    """
+    # copy_threshold を大きくして、save が常に INSERT を使うようにする
+    repo = YoutubeLiveChatMessageRepositoryImpl(copy_threshold=10**9)
+    methods = {"upsert": repo.save, "copy": repo.save_bulk}
+
+    logger.info(
+        f"{'page size':>10} | {'method':>6} | {'sec/page':>10} | {'rows/sec':>10}"
+    )
+    for size in page_sizes:
+        for name, save in methods.items():
+            elapsed = 0.0
+            for _ in range(repeat):
+                messages = _dummy_messages(size)
+                start = time.perf_counter()
+                save(messages)
+                elapsed += time.perf_counter() - start
+                _delete_messages(messages)
+            sec_per_page = elapsed / repeat
+            logger.info(
+                f"{size:>10} | {name:>6} | {sec_per_page:>10.4f} | {size / sec_per_page:>10.0f}"
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Benchmark upsert vs COPY for saving live chat messages."
+    )
+    parser.add_argument(
+        "--page-sizes", type=int, nargs="+", default=[10, 100, 1000, 2000, 10000]
+    )
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    benchmark_livechat_ingest(args.page_sizes, args.repeat)
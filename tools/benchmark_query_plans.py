@@ -0,0 +1,599 @@
+import argparse
+import json
+import logging
+import statistics
+import sys
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from itertools import islice
+from logging import getLogger
+from pathlib import Path
+from typing import Callable
+from uuid import uuid4
+
+from sqlalchemy import event, text
+
+from app.core.const import get_dummy_live_chat_message
+from app.domain.westernastrology import (
+    InfoForAstrologyEntity,
+    WesternAstrologyStateEntity,
+)
+from app.domain.youtube.live import LiveChatMessageEntity
+from app.infrastructure.broadcast_session import (
+    PARTITIONED_TABLES,
+    partition_name,
+    reset_active_session,
+    start_session,
+)
+from app.infrastructure.db_common import engine
+from app.infrastructure.queries import to_message_document
+from app.infrastructure.repositoriesImpl import (
+    WesternAstrologyStateRepositoryImpl,
+    YoutubeLiveChatMessageRepositoryImpl,
+    YoutubeLiveChatMessageSearchRepositoryImpl,
+)
+
+logger = getLogger(__name__)
+logger.addHandler(logging.StreamHandler())
+logger.setLevel(logging.INFO)
+
+# 計測用のデータを入れる配信セッション。計測後にパーティションごと削除する
+SESSION_ID = "query-plan-benchmark"
+
+# 1回の INSERT ... SELECT で作成する行数
+FILL_BATCH_SIZE = 100_000
+
+# 部分更新・取得で1回に扱う件数
+BATCH = 50
+
+INFO = InfoForAstrologyEntity(
+    name="たろう",
+    birthday="1990/01/01",
+    birth_time="12:00",
+    birthplace="東京都",
+    worries="仕事",
+)
+RESULT = "あなたの太陽星座は山羊座です。" * 40
+
+# コメントの検索で探す語。SEARCH_EVERY 件に1件のメッセージの末尾に付ける（ダミーのメッセージには含まれない文字）
+SEARCH_WORD = "蠍座"
+SEARCH_EVERY = 10_000
+
+
+def _message_id(i: int) -> str:
+    return f"bench-{i}"
+
+
+def _voice_path(i: int) -> str:
+    return f"voice/{_message_id(i)}.wav"
+
+
+# 1行目から順に、配信を始めてから100ミリ秒ごとにコメントが届いたものとして作成する。
+# 最も新しい queue_size 件ずつを処理中の各段階（未準備・占い待ち・音声生成待ち・再生待ち）にし、
+# それより古いものは 4割を占い対象外、残りを再生済みにする
+_STAGE = """
+CASE WHEN i > :rows - :queue THEN 'not_prepared'
+     WHEN i > :rows - 2 * :queue THEN 'no_result'
+     WHEN i > :rows - 3 * :queue THEN 'no_voice'
+     WHEN i > :rows - 4 * :queue THEN 'waiting_play'
+     WHEN i % 5 < 2 THEN 'excluded'
+     ELSE 'played'
+END
+"""
+
+FILL_MESSAGES = text("""
+INSERT INTO youtube_livechat_messages (session_id, id, message, created_at, updated_at)
+SELECT :session_id, 'bench-' || i,
+       jsonb_set(
+           jsonb_set(CAST(:template AS jsonb), '{id}', to_jsonb('bench-' || i)),
+           '{snippet,displayMessage}',
+           to_jsonb(:text || CASE WHEN i % :search_every = 0 THEN :search_word
+                                  ELSE '' END)
+       ),
+       t.ts, t.ts
+FROM generate_series(:start, :stop) AS i,
+     LATERAL (SELECT now() - (:rows - i) * interval '100 milliseconds' AS ts) AS t
+""")
+
+FILL_STATES = text(f"""
+INSERT INTO western_astrology_statuss (
+    session_id, message_id, is_target, required_info, result, result_voice_path,
+    is_played, created_at, updated_at
+)
+SELECT :session_id, 'bench-' || i,
+       s.stage <> 'excluded',
+       CAST(CASE WHEN s.stage IN ('excluded', 'not_prepared') THEN :initial_info
+                 ELSE :info END AS jsonb),
+       CASE WHEN s.stage IN ('no_voice', 'waiting_play', 'played') THEN :result
+            ELSE '' END,
+       CASE WHEN s.stage IN ('waiting_play', 'played') THEN 'voice/bench-' || i || '.wav'
+            ELSE '' END,
+       s.stage = 'played',
+       s.ts,
+       s.ts + CASE WHEN s.stage = 'played' THEN interval '30 seconds'
+                   ELSE interval '0' END
+FROM generate_series(:start, :stop) AS i,
+     LATERAL (
+         SELECT now() - (:rows - i) * interval '100 milliseconds' AS ts,
+                {_STAGE} AS stage
+     ) AS s
+""")
+
+# パーティションのインデックス名 -> 親テーブルに作成したインデックス名
+PARENT_INDEX_NAMES = text("""
+SELECT child.relname, parent.relname
+FROM pg_inherits
+    JOIN pg_class AS child ON child.oid = pg_inherits.inhrelid
+    JOIN pg_class AS parent ON parent.oid = pg_inherits.inhparent
+WHERE child.relkind = 'i'
+""")
+
+
+@dataclass
+class QueryCase:
+    """
+    計測するリポジトリのメソッドと、その実行計画・実行時間の期待値
+    """
+
+    name: str
+    run: Callable[[], object]
+    # 実行時間（中央値）の上限（ミリ秒）。None の場合は計測するだけで判定しない
+    budget_ms: float | None
+    # 実行計画で使われるべきインデックス（親テーブルのインデックス名）
+    indexes: list[str] = field(default_factory=list)
+    # 件数が配信セッションの大きさに比例する取得。テーブル全体の読み込み（Seq Scan）を許す。
+    # 全件をエンティティに変換するのでメモリを多く使うため、指定した時だけ計測する
+    full_scan: bool = False
+
+
+@dataclass
+class CaseResult:
+    case: QueryCase
+    median_ms: float
+    plans: list[dict]
+    seq_scans: list[str]
+    used_indexes: set[str]
+    problems: list[str]
+
+
+class StatementCapture:
+    """
+    エンジンで実行されたSQL文とパラメータを記録する（COPY など、DBAPIのカーソルを直接使うものは含まない）
+    """
+
+    def __init__(self):
+        self.statements: list[tuple[str, object]] = []
+        self.enabled = False
+
+    def __enter__(self) -> "StatementCapture":
+        event.listen(engine, "before_cursor_execute", self._record)
+        return self
+
+    def __exit__(self, *exc) -> None:
+        event.remove(engine, "before_cursor_execute", self._record)
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany):
+        if self.enabled and not executemany:
+            self.statements.append((statement, parameters))
+
+
+def fill(rows: int, queue: int) -> None:
+    """
+    計測用の配信セッションに、rows 件のメッセージと占星術ステータスを作成する
+    """
+    message = LiveChatMessageEntity(**get_dummy_live_chat_message(_message_id(0)))
+    params = {
+        "session_id": SESSION_ID,
+        "rows": rows,
+        "queue": queue,
+        "template": json.dumps(to_message_document(message), ensure_ascii=False),
+        "text": message.snippet.displayMessage,
+        "search_every": SEARCH_EVERY,
+        "search_word": SEARCH_WORD,
+        "initial_info": InfoForAstrologyEntity.get_initial().model_dump_json(),
+        "info": INFO.model_dump_json(),
+        "result": RESULT,
+    }
+    for start in range(1, rows + 1, FILL_BATCH_SIZE):
+        stop = min(start + FILL_BATCH_SIZE - 1, rows)
+        with engine.begin() as conn:
+            conn.execute(FILL_MESSAGES, {**params, "start": start, "stop": stop})
+            conn.execute(FILL_STATES, {**params, "start": start, "stop": stop})
+        logger.info(f"filled {stop} / {rows} rows")
+    # 実際の運用と同じように、統計情報と可視性マップを更新してから計測する
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        for table in PARTITIONED_TABLES:
+            conn.execute(text(f'VACUUM ANALYZE "{partition_name(table, SESSION_ID)}"'))
+
+
+def count_states() -> int:
+    # メッセージは書き込みの計測で増えるので、占星術ステータスの件数で作成済みかを判断する
+    partition = partition_name(PARTITIONED_TABLES[-1], SESSION_ID)
+    with engine.connect() as conn:
+        return conn.execute(text(f'SELECT count(1) FROM "{partition}"')).scalar_one()
+
+
+def drop_session() -> None:
+    """
+    計測用の配信セッションのパーティションと集計を削除する
+    """
+    with engine.begin() as conn:
+        # 外部キーで参照している側（占星術ステータス）から切り離して削除する
+        for table in reversed(PARTITIONED_TABLES):
+            partition = partition_name(table, SESSION_ID)
+            exists = conn.execute(
+                text("SELECT to_regclass(:name)"), {"name": f'"{partition}"'}
+            ).scalar_one()
+            if exists is not None:
+                conn.execute(
+                    text(f'ALTER TABLE {table} DETACH PARTITION "{partition}"')
+                )
+                conn.execute(text(f'DROP TABLE "{partition}"'))
+        for table in ["pipeline_stage_counts", "pipeline_stage_throughputs"]:
+            conn.execute(
+                text(f"DELETE FROM {table} WHERE session_id = :id"), {"id": SESSION_ID}
+            )
+        conn.execute(
+            text("DELETE FROM broadcast_sessions WHERE id = :id"), {"id": SESSION_ID}
+        )
+    reset_active_session()
+
+
+def build_cases(rows: int, queue: int) -> list[QueryCase]:
+    state_repo = WesternAstrologyStateRepositoryImpl()
+    message_repo = YoutubeLiveChatMessageRepositoryImpl()
+    search_repo = YoutubeLiveChatMessageSearchRepositoryImpl()
+
+    # 部分更新は、値が変わらない再生済み・占い対象外の行に行う（繰り返し計測してもデータが変わらない）
+    old = range(rows - 4 * queue, 0, -1)
+    played = list(islice((i for i in old if i % 5 >= 2), BATCH))
+    excluded = list(islice((i for i in old if i % 5 < 2), BATCH))
+    played_ids = [_message_id(i) for i in played]
+
+    def played_states() -> list[WesternAstrologyStateEntity]:
+        return [
+            WesternAstrologyStateEntity(
+                message_id=_message_id(i),
+                is_target=True,
+                required_info=INFO,
+                result=RESULT,
+                result_voice_path=_voice_path(i),
+                is_played=True,
+                created_at=datetime.now(timezone.utc),
+            )
+            for i in played
+        ]
+
+    def new_messages(size: int) -> list[LiveChatMessageEntity]:
+        return [
+            LiveChatMessageEntity(**get_dummy_live_chat_message(str(uuid4())))
+            for _ in range(size)
+        ]
+
+    def updated_recently():
+        # UIの差分取得と同じように、直近1分間に更新された行だけを取得する
+        return state_repo.get_prepared_state_and_message_updated_after(
+            datetime.now(timezone.utc) - timedelta(minutes=1)
+        )
+
+    waiting = "ix_western_astrology_statuss_waiting"
+    stage = "ix_western_astrology_statuss_stage"
+    search_indexes = [
+        "ix_youtube_livechat_messages_author_name_ngram",
+        "ix_youtube_livechat_messages_display_message_ngram",
+    ]
+    messages_pkey = "youtube_livechat_messages_pkey"
+    states_pkey = "western_astrology_statuss_pkey"
+    return [
+        # パイプラインの各タスクが繰り返し実行する取得
+        QueryCase(
+            "get_not_prepared_target",
+            lambda: state_repo.get_not_prepared_target(3),
+            budget_ms=50,
+            indexes=[stage],
+        ),
+        QueryCase(
+            "get_not_prepared_target_and_message",
+            lambda: state_repo.get_not_prepared_target_and_message(3),
+            budget_ms=50,
+            indexes=[stage],
+        ),
+        QueryCase(
+            "get_prepared_target_with_no_result",
+            lambda: state_repo.get_prepared_target_with_no_result(3),
+            budget_ms=50,
+            indexes=[stage],
+        ),
+        QueryCase(
+            "get_no_voice_target",
+            lambda: state_repo.get_no_voice_target(1),
+            budget_ms=50,
+            indexes=[stage],
+        ),
+        QueryCase(
+            "get_should_play_audio_state_and_message",
+            lambda: state_repo.get_should_play_audio_state_and_message(1),
+            budget_ms=50,
+            indexes=[waiting],
+        ),
+        QueryCase(
+            "get_waiting_audio_play_state",
+            state_repo.get_waiting_audio_play_state,
+            budget_ms=50,
+            indexes=[stage],
+        ),
+        QueryCase(
+            "get_should_play_audio_status",
+            state_repo.get_should_play_audio_status,
+            budget_ms=50,
+            indexes=[waiting],
+        ),
+        QueryCase(
+            "count_waiting_audio_play_state",
+            state_repo.count_waiting_audio_play_state,
+            budget_ms=20,
+            indexes=[stage],
+        ),
+        QueryCase(
+            "get_prepared_state_and_message_updated_after",
+            updated_recently,
+            budget_ms=100,
+            indexes=["ix_western_astrology_statuss_updated_at"],
+        ),
+        QueryCase(
+            "get_by_message_ids",
+            lambda: message_repo.get_by_message_ids(played_ids),
+            budget_ms=50,
+            indexes=[messages_pkey],
+        ),
+        # オペレーターのコメントの検索。1〜2文字の語もインデックスで絞り込む
+        QueryCase(
+            "search",
+            lambda: search_repo.search(SEARCH_WORD, limit=50),
+            budget_ms=100,
+            indexes=search_indexes,
+        ),
+        QueryCase(
+            "search_one_character",
+            lambda: search_repo.search(SEARCH_WORD[0], limit=50),
+            budget_ms=100,
+            indexes=search_indexes,
+        ),
+        # 書き込み
+        QueryCase(
+            "save_messages",
+            lambda: message_repo.save(new_messages(BATCH)),
+            budget_ms=100,
+        ),
+        QueryCase(
+            "save_messages_bulk",
+            lambda: message_repo.save_bulk(new_messages(10 * BATCH)),
+            budget_ms=300,
+        ),
+        QueryCase(
+            "save_states",
+            lambda: state_repo.save(played_states()),
+            budget_ms=100,
+            indexes=[states_pkey],
+        ),
+        QueryCase(
+            "set_required_info",
+            lambda: state_repo.set_required_info(dict.fromkeys(played_ids, INFO)),
+            budget_ms=100,
+            indexes=[states_pkey],
+        ),
+        QueryCase(
+            "set_result",
+            lambda: state_repo.set_result(dict.fromkeys(played_ids, RESULT)),
+            budget_ms=100,
+            indexes=[states_pkey],
+        ),
+        QueryCase(
+            "set_voice_path",
+            lambda: state_repo.set_voice_path(
+                {_message_id(i): _voice_path(i) for i in played}
+            ),
+            budget_ms=100,
+            indexes=[states_pkey],
+        ),
+        QueryCase(
+            "mark_played",
+            lambda: state_repo.mark_played(played_ids),
+            budget_ms=100,
+            indexes=[states_pkey],
+        ),
+        QueryCase(
+            "mark_not_target",
+            lambda: state_repo.mark_not_target([_message_id(i) for i in excluded]),
+            budget_ms=100,
+            indexes=[states_pkey],
+        ),
+        # 配信セッションの全件を取得する（UIの初回表示など）。件数に比例するので判定しない
+        QueryCase(
+            "get_all_prepared_state_and_message",
+            state_repo.get_all_prepared_state_and_message,
+            budget_ms=None,
+            full_scan=True,
+        ),
+        QueryCase(
+            "get_all_with_voice",
+            state_repo.get_all_with_voice,
+            budget_ms=None,
+            full_scan=True,
+        ),
+    ]
+
+
+def _plan_nodes(plan: dict):
+    yield plan
+    for child in plan.get("Plans", []):
+        yield from _plan_nodes(child)
+
+
+def explain(statement: str, parameters) -> dict:
+    """
+    EXPLAIN ANALYZE で実際に実行した時の実行計画を返す。書き込みの文は実行後にロールバックする
+    """
+    connection = engine.raw_connection()
+    try:
+        cursor = connection.cursor()
+        cursor.execute(
+            f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {statement}", parameters
+        )
+        return cursor.fetchone()[0][0]
+    finally:
+        connection.rollback()
+        connection.close()
+
+
+def run_case(
+    case: QueryCase, repeat: int, parent_indexes: dict[str, str]
+) -> CaseResult:
+    with StatementCapture() as capture:
+        # 1回目で実行されたSQL文を記録する（キャッシュの影響を避けるため、計測には含めない）
+        capture.enabled = True
+        case.run()
+        capture.enabled = False
+        elapsed = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            case.run()
+            elapsed.append((time.perf_counter() - start) * 1000)
+
+    plans = [
+        explain(statement, parameters) for statement, parameters in capture.statements
+    ]
+    partitions = {partition_name(table, SESSION_ID) for table in PARTITIONED_TABLES}
+    seq_scans = []
+    used_indexes = set()
+    for plan in plans:
+        for node in _plan_nodes(plan["Plan"]):
+            if (
+                node["Node Type"] == "Seq Scan"
+                and node.get("Relation Name") in partitions
+            ):
+                seq_scans.append(node["Relation Name"])
+            # ON CONFLICT で重複を調べるインデックスも含める
+            for index in [
+                node.get("Index Name"),
+                *node.get("Conflict Arbiter Indexes", []),
+            ]:
+                if index is not None:
+                    used_indexes.add(parent_indexes.get(index, index))
+
+    median_ms = statistics.median(elapsed)
+    problems = []
+    if case.budget_ms is not None and median_ms > case.budget_ms:
+        problems.append(f"{median_ms:.1f}ms > budget {case.budget_ms:.0f}ms")
+    if seq_scans and not case.full_scan:
+        problems.append(f"seq scan on {', '.join(sorted(set(seq_scans)))}")
+    for index in case.indexes:
+        if index not in used_indexes:
+            problems.append(f"{index} is not used")
+    return CaseResult(case, median_ms, plans, seq_scans, used_indexes, problems)
+
+
+def benchmark_query_plans(
+    rows: int,
+    queue: int,
+    repeat: int,
+    cases: list[str] | None,
+    plans_dir: Path | None,
+    keep_data: bool,
+    full_scans: bool,
+) -> bool:
+    """
+    大量のデータを入れた配信セッションで、リポジトリの各メソッドの実行時間と実行計画を調べる。
+    実行計画にテーブル全体の読み込み（Seq Scan）があるか、期待したインデックスが使われていないか、
+    実行時間が上限を超えた場合は失敗とする。
+    設定されたDBに書き込むので、配信中のDBでは実行しないこと。
+
+    Returns:
+        全てのメソッドが期待通りだったかどうか
+    """
+    start_session(SESSION_ID)
+    try:
+        existing = count_states()
+        if existing != rows:
+            if existing:
+                # 件数が違うデータは作り直す
+                drop_session()
+                start_session(SESSION_ID)
+            fill(rows, queue)
+
+        with engine.connect() as conn:
+            parent_indexes = dict(conn.execute(PARENT_INDEX_NAMES).all())
+
+        if plans_dir is not None:
+            plans_dir.mkdir(parents=True, exist_ok=True)
+        logger.info(
+            f"{'method':<46} | {'median ms':>10} | {'budget':>7} | {'indexes':<40} | result"
+        )
+        passed = True
+        for case in build_cases(rows, queue):
+            if cases and case.name not in cases:
+                continue
+            if case.full_scan and not full_scans:
+                continue
+            result = run_case(case, repeat, parent_indexes)
+            budget = "-" if case.budget_ms is None else f"{case.budget_ms:.0f}"
+            status = (
+                "OK" if not result.problems else "NG: " + "; ".join(result.problems)
+            )
+            logger.info(
+                f"{case.name:<46} | {result.median_ms:>10.1f} | {budget:>7} "
+                f"| {', '.join(sorted(result.used_indexes)) or '-':<40} | {status}"
+            )
+            passed = passed and not result.problems
+            if plans_dir is not None:
+                (plans_dir / f"{case.name}.json").write_text(
+                    json.dumps(result.plans, ensure_ascii=False, indent=2),
+                    encoding="utf-8",
+                )
+        return passed
+    finally:
+        if keep_data:
+            reset_active_session()
+        else:
+            drop_session()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Fill a broadcast session with synthetic rows and check the plans "
+        "and latencies of the repository queries."
+    )
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument(
+        "--queue",
+        type=int,
+        default=100,
+        help="number of states waiting in each in-flight stage",
+    )
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--cases", nargs="+", help="method names to benchmark")
+    parser.add_argument(
+        "--full-scans",
+        action="store_true",
+        help="also benchmark methods that load the whole session into memory",
+    )
+    parser.add_argument(
+        "--plans-dir", type=Path, help="write EXPLAIN ANALYZE output per method"
+    )
+    parser.add_argument(
+        "--keep-data",
+        action="store_true",
+        help="keep the synthetic session to reuse it in the next run",
+    )
+    args = parser.parse_args()
+    ok = benchmark_query_plans(
+        args.rows,
+        args.queue,
+        args.repeat,
+        args.cases,
+        args.plans_dir,
+        args.keep_data,
+        args.full_scans,
+    )
+    sys.exit(0 if ok else 1)
@@ -0,0 +1,90 @@
+import argparse
+import csv
+import json
+import logging
+from logging import getLogger
+from pathlib import Path
+from statistics import median
+
+from tools.build_gazetteer import CITY_CSV
+
+logger = getLogger(__name__)
+logger.addHandler(logging.StreamHandler())
+logger.setLevel(logging.INFO)
+
+# 出典: Geolonia 住所データ（https://github.com/geolonia/japanese-addresses, CC BY 4.0）の api ディレクトリ
+SOURCE = "Geolonia japanese-addresses (https://github.com/geolonia/japanese-addresses), CC BY 4.0"
+
+
+def _split_county(name: str) -> tuple[str, str]:
+    """
+    "賀茂郡東伊豆町" -> ("賀茂郡", "東伊豆町")。郡のない名前（"郡山市", "蒲郡市" など）はそのまま
+    """
+    if name.endswith(("町", "村")) and "郡" in name[1:-1]:
+        end = name.index("郡", 1) + 1
+        return name[:end], name[end:]
+    return "", name
+
+
+def _town_points(path: Path) -> list[tuple[float, float]]:
+    with open(path, encoding="utf-8") as f:
+        return [
+            (town["lat"], town["lng"])
+            for town in json.load(f)
+            if town["lat"] is not None and town["lng"] is not None
+        ]
+
+
+def _center(points: list[tuple[float, float]]) -> tuple[float, float]:
+    # 町丁目の代表点の中央値（飛び地や離島に引っ張られないように平均ではなく中央値を使う）
+    return (
+        round(median(p[0] for p in points), 6),
+        round(median(p[1] for p in points), 6),
+    )
+
+
+def build(api_dir: Path, output: Path) -> None:
+    """
+    Geolonia 住所データの api ディレクトリ（ja.json と ja/<都道府県>/<市区町村>.json）から、
+    全国の市区町村（東京23区、政令指定都市とその区を含む）の緯度経度のCSVを作成する。
+    緯度経度は町丁目の代表点の中央値。政令指定都市は、その区の町丁目すべてから求める
+    """
+    with open(api_dir / "ja.json", encoding="utf-8") as f:
+        prefectures: dict[str, list[str]] = json.load(f)
+
+    rows: list[tuple[str, str, str, float, float]] = []
+    for prefecture, names in prefectures.items():
+        designated: dict[str, list[tuple[float, float]]] = {}
+        for name in names:
+            points = _town_points(api_dir / "ja" / prefecture / f"{name}.json")
+            if not points:
+                logger.warning(f"No towns with coordinates: {prefecture}{name}")
+                continue
+            county, city = _split_county(name)
+            if "市" in city[:-1] and city.endswith("区"):
+                # 政令指定都市の区（"札幌市北区"）は、市の緯度経度を求めるために町丁目の代表点を集める
+                designated.setdefault(city[: city.index("市") + 1], []).extend(points)
+            rows.append((prefecture, county, city, *_center(points)))
+        for city, points in designated.items():
+            rows.append((prefecture, "", city, *_center(points)))
+
+    with open(output, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f, lineterminator="\n")
+        writer.writerow(["prefecture", "county", "city", "latitude", "longitude"])
+        writer.writerows(rows)
+    logger.info(f"{len(rows)} places were written to {output} (source: {SOURCE})")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Build the municipality CSV used by build_gazetteer "
+        "from the api directory of Geolonia japanese-addresses."
+    )
+    parser.add_argument(
+        "api_dir",
+        type=Path,
+        help="api directory of https://github.com/geolonia/japanese-addresses",
+    )
+    parser.add_argument("--output", type=Path, default=CITY_CSV)
+    args = parser.parse_args()
+    build(args.api_dir, args.output)
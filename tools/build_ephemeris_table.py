@@ -0,0 +1,47 @@
+import argparse
+import logging
+from logging import getLogger
+from pathlib import Path
+
+from app.application.ephemeris_table import EPHEMERIS_TABLE_PATH, build_ephemeris_table
+from app.application.natal_chart import EPHEMERIS_DIR
+
+logger = getLogger(__name__)
+logger.addHandler(logging.StreamHandler())
+logger.setLevel(logging.INFO)
+
+
+def build(
+    start_year: int, end_year: int, ephemeris_dir: Path, output: Path, samples: int
+) -> None:
+    """
+    天体暦のファイルから、出生図の近似の計算に使う天体暦の表（app/application/ephemeris_table.py）を作成し、
+    pyswisseph と比べた天体ごとの最大誤差を表示する
+    """
+    max_errors = build_ephemeris_table(
+        start_year, end_year, ephemeris_dir, output, samples
+    )
+    logger.info(
+        f"{start_year}-{end_year} was written to {output} ({output.stat().st_size} B)"
+    )
+    for obj_id, max_error in max_errors.items():
+        logger.info(f"{obj_id:<12} | max error {max_error:.6f}°")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Build the daily planet longitude table used to approximate "
+        "natal charts without ephemeris files."
+    )
+    parser.add_argument("--start-year", type=int, default=1920)
+    parser.add_argument("--end-year", type=int, default=2030)
+    parser.add_argument("--ephemeris-dir", type=Path, default=EPHEMERIS_DIR)
+    parser.add_argument("--output", type=Path, default=EPHEMERIS_TABLE_PATH)
+    parser.add_argument(
+        "--samples",
+        type=int,
+        default=100_000,
+        help="number of random times to compare with pyswisseph",
+    )
+    args = parser.parse_args()
+    build(args.start_year, args.end_year, args.ephemeris_dir, args.output, args.samples)
@@ -0,0 +1,109 @@
+import argparse
+import csv
+import logging
+from logging import getLogger
+from pathlib import Path
+from typing import Iterator
+
+from app.core.gazetteer import (
+    GAZETTEER_PATH,
+    Place,
+    PlaceKind,
+    build_gazetteer,
+    normalize_place,
+    place_keys,
+)
+
+logger = getLogger(__name__)
+logger.addHandler(logging.StreamHandler())
+logger.setLevel(logging.INFO)
+
+LOCATION_DATA_DIR = GAZETTEER_PATH.parent
+PREFECTURE_CSV = LOCATION_DATA_DIR / "prefecture.csv"
+CITY_CSV = LOCATION_DATA_DIR / "city.csv"
+ALIAS_CSV = LOCATION_DATA_DIR / "alias.csv"
+
+
+def _read_csv(path: Path) -> list[dict[str, str]]:
+    with open(path, encoding="utf-8", newline="") as f:
+        return [
+            {k.strip(): v.strip() for k, v in row.items()}
+            for row in csv.DictReader(f, skipinitialspace=True)
+        ]
+
+
+def _kind(name: str) -> PlaceKind:
+    if name.endswith("区"):
+        return PlaceKind.WARD
+    if name == "北海道" or name[-1] in "都府県":
+        return PlaceKind.PREFECTURE
+    return PlaceKind.MUNICIPALITY
+
+
+def _places(
+    prefecture_csv: Path, city_csvs: list[Path], alias_csv: Path
+) -> Iterator[tuple[str, Place]]:
+    """
+    索引に入れる (キー, 地名)。同じキーは先のものが使われるので、
+    正式な名前（都道府県名を付けた名前を含む）、接尾辞を取り除いた名前、別名の順に返す
+    """
+    names: dict[str, Place] = {}
+    qualified: dict[str, Place] = {}
+    for row in _read_csv(prefecture_csv):
+        names[row["prefecture"]] = Place(
+            PlaceKind.PREFECTURE, float(row["latitude"]), float(row["longitude"])
+        )
+    for path in city_csvs:
+        for row in _read_csv(path):
+            city = row["city"]
+            place = Place(_kind(city), float(row["latitude"]), float(row["longitude"]))
+            names.setdefault(city, place)
+            # 都道府県・郡の列があれば、同じ名前の市区町村（"府中市", "北区" など）を区別できるように、
+            # 都道府県名・郡名を付けたキーも作る
+            prefecture, county = row.get("prefecture", ""), row.get("county", "")
+            for qualifier in [prefecture, county, prefecture + county]:
+                if qualifier:
+                    qualified.setdefault(qualifier + city, place)
+
+    for name, place in [*names.items(), *qualified.items()]:
+        yield normalize_place(name), place
+    for name, place in names.items():
+        for key in place_keys(name)[1:]:
+            yield key, place
+    for row in _read_csv(alias_csv):
+        place = names.get(row["name"])
+        if place is None:
+            logger.warning(f"Unknown place for alias: {row['name']}")
+            continue
+        yield normalize_place(row["alias"]), place
+
+
+def build(
+    prefecture_csv: Path, city_csvs: list[Path], alias_csv: Path, output: Path
+) -> None:
+    """
+    都道府県・市区町村の緯度経度のCSVから、地名の索引（app/core/gazetteer.py）を作成する。
+    市区町村のCSVは city, latitude, longitude の列を持ち、prefecture, county の列があれば
+    都道府県名・郡名を付けた名前でも引けるようにする。同じ名前の市区町村は、都道府県名を付けずに引くとCSVの先のものになる
+    """
+    count = build_gazetteer(_places(prefecture_csv, city_csvs, alias_csv), output)
+    logger.info(f"{count} keys were written to {output} ({output.stat().st_size} B)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Build the gazetteer index used by get_coordinates "
+        "from prefecture / municipality CSV files."
+    )
+    parser.add_argument("--prefecture", type=Path, default=PREFECTURE_CSV)
+    parser.add_argument(
+        "--city",
+        type=Path,
+        action="append",
+        help="municipality CSV (city, latitude, longitude[, prefecture, county]). "
+        "can be repeated. defaults to the bundled city.csv",
+    )
+    parser.add_argument("--alias", type=Path, default=ALIAS_CSV)
+    parser.add_argument("--output", type=Path, default=GAZETTEER_PATH)
+    args = parser.parse_args()
+    build(args.prefecture, args.city or [CITY_CSV], args.alias, args.output)
@@ -10,6 +10,7 @@ import gradio as gr
 from app.application.audio_auto_player import AutoAudioPlayer
 from app.application.generate_audio import VoiceTask
 from app.application.generate_result import GenerateResultTask
+from app.application.natal_chart import chart_service
 from app.application.obs_display_service import (
     DisplayWaitingCountTreadTask,
     get_comment,
@@ -22,20 +23,39 @@ from app.application.obs_display_service import (
 from app.application.store_livechat import LivechatTask
 from app.application.text_service import extract_enclosed
 from app.application.thread_manager import ThreadTask
+from app.config import (
+    EXTRACTION_CACHE_MAX_SIZE,
+    EXTRACTION_CACHE_TTL,
+    MESSAGE_CACHE_SIZE,
+    STATE_POLLING_FALLBACK_INTERVAL,
+    STATE_WRITE_BEHIND_INTERVAL,
+)
 from app.core.const import GRAFANA_URL
-from app.domain.westernastrology import WesternAstrologyStateEntity
+from app.domain.listeners import StateChangeListener
+from app.domain.westernastrology import AstrologyStage, WesternAstrologyStateEntity
 from app.domain.youtube.live import LiveChatMessageEntity
 from app.infrastructure.db_common import initialize_db as init_db
+from app.infrastructure.repositoriesCachedImpl import (
+    CachedYoutubeLiveChatMessageRepositoryImpl,
+)
 from app.infrastructure.repositoriesImpl import (
+    BroadcastSessionRepositoryImpl,
+    InfoExtractionCacheRepositoryImpl,
     WesternAstrologyStateRepositoryImpl,
     YoutubeLiveChatMessageRepositoryImpl,
 )
+from app.infrastructure.repositoriesWriteBehindImpl import with_write_behind
+from app.infrastructure.state_notify import PgStateChangeListener
 from app.interfaces.gradio_app.constract_html import (
     div_center_bold_text,
     h1_tag,
     h2_tag,
 )
-from app.interfaces.obs.ui import custom_css, get_user_name_and_comment_html
+from app.interfaces.obs.ui import (
+    custom_css,
+    get_connection_stats_markdown,
+    get_user_name_and_comment_html,
+)
 
 
 def initialize_db():
@@ -73,21 +93,32 @@ def update_user_info_in_obs(
 
 
 class AutoWesternAstrologyThreadTask(ThreadTask):
-    def __init__(self, name: str, player: AutoAudioPlayer) -> None:
+    def __init__(
+        self,
+        name: str,
+        player: AutoAudioPlayer,
+        listener: StateChangeListener | None = None,
+    ) -> None:
         super().__init__(name)
         self.player = player
+        self.listener = listener
 
     def run(self) -> None:
         """
         Play audio for astrology result in an infinite loop.
         """
         logger.info("Start thread for playing audio")
+        self.start_listening(self.listener)
         while not self.stop_event.is_set():
             try:
                 # set the target state to play voice and display info
                 self.player.set_target()
                 if not self.player.is_playable():
-                    time.sleep(1)
+                    # wait until a voice audio is ready to play
+                    self.wait_for_change(
+                        self.listener,
+                        STATE_POLLING_FALLBACK_INTERVAL if self.listener else 1,
+                    )
                     continue
 
                 # display info in obs
@@ -104,35 +135,61 @@ class AutoWesternAstrologyThreadTask(ThreadTask):
             except Exception as e:
                 logger.exception(f"Failed to play audio: {e}")
                 time.sleep(1)
+        self.stop_listening(self.listener)
 
 
 logging_config.configure_logging()
 logger = getLogger(__name__)
 
+# 出生図を計算するワーカープロセスは fork で起動するので、他のスレッドを始める前に起動しておく
+if chart_service is not None:
+    chart_service.start()
+
+# 保存したメッセージをキャッシュし、状態と一緒に返すメッセージはキャッシュから取得する
+message_repo = CachedYoutubeLiveChatMessageRepositoryImpl(
+    YoutubeLiveChatMessageRepositoryImpl(), MESSAGE_CACHE_SIZE
+)
+
+# 占星術ステータスの書き込みは、全てのタスクで1つの書き込みを溜めるリポジトリにまとめる
+state_repo = with_write_behind(
+    WesternAstrologyStateRepositoryImpl(message_repo), STATE_WRITE_BEHIND_INTERVAL
+)
+
 # スレッドタスクの初期化
-voice_thread_task = VoiceTask("voice", WesternAstrologyStateRepositoryImpl())
+voice_thread_task = VoiceTask(
+    "voice",
+    state_repo,
+    listener=PgStateChangeListener([AstrologyStage.NO_VOICE]),
+)
 result_thread_task = GenerateResultTask(
     "result",
-    WesternAstrologyStateRepositoryImpl(),
-    YoutubeLiveChatMessageRepositoryImpl(),
+    state_repo,
+    listener=PgStateChangeListener(
+        [AstrologyStage.NOT_PREPARED, AstrologyStage.NO_RESULT]
+    ),
+    extraction_cache=InfoExtractionCacheRepositoryImpl(
+        EXTRACTION_CACHE_TTL, EXTRACTION_CACHE_MAX_SIZE
+    ),
 )
 livechat_thread_task = LivechatTask(
     "livechat",
-    WesternAstrologyStateRepositoryImpl(),
-    YoutubeLiveChatMessageRepositoryImpl(),
+    state_repo,
+    message_repo,
+    session_repo=BroadcastSessionRepositoryImpl(),
 )
 waiting_count_display_thread_task = DisplayWaitingCountTreadTask(
     "waiting_count_display",
-    WesternAstrologyStateRepositoryImpl(),
+    WesternAstrologyStateRepositoryImpl(message_repo),
     display_format="占い待ち: {}人",
     interval=5,
+    listener=PgStateChangeListener(list(AstrologyStage)),
+    session_repo=BroadcastSessionRepositoryImpl(),
 )
-auto_player = AutoAudioPlayer(
-    state_repo=WesternAstrologyStateRepositoryImpl(),
-    chat_repo=YoutubeLiveChatMessageRepositoryImpl(),
-)
+auto_player = AutoAudioPlayer(state_repo=state_repo)
 auto_system_thread_task = AutoWesternAstrologyThreadTask(
-    "auto_system", player=auto_player
+    "auto_system",
+    player=auto_player,
+    listener=PgStateChangeListener([AstrologyStage.WAITING_PLAY]),
 )
 
 with gr.Blocks(css=custom_css) as demo:
@@ -186,6 +243,16 @@ with gr.Blocks(css=custom_css) as demo:
         fn=initialize_db,
     )
 
+    # タスクごとのDBのコネクションの使用状況（コネクションプールの枯渇に気付くため）と、
+    # メッセージのキャッシュ・情報の抽出・出生図の計算の状況
+    with gr.Accordion("DBの接続状況", open=False):
+        pool_stats_view = gr.Markdown()
+        pool_stats_update_btn = gr.Button("更新")
+    pool_stats_update_btn.click(
+        fn=lambda: get_connection_stats_markdown(message_repo, chart_service),
+        outputs=pool_stats_view,
+    )
+
     # 各ボタンのクリック時に対応する関数を呼び出す
     # コメント取得
     btn_livechat_start.click(
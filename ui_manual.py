@@ -10,6 +10,7 @@ import gradio as gr
 from app.application.audio import play_audio_file
 from app.application.generate_audio import VoiceTask
 from app.application.generate_result import GenerateResultTask
+from app.application.natal_chart import chart_service
 from app.application.obs_display_service import (
     DisplayWaitingCountTreadTask,
     get_comment,
@@ -22,52 +23,102 @@ from app.application.obs_display_service import (
 )
 from app.application.store_livechat import LivechatTask
 from app.application.text_service import extract_enclosed
+from app.config import (
+    EXTRACTION_CACHE_MAX_SIZE,
+    EXTRACTION_CACHE_TTL,
+    MESSAGE_CACHE_SIZE,
+    STATE_WRITE_BEHIND_INTERVAL,
+)
 from app.core.const import GRAFANA_URL
+from app.domain.westernastrology import AstrologyStage
 from app.infrastructure.db_common import initialize_db as init_db
+from app.infrastructure.repositoriesCachedImpl import (
+    CachedYoutubeLiveChatMessageRepositoryImpl,
+)
 from app.infrastructure.repositoriesImpl import (
+    BroadcastSessionRepositoryImpl,
+    InfoExtractionCacheRepositoryImpl,
     WesternAstrologyStateRepositoryImpl,
     YoutubeLiveChatMessageRepositoryImpl,
+    YoutubeLiveChatMessageSearchRepositoryImpl,
 )
+from app.infrastructure.repositoriesWriteBehindImpl import with_write_behind
+from app.infrastructure.state_notify import PgStateChangeListener
 from app.interfaces.gradio_app.constract_html import (
     div_center_bold_text,
     h1_tag,
     h2_tag,
 )
 from app.interfaces.obs.ui import (
+    SEARCH_RESULT_HEADERS,
     AstrologyData,
     LatestGlobalStateView,
     as_code_block,
     custom_css,
     get_chat_html,
+    get_connection_stats_markdown,
+    get_delta_cursor,
     get_info_html,
     get_play_button_name,
+    get_search_rows,
     get_user_name_and_comment_html,
+    merge_astrology_data,
 )
 
 logging_config.configure_logging()
 logger = getLogger(__name__)
 
+# 出生図を計算するワーカープロセスは fork で起動するので、他のスレッドを始める前に起動しておく
+if chart_service is not None:
+    chart_service.start()
+
+# 保存したメッセージをキャッシュし、状態と一緒に返すメッセージはキャッシュから取得する
+message_repo = CachedYoutubeLiveChatMessageRepositoryImpl(
+    YoutubeLiveChatMessageRepositoryImpl(), MESSAGE_CACHE_SIZE
+)
+
+# 占星術ステータスの書き込みは、全てのタスクで1つの書き込みを溜めるリポジトリにまとめる
+state_repo = with_write_behind(
+    WesternAstrologyStateRepositoryImpl(message_repo), STATE_WRITE_BEHIND_INTERVAL
+)
+
 # スレッドタスクの初期化
-voice_thread_task = VoiceTask("voice", WesternAstrologyStateRepositoryImpl())
+voice_thread_task = VoiceTask(
+    "voice",
+    state_repo,
+    listener=PgStateChangeListener([AstrologyStage.NO_VOICE]),
+)
 result_thread_task = GenerateResultTask(
     "result",
-    WesternAstrologyStateRepositoryImpl(),
-    YoutubeLiveChatMessageRepositoryImpl(),
+    state_repo,
+    listener=PgStateChangeListener(
+        [AstrologyStage.NOT_PREPARED, AstrologyStage.NO_RESULT]
+    ),
+    extraction_cache=InfoExtractionCacheRepositoryImpl(
+        EXTRACTION_CACHE_TTL, EXTRACTION_CACHE_MAX_SIZE
+    ),
 )
 livechat_thread_task = LivechatTask(
     "livechat",
-    WesternAstrologyStateRepositoryImpl(),
-    YoutubeLiveChatMessageRepositoryImpl(),
+    state_repo,
+    message_repo,
+    session_repo=BroadcastSessionRepositoryImpl(),
 )
 waiting_count_display_thread_task = DisplayWaitingCountTreadTask(
     "waiting_count_display",
-    WesternAstrologyStateRepositoryImpl(),
+    WesternAstrologyStateRepositoryImpl(message_repo),
     display_format="占い待ち: {}人",
     interval=5,
+    listener=PgStateChangeListener(list(AstrologyStage)),
+    session_repo=BroadcastSessionRepositoryImpl(),
 )
 
 # リポジトリ
-western_astrology_repo = WesternAstrologyStateRepositoryImpl()
+western_astrology_repo = WesternAstrologyStateRepositoryImpl(message_repo)
+search_repo = YoutubeLiveChatMessageSearchRepositoryImpl()
+
+# コメント検索の1ページの件数
+SEARCH_PAGE_SIZE = 20
 
 
 def initialize_db():
@@ -82,18 +133,25 @@ def initialize_db():
         raise gr.Error(f"データベースの初期化に失敗しました. {e}", duration=3)
 
 
-def get_latest_data() -> list[AstrologyData]:
+def get_latest_data(data_list: list[AstrologyData]) -> list[AstrologyData]:
     """
-    最新のデータを取得する
+    前回の取得以降に更新されたデータだけを取得して、保持しているデータに反映する
     """
+    cursor = get_delta_cursor(data_list)
     state_list, chat_message_list = (
-        western_astrology_repo.get_all_prepared_state_and_message()
+        western_astrology_repo.get_prepared_state_and_message_updated_after(cursor)
     )
-    all_astrology_data = []
+    # 前回の取得以降に取得の対象から外れたデータは、保持しているデータから取り除く
+    removed_message_ids = (
+        western_astrology_repo.get_unprepared_message_ids_updated_after(cursor)
+        if cursor is not None
+        else []
+    )
+    new_astrology_data = []
     for state, message in zip(state_list, chat_message_list, strict=True):
         data: AstrologyData = AstrologyData(chat_message=message, state=state)
-        all_astrology_data.append(data)
-    return all_astrology_data
+        new_astrology_data.append(data)
+    return merge_astrology_data(data_list, new_astrology_data, removed_message_ids)
 
 
 def unpack_latest_state_view(func):
@@ -113,12 +171,14 @@ def unpack_latest_state_view(func):
 
 
 @unpack_latest_state_view
-def update_data(current_index) -> LatestGlobalStateView:
+def update_data(
+    current_index: int, data_list: list[AstrologyData]
+) -> LatestGlobalStateView:
     """
     表示中の AstrologyData を更新して内容を返す。
     """
     # データを更新する
-    data_list: list[AstrologyData] = get_latest_data()
+    data_list = get_latest_data(data_list)
 
     if not data_list:
         return LatestGlobalStateView(
@@ -202,7 +262,7 @@ def play_current_audio(
     play_audio_file(data.state.result_voice_path)
     # 再生済みフラグを更新
     data.state.is_played = True
-    western_astrology_repo.save([data.state])
+    western_astrology_repo.mark_played([data.state.message_id])
 
 
 @unpack_latest_state_view
@@ -224,6 +284,33 @@ def play_current_audio_ui(current_index, data_list) -> LatestGlobalStateView:
     )
 
 
+def search_messages(query: str, page: int) -> tuple[list[list[str]], str, int]:
+    """
+    現在の配信セッションのコメントを検索して、page ページ目（0始まり）の結果を返す
+    """
+    page = max(page, 0)
+    try:
+        # 次のページがあるかを調べるため、1件多く取得する
+        messages = search_repo.search(
+            query, SEARCH_PAGE_SIZE + 1, offset=page * SEARCH_PAGE_SIZE
+        )
+    except Exception as e:
+        raise gr.Error(f"コメントの検索に失敗しました. {e}", duration=3)
+    if not messages and page > 0:
+        # 最後のページより後ろには進まない
+        return search_messages(query, page - 1)
+    has_next = len(messages) > SEARCH_PAGE_SIZE
+    messages = messages[:SEARCH_PAGE_SIZE]
+    if messages:
+        start = page * SEARCH_PAGE_SIZE + 1
+        page_info = f"{start} - {start + len(messages) - 1} 件目"
+        if has_next:
+            page_info += "（続きあり）"
+    else:
+        page_info = "該当するコメントはありません"
+    return get_search_rows(messages), page_info, page
+
+
 def update_user_info_in_obs(current_index: int, data_list: list[AstrologyData]):
     """
     OBSに表示する情報を更新して返す
@@ -300,7 +387,7 @@ with gr.Blocks(css=custom_css) as demo:
         # 更新ボタン：DBから最新データを取得して表示を更新
         update_btn.click(
             fn=update_data,
-            inputs=[state_index],
+            inputs=[state_index, all_data],
             outputs=[
                 all_data,
                 info_html_component,
@@ -353,6 +440,46 @@ with gr.Blocks(css=custom_css) as demo:
         ],
     )
 
+    # 投稿者名とコメントの一部で、過去のコメントを探す
+    with gr.Accordion("コメント検索", open=False):
+        with gr.Row():
+            search_query = gr.Textbox(
+                interactive=True,
+                placeholder="投稿者名やコメントの一部（空白で区切ると全てを含むもの）",
+                show_label=False,
+                scale=4,
+            )
+            search_btn = gr.Button("検索", scale=1)
+        search_results = gr.Dataframe(
+            headers=SEARCH_RESULT_HEADERS, interactive=False, wrap=True
+        )
+        with gr.Row():
+            search_prev_btn = gr.Button("前へ")
+            search_page_info = gr.Markdown()
+            search_next_btn = gr.Button("次へ")
+        search_page = gr.State(0)
+    search_outputs = [search_results, search_page_info, search_page]
+    search_btn.click(
+        fn=lambda query: search_messages(query, 0),
+        inputs=[search_query],
+        outputs=search_outputs,
+    )
+    search_query.submit(
+        fn=lambda query: search_messages(query, 0),
+        inputs=[search_query],
+        outputs=search_outputs,
+    )
+    search_prev_btn.click(
+        fn=lambda query, page: search_messages(query, page - 1),
+        inputs=[search_query, search_page],
+        outputs=search_outputs,
+    )
+    search_next_btn.click(
+        fn=lambda query, page: search_messages(query, page + 1),
+        inputs=[search_query, search_page],
+        outputs=search_outputs,
+    )
+
     gr.Markdown("-------------------------")
     with gr.Row():
         gr.HTML(h2_tag("バックグラウンドの処理の管理"))
@@ -395,6 +522,16 @@ with gr.Blocks(css=custom_css) as demo:
         fn=initialize_db,
     )
 
+    # タスクごとのDBのコネクションの使用状況（コネクションプールの枯渇に気付くため）と、
+    # メッセージのキャッシュ・情報の抽出・出生図の計算の状況
+    with gr.Accordion("DBの接続状況", open=False):
+        pool_stats_view = gr.Markdown()
+        pool_stats_update_btn = gr.Button("更新")
+    pool_stats_update_btn.click(
+        fn=lambda: get_connection_stats_markdown(message_repo, chart_service),
+        outputs=pool_stats_view,
+    )
+
     # 各ボタンのクリック時に対応する関数を呼び出す
     # コメント取得
     btn_livechat_start.click(